@@ -0,0 +1,128 @@
+"""
+Бенчмарк накладных расходов журнала запросов (src.utils.access_log).
+
+Поднимает приложение в этом же процессе (ASGI без сети, база из .env, как при обычном запуске),
+создает продавца с книгой и гоняет GET книги и PATCH книги с токеном без журнала, с обычным
+logging.FileHandler (запись и flush файла на каждый запрос в цикле событий - для сравнения),
+с очередью и записью пачками и с очередью при доле --ratio успешных запросов.
+Журнал пишется во временный файл. Печатается лучшее из --rounds время запроса и прирост
+к запросу без журнала, а также время самой записи в журнал в цикле событий (без запросов).
+
+Пример:
+    python -m src.benchmarks.access_log --requests 2000 --ratio 0.1 --rounds 3
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+import httpx
+
+from src.main import app
+from src.utils.access_log import AccessLogFormatter, access_log_writer
+
+SELLER = {"first_name": "Bench", "last_name": "Access", "email": "bench@access.bench", "password": "password"}
+
+
+async def seed(client: httpx.AsyncClient) -> tuple:
+    await client.post("/api/v1/seller/", json=SELLER)
+    response = await client.post("/api/v1/token", data={"username": SELLER["email"], "password": SELLER["password"]})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await client.get("/api/v1/seller/")
+    seller_id = next(seller["id"] for seller in response.json()["sellers"] if seller["email"] == SELLER["email"])
+    book = {"title": "Bench", "author": "Bench", "year": 2020, "count_pages": 100, "seller_id": seller_id}
+    response = await client.post("/api/v1/books/", json=book, headers=headers)
+    return response.json()["id"], book, headers
+
+
+async def measure(client: httpx.AsyncClient, requests: int, book_id: int, book: dict, headers: dict) -> dict:
+    timings = {}
+    started = time.perf_counter()
+    for _ in range(requests):
+        await client.get(f"/api/v1/books/{book_id}")
+    timings["get_book"] = (time.perf_counter() - started) / requests
+    started = time.perf_counter()
+    for _ in range(requests // 10):
+        await client.patch(f"/api/v1/books/{book_id}", json={"count_pages": book["count_pages"]}, headers=headers)
+    timings["patch_book"] = (time.perf_counter() - started) / (requests // 10)
+    return timings
+
+
+def record_cost(handlers: list, records: int) -> float:
+    """
+    Сколько микросекунд цикл событий тратит на одну запись журнала.
+    """
+    access_log_writer.logger.handlers = handlers
+    entry = {"method": "GET", "route": "/api/v1/books/{book_id}", "status": 200, "latency_ms": 1.0}
+    started = time.perf_counter()
+    for _ in range(records):
+        access_log_writer.log(dict(entry))
+    return (time.perf_counter() - started) / records * 1e6
+
+
+async def main(requests: int, ratio: float, rounds: int) -> None:
+    directory = tempfile.mkdtemp()
+    access_log_writer.path = os.path.join(directory, "access.log")
+    access_log_writer.start()
+    queue_handlers = list(access_log_writer.logger.handlers)
+    sync_handler = logging.FileHandler(os.path.join(directory, "access-sync.log"))
+    sync_handler.setFormatter(AccessLogFormatter())
+    # (имя, журнал включен, обработчики логгера, доля успешных запросов)
+    modes = [
+        ("off", False, queue_handlers, 1.0),
+        ("file handler", True, [sync_handler], 1.0),
+        ("queue 1.0", True, queue_handlers, 1.0),
+        (f"queue {ratio}", True, queue_handlers, ratio),
+    ]
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            book_id, book, headers = await seed(client)
+            await measure(client, requests // 10, book_id, book, headers)  # прогрев
+
+            # Режимы чередуются по кругам, берется лучший круг: так рост базы и шум не попадают в разницу
+            best = {}
+            for _ in range(rounds):
+                for name, enabled, handlers, sample_ratio in modes:
+                    access_log_writer.enabled, access_log_writer.sample_ratio = enabled, sample_ratio
+                    access_log_writer.logger.handlers = handlers
+                    timings = await measure(client, requests, book_id, book, headers)
+                    best[name] = {key: min(value, best.get(name, timings)[key]) for key, value in timings.items()}
+            access_log_writer.enabled = False
+
+    baseline = best["off"]
+    print(f"{'mode':<14} {'GET us':>9} {'PATCH us':>9} {'GET +%':>7} {'PATCH +%':>9}")
+    for name, timings in best.items():
+        print(
+            f"{name:<14} {timings['get_book'] * 1e6:>9.0f} {timings['patch_book'] * 1e6:>9.0f} "
+            f"{(timings['get_book'] / baseline['get_book'] - 1) * 100:>7.1f} "
+            f"{(timings['patch_book'] / baseline['patch_book'] - 1) * 100:>9.1f}"
+        )
+    # Очередь побольше, чтобы замер не упирался в отбрасывание записей
+    access_log_writer.shutdown()
+    access_log_writer.queue_size = max(access_log_writer.queue_size, requests * 10)
+    access_log_writer.start()
+    sync_cost = record_cost([sync_handler], requests * 10)
+    queue_cost = record_cost(queue_handlers, requests * 10)
+    print(f"\nper record in the event loop: file handler {sync_cost:.1f} us, queue {queue_cost:.1f} us")
+    access_log_writer.shutdown()
+
+    stats = access_log_writer.stats()
+    print(
+        f"\nqueued: {stats['written']} written in {stats['batches']} batches, "
+        f"{stats['sampled_out']} sampled out, {stats['dropped']} dropped"
+    )
+    print(f"log files: {directory}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--ratio", type=float, default=0.1, help="sampled share of successful requests")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.ratio, args.rounds))
@@ -0,0 +1,97 @@
+"""
+Бенчмарк адаптивного лимита одновременных запросов (src.utils.concurrency) на модели перегрузки.
+
+База моделируется пулом из --pool соединений, запрос держит соединение --service-ms.
+Клиенты приходят с постоянной частотой --rps (открытая нагрузка, как у реального трафика),
+которая выше пропускной способности пула. Без лимита запросы копятся в очереди пула,
+и задержка растет все время нагрузки; с лимитом лишние запросы быстро получают 503,
+а задержка принятых остается ограниченной. Печатается таблица задержек и отказов.
+
+Пример:
+    python -m src.benchmarks.admission --rps 1500 --pool 10 --service-ms 10 --duration 5
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List, Optional
+
+from src.utils.concurrency import LIMIT_ALGORITHMS, AdaptiveLimiter, LimitExceeded
+
+
+async def _request(pool: asyncio.Semaphore, service: float, limiter: Optional[AdaptiveLimiter], latencies: List[float]):
+    started = time.perf_counter()
+    if limiter is not None:
+        try:
+            await limiter.acquire()
+        except LimitExceeded:
+            return False
+    admitted = time.perf_counter()
+    try:
+        async with pool:
+            await asyncio.sleep(service)
+    finally:
+        if limiter is not None:
+            limiter.release(time.perf_counter() - admitted)
+    latencies.append(time.perf_counter() - started)
+    return True
+
+
+async def run(rps: int, pool_size: int, service: float, duration: float, limiter: Optional[AdaptiveLimiter]) -> dict:
+    pool = asyncio.Semaphore(pool_size)
+    latencies: List[float] = []
+    tasks = []
+    started = time.perf_counter()
+    sent = 0
+    while time.perf_counter() - started < duration:
+        # Догоняем расписание: сколько запросов должно было прийти к этому моменту
+        due = int((time.perf_counter() - started) * rps)
+        for _ in range(due - sent):
+            tasks.append(asyncio.create_task(_request(pool, service, limiter, latencies)))
+        sent = due
+        await asyncio.sleep(0.001)
+    results = await asyncio.gather(*tasks)
+
+    latencies.sort()
+    return {
+        "sent": sent,
+        "ok": sum(results),
+        "rejected": sent - sum(results),
+        "p50": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+        "max": latencies[-1] * 1000 if latencies else 0.0,
+        "limit": limiter.current_limit if limiter is not None else "-",
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=int, default=1500, help="offered load")
+    parser.add_argument("--pool", type=int, default=10, help="database connections")
+    parser.add_argument("--service-ms", type=float, default=10.0, help="time a request holds a connection")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--max-queue", type=int, default=50)
+    parser.add_argument("--queue-timeout", type=float, default=1.0)
+    args = parser.parse_args()
+
+    capacity = args.pool * 1000 / args.service_ms
+    print(f"offered {args.rps} rps, capacity {capacity:.0f} rps")
+    print(
+        f"{'limiter':<10} {'sent':>7} {'ok':>7} {'rejected':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'limit':>6}"
+    )
+    for name in ("none",) + LIMIT_ALGORITHMS:
+        limiter = None
+        if name != "none":
+            limiter = AdaptiveLimiter(
+                name, args.pool, args.pool * 10, args.max_queue, args.queue_timeout, algorithm=name
+            )
+        result = asyncio.run(run(args.rps, args.pool, args.service_ms / 1000, args.duration, limiter))
+        print(
+            f"{name:<10} {result['sent']:>7} {result['ok']:>7} {result['rejected']:>9} {result['p50']:>9.1f} "
+            f"{result['p99']:>9.1f} {result['max']:>9.1f} {result['limit']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Бенчмарк сжатия списков книг: сколько CPU стоит каждая кодировка и сколько байт она экономит.
+
+Строит ответ ReturnedAllBooks из синтетических книг, сериализует его ORJSON
+(как ORJSONResponse) и для каждой доступной кодировки печатает размер, степень сжатия
+и время сжатия. Отдельно показан MessagePack и повторная отдача из кэша сжатых тел.
+
+Пример:
+    python -m src.benchmarks.compression --books 1000 10000 100000
+"""
+
+import argparse
+import time
+
+import orjson
+
+from src.schemas.books import ReturnedAllBooks, ReturnedBook
+from src.utils.compression import CompressedBodyCache, compressors, msgpack
+
+
+def make_body(count: int) -> bytes:
+    books = [
+        ReturnedBook(
+            id=i,
+            title=f"Book title {i}",
+            author=f"Author {i % 500}",
+            year=1900 + i % 120,
+            count_pages=100 + i % 900,
+            seller_id=i % 1000,
+        )
+        for i in range(count)
+    ]
+    return orjson.dumps(ReturnedAllBooks(books=books).model_dump())
+
+
+def timeit(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'books':>8} {'format':>12} {'bytes':>12} {'ratio':>7} {'ms':>9} {'MB/s':>8}")
+    for count in args.books:
+        body = make_body(count)
+        print(f"{count:>8} {'json':>12} {len(body):>12} {1:>7.2f} {0:>9.2f} {'-':>8}")
+
+        if msgpack is not None:
+            packed = msgpack.packb(orjson.loads(body))
+            elapsed = timeit(lambda: msgpack.packb(orjson.loads(body)), args.repeat)  # noqa: B023
+            print(
+                f"{count:>8} {'msgpack':>12} {len(packed):>12} {len(body) / len(packed):>7.2f} "
+                f"{elapsed * 1000:>9.2f} {len(body) / elapsed / 2**20:>8.1f}"
+            )
+
+        for encoding, compress in compressors.items():
+            compressed = compress(body)
+            elapsed = timeit(lambda: compress(body), args.repeat)  # noqa: B023
+            print(
+                f"{count:>8} {encoding:>12} {len(compressed):>12} {len(body) / len(compressed):>7.2f} "
+                f"{elapsed * 1000:>9.2f} {len(body) / elapsed / 2**20:>8.1f}"
+            )
+
+            cache = CompressedBodyCache(max_bytes=len(compressed) * 2)
+            cache.get_or_compress(encoding, body)
+            elapsed = timeit(lambda: cache.get_or_compress(encoding, body), args.repeat)  # noqa: B023
+            print(
+                f"{count:>8} {encoding + ' cached':>12} {len(compressed):>12} {len(body) / len(compressed):>7.2f} "
+                f"{elapsed * 1000:>9.2f} {len(body) / elapsed / 2**20:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Калибровка стоимости хеширования паролей под текущее железо.
+
+Для bcrypt перебираются rounds (каждый шаг удваивает время), для argon2id - time_cost
+при заданных memory_cost и parallelism. Для каждой стоимости печатается медианное время
+хеширования (вход продавца стоит столько же: verify считает тот же хеш) и число входов
+в секунду на одно ядро. В конце - самая дорогая стоимость, укладывающаяся в --target-ms,
+в виде переменных окружения для Settings. Хеши с меньшей стоимостью пересчитаются при входе.
+
+Пример:
+    python -m src.benchmarks.password_hashing --target-ms 250
+    python -m src.benchmarks.password_hashing --scheme argon2 --target-ms 100 --memory-cost 19456 --parallelism 1
+"""
+
+import argparse
+import statistics
+import time
+from typing import Callable, Iterator, Optional, Tuple
+
+from passlib.hash import argon2
+
+from src.configurations.settings import settings
+from src.utils.auth import PASSWORD_SCHEMES, make_password_context
+
+PASSWORD = "benchmark-password"
+
+
+def median_ms(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def bcrypt_costs(max_rounds: int) -> Iterator[Tuple[int, dict]]:
+    for rounds in range(4, max_rounds + 1):
+        yield rounds, {"scheme": "bcrypt", "bcrypt_rounds": rounds}
+
+
+def argon2_costs(max_time_cost: int, memory_cost: int, parallelism: int) -> Iterator[Tuple[int, dict]]:
+    for time_cost in range(1, max_time_cost + 1):
+        yield time_cost, {
+            "scheme": "argon2",
+            "argon2_time_cost": time_cost,
+            "argon2_memory_cost": memory_cost,
+            "argon2_parallelism": parallelism,
+        }
+
+
+def calibrate(costs: Iterator[Tuple[int, dict]], target_ms: float, repeat: int) -> Optional[int]:
+    """
+    Печатает время для растущей стоимости, пока оно не превысит цель вдвое.
+    Возвращает самую дорогую стоимость в пределах цели (None - даже минимальная дороже).
+    """
+    best = None
+    for cost, options in costs:
+        context = make_password_context(**options)
+        context.hash(PASSWORD)  # прогрев
+        elapsed = median_ms(lambda: context.hash(PASSWORD), repeat)  # noqa: B023
+        mark = "<=" if elapsed <= target_ms else ">"
+        print(f"{options['scheme']:>8} {cost:>6} {elapsed:>10.1f} {1000 / elapsed:>12.1f} {mark:>4} target")
+        if elapsed <= target_ms:
+            best = cost
+        if elapsed > target_ms * 2:
+            break
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scheme", choices=PASSWORD_SCHEMES, default=settings.password_scheme)
+    parser.add_argument("--target-ms", type=float, default=250.0, help="acceptable hashing time of one login")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-rounds", type=int, default=16, help="bcrypt")
+    parser.add_argument("--max-time-cost", type=int, default=10, help="argon2")
+    parser.add_argument("--memory-cost", type=int, default=settings.password_argon2_memory_cost, help="argon2, KiB")
+    parser.add_argument("--parallelism", type=int, default=settings.password_argon2_parallelism, help="argon2")
+    args = parser.parse_args()
+
+    print(f"{'scheme':>8} {'cost':>6} {'ms':>10} {'logins/s':>12}      (per core)")
+    if args.scheme == "bcrypt":
+        best = calibrate(bcrypt_costs(args.max_rounds), args.target_ms, args.repeat)
+        recommendation = {"PASSWORD_SCHEME": "bcrypt", "PASSWORD_BCRYPT_ROUNDS": best}
+    else:
+        if not argon2.has_backend():
+            print("argon2 is not available: poetry install -E argon2")
+            return
+        best = calibrate(
+            argon2_costs(args.max_time_cost, args.memory_cost, args.parallelism), args.target_ms, args.repeat
+        )
+        recommendation = {
+            "PASSWORD_SCHEME": "argon2",
+            "PASSWORD_ARGON2_TIME_COST": best,
+            "PASSWORD_ARGON2_MEMORY_COST": args.memory_cost,
+            "PASSWORD_ARGON2_PARALLELISM": args.parallelism,
+        }
+
+    if best is None:
+        print(f"even the lowest cost takes longer than {args.target_ms:.0f} ms")
+        return
+    print(f"\nrecommended settings for {args.target_ms:.0f} ms:")
+    for name, value in recommendation.items():
+        print(f"{name}={value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Бенчмарк накладных расходов сэмплирующего профилировщика (src.utils.profiler).
+
+Поднимает приложение в этом же процессе (ASGI без сети, база из .env, как при обычном запуске),
+создает продавца с книгой и гоняет GET книги и PATCH книги с токеном без профилировщика
+и с профилировщиком на интервалах --intervals (мс процессорного времени). Печатается лучшее
+из --rounds время запроса, прирост к запросу без профилировщика, число снимков и доля времени
+в обработчике сигнала. С --top печатаются самые частые стеки последнего прогона.
+
+Пример:
+    python -m src.benchmarks.profiler --requests 2000 --intervals 10 1 --rounds 3 --top 5
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from src.main import app
+from src.utils.profiler import SamplingProfiler
+
+SELLER = {"first_name": "Bench", "last_name": "Profiler", "email": "bench@profiler.bench", "password": "password"}
+
+
+async def seed(client: httpx.AsyncClient) -> tuple:
+    await client.post("/api/v1/seller/", json=SELLER)
+    response = await client.post("/api/v1/token", data={"username": SELLER["email"], "password": SELLER["password"]})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await client.get("/api/v1/seller/")
+    seller_id = next(seller["id"] for seller in response.json()["sellers"] if seller["email"] == SELLER["email"])
+    book = {"title": "Bench", "author": "Bench", "year": 2020, "count_pages": 100, "seller_id": seller_id}
+    response = await client.post("/api/v1/books/", json=book, headers=headers)
+    return response.json()["id"], book, headers
+
+
+async def measure(client: httpx.AsyncClient, requests: int, book_id: int, book: dict, headers: dict) -> dict:
+    timings = {}
+    started = time.perf_counter()
+    for _ in range(requests):
+        await client.get(f"/api/v1/books/{book_id}")
+    timings["get_book"] = (time.perf_counter() - started) / requests
+    started = time.perf_counter()
+    for _ in range(requests // 10):
+        await client.patch(f"/api/v1/books/{book_id}", json={"count_pages": book["count_pages"]}, headers=headers)
+    timings["patch_book"] = (time.perf_counter() - started) / (requests // 10)
+    return timings
+
+
+async def main(requests: int, intervals: list, rounds: int, top: int) -> None:
+    modes = [("off", None)] + [(f"{interval:g} ms", interval) for interval in intervals]
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            book_id, book, headers = await seed(client)
+            await measure(client, requests // 10, book_id, book, headers)  # прогрев
+
+            # Режимы чередуются по кругам, берется лучший круг: так рост базы и шум не попадают в разницу
+            best, results = {}, {}
+            for _ in range(rounds):
+                for name, interval in modes:
+                    profiler = None
+                    if interval is not None:
+                        profiler = SamplingProfiler(interval / 1000, loop=asyncio.get_running_loop())
+                        profiler.start()
+                    try:
+                        timings = await measure(client, requests, book_id, book, headers)
+                    finally:
+                        if profiler is not None:
+                            results[name] = profiler.stop()
+                    best[name] = {key: min(value, best.get(name, timings)[key]) for key, value in timings.items()}
+
+    baseline = best["off"]
+    print(
+        f"{'profiler':<10} {'GET us':>9} {'PATCH us':>9} {'GET +%':>7} {'PATCH +%':>9} {'samples':>8} {'handler %':>10}"
+    )
+    for name, timings in best.items():
+        result = results.get(name)
+        print(
+            f"{name:<10} {timings['get_book'] * 1e6:>9.0f} {timings['patch_book'] * 1e6:>9.0f} "
+            f"{(timings['get_book'] / baseline['get_book'] - 1) * 100:>7.1f} "
+            f"{(timings['patch_book'] / baseline['patch_book'] - 1) * 100:>9.1f} "
+            f"{result.samples if result else '-':>8} {f'{result.overhead * 100:.2f}' if result else '-':>10}"
+        )
+    if top and results:
+        name, result = list(results.items())[-1]
+        print(f"\ntop stacks ({name}):")
+        for stack, count in result.stacks.most_common(top):
+            print(f"{count:>6}  {';'.join(stack[:1] + stack[-3:])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--intervals", type=float, nargs="+", default=[10.0, 1.0], help="sampling intervals, ms")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--top", type=int, default=0, help="print the most frequent stacks")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.intervals, args.rounds, args.top))
@@ -0,0 +1,397 @@
+"""
+Воспроизведение трафика под нагрузкой: запросы из файлов REST Client (test.http) и записи трафика
+(JSONL от src.utils.traffic_capture) с отчетом о задержках по ручкам.
+
+Файлы .http разбираются как в плагине REST Client: запросы разделяются "###", "@имя = значение" -
+переменные файла, "# @name имя" - имя запроса, на ответ которого ссылаются {{имя.response.body.поле}}
+и {{имя.response.headers.Заголовок}}; поддерживаются {{$guid}}, {{$randomInt min max}}, {{$timestamp}}.
+Хост из файла заменяется на --base-url. Файлы .jsonl - записанный трафик: в путях ИД продавца и книги
+подставляются из подготовки, кроме DELETE (--keep-ids оставляет записанные везде), запросам с токеном
+добавляется свой.
+
+Перед запуском создается продавец (--email, --password), в /api/v1/token получается его токен
+и создается книга; переменные email, password, token, seller_id и book_id перекрывают значения
+из файла, -v имя=значение перекрывает все. Каждый из --concurrency виртуальных пользователей проходит
+запросы по порядку (записанный трафик - каждый со своего места, чтобы не повторять одно и то же
+одновременно) через общий пул соединений с keep-alive, пока не выполнено --requests запросов
+или не прошло --duration секунд. Печатается таблица задержек по ручкам.
+
+Пример:
+    python -m src.benchmarks.replay test.http --concurrency 20 --requests 5000
+    python -m src.benchmarks.replay capture.jsonl --base-url http://127.0.0.1:8000 --duration 60
+    python -m src.benchmarks.replay test.http --in-process --requests 500
+"""
+
+import argparse
+import asyncio
+import random
+import re
+import time
+import uuid
+from itertools import count
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+import orjson
+
+METHODS = ("GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS")
+VARIABLE = re.compile(r"{{\s*(.+?)\s*}}")
+FILE_VARIABLE = re.compile(r"^@([\w.-]+)\s*=\s*(.*)$")
+REQUEST_NAME = re.compile(r"^(?:#|//)\s*@name\s+(\S+)")
+ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+# Переменные, которые подставляет подготовка: они перекрывают значения из файла
+SETUP_VARIABLES = ("email", "password", "token", "seller_id", "book_id")
+
+
+class Unresolved(Exception):
+    pass
+
+
+class RequestTemplate:
+    __slots__ = ("name", "method", "url", "headers", "body", "route")
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        body: Optional[str] = None,
+        name: Optional[str] = None,
+        route: Optional[str] = None,
+    ):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.headers = headers
+        self.body = body
+        self.route = route
+
+    def endpoint(self, path: str) -> str:
+        # Записанный трафик знает шаблон пути ручки, для .http ИД в пути заменяются на {id}
+        return f"{self.method} {self.route or ID_SEGMENT.sub('/{id}', path)}"
+
+
+def parse_http_file(text: str) -> Tuple[List[RequestTemplate], Dict[str, str]]:
+    """
+    Запросы и переменные файла REST Client.
+    """
+    requests: List[RequestTemplate] = []
+    variables: Dict[str, str] = {}
+    for block in re.split(r"^###.*$", text, flags=re.MULTILINE):
+        name, method, url = None, None, None
+        headers: Dict[str, str] = {}
+        body_lines: List[str] = []
+        state = "request"
+        for line in block.splitlines():
+            stripped = line.strip()
+            if state == "request":
+                if not stripped:
+                    continue
+                if stripped.startswith(("#", "//")):
+                    match = REQUEST_NAME.match(stripped)
+                    if match:
+                        name = match.group(1)
+                    continue
+                match = FILE_VARIABLE.match(stripped)
+                if match:
+                    variables[match.group(1)] = match.group(2).strip()
+                    continue
+                parts = stripped.split()
+                if parts[0].upper() in METHODS:
+                    method, url = parts[0].upper(), parts[1]
+                else:
+                    method, url = "GET", parts[0]
+                state = "headers"
+            elif state == "headers":
+                if not stripped:
+                    state = "body"
+                elif stripped.startswith(("?", "&")):
+                    # Продолжение строки запроса на следующей строке
+                    url += stripped
+                elif not stripped.startswith(("#", "//")):
+                    header, _, value = stripped.partition(":")
+                    headers[header.strip()] = value.strip()
+            else:
+                body_lines.append(line)
+        if method is None:
+            continue
+        body = "\n".join(body_lines).strip() or None
+        requests.append(RequestTemplate(method, url, headers, body, name))
+    return requests, variables
+
+
+def parse_capture(lines: Iterable[str], template_ids: bool = True) -> List[RequestTemplate]:
+    """
+    Запросы из записи трафика (src.utils.traffic_capture). Запросы с обрезанным телом пропускаются.
+    """
+    requests = []
+    for line in lines:
+        if not line.strip():
+            continue
+        entry = orjson.loads(line)
+        if entry.get("body_truncated"):
+            continue
+        path = entry["path"]
+        body = entry.get("body")
+        # Удаление не переносится на продавца и книгу из подготовки: остальным запросам они еще нужны
+        if template_ids and entry.get("route") and entry["method"] != "DELETE":
+            path = entry["route"]
+            for param, value in entry.get("path_params", {}).items():
+                replacement = "{{%s}}" % param if param in SETUP_VARIABLES else value
+                path = path.replace("{%s}" % param, replacement)
+            if body and '"seller_id":' in body:
+                data = orjson.loads(body)
+                if isinstance(data, dict) and "seller_id" in data:
+                    data["seller_id"] = "__seller_id__"
+                    body = orjson.dumps(data).decode().replace('"__seller_id__"', "{{seller_id}}")
+        if entry.get("query"):
+            path = f"{path}?{entry['query']}"
+        headers = dict(entry.get("headers", {}))
+        if entry.get("auth"):
+            headers["Authorization"] = "Bearer {{token}}"
+        requests.append(RequestTemplate(entry["method"], path, headers, body, route=entry.get("route")))
+    return requests
+
+
+def _system_variable(expression: str) -> str:
+    name, *args = expression.split()
+    if name == "$guid":
+        return str(uuid.uuid4())
+    if name == "$randomInt":
+        return str(random.randint(int(args[0]), int(args[1]) - 1))
+    if name == "$timestamp":
+        return str(int(time.time()))
+    raise Unresolved(expression)
+
+
+def _response_variable(expression: str, responses: Dict[str, httpx.Response]) -> str:
+    # имя.response.body.поле.поле (допускается и JSONPath-запись $.поле) или имя.response.headers.Заголовок
+    parts = expression.split(".")
+    response = responses.get(parts[0])
+    if response is None or len(parts) < 3 or parts[1] != "response":
+        raise Unresolved(expression)
+    if parts[2] == "headers" and len(parts) == 4:
+        if parts[3] not in response.headers:
+            raise Unresolved(expression)
+        return response.headers[parts[3]]
+    if parts[2] != "body":
+        raise Unresolved(expression)
+    try:
+        value = response.json()
+    except ValueError:
+        raise Unresolved(expression)
+    for key in parts[3:]:
+        if key == "$":
+            continue
+        if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        elif isinstance(value, dict) and key in value:
+            value = value[key]
+        else:
+            raise Unresolved(expression)
+    return value if isinstance(value, str) else orjson.dumps(value).decode()
+
+
+def render(text: str, variables: Dict[str, str], responses: Dict[str, httpx.Response], depth: int = 0) -> str:
+    """
+    Подставляет {{переменные}}. Значение переменной само может ссылаться на переменные.
+    """
+    if depth > 10:
+        raise Unresolved(text)
+
+    def substitute(match: re.Match) -> str:
+        expression = match.group(1)
+        if expression.startswith("$"):
+            return _system_variable(expression)
+        if expression in variables:
+            return render(variables[expression], variables, responses, depth + 1)
+        return _response_variable(expression, responses)
+
+    return VARIABLE.sub(substitute, text)
+
+
+def display(text: str, variables: Dict[str, str], responses: Dict[str, httpx.Response]) -> str:
+    """
+    Подстановка для отчета: переменные, которые не удалось вычислить, становятся {id}.
+    """
+
+    def substitute(match: re.Match) -> str:
+        try:
+            return render(match.group(0), variables, responses)
+        except Unresolved:
+            return "{id}"
+
+    return VARIABLE.sub(substitute, text)
+
+
+def request_path(url: str) -> str:
+    """
+    Путь с параметрами: хост из файла заменяется адресом, по которому идет воспроизведение.
+    """
+    if url.startswith(("http://", "https://")):
+        parts = urlsplit(url)
+        return parts.path + (f"?{parts.query}" if parts.query else "")
+    return url
+
+
+async def prepare_variables(client: httpx.AsyncClient, email: str, password: str) -> Dict[str, str]:
+    """
+    Продавец, его токен из /api/v1/token и книга для подстановки в запросы.
+    """
+    seller = {"first_name": "Replay", "last_name": "Seller", "email": email, "password": password}
+    await client.post("/api/v1/seller/", json=seller)  # уже существует - не страшно
+    response = await client.post("/api/v1/token", data={"username": email, "password": password})
+    if response.status_code != 200:
+        raise SystemExit(f"Cannot get a token for {email}: {response.status_code} {response.text}")
+    token = response.json()["access_token"]
+    response = await client.get("/api/v1/seller/")
+    seller_id = next(item["id"] for item in response.json()["sellers"] if item["email"] == email)
+    book = {"title": "Replay", "author": "Replay", "year": 2020, "count_pages": 100, "seller_id": seller_id}
+    response = await client.post("/api/v1/books/", json=book, headers={"Authorization": f"Bearer {token}"})
+    return {
+        "email": email,
+        "password": password,
+        "token": token,
+        "seller_id": str(seller_id),
+        "book_id": str(response.json()["id"]),
+    }
+
+
+class EndpointStats:
+    __slots__ = ("latencies", "statuses", "errors", "unresolved")
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Dict[int, int] = {}
+        self.errors = 0
+        self.unresolved = 0
+
+    def percentile(self, share: float) -> float:
+        if not self.latencies:
+            return 0.0
+        return self.latencies[min(len(self.latencies) - 1, int(len(self.latencies) * share))] * 1000
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    requests: List[RequestTemplate],
+    variables: Dict[str, str],
+    concurrency: int,
+    total: int,
+    duration: Optional[float] = None,
+    stagger: bool = False,
+) -> Dict[str, EndpointStats]:
+    stats: Dict[str, EndpointStats] = {}
+    budget = count()
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def user(number: int) -> None:
+        responses: Dict[str, httpx.Response] = {}
+        index = number * len(requests) // concurrency if stagger else 0
+        while next(budget) < total and (deadline is None or time.perf_counter() < deadline):
+            template = requests[index % len(requests)]
+            index += 1
+            try:
+                path = request_path(render(template.url, variables, responses))
+                headers = {key: render(value, variables, responses) for key, value in template.headers.items()}
+                body = render(template.body, variables, responses) if template.body is not None else None
+            except Unresolved:
+                # Нет ответа, на который ссылается запрос: пользователь начал не с начала файла
+                path = request_path(display(template.url, variables, responses))
+                stats.setdefault(template.endpoint(path.split("?")[0]), EndpointStats()).unresolved += 1
+                continue
+            endpoint = stats.setdefault(template.endpoint(path.split("?")[0]), EndpointStats())
+            started = time.perf_counter()
+            try:
+                response = await client.request(template.method, path, headers=headers, content=body)
+            except httpx.HTTPError:
+                endpoint.errors += 1
+                continue
+            endpoint.latencies.append(time.perf_counter() - started)
+            endpoint.statuses[response.status_code] = endpoint.statuses.get(response.status_code, 0) + 1
+            if template.name:
+                responses[template.name] = response
+
+    await asyncio.gather(*(user(number) for number in range(concurrency)))
+    for endpoint in stats.values():
+        endpoint.latencies.sort()
+    return stats
+
+
+def print_report(stats: Dict[str, EndpointStats], elapsed: float) -> None:
+    print(
+        f"{'endpoint':<42} {'count':>7} {'2xx/3xx':>8} {'4xx':>6} {'5xx':>6} {'errors':>7} "
+        f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    )
+    completed = 0
+    for name, endpoint in sorted(stats.items(), key=lambda item: item[0].split(" ", 1)[::-1]):
+        ok = sum(value for status, value in endpoint.statuses.items() if status < 400)
+        client_errors = sum(value for status, value in endpoint.statuses.items() if 400 <= status < 500)
+        server_errors = sum(value for status, value in endpoint.statuses.items() if status >= 500)
+        completed += len(endpoint.latencies)
+        print(
+            f"{name[:42]:<42} {len(endpoint.latencies):>7} {ok:>8} {client_errors:>6} {server_errors:>6} "
+            f"{endpoint.errors + endpoint.unresolved:>7} {endpoint.percentile(0.5):>8.1f} "
+            f"{endpoint.percentile(0.9):>8.1f} {endpoint.percentile(0.99):>8.1f} {endpoint.percentile(1.0):>8.1f}"
+        )
+    print(f"\n{completed} requests in {elapsed:.1f} s, {completed / elapsed if elapsed else 0:.0f} rps")
+
+
+def load_requests(paths: List[str], template_ids: bool) -> Tuple[List[RequestTemplate], Dict[str, str], bool]:
+    requests: List[RequestTemplate] = []
+    variables: Dict[str, str] = {}
+    captured = False
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            if path.endswith(".jsonl"):
+                requests += parse_capture(file, template_ids)
+                captured = True
+            else:
+                file_requests, file_variables = parse_http_file(file.read())
+                requests += file_requests
+                variables.update(file_variables)
+    return requests, variables, captured
+
+
+async def main(args: argparse.Namespace) -> None:
+    requests, variables, captured = load_requests(args.files, not args.keep_ids)
+    if not requests:
+        raise SystemExit("No requests to replay")
+    overrides = dict(item.split("=", 1) for item in args.var)
+    total = args.requests or (len(requests) if not args.duration else 1 << 62)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async def run(client: httpx.AsyncClient) -> None:
+        variables.update(await prepare_variables(client, args.email, args.password))
+        variables.update(overrides)
+        started = time.perf_counter()
+        stats = await replay(client, requests, variables, args.concurrency, total, args.duration, stagger=captured)
+        print_report(stats, time.perf_counter() - started)
+
+    if args.in_process:
+        from src.main import app
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url=args.base_url, timeout=args.timeout) as client:
+                await run(client)
+    else:
+        async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+            await run(client)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help=".http files and .jsonl captures")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=10, help="virtual users sharing keep-alive connections")
+    parser.add_argument("--requests", type=int, default=0, help="total requests (default: each request once)")
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run instead of --requests")
+    parser.add_argument("--email", default="replay@replay.bench")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("-v", "--var", action="append", default=[], help="name=value, overrides everything")
+    parser.add_argument("--keep-ids", action="store_true", help="replay captured ids as recorded")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--in-process", action="store_true", help="run src.main:app in this process, no server")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,40 @@
+"""
+Отчет о времени прогона тестов в зависимости от числа воркеров pytest-xdist.
+
+Пример:
+    python -m src.benchmarks.test_suite --workers 0 1 2 4 8
+
+0 воркеров - обычный запуск в одном процессе без xdist.
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+
+def run_suite(workers: int, extra_args) -> tuple:
+    command = [sys.executable, "-m", "pytest", "-c", "src/pytest.ini", "src/tests", "-q", "-p", "no:cacheprovider"]
+    if workers:
+        command += ["-n", str(workers)]
+    started = time.perf_counter()
+    result = subprocess.run(command + extra_args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started, result.returncode
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    args, extra_args = parser.parse_known_args()
+
+    print(f"{'workers':>8} {'seconds':>9} {'speedup':>8} {'result':>7}")
+    baseline = None
+    for workers in args.workers:
+        elapsed, returncode = run_suite(workers, extra_args)
+        baseline = baseline or elapsed
+        result = "ok" if returncode == 0 else f"rc={returncode}"
+        print(f"{workers:>8} {elapsed:>9.2f} {baseline / elapsed:>7.2f}x {result:>7}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Бенчмарк накладных расходов трассировки (src.utils.tracing).
+
+Поднимает приложение в этом же процессе (ASGI без сети, база из .env, как при обычном запуске),
+создает продавца с книгой и гоняет GET книги и PATCH книги с токеном при выключенной трассировке,
+при записи каждой трассы и при записи доли --ratio трасс. Спаны пишутся файловым экспортом
+во временный файл. Печатается лучшее из --rounds время запроса и прирост к запросу без трассировки.
+
+Пример:
+    python -m src.benchmarks.tracing --requests 2000 --ratio 0.1 --rounds 3
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from src.main import app
+from src.utils.tracing import BatchSpanProcessor, FileSpanExporter, tracer
+
+SELLER = {"first_name": "Bench", "last_name": "Tracing", "email": "bench@tracing.bench", "password": "password"}
+
+
+async def seed(client: httpx.AsyncClient) -> tuple:
+    await client.post("/api/v1/seller/", json=SELLER)
+    response = await client.post("/api/v1/token", data={"username": SELLER["email"], "password": SELLER["password"]})
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await client.get("/api/v1/seller/")
+    seller_id = next(seller["id"] for seller in response.json()["sellers"] if seller["email"] == SELLER["email"])
+    book = {"title": "Bench", "author": "Bench", "year": 2020, "count_pages": 100, "seller_id": seller_id}
+    response = await client.post("/api/v1/books/", json=book, headers=headers)
+    return response.json()["id"], book, headers
+
+
+async def measure(client: httpx.AsyncClient, requests: int, book_id: int, book: dict, headers: dict) -> dict:
+    timings = {}
+    started = time.perf_counter()
+    for _ in range(requests):
+        await client.get(f"/api/v1/books/{book_id}")
+    timings["get_book"] = (time.perf_counter() - started) / requests
+
+    started = time.perf_counter()
+    for _ in range(requests // 10):
+        await client.patch(f"/api/v1/books/{book_id}", json={"count_pages": book["count_pages"]}, headers=headers)
+    timings["patch_book"] = (time.perf_counter() - started) / (requests // 10)
+    return timings
+
+
+async def main(requests: int, ratio: float, rounds: int) -> None:
+    trace_file = os.path.join(tempfile.mkdtemp(), "traces.jsonl")
+    processor = BatchSpanProcessor(FileSpanExporter(trace_file), "benchmark", 512, 100_000, 1.0)
+    modes = [("off", False, 1.0), ("ratio 1.0", True, 1.0), (f"ratio {ratio}", True, ratio)]
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            book_id, book, headers = await seed(client)
+            await measure(client, requests // 10, book_id, book, headers)  # прогрев
+
+            # Режимы чередуются по кругам, берется лучший круг: так рост базы и шум не попадают в разницу
+            best = {}
+            for _ in range(rounds):
+                for name, enabled, sample_ratio in modes:
+                    tracer.enabled, tracer.sample_ratio, tracer.processor = enabled, sample_ratio, processor
+                    timings = await measure(client, requests, book_id, book, headers)
+                    best[name] = {key: min(value, best.get(name, timings)[key]) for key, value in timings.items()}
+
+            baseline = best["off"]
+            print(f"{'mode':<12} {'GET us':>9} {'PATCH us':>9} {'GET +%':>7} {'PATCH +%':>9}")
+            for name, timings in best.items():
+                print(
+                    f"{name:<12} {timings['get_book'] * 1e6:>9.0f} {timings['patch_book'] * 1e6:>9.0f} "
+                    f"{(timings['get_book'] / baseline['get_book'] - 1) * 100:>7.1f} "
+                    f"{(timings['patch_book'] / baseline['patch_book'] - 1) * 100:>9.1f}"
+                )
+            tracer.shutdown()
+            tracer.enabled = False
+
+    print(f"\nspans: {processor.exported} exported in {processor.batches} batches, {processor.dropped} dropped")
+    print(f"trace file: {trace_file} ({os.path.getsize(trace_file) if os.path.exists(trace_file) else 0} bytes)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--ratio", type=float, default=0.1, help="sampled share of traces")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.ratio, args.rounds))
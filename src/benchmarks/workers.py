@@ -0,0 +1,102 @@
+"""
+Бенчмарк масштабирования RPS по числу воркеров production-запуска (python -m src.serve).
+
+Для каждого числа воркеров от 1 до --max-workers поднимает сервер на отдельном порту,
+нагружает его из нескольких процессов-клиентов (один Python-клиент сам упирается в ядро)
+и печатает таблицу RPS. Сервер использует БД из .env, как при обычном запуске.
+
+Пример:
+    python -m src.benchmarks.workers --max-workers 8 --path /api/v1/books/ --duration 10
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+async def _load(url: str, duration: float, concurrency: int) -> int:
+    done = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+
+        async def worker():
+            nonlocal done
+            while time.perf_counter() < deadline:
+                await client.get(url)
+                done += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    return done
+
+
+def _load_process(url: str, duration: float, concurrency: int, results) -> None:
+    results.put(asyncio.run(_load(url, duration, concurrency)))
+
+
+def wait_until_ready(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start in {timeout} seconds")
+
+
+def measure(workers: int, args) -> float:
+    port = args.port + workers
+    url = f"http://127.0.0.1:{port}{args.path}"
+    env = dict(os.environ, SERVE_WORKERS=str(workers), SERVE_PORT=str(port), SERVE_HOST="127.0.0.1")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "src.serve"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_ready(url)
+        results = multiprocessing.Queue()
+        clients = [
+            multiprocessing.Process(
+                target=_load_process, args=(url, args.duration, args.concurrency // args.clients, results)
+            )
+            for _ in range(args.clients)
+        ]
+        for client in clients:
+            client.start()
+        total = sum(results.get() for _ in clients)
+        for client in clients:
+            client.join()
+        return total / args.duration
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--path", default="/api/v1/books/")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--clients", type=int, default=max(1, multiprocessing.cpu_count() // 2))
+    parser.add_argument("--port", type=int, default=18000)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'rps':>10} {'speedup':>8}")
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        rps = measure(workers, args)
+        baseline = baseline or rps
+        print(f"{workers:>8} {rps:>10.0f} {rps / baseline:>7.2f}x", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Архивация холодных книг: python -m src.commands.archive_books --before-year 1950
+
+Книги, изданные раньше --before-year, переносятся в таблицу books_archive_table
+(читаются ручками книг с include_archived=true) или, с --parquet DIR, выгружаются
+в сжатые файлы Parquet и удаляются из базы. При шардировании обрабатывается каждый шард.
+Об ушедших из каталога книгах в ленту изменений (outbox) пишутся события удаления.
+С --dry-run команда только считает, сколько книг будет перенесено.
+"""
+
+import argparse
+import asyncio
+import os
+from typing import Optional
+
+from src.configurations.database import dispose_engine, get_engine, get_shard_router, global_init
+from src.service.archive import ArchiveService
+
+
+async def main(before_year: int, batch_size: int, dry_run: bool, parquet_dir: Optional[str]) -> None:
+    global_init()
+    router = get_shard_router()
+    engines = router.shard_engines if router else [get_engine()]
+    if parquet_dir is not None:
+        os.makedirs(parquet_dir, exist_ok=True)
+
+    total, files = 0, 0
+    try:
+        for engine in engines:
+            report = await ArchiveService.archive_books(
+                engine, before_year, batch_size, dry_run, parquet_dir, router.default_engine if router else None
+            )
+            total += report["archived"]
+            files += len(report["files"])
+    finally:
+        await dispose_engine()
+
+    action = "would archive" if dry_run else "archived"
+    target = f"{files} parquet files in {parquet_dir}" if parquet_dir else "books_archive_table"
+    print(f"{action} {total} books published before {before_year} from {len(engines)} databases into {target}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--before-year", type=int, required=True)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--parquet", dest="parquet_dir", default=None, help="directory for Parquet files")
+    args = parser.parse_args()
+    asyncio.run(main(args.before_year, args.batch_size, args.dry_run, args.parquet_dir))
@@ -0,0 +1,99 @@
+"""
+Массовый импорт продавцов: python -m src.commands.import_sellers sellers.ndjson
+
+Файл - NDJSON (по записи IncomingSeller на строку) или CSV с колонками first_name, last_name,
+email, password; "-" - чтение из stdin. Пароли хешируются в пуле процессов (--workers, по умолчанию
+по числу ядер), уже захешированные (bcrypt, argon2) пароли переносятся как есть. Продавцы с занятым email
+пропускаются, поэтому прерванный импорт можно просто повторить. Приложение при этом продолжает
+работать: импорт идет в отдельном процессе и пачками в коротких транзакциях.
+"""
+
+import argparse
+import asyncio
+import csv
+import sys
+from itertools import islice
+from typing import Any, Iterator, List, Optional, TextIO, Tuple
+
+import orjson
+
+from src.configurations.database import (
+    dispose_engine,
+    get_session_factory,
+    get_shard_router,
+    global_init,
+    lease_id_node,
+)
+from src.service.seller_import import SellerImportService
+
+
+def read_records(file: TextIO, file_format: str) -> Iterator[Tuple[int, Any]]:
+    if file_format == "csv":
+        # Строка 1 - заголовок
+        yield from enumerate(csv.DictReader(file), start=2)
+        return
+    for line_no, line in enumerate(file, start=1):
+        if line.strip():
+            try:
+                yield line_no, orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # Строка не JSON - попадет в отчет как ошибка валидации
+                yield line_no, line
+
+
+def batched(records: Iterator[Tuple[int, Any]], batch_size: int) -> Iterator[List[Tuple[int, Any]]]:
+    while batch := list(islice(records, batch_size)):
+        yield batch
+
+
+def print_progress(report: dict) -> None:
+    print(
+        f"batch {report['batches']}: read {report['read']}, imported {report['imported']}, "
+        f"{report['rows_per_sec']:.0f} rows/sec",
+        file=sys.stderr,
+    )
+
+
+async def main(path: str, file_format: Optional[str], batch_size: int, workers: Optional[int], welcome: bool) -> None:
+    global_init()
+    # ИД новых продавцов выдает генератор с собственным номером узла, как у воркеров приложения
+    await lease_id_node()
+    file_format = file_format or ("csv" if path.endswith(".csv") else "ndjson")
+    file = sys.stdin if path == "-" else open(path, newline="" if file_format == "csv" else None)
+    executor = SellerImportService.process_pool(workers)
+    try:
+        report = await SellerImportService.import_sellers(
+            batched(read_records(file, file_format), batch_size),
+            get_session_factory(),
+            get_shard_router(),
+            executor,
+            welcome,
+            print_progress,
+        )
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if file is not sys.stdin:
+            file.close()
+        await dispose_engine()
+
+    print(f"{'read':<12} {'imported':<10} {'existing':<10} {'duplicates':<11} {'invalid':<8} rows/sec")
+    print(
+        f"{report['read']:<12} {report['imported']:<10} {report['existing']:<10} {report['duplicates']:<11} "
+        f"{report['invalid']:<8} {report['rows_per_sec']:.0f}"
+    )
+    print(f"passwords: hashed {report['hashed']}, imported as hashes {report['passthrough']}")
+    print(f"elapsed {report['seconds']:.1f}s in {report['batches']} batches")
+    for error in report["errors"]:
+        print(error)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="NDJSON or CSV file, - for stdin")
+    parser.add_argument("--format", dest="file_format", choices=["ndjson", "csv"], default=None)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None, help="hashing processes, 0 - hash in this process")
+    parser.add_argument("--welcome", action="store_true", help="send welcome emails to imported sellers")
+    args = parser.parse_args()
+    asyncio.run(main(args.path, args.file_format, args.batch_size, args.workers, args.welcome))
@@ -0,0 +1,60 @@
+"""
+Миграции схемы: python -m src.commands.migrate
+
+Применяет ожидающие миграции (src/migrations) к основной базе и ко всем шардам из DB_BOOK_SHARDS.
+Базы, созданные до появления миграций, сначала помечаются базовой ревизией.
+
+С --dry-run в базы ничего не пишется: для каждой печатается SQL ожидающих миграций
+и блокировки, которые возьмет каждое выражение, и что они заблокируют (чтение, запись).
+Выражения, блокирующие чтение и запись, стоит выполнять в окно обслуживания.
+"""
+
+import argparse
+import asyncio
+
+from src.configurations.database import dispose_engine, global_init
+from src.configurations.migrations import database_groups, pending_lock_report, prepare_database, sync_email_directory
+from src.configurations.settings import settings
+
+
+def print_report(url: str, group: str, report: dict) -> None:
+    print(f"{url} ({group} tables): {report['current'] or 'empty'} -> {report['head']}")
+    if not report["statements"]:
+        print("  up to date")
+        return
+    print(f"  {'lock':<24} {'blocks':<18} {'table':<22} statement")
+    for item in report["statements"]:
+        statement = item["statement"] if len(item["statement"]) <= 80 else item["statement"][:77] + "..."
+        print(f"  {item['lock']:<24} {item['blocks']:<18} {item['table']:<22} {statement}")
+
+
+async def main(dry_run: bool) -> None:
+    global_init()
+    # Команду запускают именно для миграции, независимо от настройки старта приложения
+    settings.db_migrate_on_startup = True
+    try:
+        shared_action = "up to date"
+        for engine, group in database_groups():
+            url = engine.url.render_as_string()
+            if dry_run:
+                print_report(url, group, await pending_lock_report(engine, group))
+            else:
+                action = await prepare_database(engine, group)
+                print(f"{url} ({group} tables): {action}")
+                if group == "shared":
+                    shared_action = action
+        report = None if dry_run else await sync_email_directory(shared_action)
+        if report is not None:
+            print(
+                f"seller email directory: scanned {report['scanned']}, added {report['added']}, "
+                f"conflicts {report['conflicts']}"
+            )
+    finally:
+        await dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.dry_run))
@@ -0,0 +1,48 @@
+"""
+Перебалансировка шардов каталога: python -m src.commands.rebalance_shards
+
+Переносит продавцов вместе с книгами в шарды, положенные им по текущему списку DB_BOOK_SHARDS.
+Порядок добавления шарда:
+1. создать базу нового шарда и дописать ее URL в конец DB_BOOK_SHARDS;
+2. перезапустить приложение (таблицы в новом шарде создадутся при старте);
+3. запустить эту команду - переедут только продавцы, которым теперь положен новый шард.
+
+При удалении шардов из конца списка их URL передаются через --source, чтобы продавцы
+из них переехали в оставшиеся шарды. С --dry-run команда только считает, что будет перенесено.
+Копирование идемпотентно, прерванный запуск можно просто повторить.
+"""
+
+import argparse
+import asyncio
+
+from src.configurations.database import create_engine, dispose_engine, get_shard_router, global_init
+
+
+async def main(sources: list, dry_run: bool, batch_size: int) -> None:
+    global_init()
+    router = get_shard_router()
+    if router is None:
+        raise SystemExit("Sharding is not configured: set DB_BOOK_SHARDS")
+
+    extra_engines = [create_engine(url) for url in sources]
+    try:
+        report = await router.rebalance(router.shard_engines + extra_engines, dry_run=dry_run, batch_size=batch_size)
+    finally:
+        for engine in extra_engines:
+            await engine.dispose()
+        await dispose_engine()
+
+    action = "would move" if dry_run else "moved"
+    print(
+        f"scanned {report['scanned']} sellers in {len(router.shard_ids) + len(sources)} shards, "
+        f"{action} {report['moved_sellers']} sellers and {report['moved_books']} books"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", action="append", default=[], help="URL of a shard being removed")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.source, args.dry_run, args.batch_size))
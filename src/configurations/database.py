@@ -1,53 +1,287 @@
 import logging
+import os
+from contextlib import asynccontextmanager
 from typing import AsyncGenerator, Callable, Optional
+from uuid import uuid4
 
+from fastapi import Request
+from sqlalchemy import event, make_url, text
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
 
 from src.models.base import BaseModel
-from src.models.books import Book  # noqa F401
+from src.models.books import ArchivedBook, Book  # noqa F401
+from src.models.events import OutboxEvent  # noqa F401
+from src.models.id_nodes import IdNodeLease  # noqa F401
+from src.models.jobs import Job  # noqa F401
+from src.models.partitioning import partition_books_table
+from src.models.sellers import Seller  # noqa F401
+
+# access_log, deadlines и tracing импортируются модулями: они сами читают настройки из src.configurations,
+# и если импортировать их первыми, к загрузке этого файла они будут инициализированы лишь частично
+from src.utils import access_log, deadlines, tracing
+from src.utils.db_metrics import (
+    RequestDBStats,
+    TimedAsyncAdaptedQueuePool,
+    current_request_stats,
+    db_metrics,
+    instrument_engine,
+)
 
 from .settings import settings
+from .sharding import IdGenerator, ShardRouter
 
-logger = logging.getLogger("__name__")
+logger = logging.getLogger(__name__)
 
 
-__all__ = ["global_init", "get_async_session", "create_db_and_tables", "delete_db_and_tables"]
+__all__ = [
+    "global_init",
+    "get_async_session",
+    "get_session_factory",
+    "get_engine",
+    "create_engine",
+    "get_shard_router",
+    "lease_id_node",
+    "create_db_and_tables",
+    "delete_db_and_tables",
+    "dispose_engine",
+    "request_session",
+    "session_has_writes",
+]
 
 __async_engine: Optional[AsyncEngine] = None
 __session_factory: Optional[Callable[[], AsyncSession]] = None
+__read_session_factory: Optional[Callable[[], AsyncSession]] = None
+__engine_pid: Optional[int] = None
+__shard_router: Optional[ShardRouter] = None
 
 SQLALCHEMY_DATABASE_URL = settings.database_url
 
+# Запросы этих методов только читают: для них берется сессия из read_only_options
+READ_ONLY_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+WRITES_KEY = "has_writes"
+# Дедлайн запроса в session.info и текущий statement_timeout соединения (вне транзакций) в connection.info
+DEADLINE_KEY = "deadline"
+STATEMENT_TIMEOUT_KEY = "statement_timeout_ms"
+# Таблица, где Alembic хранит ревизию схемы (см. configurations.migrations)
+ALEMBIC_VERSION_TABLE = "alembic_version"
+
+
+def engine_options(url: str) -> dict:
+    """
+    Параметры движка, зависящие от СУБД. SQLite используется только как локальная замена Postgres.
+    """
+    parsed_url = make_url(url)
+    if parsed_url.get_backend_name() == "sqlite":
+        return {"query_cache_size": settings.db_query_cache_size}
+
+    options = {
+        "pool_size": settings.max_connection_count,
+        "poolclass": TimedAsyncAdaptedQueuePool,
+        "query_cache_size": settings.db_query_cache_size,
+    }
+    if parsed_url.get_driver_name() == "asyncpg":
+        if settings.db_pgbouncer_mode:
+            # pgbouncer в режиме transaction pooling отдает каждой транзакции произвольное серверное
+            # соединение, поэтому подготовленные выражения нельзя ни кэшировать, ни называть одинаково
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+        else:
+            options["connect_args"] = {"prepared_statement_cache_size": settings.db_prepared_statement_cache_size}
+    return options
+
+
+def read_only_options(url: str) -> dict:
+    """
+    Параметры выполнения для сессий читающих запросов (settings.db_read_mode):
+    - autocommit - без BEGIN/COMMIT, каждый запрос - одно обращение к серверу;
+    - read_only - транзакция BEGIN READ ONLY (только Postgres, защищает от случайной записи);
+    - transaction - обычная транзакция, как у пишущих запросов.
+    """
+    if settings.db_read_mode == "autocommit":
+        return {"isolation_level": "AUTOCOMMIT"}
+    if settings.db_read_mode == "read_only" and make_url(url).get_backend_name() == "postgresql":
+        return {"postgresql_readonly": True}
+    return {}
+
+
+def create_engine(url: str) -> AsyncEngine:
+    engine = create_async_engine(url=url, echo=False, **engine_options(url))
+    instrument_engine(engine)
+    tracing.instrument_engine_tracing(engine)
+    return engine
+
 
 def global_init() -> None:
-    global __async_engine, __session_factory
+    global __async_engine, __session_factory, __read_session_factory, __engine_pid, __shard_router
+
+    if __engine_pid != os.getpid():
+        # Движок, унаследованный от родителя через fork, использовать нельзя: его соединения
+        # принадлежат родительскому процессу. Забываем их, не закрывая, и создаем свой движок.
+        if __async_engine is not None:
+            __async_engine.sync_engine.dispose(close=False)
+        if __shard_router is not None:
+            for engine in __shard_router.shard_engines:
+                engine.sync_engine.dispose(close=False)
+        __async_engine = None
+        __session_factory = None
+        __read_session_factory = None
+        __shard_router = None
+        __engine_pid = os.getpid()
 
     if __session_factory:
         return
 
     if not __async_engine:
-        __async_engine = create_async_engine(url=SQLALCHEMY_DATABASE_URL, echo=False)
+        if make_url(SQLALCHEMY_DATABASE_URL).get_backend_name() == "postgresql":
+            # Должно случиться до create_all: схема секций входит в метаданные таблицы книг
+            partition_books_table(
+                Book.__table__,
+                settings.db_books_partitioning,
+                settings.db_books_hash_partitions,
+                settings.db_books_partition_years,
+            )
+        __async_engine = create_engine(SQLALCHEMY_DATABASE_URL)
+        if settings.db_book_shards:
+            # Продавцы и книги живут в шардах, основная база хранит только общие таблицы
+            __shard_router = ShardRouter(
+                __async_engine,
+                [create_engine(url) for url in settings.db_book_shards],
+                IdGenerator(),
+            )
+
+    read_options = read_only_options(SQLALCHEMY_DATABASE_URL)
+    if __shard_router:
+        __session_factory = __shard_router.session_factory()
+        __read_session_factory = __shard_router.session_factory(**read_options)
+        return
 
     __session_factory = async_sessionmaker(__async_engine)
+    # Движок с другими параметрами выполнения, но с тем же пулом соединений
+    __read_session_factory = async_sessionmaker(__async_engine.execution_options(**read_options))
 
 
-async def get_async_session() -> AsyncGenerator:
-    global __session_factory
+def get_engine() -> AsyncEngine:
+    global __async_engine
+
+    if __async_engine is None:
+        raise ValueError({"message": "You must call global_init() before using this method."})
+
+    return __async_engine
+
+
+def get_shard_router() -> Optional[ShardRouter]:
+    """
+    Маршрутизатор шардов или None, если шардирование не настроено (settings.db_book_shards).
+    """
+    return __shard_router
+
+
+async def lease_id_node() -> None:
+    """
+    При шардировании арендует процессу номер узла в ИД продавцов и книг (см. sharding.IdNodeLease).
+    Вызывается после migrate_database, аренда освобождается в dispose_engine.
+    """
+    if __shard_router is not None:
+        await __shard_router.lease_id_node(settings.db_id_node_lease_ttl)
+
+
+def get_session_factory(read_only: bool = False) -> Callable[[], AsyncSession]:
+    """
+    Фабрика сессий для кода, работающего вне запроса (фоновые воркеры, стриминг ответов).
+    """
+    global __session_factory, __read_session_factory
 
     if not __session_factory:
         raise ValueError({"message": "You must call global_init() before using this method."})
 
-    session: AsyncSession = __session_factory()
+    return __read_session_factory if read_only else __session_factory
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session: Session, flush_context) -> None:
+    session.info[WRITES_KEY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dml(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[WRITES_KEY] = True
+
+
+@event.listens_for(Session, "after_begin")
+def _set_statement_timeout(session: Session, transaction, connection) -> None:
+    """
+    Ограничивает запросы транзакции остатком дедлайна HTTP-запроса (Postgres statement_timeout):
+    сервер сам прервет запрос, который уже не успеет к дедлайну.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    autocommit = connection.get_execution_options().get("isolation_level") == "AUTOCOMMIT"
+    timeout_ms = deadlines.remaining_ms(session.info.get(DEADLINE_KEY))
+    for statement in deadlines.statement_timeout_sql(
+        timeout_ms, autocommit, connection.info.get(STATEMENT_TIMEOUT_KEY)
+    ):
+        connection.exec_driver_sql(statement)
+    if autocommit:
+        connection.info[STATEMENT_TIMEOUT_KEY] = timeout_ms
+
+
+def session_has_writes(session: AsyncSession) -> bool:
+    """
+    Была ли в сессии запись: flush, DML-запрос через session.execute или несохраненные изменения.
+    """
+    return bool(session.info.get(WRITES_KEY) or session.new or session.dirty or session.deleted)
+
+
+@asynccontextmanager
+async def request_session(session_factory: Callable[[], AsyncSession], kind: str) -> AsyncGenerator:
+    """
+    Жизненный цикл сессии одного запроса. Соединение берется из пула лениво, при первом запросе к базе.
+    commit выполняется только если сессия что-то записала. Иначе транзакция (если она была)
+    откатывается при возврате соединения в пул в session.close(): для чтения это то же самое,
+    но без лишней работы ORM. Повторный rollback перед close больше не нужен.
+    """
+    session: AsyncSession = session_factory()
+    session.info[DEADLINE_KEY] = deadlines.current_deadline.get()
+    stats = RequestDBStats()
+    current_request_stats.set(stats)
+    committed = False
 
     try:
         yield session
-        await session.commit()
+        if session_has_writes(session):
+            await session.commit()
+            committed = True
     except Exception as e:
         logger.error("Raises exception: %s", e)
         raise e
     finally:
-        await session.rollback()
         await session.close()
+        current_request_stats.set(None)
+        db_metrics.observe_request(kind, stats, committed)
+        log_context = access_log.current_log_context.get()
+        if log_context is not None:
+            log_context.db_time += stats.query_time + stats.checkout_time
+            log_context.db_queries += stats.round_trips
+
+
+async def get_async_session(request: Request) -> AsyncGenerator:
+    global __session_factory, __read_session_factory
+
+    if not __session_factory:
+        raise ValueError({"message": "You must call global_init() before using this method."})
+
+    if request.method in READ_ONLY_METHODS:
+        session_factory, kind = __read_session_factory, "read"
+    else:
+        session_factory, kind = __session_factory, "write"
+
+    async with request_session(session_factory, kind) as session:
+        yield session
 
 
 async def create_db_and_tables():
@@ -56,15 +290,38 @@ async def create_db_and_tables():
     if __async_engine is None:
         raise ValueError({"message": "You must call global_init() before using this method."})
 
+    if __shard_router:
+        await __shard_router.create_tables()
+        return
+
     async with __async_engine.begin() as conn:
         await conn.run_sync(BaseModel.metadata.create_all)
 
 
+async def dispose_engine():
+    global __async_engine, __session_factory, __read_session_factory, __shard_router
+
+    if __shard_router is not None:
+        await __shard_router.dispose()
+    __shard_router = None
+    if __async_engine is not None:
+        await __async_engine.dispose()
+    __async_engine = None
+    __session_factory = None
+    __read_session_factory = None
+
+
 async def delete_db_and_tables():
     global __async_engine
 
     if __async_engine is None:
         raise ValueError({"message": "You must call global_init() before using this method."})
 
+    if __shard_router:
+        await __shard_router.drop_tables()
+        return
+
     async with __async_engine.begin() as conn:
         await conn.run_sync(BaseModel.metadata.drop_all)
+        # Без таблиц ревизия схемы теряет смысл: при следующем старте база создастся заново
+        await conn.execute(text(f"DROP TABLE IF EXISTS {ALEMBIC_VERSION_TABLE}"))
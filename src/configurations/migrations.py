@@ -0,0 +1,396 @@
+"""
+Миграции схемы на Alembic (сценарии в src/migrations).
+
+При старте приложения migrate_database() для основной базы и для каждого шарда:
+- пустая база при db_create_on_startup создается через create_all и помечается последней ревизией,
+  без этой настройки к ней применяются все миграции;
+- база, созданная create_all до появления миграций (таблицы есть, alembic_version нет),
+  помечается базовой ревизией, после чего к ней применяются остальные;
+- отставшая база обновляется при db_migrate_on_startup, иначе приложение не стартует.
+  В Postgres это делается под advisory-блокировкой, чтобы воркеры не мигрировали одновременно.
+
+Индексы в миграциях строятся через create_index_online (CREATE INDEX CONCURRENTLY, запись в таблицу
+не блокируется). lock_report разбирает SQL ожидающих миграций и показывает, какие блокировки они возьмут
+(python -m src.commands.migrate --dry-run).
+"""
+
+import io
+import logging
+import os
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from alembic import command, op
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import Connection, Table, inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from src.models.base import BaseModel
+
+from .database import get_engine, get_shard_router
+from .settings import settings
+from .sharding import TENANT_TABLES
+
+__all__ = [
+    "BASELINE_REVISION",
+    "alembic_config",
+    "head_revision",
+    "group_tables",
+    "database_groups",
+    "migrate_database",
+    "sync_email_directory",
+    "prepare_database",
+    "pending_lock_report",
+    "lock_report",
+    "applies_to",
+    "create_index_online",
+    "drop_index_online",
+    "set_not_null_online",
+]
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "migrations")
+# Ревизия, соответствующая схеме, которую строил create_all до появления миграций
+BASELINE_REVISION = "0001"
+# Ключ advisory-блокировки, под которой процессы по очереди мигрируют базу
+MIGRATIONS_LOCK_KEY = 31_0039
+
+
+def group_tables(group: str) -> List[Table]:
+    """
+    Таблицы группы: при шардировании основная база хранит shared, шарды - tenant, иначе все (all) в одной базе.
+    """
+    tables = BaseModel.metadata.sorted_tables
+    if group == "tenant":
+        return [table for table in tables if table in TENANT_TABLES]
+    if group == "shared":
+        return [table for table in tables if table not in TENANT_TABLES]
+    return tables
+
+
+def alembic_config(
+    group: str = "all", url: Optional[str] = None, output_buffer: Optional[io.StringIO] = None
+) -> Config:
+    config = Config(output_buffer=output_buffer)
+    config.set_main_option("script_location", MIGRATIONS_DIR)
+    if url is not None:
+        config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    config.attributes["tables"] = group
+    return config
+
+
+def head_revision() -> str:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def _current_revision(sync_conn: Connection) -> Optional[str]:
+    revision = MigrationContext.configure(sync_conn).get_current_revision()
+    # Alembic дальше сам управляет транзакциями на этом соединении
+    sync_conn.rollback()
+    return revision
+
+
+def _run_command(sync_conn: Connection, group: str, name: str, revision: str) -> None:
+    config = alembic_config(group)
+    config.attributes["connection"] = sync_conn
+    getattr(command, name)(config, revision)
+
+
+def _prepare(sync_conn: Connection, group: str) -> str:
+    current = _current_revision(sync_conn)
+    head = head_revision()
+
+    if current is None:
+        tables = group_tables(group)
+        existing = set(inspect(sync_conn).get_table_names())
+        sync_conn.rollback()
+        if not existing & {table.name for table in tables}:
+            if settings.db_create_on_startup:
+                BaseModel.metadata.create_all(sync_conn, tables=tables)
+                sync_conn.commit()
+                _run_command(sync_conn, group, "stamp", "head")
+                return "created"
+        else:
+            _run_command(sync_conn, group, "stamp", BASELINE_REVISION)
+            current = BASELINE_REVISION
+
+    if current == head:
+        return "up to date"
+    if not settings.db_migrate_on_startup:
+        raise RuntimeError(
+            f"Database schema is at revision {current}, expected {head}: run python -m src.commands.migrate"
+        )
+    _run_command(sync_conn, group, "upgrade", "head")
+    return "upgraded"
+
+
+async def _advisory_lock(conn: AsyncConnection, function: str) -> None:
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text(f"SELECT {function}(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+        # Блокировка уровня сессии переживает commit, а соединение должно остаться без транзакции
+        await conn.commit()
+
+
+async def prepare_database(engine: AsyncEngine, group: str = "all") -> str:
+    """
+    Создает, помечает или обновляет схему одной базы. Возвращает, что было сделано.
+    """
+    async with engine.connect() as conn:
+        await _advisory_lock(conn, "pg_advisory_lock")
+        try:
+            return await conn.run_sync(_prepare, group)
+        finally:
+            await _advisory_lock(conn, "pg_advisory_unlock")
+
+
+def database_groups() -> List[Tuple[AsyncEngine, str]]:
+    router = get_shard_router()
+    if router is None:
+        return [(get_engine(), "all")]
+    return [(router.default_engine, "shared")] + [(engine, "tenant") for engine in router.shard_engines]
+
+
+async def sync_email_directory(shared_action: str) -> Optional[dict]:
+    """
+    После изменения схемы основной базы при шардировании дописывает в справочник email продавцов,
+    созданных до него (миграция 0005 сама шарды не видит). В остальных случаях ничего не делает.
+    """
+    router = get_shard_router()
+    if router is None or shared_action == "up to date":
+        return None
+    return await router.sync_email_directory()
+
+
+async def migrate_database() -> None:
+    shared_action = "up to date"
+    for engine, group in database_groups():
+        action = await prepare_database(engine, group)
+        logger.info("Database %s (%s tables): %s", engine.url.render_as_string(), group, action)
+        if group == "shared":
+            shared_action = action
+    report = await sync_email_directory(shared_action)
+    if report is not None:
+        logger.info("Seller email directory: %s", report)
+
+
+async def pending_lock_report(engine: AsyncEngine, group: str = "all") -> dict:
+    """
+    SQL ожидающих миграций (офлайн-режим Alembic, в базу ничего не пишется) и блокировки каждого выражения.
+    """
+    async with engine.connect() as conn:
+        current = await conn.run_sync(_current_revision)
+    head = head_revision()
+    report = {"current": current, "head": head, "statements": []}
+    if current == head:
+        return report
+
+    buffer = io.StringIO()
+    config = alembic_config(group, engine.url.render_as_string(hide_password=False), buffer)
+    command.upgrade(config, f"{current}:head" if current else "head", sql=True)
+    report["statements"] = lock_report(buffer.getvalue())
+    return report
+
+
+# Блокировки Postgres для DDL и DML: (шаблон выражения, уровень блокировки, что она блокирует).
+# Первое совпадение выигрывает, поэтому частные случаи стоят раньше общих.
+LOCK_RULES = (
+    (r"CREATE (UNIQUE )?INDEX CONCURRENTLY", "SHARE UPDATE EXCLUSIVE", "-"),
+    (r"DROP INDEX CONCURRENTLY", "SHARE UPDATE EXCLUSIVE", "-"),
+    # Пустой индекс на родительской секционированной таблице: данные не читаются, блокировка мгновенная
+    (r"CREATE (UNIQUE )?INDEX (IF NOT EXISTS )?\S+ ON ONLY", "SHARE", "writes (brief)"),
+    (r"CREATE (UNIQUE )?INDEX", "SHARE", "writes"),
+    (r"DROP INDEX", "ACCESS EXCLUSIVE", "reads and writes"),
+    (r"CREATE TABLE \S+ PARTITION OF", "ACCESS EXCLUSIVE", "reads and writes"),
+    (r"CREATE TABLE", "-", "-"),
+    (r"ALTER INDEX .* ATTACH PARTITION", "SHARE UPDATE EXCLUSIVE", "-"),
+    (
+        r"ALTER TABLE .* (VALIDATE CONSTRAINT|ATTACH PARTITION|DETACH PARTITION CONCURRENTLY)",
+        "SHARE UPDATE EXCLUSIVE",
+        "-",
+    ),
+    (r"ALTER TABLE .* ADD CONSTRAINT .* FOREIGN KEY", "SHARE ROW EXCLUSIVE", "writes"),
+    (r"ALTER TABLE|DROP TABLE|TRUNCATE", "ACCESS EXCLUSIVE", "reads and writes"),
+    (r"INSERT|UPDATE|DELETE", "ROW EXCLUSIVE", "-"),
+)
+
+# Откуда брать имя таблицы (или индекса, если таблицы в выражении нет): первый подошедший шаблон
+_TABLE_PATTERNS = tuple(
+    re.compile(pattern)
+    for pattern in (
+        r"INDEX .*?\bON (?:ONLY )?([\w.\"]+)",
+        r"\bPARTITION OF ([\w.\"]+)",
+        r"\bTABLE (?:IF (?:NOT )?EXISTS )?([\w.\"]+)",
+        r"\bINTO ([\w.\"]+)",
+        r"^UPDATE ([\w.\"]+)",
+        r"\bFROM ([\w.\"]+)",
+        r"\bINDEX (?:CONCURRENTLY )?(?:IF EXISTS )?([\w.\"]+)",
+    )
+)
+
+
+def _statement_table(statement: str) -> str:
+    for pattern in _TABLE_PATTERNS:
+        match = pattern.search(statement)
+        if match:
+            return match.group(1)
+    return ""
+
+
+def lock_report(sql: str) -> List[dict]:
+    report = []
+    for statement in (part.strip() for part in sql.split(";")):
+        flat = " ".join(line for line in statement.splitlines() if not line.strip().startswith("--"))
+        flat = " ".join(flat.split())
+        if not flat or flat.upper() in ("BEGIN", "COMMIT") or "alembic_version" in flat:
+            continue
+
+        upper = flat.upper()
+        lock, blocks = "unknown", "unknown"
+        for pattern, rule_lock, rule_blocks in LOCK_RULES:
+            if re.match(pattern, upper):
+                lock, blocks = rule_lock, rule_blocks
+                break
+        report.append({"statement": flat, "table": _statement_table(flat), "lock": lock, "blocks": blocks})
+    return report
+
+
+# ---------------------------------------------------------------------------
+# Помощники для сценариев миграций (вызываются внутри upgrade / downgrade)
+# ---------------------------------------------------------------------------
+
+
+def applies_to(table_name: str) -> bool:
+    """
+    Лежит ли таблица в мигрируемой базе: при шардировании таблицы продавцов и книг есть только в шардах.
+    """
+    group = op.get_context().config.attributes.get("tables", "all")
+    if group == "all":
+        return True
+    is_tenant = table_name in {table.name for table in TENANT_TABLES}
+    return is_tenant if group == "tenant" else not is_tenant
+
+
+def _scalars(sql: str, **params) -> list:
+    return op.get_bind().execute(text(sql), params).scalars().all()
+
+
+def _drop_invalid_index(name: str) -> None:
+    # Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс, IF NOT EXISTS его бы пропустил
+    invalid = _scalars(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND NOT i.indisvalid AND c.relkind = 'i'",
+        name=name,
+    )
+    if invalid:
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def create_index_online(name: str, table_name: str, columns: Sequence[str], unique: bool = False) -> None:
+    """
+    Индекс без блокировки записи: в Postgres - CREATE INDEX CONCURRENTLY вне транзакции.
+    Для секционированной таблицы CONCURRENTLY недоступен, поэтому на ней создается пустой индекс (ON ONLY),
+    а индексы секций строятся по одной конкурентно и присоединяются к нему. Повторный запуск безопасен.
+    """
+    if not applies_to(table_name):
+        return
+    context = op.get_context()
+    if context.dialect.name != "postgresql":
+        op.create_index(name, table_name, list(columns), unique=unique, if_not_exists=True)
+        return
+
+    if context.as_sql:
+        # Офлайн (--dry-run) базы нет: секции берутся из метаданных (src.models.partitioning)
+        table = BaseModel.metadata.tables.get(table_name)
+        partitions = table.info.get("partitions", []) if table is not None else []
+    else:
+        partitions = _scalars(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :table ORDER BY c.relname",
+            table=table_name,
+        )
+
+    column_list = ", ".join(columns)
+    unique_sql = "UNIQUE " if unique else ""
+    with context.autocommit_block():
+        if not partitions:
+            if not context.as_sql:
+                _drop_invalid_index(name)
+            op.create_index(
+                name, table_name, list(columns), unique=unique, postgresql_concurrently=True, if_not_exists=True
+            )
+            return
+
+        op.execute(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON ONLY {table_name} ({column_list})")
+        attached = []
+        if not context.as_sql:
+            attached = _scalars(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :name",
+                name=name,
+            )
+        for partition in partitions:
+            partition_index = f"{name}_{partition}"[:63]
+            if partition_index in attached:
+                continue
+            if not context.as_sql:
+                _drop_invalid_index(partition_index)
+            op.execute(
+                f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {partition_index} ON {partition} ({column_list})"
+            )
+            op.execute(f"ALTER INDEX {name} ATTACH PARTITION {partition_index}")
+
+
+def drop_index_online(name: str, table_name: str) -> None:
+    if not applies_to(table_name):
+        return
+    context = op.get_context()
+    if context.dialect.name != "postgresql":
+        op.drop_index(name, table_name=table_name, if_exists=True)
+        return
+
+    if context.as_sql:
+        table = BaseModel.metadata.tables.get(table_name)
+        partitioned = table is not None and "partitioning" in table.info
+    else:
+        partitioned = _scalars(
+            "SELECT relname FROM pg_class WHERE relname = :table AND relkind = 'p'", table=table_name
+        )
+    with context.autocommit_block():
+        if partitioned:
+            # Индекс секционированной таблицы удаляется только обычным DROP INDEX (вместе с индексами секций)
+            op.execute(f"DROP INDEX IF EXISTS {name}")
+        else:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def set_not_null_online(table_name: str, column: str, existing_type, backfill: Optional[str] = None) -> None:
+    """
+    NOT NULL без долгой блокировки. SET NOT NULL сам по себе проверяет всю таблицу под ACCESS EXCLUSIVE,
+    поэтому в Postgres сначала добавляется CHECK ... NOT VALID (мгновенно), затем он проверяется
+    под SHARE UPDATE EXCLUSIVE (запись не блокируется), и SET NOT NULL опирается на него без сканирования.
+    Каждый шаг - в своей транзакции. backfill - UPDATE, дозаполняющий строки, записанные после основного
+    заполнения (например, процессами со старой версией кода).
+    В остальных СУБД таблица пересоздается (batch-режим Alembic).
+    """
+    if not applies_to(table_name):
+        return
+    context = op.get_context()
+    if context.dialect.name != "postgresql":
+        if backfill:
+            op.execute(backfill)
+        with op.batch_alter_table(table_name) as batch:
+            batch.alter_column(column, existing_type=existing_type, nullable=False)
+        return
+
+    constraint = f"ck_{table_name}_{column}_not_null"[:63]
+    with context.autocommit_block():
+        if backfill:
+            op.execute(backfill)
+        op.execute(f"ALTER TABLE {table_name} DROP CONSTRAINT IF EXISTS {constraint}")
+        op.execute(f"ALTER TABLE {table_name} ADD CONSTRAINT {constraint} CHECK ({column} IS NOT NULL) NOT VALID")
+        op.execute(f"ALTER TABLE {table_name} VALIDATE CONSTRAINT {constraint}")
+        op.execute(f"ALTER TABLE {table_name} ALTER COLUMN {column} SET NOT NULL")
+        op.execute(f"ALTER TABLE {table_name} DROP CONSTRAINT {constraint}")
@@ -8,6 +8,8 @@
 Пример находится в файлике .env.example
 """
 
+from typing import Dict, List, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -16,10 +18,151 @@ class Settings(BaseSettings):
     db_host: str
     db_name: str
     db_test_name: str = "fastapi_project_test_db"
-    max_connection_count: int = 10
+    test_db_backend: str = "postgres"  # postgres | sqlite (база в памяти для каждого воркера pytest)
+    test_db_echo: bool = False
+    max_connection_count: int = 10  # размер пула соединений одного процесса
+    # Кэши запросов: скомпилированный SQL в SQLAlchemy и подготовленные выражения asyncpg на соединение
+    db_query_cache_size: int = 500
+    db_prepared_statement_cache_size: int = 256
+    db_pgbouncer_mode: bool = False  # отключает кэш подготовленных выражений (pgbouncer, transaction pooling)
+    # Шарды каталога (продавцы вместе с книгами): список URL баз, например
+    # DB_BOOK_SHARDS='["postgresql+asyncpg://.../books_0", "postgresql+asyncpg://.../books_1"]'.
+    # Пустой список - все в основной базе. Новые шарды добавляются только в конец списка.
+    db_book_shards: List[str] = []
+    # Номер узла (0-63) в ИД при шардировании каждый процесс арендует в основной базе на столько секунд
+    # и продлевает каждую четверть срока. Упавший процесс освобождает номер через этот срок
+    db_id_node_lease_ttl: float = 30.0
+    # Секционирование книг в Postgres (src.models.partitioning): none | hash (по seller_id) | range (по году)
+    db_books_partitioning: str = "none"
+    db_books_hash_partitions: int = 8
+    db_books_partition_years: List[int] = [1900, 2000]  # границы секций при range
+    # Транзакции читающих запросов (GET/HEAD/OPTIONS): autocommit | read_only (только Postgres) | transaction
+    db_read_mode: str = "autocommit"
+    # Создание таблиц при старте и их удаление при остановке приложения (удобно для разработки)
+    db_create_on_startup: bool = True
+    # Применять миграции схемы (src/migrations) при старте; False - только проверить и не стартовать при отставании
+    db_migrate_on_startup: bool = True
+    db_drop_on_shutdown: bool = True
+    # Быстрый путь чтения через Core и orjson, минуя ORM и Pydantic (включается для каждой ручки отдельно)
+    books_fast_path_get_book: bool = False  # GET /api/v1/books/{book_id}
+    books_fast_path_get_all: bool = False  # GET /api/v1/books/
+    # Single-flight: одинаковые одновременные GET выполняются одним запросом к базе (включается для ручки)
+    single_flight_get_book: bool = False  # GET /api/v1/books/{book_id}
+    single_flight_get_seller: bool = False  # GET /api/v1/seller/{seller_id}
+    single_flight_timeout: float = 5.0  # секунд на одну общую загрузку, дольше - 504
+    # Адаптивный лимит одновременных запросов /api (src.utils.concurrency): отдельно для auth, read и write.
+    # Сверх лимита запросы ждут в очереди до concurrency_queue_timeout секунд, при полной очереди - 503.
+    concurrency_limit_enabled: bool = False
+    concurrency_algorithm: str = "gradient"  # gradient | aimd
+    concurrency_min_limit: int = 1
+    concurrency_initial_limits: Dict[str, int] = {"auth": 4, "read": 20, "write": 10}
+    concurrency_max_limits: Dict[str, int] = {"auth": 32, "read": 200, "write": 100}
+    concurrency_max_queue: Dict[str, int] = {"auth": 16, "read": 100, "write": 50}
+    concurrency_queue_timeout: float = 1.0
+    # Долгие потоковые ручки, которые не ограничиваются
+    concurrency_exempt_paths: List[str] = ["/api/v1/push", "/api/v1/changes", "/api/v1/books/export"]
+    # Дедлайны запросов (src.utils.deadlines): по истечении ручка отменяется вместе с запросами к базе (504),
+    # остаток передается в statement_timeout. Ключ - "МЕТОД шаблон пути", 0 - без дедлайна
+    request_deadline_default: float = 30.0
+    request_deadlines: Dict[str, float] = {
+        "GET /api/v1/books/export": 0,
+        "GET /api/v1/changes": 0,
+        "GET /api/v1/push/sse": 0,
+        "GET /internal/profile": 305,  # profiler_max_seconds и время на ответ
+    }
+    request_deadline_header: str = "X-Request-Timeout"  # клиент может сократить дедлайн (секунды)
+    # Трассировка (src.utils.tracing): спаны запросов, методов сервисов, SQL, bcrypt и JWT в формате OTLP
+    tracing_enabled: bool = False
+    tracing_sample_ratio: float = 1.0  # доля записываемых трасс (если вызывающий сервис не решил за нас)
+    tracing_exporter: str = "file"  # file | otlp
+    tracing_file: str = "traces.jsonl"
+    tracing_otlp_endpoint: str = "http://127.0.0.1:4318/v1/traces"  # OTLP/HTTP JSON
+    tracing_service_name: str = "book-library"
+    tracing_batch_size: int = 512
+    tracing_queue_size: int = 8192  # спанов в ожидании отправки, лишние отбрасываются
+    tracing_export_interval: float = 5.0
+    # Служебные ручки /internal доступны только с токеном оператора в заголовке internal_token_header.
+    # Пустой токен - служебные ручки выключены (404)
+    internal_token: str = ""
+    internal_token_header: str = "X-Internal-Token"
+    # Сэмплирующий профилировщик (src.utils.profiler): GET /internal/profile?seconds=30 с токеном оператора.
+    # Профиль не дольше profiler_max_seconds и дедлайна запроса
+    profiler_enabled: bool = False
+    profiler_interval_ms: float = 10.0  # период снимков стеков
+    profiler_max_seconds: float = 300.0
+    # Журнал запросов (src.utils.access_log): строка JSON на запрос, запись пачками из фонового потока
+    access_log_enabled: bool = False
+    access_log_file: str = "access.log"  # "-" - stdout
+    access_log_sample_ratio: float = 1.0  # доля записываемых успешных запросов, ошибки и медленные - всегда
+    access_log_slow_ms: float = 500.0
+    access_log_batch_size: int = 1024
+    access_log_queue_size: int = 65536  # записей в ожидании, лишние отбрасываются
+    access_log_flush_interval: float = 0.2
+    # Запись трафика /api в JSONL для воспроизведения (src.utils.traffic_capture, src.benchmarks.replay)
+    capture_enabled: bool = False
+    capture_file: str = "capture.jsonl"
+    capture_sample_ratio: float = 1.0
+    capture_max_body: int = 64 * 1024  # тела больше не записываются
+    capture_exempt_paths: List[str] = ["/api/v1/push", "/api/v1/changes"]
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
+    # Политика хеширования паролей (src.benchmarks.password_hashing подбирает стоимость под железо).
+    # Хеши по прежней схеме или с меньшей стоимостью пересчитываются при входе продавца.
+    password_scheme: str = "bcrypt"  # bcrypt | argon2 (argon2id, нужен argon2-cffi)
+    password_bcrypt_rounds: int = 12
+    password_argon2_time_cost: int = 3
+    password_argon2_memory_cost: int = 65536  # КиБ
+    password_argon2_parallelism: int = 4
+    password_hash_threads: int = 0  # одновременных хеширований в пуле потоков, 0 - по числу ядер
+    # Кэш неизвестных email для входа и проверки токена (0 - выключен). Без push_pg_bridge новый продавец
+    # до ttl секунд получает 401 в воркерах, где его email уже закэширован, поэтому ttl короткий
+    auth_unknown_email_ttl: float = 5.0
+    auth_unknown_email_cache_size: int = 100_000
+    # Выгрузка каталога /api/v1/books/export
+    export_batch_size: int = 1000  # строк за одно чтение из серверного курсора
+    export_snapshot_dir: str = ""  # каталог кэша снимков, пусто - без кэша
+    export_snapshot_ttl: float = 3600.0
+    export_snapshot_max_files: int = 20
+    # Фоновая очередь задач (0 воркеров - очередь не обрабатывается этим процессом)
+    jobs_workers: int = 2
+    jobs_poll_interval: float = 1.0
+    jobs_batch_size: int = 10
+    jobs_max_attempts: int = 5
+    jobs_retry_backoff: float = 2.0
+    jobs_retry_backoff_max: float = 300.0
+    # Лента изменений /api/v1/changes
+    changes_poll_interval: float = 1.0
+    changes_max_wait: float = 30.0
+    changes_sse_heartbeat: float = 15.0
+    # Push-канал обновлений каталога (SSE / WebSocket)
+    push_queue_size: int = 64
+    push_drop_policy: str = "drop_oldest"  # drop_oldest | drop_newest | disconnect
+    push_heartbeat: float = 15.0
+    push_max_topics: int = 50
+    push_pg_bridge: bool = False
+    push_channel: str = "catalog_updates"
+    # Сжатие ответов (gzip всегда, br и zstd - если установлены brotli / zstandard)
+    compression_min_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_zstd_level: int = 3
+    compression_cache_bytes: int = 64 * 1024 * 1024
+    # Тела от этого размера сжимаются и перекодируются в MessagePack в пуле потоков, а не в цикле событий
+    compression_thread_min_size: int = 64 * 1024
+    # Production-запуск через python -m src.serve
+    serve_host: str = "0.0.0.0"
+    serve_port: int = 8000
+    serve_workers: int = 0  # 0 - по числу ядер
+    serve_loop: str = "auto"  # auto | uvloop | asyncio
+    serve_http: str = "auto"  # auto | httptools | h11
+    serve_backlog: int = 2048
+    serve_keep_alive: int = 5
+    serve_timeout: int = 30
+    serve_graceful_timeout: int = 30
+    serve_max_requests: int = 0  # 0 - воркеры не перезапускаются
+    serve_max_requests_jitter: int = 0
+    serve_limit_concurrency: Optional[int] = None
 
     @property
     def database_url(self) -> str:
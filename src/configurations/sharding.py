@@ -0,0 +1,448 @@
+"""
+Шардирование каталога по продавцам (multi-tenant).
+
+Продавец и все его книги лежат в одном шарде, номер которого считается по ИД продавца
+(jump consistent hash). Внутри шарда сохраняется внешний ключ книг на продавца и работают
+связи ORM (Seller.books). Общие таблицы (outbox, очередь задач) остаются в основной базе - шард "default".
+
+Маршрутизацию делает ShardedSession из sqlalchemy.ext.horizontal_shard:
+- INSERT идет в шард продавца (shard_chooser);
+- session.get(Seller, id) - сразу в нужный шард, session.get(Book, id) - по очереди во все шарды;
+- запросы с условием Seller.id / Book.seller_id (= или IN) - только в нужные шарды,
+  остальные запросы к продавцам и книгам - во все шарды с объединением результатов (scatter-gather).
+
+ИД продавцов и книг в этом режиме выдает приложение (IdGenerator), чтобы они были уникальны
+во всех шардах и не менялись при переносе продавца в другой шард (см. src.commands.rebalance_shards).
+Номер узла в ИД каждый процесс арендует в основной базе (IdNodeLease).
+Транзакция, задевшая несколько шардов, фиксируется в каждом по очереди (без двухфазного commit).
+"""
+
+import asyncio
+import logging
+import math
+import os
+import random
+import socket
+import time
+from datetime import timedelta
+from typing import Iterable, List, Optional, Set
+from uuid import uuid4
+
+from sqlalchemy import BinaryExpression, BindParameter, Column, delete, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import ORMExecuteState
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BooleanClauseList
+
+from src.models.base import BaseModel
+from src.models.books import ArchivedBook, Book
+from src.models.id_nodes import IdNodeLease as IdNodeLeaseModel
+from src.models.jobs import utcnow
+from src.models.sellers import Seller, SellerEmail
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["DEFAULT_SHARD", "TENANT_TABLES", "jump_hash", "IdGenerator", "IdNodeLease", "ShardRouter"]
+
+DEFAULT_SHARD = "default"
+
+# Таблицы, которые живут в шардах. Все остальные - в основной базе.
+TENANT_TABLES = (Seller.__table__, Book.__table__, ArchivedBook.__table__)
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping, Veach). При добавлении шарда в конец списка
+    переезжает только ~1/N продавцов, и все они - в новый шард.
+    """
+    b, j = -1, 0
+    key &= 0xFFFFFFFFFFFFFFFF
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+class IdGenerator:
+    """
+    ИД из времени, номера узла и счетчика: 41 бит миллисекунд от EPOCH_MS, 6 бит узла и 6 бит счетчика.
+    Итого 53 бита - такие числа без потерь читаются в JavaScript.
+
+    ИД уникальны, только если номер узла один у процесса: его выдает аренда (IdNodeLease), пока она
+    продлевается. Без узла или после истечения аренды генератор отказывается выдавать ИД.
+    Явный node (тесты, разовые скрипты) действует бессрочно.
+    """
+
+    EPOCH_MS = 1704067200000  # 2024-01-01 UTC
+    NODE_BITS = 6
+    SEQUENCE_BITS = 6
+    NODES = 1 << NODE_BITS
+
+    def __init__(self, node: Optional[int] = None):
+        self.node: Optional[int] = None
+        self.valid_until = 0.0
+        if node is not None:
+            self.assign(node, math.inf)
+        self._last_ms = -1
+        self._sequence = 0
+
+    def assign(self, node: Optional[int], valid_until: float) -> None:
+        """
+        Номер узла и момент (time.monotonic), до которого им можно пользоваться.
+        """
+        self.node = None if node is None else node & (self.NODES - 1)
+        self.valid_until = valid_until
+
+    def __call__(self) -> int:
+        if self.node is None or time.monotonic() >= self.valid_until:
+            raise RuntimeError("ID node is not leased: ids cannot be generated")
+        now_ms = int(time.time() * 1000) - self.EPOCH_MS
+        if now_ms <= self._last_ms:
+            now_ms = self._last_ms
+            self._sequence = (self._sequence + 1) & ((1 << self.SEQUENCE_BITS) - 1)
+            if self._sequence == 0:
+                # Счетчик этой миллисекунды исчерпан: берем ИД из следующей
+                now_ms += 1
+        else:
+            self._sequence = 0
+        self._last_ms = now_ms
+        return (now_ms << (self.NODE_BITS + self.SEQUENCE_BITS)) | (self.node << self.SEQUENCE_BITS) | self._sequence
+
+
+class IdNodeLease:
+    """
+    Аренда номера узла IdGenerator в основной базе (таблица id_node_leases), чтобы два процесса -
+    воркеры gunicorn, другие машины, команда импорта - никогда не выдавали ИД с одним номером узла.
+
+    start() занимает свободный или просроченный номер, фоновая задача продлевает аренду каждые ttl / 4.
+    Генератор выдает ИД не дольше ttl / 2 после начала последнего успешного продления: другой процесс
+    заберет номер только после ttl, запас покрывает задержку продления и расхождение часов.
+    Если номер успели забрать (процесс долго не мог достучаться до базы), арендуется новый.
+    Номеров всего IdGenerator.NODES - это предел числа одновременно пишущих процессов.
+    """
+
+    ACQUIRE_ATTEMPTS = 3
+
+    def __init__(self, engine: AsyncEngine, generator: IdGenerator, ttl: float):
+        self.engine = engine
+        self.generator = generator
+        self.ttl = ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.node: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> int:
+        await self.acquire()
+        self._task = asyncio.create_task(self._renew_forever(), name="id-node-lease")
+        return self.node
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.release()
+
+    async def acquire(self) -> int:
+        leases = IdNodeLeaseModel.__table__
+        for _ in range(self.ACQUIRE_ATTEMPTS):
+            started, now = time.monotonic(), utcnow()
+            async with self.engine.connect() as conn:
+                rows = (await conn.execute(select(leases.c.node, leases.c.expires_at > now))).all()
+            known = {node for node, _ in rows}
+            busy = {node for node, active in rows if active}
+            free = [node for node in range(IdGenerator.NODES) if node not in busy]
+            random.shuffle(free)
+            for node in free:
+                values = {"node": node, "owner": self.owner, "expires_at": now + timedelta(seconds=self.ttl)}
+                try:
+                    async with self.engine.begin() as conn:
+                        if node in known:
+                            # Просроченную аренду забирает тот, чей UPDATE успел первым
+                            res = await conn.execute(
+                                update(leases).where(leases.c.node == node, leases.c.expires_at <= now).values(values)
+                            )
+                            if res.rowcount != 1:
+                                continue
+                        else:
+                            await conn.execute(insert(leases).values(values))
+                except IntegrityError:
+                    # Свободный номер одновременно занял другой процесс
+                    continue
+                self._hold(node, started)
+                logger.info("Leased ID node %s as %s", node, self.owner)
+                return node
+        raise RuntimeError(f"No free ID node: all {IdGenerator.NODES} are leased by other processes")
+
+    async def renew(self) -> None:
+        leases = IdNodeLeaseModel.__table__
+        started, now = time.monotonic(), utcnow()
+        async with self.engine.begin() as conn:
+            res = await conn.execute(
+                update(leases)
+                .where(leases.c.node == self.node, leases.c.owner == self.owner)
+                .values(expires_at=now + timedelta(seconds=self.ttl))
+            )
+        if res.rowcount == 1:
+            self._hold(self.node, started)
+            return
+        logger.error("ID node %s lease was lost, leasing another one", self.node)
+        self.generator.assign(None, 0.0)
+        await self.acquire()
+
+    async def release(self) -> None:
+        if self.node is None:
+            return
+        leases = IdNodeLeaseModel.__table__
+        self.generator.assign(None, 0.0)
+        async with self.engine.begin() as conn:
+            await conn.execute(delete(leases).where(leases.c.node == self.node, leases.c.owner == self.owner))
+        self.node = None
+
+    def _hold(self, node: int, started: float) -> None:
+        self.node = node
+        self.generator.assign(node, started + self.ttl / 2)
+
+    async def _renew_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl / 4)
+            try:
+                await self.renew()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Следующая попытка через ttl / 4; до тех пор генератор работает, пока не истечет срок
+                logger.error("ID node lease renewal failed: %s", e)
+
+
+def _conjuncts(clause) -> Iterable:
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        for item in clause.clauses:
+            yield from _conjuncts(item)
+    else:
+        yield clause
+
+
+def criteria_values(orm_context: ORMExecuteState, column: Column) -> Optional[Set[int]]:
+    """
+    Значения column из условий вида column = :x и column IN (...), объединенных через AND.
+    None - ограничения по column в запросе нет.
+    """
+    where = getattr(orm_context.statement, "whereclause", None)
+    if where is None:
+        return None
+
+    parameters = orm_context.parameters if isinstance(orm_context.parameters, dict) else {}
+    for clause in _conjuncts(where):
+        if not isinstance(clause, BinaryExpression) or not isinstance(clause.right, BindParameter):
+            continue
+        left = clause.left
+        if getattr(left, "table", None) is not column.table or getattr(left, "name", None) != column.name:
+            continue
+
+        value = parameters.get(clause.right.key, clause.right.effective_value)
+        if clause.operator is operators.eq:
+            return {value}
+        if clause.operator is operators.in_op:
+            return set(value)
+    return None
+
+
+class ShardRouter:
+    def __init__(self, default_engine: AsyncEngine, shard_engines: List[AsyncEngine], id_generator: IdGenerator):
+        self.default_engine = default_engine
+        self.shard_engines = shard_engines
+        self.shard_ids = [f"shard_{i}" for i in range(len(shard_engines))]
+        self.next_id = id_generator
+        self.id_lease: Optional[IdNodeLease] = None
+
+    def shard_for(self, seller_id: int) -> str:
+        return self.shard_ids[jump_hash(seller_id, len(self.shard_ids))]
+
+    def _shards_for(self, seller_ids: Optional[Set[int]]) -> List[str]:
+        if seller_ids is None:
+            return self.shard_ids
+        return sorted({self.shard_for(seller_id) for seller_id in seller_ids})
+
+    def _shard_chooser(self, mapper, instance, clause=None) -> str:
+        if mapper is None or mapper.local_table not in TENANT_TABLES:
+            return DEFAULT_SHARD
+        if instance is None:
+            # Запрос без объекта (например, session.connection() для продавцов) - шард указывают явно
+            return self.shard_ids[0]
+
+        if mapper.local_table is Seller.__table__:
+            if instance.id is None:
+                instance.id = self.next_id()
+            return self.shard_for(instance.id)
+
+        if instance.id is None:
+            instance.id = self.next_id()
+        return self.shard_for(instance.seller_id)
+
+    def _identity_chooser(self, mapper, primary_key, **kw) -> List[str]:
+        if mapper.local_table is Seller.__table__:
+            return [self.shard_for(primary_key[0])]
+        if mapper.local_table is not Seller.__table__ and mapper.local_table in TENANT_TABLES:
+            return self.shard_ids
+        return [DEFAULT_SHARD]
+
+    def _execute_chooser(self, orm_context: ORMExecuteState) -> List[str]:
+        mapper = orm_context.bind_mapper
+        if mapper is None or mapper.local_table not in TENANT_TABLES:
+            return [DEFAULT_SHARD]
+        if mapper.local_table is Seller.__table__:
+            return self._shards_for(criteria_values(orm_context, Seller.__table__.c.id))
+        return self._shards_for(criteria_values(orm_context, mapper.local_table.c.seller_id))
+
+    def session_factory(self, **execution_options) -> async_sessionmaker:
+        def bind(engine: AsyncEngine):
+            return engine.execution_options(**execution_options).sync_engine
+
+        shards = {DEFAULT_SHARD: bind(self.default_engine)}
+        shards.update({shard_id: bind(engine) for shard_id, engine in zip(self.shard_ids, self.shard_engines)})
+        return async_sessionmaker(
+            sync_session_class=ShardedSession,
+            shards=shards,
+            shard_chooser=self._shard_chooser,
+            identity_chooser=self._identity_chooser,
+            execute_chooser=self._execute_chooser,
+            info={"book_shards": list(self.shard_ids)},
+        )
+
+    async def create_tables(self) -> None:
+        tenant_tables = list(TENANT_TABLES)
+        shared_tables = [table for table in BaseModel.metadata.sorted_tables if table not in TENANT_TABLES]
+        async with self.default_engine.begin() as conn:
+            await conn.run_sync(BaseModel.metadata.create_all, tables=shared_tables)
+        for engine in self.shard_engines:
+            async with engine.begin() as conn:
+                await conn.run_sync(BaseModel.metadata.create_all, tables=tenant_tables)
+
+    async def drop_tables(self) -> None:
+        tenant_tables = list(TENANT_TABLES)
+        shared_tables = [table for table in BaseModel.metadata.sorted_tables if table not in TENANT_TABLES]
+        for engine in self.shard_engines:
+            async with engine.begin() as conn:
+                await conn.run_sync(BaseModel.metadata.drop_all, tables=tenant_tables)
+                await conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+        async with self.default_engine.begin() as conn:
+            await conn.run_sync(BaseModel.metadata.drop_all, tables=shared_tables)
+            await conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+
+    async def lease_id_node(self, ttl: float) -> None:
+        """
+        Арендует номер узла генератора ИД (если он не задан явно). Таблица аренд должна уже существовать.
+        """
+        if self.next_id.node is None and self.id_lease is None:
+            self.id_lease = IdNodeLease(self.default_engine, self.next_id, ttl)
+            await self.id_lease.start()
+
+    async def dispose(self) -> None:
+        if self.id_lease is not None:
+            await self.id_lease.stop()
+            self.id_lease = None
+        for engine in self.shard_engines:
+            await engine.dispose()
+
+    async def sync_email_directory(self, batch_size: int = 1000) -> dict:
+        """
+        Дописывает в справочник email основной базы (SellerEmail) продавцов шардов, которых в нем нет.
+        Email, занятый в справочнике другим продавцом, - дубликат из времени до справочника: он считается
+        в conflicts и пишется в журнал, разобрать такие дубликаты нужно вручную. Запуск можно повторять.
+        """
+        sellers, emails = Seller.__table__, SellerEmail.__table__
+        report = {"scanned": 0, "added": 0, "conflicts": 0}
+        for engine in self.shard_engines:
+            after_id = None
+            while True:
+                query = select(sellers.c.id, sellers.c.email_normalized).order_by(sellers.c.id).limit(batch_size)
+                if after_id is not None:
+                    query = query.where(sellers.c.id > after_id)
+                async with engine.connect() as conn:
+                    rows = (await conn.execute(query)).all()
+                if not rows:
+                    break
+                after_id = rows[-1].id
+                report["scanned"] += len(rows)
+
+                async with self.default_engine.begin() as conn:
+                    res = await conn.execute(
+                        select(emails.c.email_normalized, emails.c.seller_id).where(
+                            emails.c.email_normalized.in_([row.email_normalized for row in rows])
+                        )
+                    )
+                    claimed = dict(res.all())
+                    missing = {}
+                    for seller_id, email in rows:
+                        owner = claimed.get(email, missing.get(email, seller_id))
+                        if owner != seller_id:
+                            report["conflicts"] += 1
+                            logger.warning("Email %s belongs to sellers %s and %s", email, owner, seller_id)
+                        elif email not in claimed:
+                            missing[email] = seller_id
+                    if missing:
+                        await conn.execute(
+                            insert(emails), [{"email_normalized": e, "seller_id": i} for e, i in missing.items()]
+                        )
+                        report["added"] += len(missing)
+        return report
+
+    async def rebalance(self, sources: List[AsyncEngine], dry_run: bool = False, batch_size: int = 100) -> dict:
+        """
+        Переносит продавцов (вместе с книгами) из шардов sources в шарды, положенные им
+        по текущей конфигурации. Продавец сначала копируется в целевой шард (с заменой,
+        если там осталась копия от прерванного запуска), и только потом удаляется из исходного,
+        поэтому запуск можно безопасно повторять.
+        """
+        sellers, books, archived_books = TENANT_TABLES
+        report = {"scanned": 0, "moved_sellers": 0, "moved_books": 0}
+        engines = dict(zip(self.shard_ids, self.shard_engines))
+
+        for source in sources:
+            async with source.connect() as conn:
+                seller_ids = (await conn.execute(select(sellers.c.id))).scalars().all()
+            report["scanned"] += len(seller_ids)
+
+            misplaced = [seller_id for seller_id in seller_ids if engines[self.shard_for(seller_id)].url != source.url]
+            for start in range(0, len(misplaced), batch_size):
+                batch = misplaced[start : start + batch_size]  # noqa: E203
+                async with source.connect() as conn:
+                    seller_rows = (await conn.execute(select(sellers).where(sellers.c.id.in_(batch)))).mappings().all()
+                    book_rows = (await conn.execute(select(books).where(books.c.seller_id.in_(batch)))).mappings().all()
+                    archived_rows = (
+                        (await conn.execute(select(archived_books).where(archived_books.c.seller_id.in_(batch))))
+                        .mappings()
+                        .all()
+                    )
+                report["moved_sellers"] += len(seller_rows)
+                report["moved_books"] += len(book_rows)
+                if dry_run:
+                    continue
+
+                for shard_id in {self.shard_for(seller_id) for seller_id in batch}:
+                    shard_sellers = [dict(row) for row in seller_rows if self.shard_for(row["id"]) == shard_id]
+                    shard_seller_ids = [row["id"] for row in shard_sellers]
+                    shard_books = [dict(row) for row in book_rows if row["seller_id"] in shard_seller_ids]
+                    shard_archived = [dict(row) for row in archived_rows if row["seller_id"] in shard_seller_ids]
+                    async with engines[shard_id].begin() as conn:
+                        await conn.execute(
+                            delete(archived_books).where(archived_books.c.seller_id.in_(shard_seller_ids))
+                        )
+                        await conn.execute(delete(books).where(books.c.seller_id.in_(shard_seller_ids)))
+                        await conn.execute(delete(sellers).where(sellers.c.id.in_(shard_seller_ids)))
+                        await conn.execute(insert(sellers), shard_sellers)
+                        if shard_books:
+                            await conn.execute(insert(books), shard_books)
+                        if shard_archived:
+                            await conn.execute(insert(archived_books), shard_archived)
+
+                async with source.begin() as conn:
+                    await conn.execute(delete(archived_books).where(archived_books.c.seller_id.in_(batch)))
+                    await conn.execute(delete(books).where(books.c.seller_id.in_(batch)))
+                    await conn.execute(delete(sellers).where(sellers.c.id.in_(batch)))
+
+        return report
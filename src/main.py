@@ -4,8 +4,25 @@ from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordBearer
 
-from src.configurations.database import create_db_and_tables, delete_db_and_tables, global_init
-from src.routers import v1_router
+from src.configurations.database import (
+    delete_db_and_tables,
+    dispose_engine,
+    get_engine,
+    get_session_factory,
+    global_init,
+    lease_id_node,
+)
+from src.configurations.migrations import migrate_database
+from src.configurations.settings import settings
+from src.routers import internal_router, v1_router
+from src.service.push import PushService
+from src.utils.access_log import AccessLogMiddleware, access_log_writer
+from src.utils.compression import CompressionMiddleware
+from src.utils.concurrency import ConcurrencyLimitMiddleware
+from src.utils.deadlines import DeadlineMiddleware
+from src.utils.job_queue import JobWorkerPool
+from src.utils.tracing import TracingMiddleware, tracer
+from src.utils.traffic_capture import TrafficCaptureMiddleware, capture_writer
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -14,10 +31,23 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 async def lifespan(app: FastAPI):
     # Запускается при старте приложения
     global_init()
-    await create_db_and_tables()
+    # Создание пустой базы, применение или проверка миграций (см. configurations.migrations)
+    await migrate_database()
+    # При шардировании процессу нужен свой номер узла в ИД продавцов и книг
+    await lease_id_node()
+    job_pool = JobWorkerPool(get_session_factory(), workers=settings.jobs_workers)
+    await job_pool.start()
+    await PushService.start_bridge(get_engine())
     yield
     # Запускается при остановке приложения
-    await delete_db_and_tables()
+    await PushService.stop_bridge()
+    await job_pool.stop()
+    if settings.db_drop_on_shutdown:
+        await delete_db_and_tables()
+    await dispose_engine()
+    tracer.shutdown()
+    access_log_writer.shutdown()
+    capture_writer.shutdown()
 
 
 def create_application() -> FastAPI:
@@ -35,6 +65,18 @@ def create_application() -> FastAPI:
 
 def _configure(app: FastAPI):
     app.include_router(v1_router)
+    app.include_router(internal_router)
+    app.add_middleware(CompressionMiddleware)
+    app.add_middleware(DeadlineMiddleware)
+    if settings.concurrency_limit_enabled:
+        # Добавленный последним выполняется первым: отказ 503 не тратит время на остальную обработку
+        app.add_middleware(ConcurrencyLimitMiddleware)
+    # Журнал запросов видит и отказы лимита, и trace_id спана запроса
+    app.add_middleware(AccessLogMiddleware)
+    if settings.capture_enabled:
+        app.add_middleware(TrafficCaptureMiddleware)
+    # Внешний слой: спан запроса включает и ожидание в очереди лимита
+    app.add_middleware(TracingMiddleware)
 
 
 app = create_application()
@@ -0,0 +1,79 @@
+"""
+Окружение Alembic.
+
+Приложение и src.commands.migrate передают готовое соединение через config.attributes["connection"]
+и группу таблиц через config.attributes["tables"] (all | shared | tenant, см. configurations.migrations).
+При запуске из консоли база берется из -x url=... или из настроек приложения, группа - из -x tables=...
+"""
+
+import asyncio
+
+from alembic import context
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.configurations.migrations import group_tables
+from src.configurations.settings import settings
+from src.models.base import BaseModel
+
+config = context.config
+x_arguments = context.get_x_argument(as_dictionary=True)
+config.attributes.setdefault("tables", x_arguments.get("tables", "all"))
+
+target_metadata = BaseModel.metadata
+_group_table_names = {table.name for table in group_tables(config.attributes["tables"])}
+
+
+def include_name(name, type_, parent_names) -> bool:
+    # Автогенерация сравнивает только таблицы своей группы
+    return type_ != "table" or name in _group_table_names
+
+
+def database_url() -> str:
+    return x_arguments.get("url") or config.get_main_option("sqlalchemy.url") or settings.database_url
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=database_url(),
+        target_metadata=target_metadata,
+        include_name=include_name,
+        literal_binds=True,
+        transaction_per_migration=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection) -> None:
+    # Каждая миграция в своей транзакции: CREATE INDEX CONCURRENTLY выполняется между ними (autocommit_block)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+        transaction_per_migration=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    engine = create_async_engine(database_url(), poolclass=NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is None:
+        asyncio.run(run_async_migrations())
+    else:
+        do_run_migrations(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
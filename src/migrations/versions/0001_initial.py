@@ -0,0 +1,119 @@
+"""Схема, которую строил create_all до появления миграций
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 12:00:00
+
+Базы, созданные до появления миграций, помечаются этой ревизией (см. configurations.migrations).
+Таблица книг секционируется по настройкам DB_BOOKS_PARTITIONING, как и в src.models.partitioning.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from src.configurations.migrations import applies_to
+from src.configurations.settings import settings
+from src.models.partitioning import partition_key, partition_statements
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BigId = sa.BigInteger().with_variant(sa.Integer(), "sqlite")
+
+
+def _books_partitioning() -> dict:
+    scheme = settings.db_books_partitioning
+    if scheme == "none" or op.get_context().dialect.name != "postgresql":
+        return {}
+    return {"postgresql_partition_by": f"{scheme.upper()} ({partition_key(scheme)})"}
+
+
+def upgrade() -> None:
+    if applies_to("jobs_table"):
+        op.create_table(
+            "jobs_table",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("kind", sa.String(50), nullable=False),
+            sa.Column("payload", sa.JSON(), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("max_attempts", sa.Integer(), nullable=False),
+            sa.Column("run_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("last_error", sa.Text(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        )
+        op.create_index("ix_jobs_table_status_run_at", "jobs_table", ["status", "run_at"])
+
+    if applies_to("outbox_table"):
+        op.create_table(
+            "outbox_table",
+            sa.Column("seq", sa.Integer(), primary_key=True),
+            sa.Column("entity", sa.String(20), nullable=False),
+            sa.Column("entity_id", BigId, nullable=False),
+            sa.Column("op", sa.String(20), nullable=False),
+            sa.Column("payload", sa.JSON(), nullable=True),
+            sa.Column("txid", sa.BigInteger(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        )
+
+    if applies_to("sellers_table"):
+        op.create_table(
+            "sellers_table",
+            sa.Column("id", BigId, primary_key=True),
+            sa.Column("first_name", sa.String(30), nullable=False),
+            sa.Column("last_name", sa.String(90), nullable=False),
+            sa.Column("email", sa.String(100), nullable=False),
+            sa.Column("password", sa.String(200), nullable=False),
+            sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+        )
+        op.create_index("ix_sellers_table_email", "sellers_table", ["email"], unique=True)
+
+    if applies_to("books_table"):
+        partitioning = _books_partitioning()
+        # Ключ секционирования обязан входить в первичный ключ секционированной таблицы
+        primary_key = ["id", partition_key(settings.db_books_partitioning)] if partitioning else ["id"]
+        books = op.create_table(
+            "books_table",
+            sa.Column("id", BigId, autoincrement=True),
+            sa.Column("title", sa.String(200), nullable=False),
+            sa.Column("author", sa.String(150), nullable=False),
+            sa.Column("year", sa.Integer(), nullable=False),
+            sa.Column("count_pages", sa.Integer(), nullable=False),
+            sa.Column("seller_id", BigId, sa.ForeignKey("sellers_table.id"), nullable=False),
+            sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+            sa.PrimaryKeyConstraint(*primary_key),
+            **partitioning,
+        )
+        if partitioning:
+            for statement in partition_statements(
+                books,
+                settings.db_books_partitioning,
+                settings.db_books_hash_partitions,
+                settings.db_books_partition_years,
+            ):
+                op.execute(statement)
+
+    if applies_to("books_archive_table"):
+        op.create_table(
+            "books_archive_table",
+            sa.Column("id", BigId, primary_key=True, autoincrement=False),
+            sa.Column("title", sa.String(200), nullable=False),
+            sa.Column("author", sa.String(150), nullable=False),
+            sa.Column("year", sa.Integer(), nullable=False),
+            sa.Column("count_pages", sa.Integer(), nullable=False),
+            sa.Column("seller_id", BigId, nullable=False),
+            sa.Column("version", sa.Integer(), server_default="1", nullable=False),
+            sa.Column("archived_at", sa.DateTime(timezone=True), nullable=False),
+        )
+        op.create_index("ix_books_archive_table_seller_id", "books_archive_table", ["seller_id"])
+
+
+def downgrade() -> None:
+    for table in ("books_archive_table", "books_table", "sellers_table", "outbox_table", "jobs_table"):
+        if applies_to(table):
+            op.drop_table(table)
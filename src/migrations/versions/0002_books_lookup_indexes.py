@@ -0,0 +1,29 @@
+"""Индексы книг: по продавцу (внешний ключ) и по году издания
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 12:30:00
+
+Без индекса по seller_id каскадное удаление продавца и selectinload(Seller.books) читают всю таблицу книг.
+Индекс по year нужен выборке холодных книг (src.commands.archive_books).
+Индексы строятся конкурентно, запись в таблицу книг на это время не блокируется.
+"""
+
+from typing import Sequence, Union
+
+from src.configurations.migrations import create_index_online, drop_index_online
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    create_index_online("ix_books_table_seller_id", "books_table", ["seller_id"])
+    create_index_online("ix_books_table_year", "books_table", ["year"])
+
+
+def downgrade() -> None:
+    drop_index_online("ix_books_table_year", "books_table")
+    drop_index_online("ix_books_table_seller_id", "books_table")
@@ -0,0 +1,43 @@
+"""Нормализованный email продавца с уникальным индексом
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 15:00:00
+
+Вход и проверка токена ищут продавца по email_normalized (email в нижнем регистре), поэтому
+Seller@Mail.com и seller@mail.com - один продавец, а поиск по-прежнему идет по индексу.
+Если в базе уже есть email, отличающиеся только регистром, уникальный индекс не построится:
+такие дубликаты нужно разобрать вручную и перезапустить миграцию.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from src.configurations.migrations import applies_to, create_index_online, drop_index_online, set_not_null_online
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL = "UPDATE sellers_table SET email_normalized = lower(trim(email)) WHERE email_normalized IS NULL"
+
+
+def upgrade() -> None:
+    if not applies_to("sellers_table"):
+        return
+    # Колонка без значения по умолчанию добавляется без переписывания таблицы
+    op.add_column("sellers_table", sa.Column("email_normalized", sa.String(100), nullable=True))
+    op.execute(BACKFILL)
+    create_index_online("ix_sellers_table_email_normalized", "sellers_table", ["email_normalized"], unique=True)
+    set_not_null_online("sellers_table", "email_normalized", sa.String(100), backfill=BACKFILL)
+
+
+def downgrade() -> None:
+    if not applies_to("sellers_table"):
+        return
+    drop_index_online("ix_sellers_table_email_normalized", "sellers_table")
+    with op.batch_alter_table("sellers_table") as batch:
+        batch.drop_column("email_normalized")
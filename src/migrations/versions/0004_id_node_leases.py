@@ -0,0 +1,39 @@
+"""Аренда номеров узлов генератора ИД
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 16:00:00
+
+При шардировании ИД продавцов и книг выдает приложение, и номер узла в ИД должен быть свой у каждого
+процесса. Процессы арендуют номера в этой таблице основной базы (src.configurations.sharding.IdNodeLease).
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from src.configurations.migrations import applies_to
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not applies_to("id_node_leases"):
+        return
+    op.create_table(
+        "id_node_leases",
+        sa.Column("node", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("owner", sa.String(100), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("node"),
+    )
+
+
+def downgrade() -> None:
+    if not applies_to("id_node_leases"):
+        return
+    op.drop_table("id_node_leases")
@@ -0,0 +1,45 @@
+"""Справочник email продавцов в основной базе
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 16:30:00
+
+Уникальные индексы email у продавцов действуют только внутри шарда, а шард продавца выбирается по ИД,
+поэтому один email мог зарегистрироваться в двух шардах. При шардировании занятые email записываются
+в эту таблицу основной базы в той же транзакции, что и продавец. Продавцов, созданных до миграции,
+дописывает в нее migrate_database (ShardRouter.sync_email_directory) - шарды из миграции не видны.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+from src.configurations.migrations import applies_to
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BigId = sa.BigInteger().with_variant(sa.Integer(), "sqlite")
+
+
+def upgrade() -> None:
+    if not applies_to("seller_emails_table"):
+        return
+    op.create_table(
+        "seller_emails_table",
+        sa.Column("email_normalized", sa.String(100), nullable=False),
+        sa.Column("seller_id", BigId, nullable=False),
+        sa.PrimaryKeyConstraint("email_normalized"),
+    )
+    # Таблица новая и пустая, поэтому индекс строится обычным CREATE INDEX
+    op.create_index("ix_seller_emails_table_seller_id", "seller_emails_table", ["seller_id"])
+
+
+def downgrade() -> None:
+    if not applies_to("seller_emails_table"):
+        return
+    op.drop_index("ix_seller_emails_table_seller_id", "seller_emails_table")
+    op.drop_table("seller_emails_table")
@@ -1,5 +1,10 @@
+from sqlalchemy import BigInteger, Integer
 from sqlalchemy.orm import DeclarativeBase
 
+# Тип ИД продавцов и книг. При шардировании ИД выдает приложение (до 53 бит), им мало INTEGER в Postgres.
+# В SQLite автоинкремент работает только у INTEGER PRIMARY KEY, а он и так 64-битный.
+BigId = BigInteger().with_variant(Integer, "sqlite")
+
 
 class BaseModel(DeclarativeBase):
     pass
@@ -1,21 +1,54 @@
-from sqlalchemy import ForeignKey, String
+from datetime import datetime
+
+from sqlalchemy import DateTime, ForeignKey, String
 from sqlalchemy.orm import Mapped, mapped_column
 
-from .base import BaseModel
+from .base import BaseModel, BigId
+from .jobs import utcnow
 
 
 class Book(BaseModel):
     __tablename__ = "books_table"
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(BigId, primary_key=True)
     title: Mapped[str] = mapped_column(String(200), nullable=False)
     author: Mapped[str] = mapped_column(String(150), nullable=False)
-    year: Mapped[int]
+    # Индексы по году и продавцу добавлены миграцией 0002 (src/migrations)
+    year: Mapped[int] = mapped_column(index=True)
     count_pages: Mapped[int]
-    seller_id: Mapped[int] = mapped_column(ForeignKey("sellers_table.id"))
+    seller_id: Mapped[int] = mapped_column(BigId, ForeignKey("sellers_table.id"), index=True)
+    # Версия строки для оптимистичных блокировок (ETag / If-Match), растет при каждом UPDATE
+    version: Mapped[int] = mapped_column(nullable=False, server_default="1")
+
+    # При секционировании (src.models.partitioning) первичный ключ таблицы становится составным,
+    # а ORM продолжает идентифицировать книгу только по id
+    __mapper_args__ = {"version_id_col": version, "primary_key": [id]}
 
     def __repr__(self):
         return (
             f"<Book(id={self.id}, title='{self.title}', author='{self.author}', "
             f"year={self.year}, count_pages={self.count_pages}, seller_id={self.seller_id})>"
         )
+
+
+class ArchivedBook(BaseModel):
+    """
+    Холодные книги, перенесенные из books_table командой src.commands.archive_books.
+    Колонки те же, что у книги; читаются вместе с основной таблицей при include_archived.
+    """
+
+    __tablename__ = "books_archive_table"
+
+    # ИД сохраняется из books_table, поэтому без автоинкремента
+    id: Mapped[int] = mapped_column(BigId, primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(String(200), nullable=False)
+    author: Mapped[str] = mapped_column(String(150), nullable=False)
+    year: Mapped[int]
+    count_pages: Mapped[int]
+    # Без внешнего ключа: архив не мешает удалять продавцов, его книги удаляет SellersService.delete_seller
+    seller_id: Mapped[int] = mapped_column(BigId, index=True)
+    version: Mapped[int] = mapped_column(nullable=False, server_default="1")
+    archived_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utcnow)
+
+    def __repr__(self):
+        return f"<ArchivedBook(id={self.id}, title='{self.title}', seller_id={self.seller_id})>"
@@ -0,0 +1,38 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import JSON, BigInteger, DateTime, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import BaseModel, BigId
+from .jobs import utcnow
+
+
+# Сущности, изменения которых попадают в outbox
+class EventEntity:
+    BOOK = "book"
+    SELLER = "seller"
+
+
+# Виды изменений
+class EventOp:
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+
+
+class OutboxEvent(BaseModel):
+    __tablename__ = "outbox_table"
+
+    # Монотонный номер события - по нему потребители продолжают чтение ленты
+    seq: Mapped[int] = mapped_column(primary_key=True)
+    entity: Mapped[str] = mapped_column(String(20), nullable=False)
+    entity_id: Mapped[int] = mapped_column(BigId, nullable=False)
+    op: Mapped[str] = mapped_column(String(20), nullable=False)
+    payload: Mapped[Optional[dict]] = mapped_column(JSON)
+    # ИД транзакции Postgres, записавшей событие (для остальных СУБД не заполняется)
+    txid: Mapped[Optional[int]] = mapped_column(BigInteger)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, default=utcnow)
+
+    def __repr__(self):
+        return f"<OutboxEvent(seq={self.seq}, entity='{self.entity}', entity_id={self.entity_id}, op='{self.op}')>"
@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base import BaseModel
+
+
+class IdNodeLease(BaseModel):
+    """
+    Аренда номера узла генератора ИД (src.configurations.sharding.IdNodeLease).
+    Строка живет в основной базе, пока процесс ее продлевает; просроченную аренду забирает другой процесс.
+    """
+
+    __tablename__ = "id_node_leases"
+
+    node: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    owner: Mapped[str] = mapped_column(String(100), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<IdNodeLease(node={self.node}, owner='{self.owner}', expires_at={self.expires_at})>"
@@ -0,0 +1,73 @@
+"""
+Декларативное секционирование таблицы книг в Postgres.
+
+Схема задается в метаданных таблицы: PARTITION BY попадает в CREATE TABLE через dialect-параметр
+postgresql_partition_by, а секции создаются событием after_create той же таблицы, поэтому
+metadata.create_all строит всю структуру сразу. В SQLite и без настройки таблица остается обычной.
+
+- hash - по seller_id на N секций: запросы и удаление книг одного продавца затрагивают одну секцию;
+- range - по году издания с границами years: старые книги лежат отдельно и их удобно архивировать.
+
+Postgres требует, чтобы ключ секционирования входил в первичный ключ, поэтому в таблице он становится
+составным (id, seller_id) или (id, year). ORM по-прежнему идентифицирует книги только по id
+(см. primary_key в Book.__mapper_args__), ИД уникальны благодаря общей последовательности.
+"""
+
+from typing import Sequence
+
+from sqlalchemy import DDL, PrimaryKeyConstraint, Table, event
+
+__all__ = ["PARTITION_SCHEMES", "partition_books_table", "partition_key", "partition_names", "partition_statements"]
+
+PARTITION_SCHEMES = ("none", "hash", "range")
+
+
+def partition_names(table: Table, count: int) -> list:
+    prefix = f"{table.schema}." if table.schema else ""
+    return [f"{prefix}{table.name}_p{i}" for i in range(count)]
+
+
+def partition_key(scheme: str) -> str:
+    return "seller_id" if scheme == "hash" else "year"
+
+
+def _partition_bounds(scheme: str, partitions: int, years: Sequence[int]) -> list:
+    if scheme == "hash":
+        return [f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})" for i in range(partitions)]
+
+    edges = ["MINVALUE", *map(str, sorted(years)), "MAXVALUE"]
+    return [f"FOR VALUES FROM ({low}) TO ({high})" for low, high in zip(edges, edges[1:])]
+
+
+def partition_books_table(table: Table, scheme: str, partitions: int = 8, years: Sequence[int] = ()) -> None:
+    """
+    Включает секционирование для таблицы книг (или ее копии, см. src.benchmarks.partitioning).
+    Вызывается до create_all; повторный вызов для той же таблицы ничего не делает.
+    """
+    if scheme not in PARTITION_SCHEMES:
+        raise ValueError(f"Unknown partitioning scheme: {scheme}")
+    if scheme == "none" or "partitioning" in table.info:
+        return
+
+    key = table.c[partition_key(scheme)]
+    table.info["partitioning"] = scheme
+    table.dialect_kwargs["postgresql_partition_by"] = f"{scheme.upper()} ({key.name})"
+
+    key.primary_key = True
+    table.append_constraint(PrimaryKeyConstraint(table.c.id, key))
+    # Для составного ключа SQLAlchemy сам не делает id автоинкрементным (BIGSERIAL)
+    table.c.id.autoincrement = True
+
+    statements = partition_statements(table, scheme, partitions, years)
+    table.info["partitions"] = partition_names(table, len(statements))
+    for statement in statements:
+        event.listen(table, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+
+def partition_statements(table: Table, scheme: str, partitions: int = 8, years: Sequence[int] = ()) -> list:
+    """
+    CREATE TABLE ... PARTITION OF для всех секций (используется и в миграциях src/migrations).
+    """
+    bounds = _partition_bounds(scheme, partitions, years)
+    names = partition_names(table, len(bounds))
+    return [f"CREATE TABLE {name} PARTITION OF {table.fullname} {bound}" for name, bound in zip(names, bounds)]
@@ -3,18 +3,54 @@ from typing import List
 from sqlalchemy import String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from .base import BaseModel
+from .base import BaseModel, BigId
+
+
+def normalize_email(email: str) -> str:
+    """
+    Ключ поиска продавца по email: без учета регистра и пробелов по краям.
+    """
+    return email.strip().lower()
+
+
+def _email_normalized_default(context) -> str:
+    # Для вставок, где email_normalized не передан явно (фикстуры, прямые INSERT)
+    return normalize_email(context.get_current_parameters()["email"])
 
 
 class Seller(BaseModel):
     __tablename__ = "sellers_table"
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(BigId, primary_key=True)
     first_name: Mapped[str] = mapped_column(String(30), nullable=False)
     last_name: Mapped[str] = mapped_column(String(90), nullable=False)
     email: Mapped[str] = mapped_column(String(100), unique=True, index=True, nullable=False)
+    # email в нижнем регистре: по нему ищут вход и проверка токена, уникален без учета регистра.
+    # При смене email обновляется вместе с ним (SellersService.update_seller / patch_seller)
+    email_normalized: Mapped[str] = mapped_column(
+        String(100), unique=True, index=True, nullable=False, default=_email_normalized_default
+    )
     password: Mapped[str] = mapped_column(String(200), nullable=False)
     books: Mapped[List["Book"]] = relationship("Book", cascade="all, delete-orphan")
+    # Версия строки для оптимистичных блокировок (ETag / If-Match), растет при каждом UPDATE
+    version: Mapped[int] = mapped_column(nullable=False, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     def __repr__(self):
         return f"<Seller(id={self.id}, first_name='{self.first_name}', last_name='{self.last_name}', email='{self.email}')>"
+
+
+class SellerEmail(BaseModel):
+    """
+    Справочник занятых email при шардировании: уникальный индекс продавцов есть только внутри шарда,
+    а эта таблица лежит в основной базе и одна на все шарды (см. SellerEmailService).
+    """
+
+    __tablename__ = "seller_emails_table"
+
+    email_normalized: Mapped[str] = mapped_column(String(100), primary_key=True)
+    seller_id: Mapped[int] = mapped_column(BigId, index=True, nullable=False)
+
+    def __repr__(self):
+        return f"<SellerEmail(email_normalized='{self.email_normalized}', seller_id={self.seller_id})>"
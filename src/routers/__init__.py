@@ -1,6 +1,20 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
+from src.utils.auth import check_internal_token
+
+from .internal.access_log import access_log_router
+from .internal.auth import auth_stats_router
+from .internal.concurrency import concurrency_router
+from .internal.db import db_router
+from .internal.deadlines import deadlines_router
+from .internal.jobs import jobs_router
+from .internal.profile import profile_router
+from .internal.push import push_stats_router
+from .internal.single_flight import single_flight_router
+from .internal.tracing import tracing_router
 from .v1.books import books_router
+from .v1.changes import changes_router
+from .v1.push import push_router
 from .v1.sellers import sellers_router
 from .v1.token import auth_router
 
@@ -10,3 +24,21 @@ v1_router = APIRouter(tags=["v1"], prefix="/api/v1")
 v1_router.include_router(books_router)
 v1_router.include_router(sellers_router)
 v1_router.include_router(auth_router)
+v1_router.include_router(changes_router)
+v1_router.include_router(push_router)
+
+# Служебные ручки, не входящие в публичное API: статистика процесса, очередь задач (с email продавцов), профиль.
+# Доступны только оператору с settings.internal_token
+internal_router = APIRouter(tags=["internal"], prefix="/internal", dependencies=[Depends(check_internal_token)])
+
+
+internal_router.include_router(jobs_router)
+internal_router.include_router(push_stats_router)
+internal_router.include_router(db_router)
+internal_router.include_router(auth_stats_router)
+internal_router.include_router(single_flight_router)
+internal_router.include_router(concurrency_router)
+internal_router.include_router(deadlines_router)
+internal_router.include_router(tracing_router)
+internal_router.include_router(profile_router)
+internal_router.include_router(access_log_router)
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from src.utils.access_log import access_log_writer
+
+access_log_router = APIRouter(tags=["access-log"], prefix="/access-log")
+
+
+# Ручка со статистикой журнала запросов этого процесса: записанные, отброшенные выборкой и потерянные записи
+@access_log_router.get("/")
+async def get_access_log_stats():
+    return access_log_writer.stats()
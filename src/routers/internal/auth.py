@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from src.utils.negative_cache import unknown_emails
+
+auth_stats_router = APIRouter(tags=["auth"], prefix="/auth")
+
+
+# Ручка со статистикой кэша неизвестных email этого процесса
+@auth_stats_router.get("/")
+async def get_auth_stats():
+    return {"unknown_emails": unknown_emails.stats()}
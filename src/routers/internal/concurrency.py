@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from src.utils.concurrency import concurrency_limiters
+
+concurrency_router = APIRouter(tags=["concurrency"], prefix="/concurrency")
+
+
+# Ручка с лимитами одновременных запросов этого процесса: текущий лимит, очередь и отказы по классам ручек
+@concurrency_router.get("/")
+async def get_concurrency_stats():
+    return {name: limiter.stats() for name, limiter in concurrency_limiters.items()}
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from src.utils.db_metrics import db_metrics
+
+db_router = APIRouter(tags=["db"], prefix="/db")
+
+
+# Ручка с метриками работы с базой этого процесса: время выдачи соединений и обращения к серверу на запрос
+@db_router.get("/")
+async def get_db_stats():
+    return db_metrics.stats()
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from src.utils.deadlines import deadline_metrics
+
+deadlines_router = APIRouter(tags=["deadlines"], prefix="/deadlines")
+
+
+# Ручка со статистикой дедлайнов этого процесса: сколько запросов отменено и сколько работы пропало
+@deadlines_router.get("/")
+async def get_deadline_stats():
+    return deadline_metrics.stats()
@@ -0,0 +1,25 @@
+from typing import Optional
+
+from fastapi import APIRouter, Query
+
+from src.schemas.jobs import ReturnedJob, ReturnedJobsStatus
+from src.service.jobs import JobService
+from src.utils.db_session import DBSession
+
+jobs_router = APIRouter(tags=["jobs"], prefix="/jobs")
+
+
+# Ручка, возвращающая состояние очереди фоновых задач
+@jobs_router.get("/", response_model=ReturnedJobsStatus)
+async def get_jobs(
+    session: DBSession,
+    job_status: Optional[str] = Query(default=None, alias="status"),
+    limit: int = Query(default=100, ge=1, le=1000),
+):
+    return await JobService.get_jobs(session, job_status, limit)
+
+
+# Ручка для получения задачи по ее ИД
+@jobs_router.get("/{job_id}", response_model=ReturnedJob)
+async def get_job(job_id: int, session: DBSession):
+    return await JobService.get_job(job_id, session)
@@ -0,0 +1,43 @@
+import time
+
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from src.configurations.settings import settings
+from src.utils.deadlines import current_deadline
+from src.utils.profiler import ProfilerUnavailable, collapsed_stacks, profile
+
+profile_router = APIRouter(tags=["profile"], prefix="/profile")
+
+# Запас дедлайна на сборку и отправку ответа после профилирования
+PROFILE_DEADLINE_MARGIN = 1.0
+
+
+# Ручка для профилирования воркера, принявшего запрос: collapsed stacks за seconds секунд (для flamegraph.pl,
+# speedscope). Включается настройкой profiler_enabled, доступна только оператору (см. internal_router).
+# Профиль укладывается в дедлайн запроса, поэтому ушедший клиент или дедлайн не оставляют таймер работать
+@profile_router.get("", response_class=PlainTextResponse)
+async def get_profile(
+    seconds: float = Query(default=30.0, gt=0),
+    threads: bool = Query(default=True),
+):
+    if not settings.profiler_enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiler is disabled")
+    seconds = min(seconds, settings.profiler_max_seconds)
+    deadline = current_deadline.get()
+    if deadline is not None:
+        seconds = min(seconds, deadline - time.monotonic() - PROFILE_DEADLINE_MARGIN)
+        if seconds <= 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Request deadline is too short")
+    try:
+        result = await profile(seconds, settings.profiler_interval_ms / 1000, threads)
+    except ProfilerUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return PlainTextResponse(
+        collapsed_stacks(result.stacks),
+        headers={
+            "X-Profile-Samples": str(result.samples),
+            "X-Profile-Seconds": f"{result.seconds:.3f}",
+            "X-Profile-Overhead": f"{result.overhead:.4f}",
+        },
+    )
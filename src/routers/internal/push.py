@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from src.service.push import catalog_broker
+
+push_stats_router = APIRouter(tags=["push"], prefix="/push")
+
+
+# Ручка со статистикой брокера push-уведомлений этого процесса
+@push_stats_router.get("/")
+async def get_push_stats():
+    return catalog_broker.stats()
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from src.utils.single_flight import single_flight
+
+single_flight_router = APIRouter(tags=["single-flight"], prefix="/single-flight")
+
+
+# Ручка со статистикой single-flight этого процесса: сколько чтений объединено с уже идущими
+@single_flight_router.get("/")
+async def get_single_flight_stats():
+    return single_flight.stats()
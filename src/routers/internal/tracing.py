@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+
+from src.utils.tracing import tracer
+
+tracing_router = APIRouter(tags=["tracing"], prefix="/tracing")
+
+
+# Ручка со статистикой трассировки этого процесса: записанные и отправленные спаны, потери при отправке
+@tracing_router.get("/")
+async def get_tracing_stats():
+    return tracer.stats()
@@ -1,10 +1,19 @@
-from fastapi import APIRouter, Depends, status
+from typing import Optional
 
+from fastapi import APIRouter, Depends, Header, Query, Response, status
+from fastapi.responses import StreamingResponse
+
+from src.configurations.settings import settings
 from src.schemas import IncomingBook, ReturnedAllBooks, ReturnedBook, SellerOut
-from src.schemas.books import UpdatedBook
+from src.schemas.books import PatchedBook, UpdatedBook
 from src.service.books import BookService
+from src.service.changes import ChangeService
+from src.service.export import ExportService
 from src.utils.auth import check_seller_token
 from src.utils.db_session import DBSession
+from src.utils.etag import parse_if_match, set_etag
+from src.utils.single_flight import shared_response
+from src.utils.snapshots import MmapResponse, snapshot_store
 
 books_router = APIRouter(tags=["books"], prefix="/books")
 
@@ -12,16 +21,61 @@ books_router = APIRouter(tags=["books"], prefix="/books")
 # ===================================================================
 # ---------------------РУЧКИ БЕЗ АВТОРИЗАЦИИ-------------------------
 # ===================================================================
-# Ручка, возвращающая все книги
+# Ручка, возвращающая все книги.
+# С параметром limit отдает страницу по возрастанию ИД, следующая страница - after_id=<ИД последней книги>.
+# С include_archived=true в выдачу попадают и книги из архива (см. src.commands.archive_books).
 @books_router.get("/", response_model=ReturnedAllBooks)
-async def get_all_books(session: DBSession):
-    return await BookService.get_all_books(session)
+async def get_all_books(
+    session: DBSession,
+    after_id: Optional[int] = Query(default=None),
+    limit: Optional[int] = Query(default=None, ge=1, le=1000),
+    include_archived: bool = Query(default=False),
+):
+    if settings.books_fast_path_get_all and not include_archived:
+        return await BookService.get_all_books_raw(session, after_id, limit)
+    return await BookService.get_all_books(session, after_id, limit, include_archived)
+
+
+# Ручка выгрузки всего каталога файлом: format=csv|ndjson|parquet, compression=none|gzip|zstd
+# (для parquet - кодек внутри файла). Выгрузка идет по возрастанию ИД; оборванную загрузку
+# можно продолжить с after_id=<последний полученный ИД>, to_id ограничивает диапазон сверху.
+# Готовые выгрузки кэшируются на диске (EXPORT_SNAPSHOT_DIR) до следующего изменения каталога.
+@books_router.get("/export")
+async def export_books(
+    session: DBSession,
+    format: str = Query(default="ndjson"),
+    compression: str = Query(default="none"),
+    after_id: Optional[int] = Query(default=None),
+    to_id: Optional[int] = Query(default=None),
+):
+    ExportService.check_format(format, compression)
+    file_name = ExportService.file_name(format, compression, after_id, to_id)
+    headers = {"Content-Disposition": f'attachment; filename="{file_name}"'}
+    media_type = ExportService.media_type(format, compression)
+    if not snapshot_store.enabled:
+        chunks = ExportService.export_books(format, compression, after_id, to_id)
+        return StreamingResponse(chunks, media_type=media_type, headers=headers)
 
+    # Версия каталога в имени снимка: после любого изменения книг снимок строится заново
+    snapshot = f"v{await ChangeService.last_seq(session)}_{file_name}"
+    mapped = snapshot_store.get(snapshot)
+    if mapped is not None:
+        return MmapResponse(mapped, media_type=media_type, headers=headers)
+    chunks = ExportService.export_books(format, compression, after_id, to_id)
+    return StreamingResponse(snapshot_store.write_through(snapshot, chunks), media_type=media_type, headers=headers)
 
-# Ручка для получения книги по ее ИД
+
+# Ручка для получения книги по ее ИД (include_archived=true - искать и в архиве).
+# С single_flight_get_book одновременные запросы одной книги делят одно обращение к базе.
 @books_router.get("/{book_id}", response_model=ReturnedBook)
-async def get_book(book_id: int, session: DBSession):
-    return await BookService.get_book(book_id, session)
+async def get_book(book_id: int, session: DBSession, response: Response, include_archived: bool = Query(default=False)):
+    if settings.single_flight_get_book:
+        return await shared_response(
+            ("book", book_id, include_archived), lambda: BookService.get_book_response(book_id, include_archived)
+        )
+    if settings.books_fast_path_get_book and not include_archived:
+        return await BookService.get_book_raw(book_id, session)
+    return set_etag(await BookService.get_book(book_id, session, include_archived), response)
 
 
 # Ручка для удаления книги
@@ -41,9 +95,30 @@ async def create_book(book: IncomingBook, session: DBSession, current_user: Sell
     return await BookService.create_book(book, session)
 
 
-# Ручка для обновления книги
+# Ручка для обновления книги.
+# С заголовком If-Match книга обновится, только если ее не изменили после получения ETag, иначе 412.
 @books_router.put("/{book_id}")
 async def update_book(
-    book_id: int, new_data: UpdatedBook, session: DBSession, current_user: SellerOut = Depends(check_seller_token)
+    book_id: int,
+    new_data: UpdatedBook,
+    session: DBSession,
+    response: Response,
+    if_match: Optional[str] = Header(default=None),
+    current_user: SellerOut = Depends(check_seller_token),
+):
+    result = await BookService.update_book(book_id, new_data, session, parse_if_match(if_match))
+    return set_etag(result, response)
+
+
+# Ручка для частичного обновления книги: меняются только переданные поля
+@books_router.patch("/{book_id}", response_model=ReturnedBook)
+async def patch_book(
+    book_id: int,
+    patch: PatchedBook,
+    session: DBSession,
+    response: Response,
+    if_match: Optional[str] = Header(default=None),
+    current_user: SellerOut = Depends(check_seller_token),
 ):
-    return await BookService.update_book(book_id, new_data, session)
+    result = await BookService.patch_book(book_id, patch, session, parse_if_match(if_match))
+    return set_etag(result, response)
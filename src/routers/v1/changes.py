@@ -0,0 +1,34 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import StreamingResponse
+
+from src.schemas.changes import ReturnedChanges
+from src.service.changes import ChangeService
+from src.utils.db_session import DBSession
+
+changes_router = APIRouter(tags=["changes"], prefix="/changes")
+
+
+# Ручка ленты изменений книг и продавцов.
+# Обычный запрос работает как long-poll (параметр wait),
+# а при Accept: text/event-stream ответ становится бесконечным потоком SSE.
+@changes_router.get("", response_model=ReturnedChanges)
+async def get_changes(
+    request: Request,
+    session: DBSession,
+    since: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=1000),
+    wait: float = Query(default=0, ge=0),
+    last_event_id: Optional[int] = Header(default=None),
+):
+    if "text/event-stream" in request.headers.get("accept", ""):
+        # При переподключении браузер сам присылает Last-Event-ID
+        start = last_event_id if last_event_id is not None else since
+        return StreamingResponse(
+            ChangeService.stream_changes(start, limit),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    return await ChangeService.wait_for_changes(since, limit, wait, session)
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Query, WebSocket
+from fastapi.responses import StreamingResponse
+
+from src.service.push import PushService
+
+push_router = APIRouter(tags=["push"], prefix="/push")
+
+
+# Ручка подписки на обновления каталога через Server-Sent Events.
+# Темы передаются через запятую: books, sellers, book:<id>, seller:<id>, seller:<id>:books
+@push_router.get("/sse")
+async def subscribe_sse(topics: str = Query(min_length=1)):
+    return StreamingResponse(
+        PushService.stream_sse(PushService.check_topics(topics.split(","))),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Та же подписка через WebSocket, темы меняются сообщениями subscribe/unsubscribe
+@push_router.websocket("/ws")
+async def subscribe_ws(websocket: WebSocket):
+    await PushService.serve_websocket(websocket)
@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, status
+from typing import Optional
 
+from fastapi import APIRouter, Depends, Header, Response, status
+
+from src.configurations.settings import settings
 from src.schemas import IncomingSeller, ReturnedAllSellers, ReturnedSeller
 from src.schemas.sellers import ReturnedSellerWithBooks, SellerOut, UpdatedSeller
 from src.service.sellers import SellersService
 from src.utils.auth import check_seller_token
 from src.utils.db_session import DBSession
+from src.utils.etag import parse_if_match, set_etag
+from src.utils.single_flight import shared_response
 
 sellers_router = APIRouter(tags=["sellers"], prefix="/seller")
 
@@ -32,10 +37,31 @@ async def delete_seller(seller_id: int, session: DBSession):
     return await SellersService.delete_seller(seller_id, session)
 
 
-# Ручка для обновления информации об определенном продавце
+# Ручка для обновления информации об определенном продавце.
+# С заголовком If-Match продавец обновится, только если его не изменили после получения ETag, иначе 412.
 @sellers_router.put("/{seller_id}", response_model=ReturnedSeller)
-async def update_seller(seller_id: int, new_data: UpdatedSeller, session: DBSession):
-    return await SellersService.update_seller(seller_id, new_data, session)
+async def update_seller(
+    seller_id: int,
+    new_data: UpdatedSeller,
+    session: DBSession,
+    response: Response,
+    if_match: Optional[str] = Header(default=None),
+):
+    result = await SellersService.update_seller(seller_id, new_data, session, parse_if_match(if_match))
+    return set_etag(result, response)
+
+
+# Ручка для частичного обновления продавца: меняются только переданные поля
+@sellers_router.patch("/{seller_id}", response_model=ReturnedSeller)
+async def patch_seller(
+    seller_id: int,
+    patch: UpdatedSeller,
+    session: DBSession,
+    response: Response,
+    if_match: Optional[str] = Header(default=None),
+):
+    result = await SellersService.patch_seller(seller_id, patch, session, parse_if_match(if_match))
+    return set_etag(result, response)
 
 
 # ===================================================================
@@ -43,7 +69,13 @@ async def update_seller(seller_id: int, new_data: UpdatedSeller, session: DBSess
 # ===================================================================
 
 
-# Ручка для получения информации об определенном продавце
+# Ручка для получения информации об определенном продавце.
+# С single_flight_get_seller одновременные запросы одного продавца делят одно обращение к базе
+# (токен проверяется у каждого запроса отдельно).
 @sellers_router.get("/{seller_id}", response_model=ReturnedSellerWithBooks)
-async def get_seller(seller_id: int, session: DBSession, current_user: SellerOut = Depends(check_seller_token)):
-    return await SellersService.get_seller(seller_id, session)
+async def get_seller(
+    seller_id: int, session: DBSession, response: Response, current_user: SellerOut = Depends(check_seller_token)
+):
+    if settings.single_flight_get_seller:
+        return await shared_response(("seller", seller_id), lambda: SellersService.get_seller_response(seller_id))
+    return set_etag(await SellersService.get_seller(seller_id, session), response)
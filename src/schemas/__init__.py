@@ -1,4 +1,6 @@
 from .books import *  # noqa F403
+from .changes import *  # noqa F403
+from .jobs import *  # noqa F403
 from .sellers import *  # noqa F403
 
-__all__ = books.__all__ + sellers.__all__  # noqa F405
+__all__ = books.__all__ + changes.__all__ + jobs.__all__ + sellers.__all__  # noqa F405
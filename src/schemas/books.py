@@ -1,9 +1,9 @@
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel, Field, field_validator
 from pydantic_core import PydanticCustomError
 
-__all__ = ["IncomingBook", "ReturnedAllBooks", "ReturnedBook", "UpdatedBook", "ReturnedBookForSeller"]
+__all__ = ["IncomingBook", "ReturnedAllBooks", "ReturnedBook", "UpdatedBook", "PatchedBook", "ReturnedBookForSeller"]
 
 
 # Базовый класс "Книги", содержащий поля, которые есть во всех классах-наследниках.
@@ -44,6 +44,7 @@ class IncomingBook(ValidationIncomingBook, BookWithSeller):
 class ReturnedBook(BaseBook, BookWithSeller):
     id: int
     count_pages: int = 0
+    version: Optional[int] = Field(default=None, exclude=True)  # Отдается в заголовке ETag, а не в теле
 
     class Config:
         from_attributes = True
@@ -53,6 +54,24 @@ class UpdatedBook(ValidationIncomingBook):
     pass
 
 
+# Класс для частичного обновления (PATCH): без значений по умолчанию, меняются только переданные поля
+class PatchedBook(BaseModel):
+    title: Optional[str] = None
+    author: Optional[str] = None
+    year: Optional[int] = None
+    count_pages: Optional[int] = Field(alias="pages", default=None)
+
+    @field_validator("year")
+    @staticmethod
+    def validate_year(val: Optional[int]):
+        if val is None:
+            return val
+        return ValidationIncomingBook.validate_year(val)
+
+    class Config:
+        populate_by_name = True
+
+
 # Класс для возврата массива объектов "Книга"
 class ReturnedAllBooks(BaseModel):
     books: List[ReturnedBook]
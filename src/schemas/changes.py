@@ -0,0 +1,24 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+__all__ = ["ReturnedEvent", "ReturnedChanges"]
+
+
+class ReturnedEvent(BaseModel):
+    seq: int
+    entity: str
+    entity_id: int
+    op: str
+    payload: Optional[dict] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+# Порция ленты изменений. last_seq передается в since следующего запроса
+class ReturnedChanges(BaseModel):
+    events: List[ReturnedEvent]
+    last_seq: int
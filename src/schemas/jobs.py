@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+__all__ = ["ReturnedJob", "ReturnedJobsStatus"]
+
+
+class ReturnedJob(BaseModel):
+    id: int
+    kind: str
+    payload: dict
+    status: str
+    attempts: int
+    max_attempts: int
+    run_at: datetime
+    last_error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+# Сводка по очереди: количество задач в каждом статусе и сами задачи
+class ReturnedJobsStatus(BaseModel):
+    stats: Dict[str, int]
+    jobs: List[ReturnedJob]
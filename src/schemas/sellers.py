@@ -27,6 +27,7 @@ class IncomingSeller(BaseSeller):
 
 class ReturnedSeller(BaseSeller):
     id: int
+    version: Optional[int] = Field(default=None, exclude=True)  # Отдается в заголовке ETag, а не в теле
 
     class Config:
         from_attributes = True
@@ -0,0 +1,92 @@
+"""
+Production-запуск приложения: python -m src.serve
+
+Процессами управляет gunicorn, внутри каждого процесса работает uvicorn (UvicornWorker).
+Все параметры берутся из Settings (переменные окружения SERVE_*):
+- число воркеров (по умолчанию по числу ядер);
+- выбор event loop (uvloop) и HTTP-парсера (httptools);
+- backlog сокета, keep-alive, мягкая остановка (graceful drain) и перезапуск воркеров
+  после max_requests запросов (с разбросом jitter, чтобы они не перезапускались одновременно).
+
+Схема БД готовится и мигрирует один раз в мастер-процессе до fork, воркеры только проверяют ее ревизию.
+Движок и пул соединений каждый воркер создает сам в lifespan приложения (см. global_init).
+"""
+
+import asyncio
+import multiprocessing
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+from src.configurations.database import dispose_engine, global_init
+from src.configurations.migrations import migrate_database
+from src.configurations.settings import settings
+
+
+class TunedUvicornWorker(UvicornWorker):
+    CONFIG_KWARGS = {
+        "loop": settings.serve_loop,
+        "http": settings.serve_http,
+        "limit_concurrency": settings.serve_limit_concurrency,
+        # Собственный журнал uvicorn пишет синхронно на каждый запрос; при access_log_enabled он не нужен
+        "access_log": not settings.access_log_enabled,
+    }
+
+
+class ProductionApplication(BaseApplication):
+    def __init__(self, app_uri: str, options: dict):
+        self.app_uri = app_uri
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # Приложение импортируется уже в воркере, после fork
+        from src.main import app
+
+        return app
+
+
+def workers_count() -> int:
+    return settings.serve_workers or multiprocessing.cpu_count()
+
+
+def gunicorn_options() -> dict:
+    return {
+        "bind": f"{settings.serve_host}:{settings.serve_port}",
+        "workers": workers_count(),
+        "worker_class": "src.serve.TunedUvicornWorker",
+        "backlog": settings.serve_backlog,
+        "keepalive": settings.serve_keep_alive,
+        "timeout": settings.serve_timeout,
+        "graceful_timeout": settings.serve_graceful_timeout,
+        "max_requests": settings.serve_max_requests,
+        "max_requests_jitter": settings.serve_max_requests_jitter,
+        "preload_app": False,
+    }
+
+
+async def prepare_database() -> None:
+    global_init()
+    await migrate_database()
+    # Соединения мастера не должны достаться воркерам
+    await dispose_engine()
+
+
+def main() -> None:
+    asyncio.run(prepare_database())
+
+    # Воркеры не трогают схему: её подготовил мастер, а перезапуск воркера
+    # по max_requests не должен удалять таблицы
+    settings.db_create_on_startup = False
+    settings.db_migrate_on_startup = False
+    settings.db_drop_on_shutdown = False
+
+    ProductionApplication("src.main:app", gunicorn_options()).run()
+
+
+if __name__ == "__main__":
+    main()
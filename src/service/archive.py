@@ -0,0 +1,100 @@
+"""
+Архивация холодных книг: перенос книг старше заданного года из books_table.
+
+По умолчанию книги переезжают в таблицу books_archive_table той же базы (того же шарда),
+откуда их читают ручки книг с include_archived=true. С parquet_dir книги выгружаются в файлы
+Parquet со сжатием zstd (нужен pyarrow) и из базы удаляются совсем - для холодного хранения.
+
+Перенос идет пачками по возрастанию ИД, каждая пачка - отдельная транзакция: вставка в архив
+(или запись файла), удаление из books_table и события удаления книг в outbox (с "archived": true
+в payload), чтобы лента изменений и push-подписчики узнали, что книги ушли из каталога.
+Прерванный запуск можно просто повторить.
+"""
+
+import os
+from contextlib import AsyncExitStack
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from src.models.books import ArchivedBook, Book
+from src.models.events import EventEntity, EventOp
+from src.service.changes import ChangeService
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+__all__ = ["ArchiveService"]
+
+_books = Book.__table__
+_archive = ArchivedBook.__table__
+
+
+class ArchiveService:
+    @staticmethod
+    def write_parquet(rows: list, path: str) -> None:
+        table = pyarrow.Table.from_pylist(rows)
+        pyarrow.parquet.write_table(table, path, compression="zstd")
+
+    @staticmethod
+    async def archive_books(
+        engine: AsyncEngine,
+        before_year: int,
+        batch_size: int = 1000,
+        dry_run: bool = False,
+        parquet_dir: Optional[str] = None,
+        outbox_engine: Optional[AsyncEngine] = None,
+    ) -> dict:
+        """
+        Переносит книги с year < before_year из одной базы. Возвращает отчет: сколько книг
+        перенесено, за сколько пачек и какие файлы Parquet записаны.
+        outbox_engine - основная база с outbox, если она не совпадает с engine (шардирование).
+        """
+        if parquet_dir is not None and pyarrow is None:
+            raise RuntimeError("Parquet export requires pyarrow: poetry install -E archive")
+
+        cold = _books.c.year < before_year
+        report = {"archived": 0, "batches": 0, "files": []}
+        if dry_run:
+            async with engine.connect() as conn:
+                report["archived"] = (await conn.execute(select(func.count()).where(cold))).scalar_one()
+            return report
+
+        while True:
+            async with AsyncExitStack() as stack:
+                conn = await stack.enter_async_context(engine.begin())
+                # При шардировании outbox в основной базе фиксируется раньше шарда: если упадет
+                # фиксация шарда, книги останутся на месте и повторный запуск отправит события еще раз
+                outbox_conn = conn
+                if outbox_engine is not None:
+                    outbox_conn = await stack.enter_async_context(outbox_engine.begin())
+
+                query = select(_books).where(cold).order_by(_books.c.id).limit(batch_size)
+                rows = [dict(row) for row in (await conn.execute(query)).mappings()]
+                if not rows:
+                    break
+
+                if parquet_dir is not None:
+                    path = os.path.join(parquet_dir, f"books_{rows[0]['id']}_{rows[-1]['id']}.parquet")
+                    ArchiveService.write_parquet(rows, path)
+                    report["files"].append(path)
+                else:
+                    await conn.execute(insert(_archive), rows)
+                await conn.execute(delete(_books).where(_books.c.id.in_([row["id"] for row in rows])))
+
+                # Сессия только записывает события в транзакцию outbox_conn (и NOTIFY при push_pg_bridge)
+                outbox = AsyncSession(bind=outbox_conn)
+                for row in rows:
+                    payload = {"id": row["id"], "seller_id": row["seller_id"], "archived": True}
+                    ChangeService.record(EventEntity.BOOK, EventOp.DELETED, row["id"], payload, outbox)
+                await outbox.flush()
+                await outbox.close()
+
+            report["archived"] += len(rows)
+            report["batches"] += 1
+
+        return report
@@ -1,13 +1,52 @@
+from itertools import chain
+from operator import attrgetter, itemgetter
+from typing import List, Optional
+
+import orjson
 from fastapi import Response, status
-from sqlalchemy import select
+from sqlalchemy import Select, update
+from sqlalchemy.ext.asyncio import AsyncConnection
 
-from src.models.books import Book
+from src.configurations.database import get_session_factory, request_session
+from src.configurations.settings import settings
+from src.models.books import ArchivedBook, Book
+from src.models.events import EventEntity, EventOp
 from src.models.sellers import Seller
 from src.schemas import IncomingBook
-from src.schemas.books import ReturnedAllBooks, ReturnedBook, UpdatedBook
+from src.schemas.books import PatchedBook, ReturnedAllBooks, ReturnedBook, UpdatedBook
+from src.service.changes import ChangeService
+from src.service.queries import (
+    ALL_ARCHIVED_BOOKS,
+    ALL_BOOK_ROWS,
+    ALL_BOOKS,
+    ARCHIVED_BOOK_BY_ID,
+    BOOK_BY_ID,
+    BOOK_RETURNING_COLUMNS,
+    BOOK_ROW_BY_ID,
+)
 from src.utils.db_session import DBSession
+from src.utils.etag import ANY_VERSION, format_etag
+from src.utils.single_flight import model_response
+from src.utils.tracing import trace_methods
+
+
+def _keyset_page(query: Select, id_column, after_id: Optional[int], limit: Optional[int]) -> Select:
+    if after_id is not None:
+        query = query.where(id_column > after_id)
+    if limit is not None:
+        query = query.order_by(id_column).limit(limit)
+    return query
+
 
+async def _book_connections(session: DBSession) -> List[AsyncConnection]:
+    # Соединения со всеми базами, где лежат книги: с каждым шардом или одно соединение сессии
+    shard_ids = session.info.get("book_shards")
+    if shard_ids is None:
+        return [await session.connection()]
+    return [await session.connection(bind_arguments={"shard_id": shard_id}) for shard_id in shard_ids]
 
+
+@trace_methods
 class BookService:
     @staticmethod
     async def create_book(book: IncomingBook, session: DBSession) -> ReturnedBook | Response:
@@ -21,13 +60,28 @@ class BookService:
         session.add(new_book)
         await session.flush()
 
-        return ReturnedBook.from_orm(new_book)
+        returned_book = ReturnedBook.from_orm(new_book)
+        ChangeService.record(
+            EventEntity.BOOK, EventOp.CREATED, new_book.id, returned_book.model_dump(mode="json"), session
+        )
+        return returned_book
 
     @staticmethod
-    async def get_all_books(session: DBSession) -> ReturnedAllBooks | Response:
-        query = select(Book)
-        res = await session.execute(query)
+    async def get_all_books(
+        session: DBSession, after_id: Optional[int] = None, limit: Optional[int] = None, include_archived: bool = False
+    ) -> ReturnedAllBooks | Response:
+        """
+        Все книги или страница по ключу (after_id, limit). При шардировании запрос уходит во все шарды,
+        каждый отдает свою первую страницу, а итоговая страница собирается из них по возрастанию ИД.
+        С include_archived так же подмешивается страница из архива холодных книг.
+        """
+        res = await session.execute(_keyset_page(ALL_BOOKS, Book.id, after_id, limit))
         books = res.scalars().all()
+        if include_archived:
+            res = await session.execute(_keyset_page(ALL_ARCHIVED_BOOKS, ArchivedBook.id, after_id, limit))
+            books = [*books, *res.scalars().all()]
+        if limit is not None:
+            books = sorted(books, key=attrgetter("id"))[:limit]
         if books:
             books_response = [ReturnedBook.from_orm(book) for book in books]
             return ReturnedAllBooks(books=books_response)
@@ -35,31 +89,136 @@ class BookService:
             return Response(status_code=status.HTTP_404_NOT_FOUND)
 
     @staticmethod
-    async def get_book(book_id: int, session: DBSession) -> ReturnedBook | Response:
-        res = await session.get(Book, book_id)
-        if res:
-            return ReturnedBook.from_orm(res)
+    async def get_book(book_id: int, session: DBSession, include_archived: bool = False) -> ReturnedBook | Response:
+        res = await session.execute(BOOK_BY_ID, {"book_id": book_id})
+        book = res.scalar_one_or_none()
+        if book is None and include_archived:
+            res = await session.execute(ARCHIVED_BOOK_BY_ID, {"book_id": book_id})
+            book = res.scalar_one_or_none()
+        if book:
+            return ReturnedBook.from_orm(book)
         else:
             return Response(status_code=status.HTTP_404_NOT_FOUND)
 
+    # Быстрый путь чтения: Core-запрос на соединении сессии и сериализация строк сразу в байты orjson.
+    # Ответ совпадает байт в байт с get_all_books / get_book (порядок колонок задан в запросах).
+    @staticmethod
+    async def get_all_books_raw(
+        session: DBSession, after_id: Optional[int] = None, limit: Optional[int] = None
+    ) -> Response:
+        query = _keyset_page(ALL_BOOK_ROWS, Book.__table__.c.id, after_id, limit)
+        shard_rows = [await conn.execute(query) for conn in await _book_connections(session)]
+        books = [row._asdict() for row in chain.from_iterable(shard_rows)]
+        if limit is not None:
+            books = sorted(books, key=itemgetter("id"))[:limit]
+        if books:
+            return Response(content=orjson.dumps({"books": books}), media_type="application/json")
+        else:
+            return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+    @staticmethod
+    async def get_book_raw(book_id: int, session: DBSession) -> Response:
+        for conn in await _book_connections(session):
+            res = await conn.execute(BOOK_ROW_BY_ID, {"book_id": book_id})
+            book = res.first()
+            if book:
+                content = book._asdict()
+                etag = format_etag(content.pop("version"))
+                return Response(content=orjson.dumps(content), media_type="application/json", headers={"ETag": etag})
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+    @staticmethod
+    async def get_book_response(book_id: int, include_archived: bool = False) -> Response:
+        """
+        Готовый ответ GET /books/{book_id} в собственной сессии чтения: его делят запросы single-flight,
+        поэтому он не зависит от сессии запроса, который начал загрузку. Жизненный цикл - как у сессии запроса
+        (request_session): дедлайн загрузки, статистика БД и время в журнале запроса, запустившего загрузку.
+        """
+        async with request_session(get_session_factory(read_only=True), "read") as session:
+            if settings.books_fast_path_get_book and not include_archived:
+                return await BookService.get_book_raw(book_id, session)
+            return model_response(await BookService.get_book(book_id, session, include_archived))
+
     @staticmethod
     async def delete_book(book_id: int, session: DBSession) -> Response:
         deleted_book = await session.get(Book, book_id)
         if deleted_book:
             await session.delete(deleted_book)
+            ChangeService.record(
+                EventEntity.BOOK,
+                EventOp.DELETED,
+                book_id,
+                {"id": book_id, "seller_id": deleted_book.seller_id},
+                session,
+            )
             return Response(status_code=status.HTTP_204_NO_CONTENT)
         else:
             return Response(status_code=status.HTTP_404_NOT_FOUND)
 
     @staticmethod
-    async def update_book(book_id: int, new_data: UpdatedBook, session: DBSession) -> ReturnedBook | Response:
-        updated_book = await session.get(Book, book_id)
+    async def update_book(
+        book_id: int, new_data: UpdatedBook, session: DBSession, expected_version: Optional[int] = None
+    ) -> ReturnedBook | Response:
+        """
+        Обновление одним запросом UPDATE ... RETURNING без предварительного чтения строки.
+        Если передана ожидаемая версия (If-Match), строка обновится только при совпадении версии,
+        иначе вернется 412: значит кто-то успел изменить книгу раньше.
+        """
+        query = (
+            update(Book)
+            .where(Book.id == book_id)
+            .values(**new_data.dict(exclude_unset=True), version=Book.version + 1)
+            .returning(Book)
+            .execution_options(synchronize_session="fetch")
+        )
+        if expected_version not in (None, ANY_VERSION):
+            query = query.where(Book.version == expected_version)
+
+        res = await session.execute(query)
+        updated_book = res.scalar_one_or_none()
         if updated_book:
-            # Итерация по полям модели UpdatedBook и обновление соответствующих атрибутов в updated_book
-            for field, value in new_data.dict(exclude_unset=True).items():
-                setattr(updated_book, field, value)
+            returned_book = ReturnedBook.from_orm(updated_book)
+            ChangeService.record(
+                EventEntity.BOOK, EventOp.UPDATED, book_id, returned_book.model_dump(mode="json"), session
+            )
+            return returned_book
 
-            await session.flush()
-            return ReturnedBook.from_orm(updated_book)
+        # If-Match: * на отсутствующий ресурс - тоже несработавшее условие
+        if expected_version == ANY_VERSION or (expected_version is not None and await session.get(Book, book_id)):
+            return Response(status_code=status.HTTP_412_PRECONDITION_FAILED)
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+    @staticmethod
+    async def patch_book(
+        book_id: int, patch: PatchedBook, session: DBSession, expected_version: Optional[int] = None
+    ) -> ReturnedBook | Response:
+        """
+        Частичное обновление: в UPDATE попадают только переданные поля, ответ собирается из RETURNING
+        без загрузки ORM-объекта. Пустой RETURNING означает 404 (или 412 при несовпадении версии).
+        """
+        fields = patch.dict(exclude_unset=True, exclude_none=True)
+        # Пустой PATCH ничего не меняет и не должен менять ETag, но проверяет существование и версию
+        query = (
+            update(Book)
+            .where(Book.id == book_id)
+            .values(**fields, version=Book.version + 1 if fields else Book.version)
+            .returning(*BOOK_RETURNING_COLUMNS)
+            .execution_options(synchronize_session="fetch")
+        )
+        if expected_version not in (None, ANY_VERSION):
+            query = query.where(Book.version == expected_version)
+
+        res = await session.execute(query)
+        row = res.first()
+        if row:
+            returned_book = ReturnedBook.model_validate(row._asdict())
+            if fields:
+                ChangeService.record(
+                    EventEntity.BOOK, EventOp.UPDATED, book_id, returned_book.model_dump(mode="json"), session
+                )
+            return returned_book
 
+        # If-Match: * на отсутствующий ресурс - тоже несработавшее условие
+        if expected_version == ANY_VERSION or (expected_version is not None and await session.get(Book, book_id)):
+            return Response(status_code=status.HTTP_412_PRECONDITION_FAILED)
         return Response(status_code=status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,144 @@
+"""
+Transactional outbox: каждая запись в BookService/SellersService добавляет событие в outbox_table
+в той же транзакции, которую фиксирует get_async_session. Потребители читают ленту по seq.
+"""
+
+import asyncio
+from typing import AsyncIterator, Callable, List, Optional
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.configurations.database import get_session_factory
+from src.configurations.settings import settings
+from src.models.events import OutboxEvent
+from src.schemas.changes import ReturnedChanges, ReturnedEvent
+from src.utils.db_session import DBSession
+
+# Ключ в session.info со списком событий, записанных в текущей транзакции
+OUTBOX_EVENTS_KEY = "outbox_events"
+
+
+class ChangeNotifier:
+    """
+    Будит ожидающих читателей ленты после фиксации транзакции с событиями
+    и передает зафиксированные события подписчикам (например, push-каналу).
+    Работает только внутри процесса, поэтому читатели всё равно периодически опрашивают базу.
+    """
+
+    def __init__(self):
+        self._event = asyncio.Event()
+        self._listeners: List[Callable[[List[ReturnedEvent]], None]] = []
+
+    def add_listener(self, listener: Callable[[List[ReturnedEvent]], None]) -> None:
+        self._listeners.append(listener)
+
+    def notify(self, events: List[ReturnedEvent]) -> None:
+        self._event.set()
+        self._event = asyncio.Event()
+        for listener in self._listeners:
+            listener(events)
+
+    async def wait(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+change_notifier = ChangeNotifier()
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session: Session) -> None:
+    # Хук вызывается до истечения атрибутов объектов, поэтому их можно читать без запросов в базу
+    events = session.info.pop(OUTBOX_EVENTS_KEY, None)
+    if events:
+        change_notifier.notify([ReturnedEvent.model_validate(item) for item in events])
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session: Session) -> None:
+    session.info.pop(OUTBOX_EVENTS_KEY, None)
+
+
+class ChangeService:
+    @staticmethod
+    def record(entity: str, op: str, entity_id: int, payload: Optional[dict], session: DBSession) -> OutboxEvent:
+        """
+        Добавляет событие в outbox в рамках текущей транзакции.
+        """
+        new_event = OutboxEvent(entity=entity, op=op, entity_id=entity_id, payload=payload)
+        if session.get_bind(inspect(OutboxEvent)).dialect.name == "postgresql":
+            new_event.txid = func.txid_current()
+        session.add(new_event)
+        session.info.setdefault(OUTBOX_EVENTS_KEY, []).append(new_event)
+        return new_event
+
+    @staticmethod
+    async def last_seq(session: AsyncSession) -> int:
+        """
+        Номер последнего события: меняется при любом изменении каталога (версия каталога).
+        """
+        res = await session.execute(select(func.max(OutboxEvent.seq)))
+        return res.scalar_one() or 0
+
+    @staticmethod
+    async def get_changes(since: int, limit: int, session: AsyncSession) -> ReturnedChanges:
+        query = select(OutboxEvent).where(OutboxEvent.seq > since).order_by(OutboxEvent.seq).limit(limit)
+        if session.get_bind(inspect(OutboxEvent)).dialect.name == "postgresql":
+            # seq выдается при вставке, а не при commit, поэтому транзакция с меньшим seq
+            # может зафиксироваться позже. Отдаем только события транзакций, которые старше
+            # всех ещё выполняющихся, чтобы читатель не перепрыгнул через незафиксированное событие.
+            query = query.where(OutboxEvent.txid < func.txid_snapshot_xmin(func.txid_current_snapshot()))
+        res = await session.execute(query)
+        events: List[ReturnedEvent] = [ReturnedEvent.model_validate(item) for item in res.scalars().all()]
+
+        return ReturnedChanges(events=events, last_seq=events[-1].seq if events else since)
+
+    @staticmethod
+    async def wait_for_changes(since: int, limit: int, wait: float, session: DBSession) -> ReturnedChanges:
+        """
+        Long-poll: если новых событий нет, ждет их не дольше wait секунд.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + min(wait, settings.changes_max_wait)
+
+        while True:
+            changes = await ChangeService.get_changes(since, limit, session)
+            remaining = deadline - loop.time()
+            if changes.events or remaining <= 0:
+                return changes
+
+            # Возвращаем соединение в пул на время ожидания
+            await session.rollback()
+            await change_notifier.wait(min(remaining, settings.changes_poll_interval))
+
+    @staticmethod
+    async def stream_changes(since: int, limit: int) -> AsyncIterator[str]:
+        """
+        Бесконечный поток событий в формате Server-Sent Events начиная с since.
+        Сессия берется из фабрики, т.к. поток живет дольше зависимости get_async_session.
+        """
+        session_factory = get_session_factory(read_only=True)
+        loop = asyncio.get_running_loop()
+        last_sent_at = loop.time()
+
+        while True:
+            async with session_factory() as session:
+                changes = await ChangeService.get_changes(since, limit, session)
+
+            for item in changes.events:
+                yield f"id: {item.seq}\nevent: {item.entity}.{item.op}\ndata: {item.model_dump_json()}\n\n"
+            since = changes.last_seq
+
+            if changes.events:
+                last_sent_at = loop.time()
+                continue
+
+            if loop.time() - last_sent_at >= settings.changes_sse_heartbeat:
+                # Комментарий-пульс не дает прокси закрыть простаивающее соединение
+                yield ": keep-alive\n\n"
+                last_sent_at = loop.time()
+            await change_notifier.wait(settings.changes_poll_interval)
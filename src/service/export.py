@@ -0,0 +1,246 @@
+"""
+Выгрузка всего каталога книг (CSV, NDJSON, Parquet) потоком с постоянным расходом памяти.
+
+Книги читаются серверным курсором (stream_results) пачками по export_batch_size строк по возрастанию ИД,
+каждая пачка сразу кодируется, сжимается и уходит клиенту. Parquet пишется группами строк
+из Arrow record batch, по одной на пачку. При шардировании потоки шардов сливаются по ИД,
+поэтому прерванную выгрузку можно продолжить с after_id = последний полученный ИД.
+pyarrow (Parquet) и zstandard (zstd) - необязательные зависимости.
+"""
+
+import csv
+import heapq
+import io
+import zlib
+from typing import AsyncIterator, List, Optional
+
+import orjson
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncResult
+
+from src.configurations.database import get_session_factory
+from src.configurations.settings import settings
+from src.service.books import _book_connections
+from src.service.queries import ALL_BOOK_ROWS, _books
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+__all__ = ["EXPORT_FORMATS", "EXPORT_COMPRESSIONS", "ExportService"]
+
+# Формат -> (Content-Type, расширение файла)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+# Сжатие -> (Content-Type сжатого файла, расширение)
+EXPORT_COMPRESSIONS = {
+    "none": (None, ""),
+    "gzip": ("application/gzip", ".gz"),
+    "zstd": ("application/zstd", ".zst"),
+}
+
+COLUMNS = [column.name for column in ALL_BOOK_ROWS.selected_columns]
+
+
+class _NdjsonEncoder:
+    def begin(self) -> bytes:
+        return b""
+
+    def encode(self, rows: List[dict]) -> bytes:
+        return b"".join(orjson.dumps(row, option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+    def end(self) -> bytes:
+        return b""
+
+
+class _CsvEncoder:
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.DictWriter(self._buffer, fieldnames=COLUMNS, lineterminator="\n")
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def begin(self) -> bytes:
+        self._writer.writeheader()
+        return self._drain()
+
+    def encode(self, rows: List[dict]) -> bytes:
+        self._writer.writerows(rows)
+        return self._drain()
+
+    def end(self) -> bytes:
+        return b""
+
+
+class _ParquetEncoder:
+    """
+    Каждая пачка - отдельная группа строк Parquet. Writer пишет в буфер последовательно,
+    поэтому готовые байты можно забирать после каждой группы, а футер файла приходит в end().
+    """
+
+    def __init__(self, compression: str):
+        self._buffer = io.BytesIO()
+        self._schema = pyarrow.schema(
+            [
+                ("seller_id", pyarrow.int64()),
+                ("title", pyarrow.string()),
+                ("author", pyarrow.string()),
+                ("year", pyarrow.int32()),
+                ("id", pyarrow.int64()),
+                ("count_pages", pyarrow.int32()),
+            ]
+        )
+        self._writer = pyarrow.parquet.ParquetWriter(self._buffer, self._schema, compression=compression)
+
+    def _drain(self) -> bytes:
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def begin(self) -> bytes:
+        return self._drain()
+
+    def encode(self, rows: List[dict]) -> bytes:
+        batch = pyarrow.RecordBatch.from_pylist(rows, schema=self._schema)
+        self._writer.write_batch(batch)
+        return self._drain()
+
+    def end(self) -> bytes:
+        self._writer.close()
+        return self._drain()
+
+
+class _Identity:
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def _compressor(compression: str):
+    if compression == "gzip":
+        # wbits=31 - поток в формате gzip (с заголовком), а не голый deflate
+        return zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 31)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=settings.compression_zstd_level).compressobj()
+    return _Identity()
+
+
+async def _partitions(result: AsyncResult, batch_size: int) -> AsyncIterator[List[dict]]:
+    async for partition in result.partitions(batch_size):
+        yield [row._asdict() for row in partition]
+
+
+async def _merge_by_id(results: List[AsyncResult], batch_size: int) -> AsyncIterator[List[dict]]:
+    """
+    Слияние упорядоченных по ИД потоков шардов в один упорядоченный поток пачек.
+    В памяти держится не больше одной пачки на шард.
+    """
+    iterators = [_partitions(result, batch_size).__aiter__() for result in results]
+    buffers: List[List[dict]] = [[] for _ in iterators]
+    heap = []
+
+    async def refill(index: int) -> None:
+        partition = await anext(iterators[index], None)
+        if partition:
+            buffers[index] = partition[::-1]
+            heapq.heappush(heap, (buffers[index][-1]["id"], index))
+
+    for index in range(len(iterators)):
+        await refill(index)
+
+    batch: List[dict] = []
+    while heap:
+        _, index = heapq.heappop(heap)
+        batch.append(buffers[index].pop())
+        if buffers[index]:
+            heapq.heappush(heap, (buffers[index][-1]["id"], index))
+        else:
+            await refill(index)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ExportService:
+    @staticmethod
+    def check_format(export_format: str, compression: str) -> None:
+        if export_format not in EXPORT_FORMATS or compression not in EXPORT_COMPRESSIONS:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown format or compression")
+        if export_format == "parquet" and pyarrow is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Parquet export requires pyarrow")
+        if compression == "zstd" and zstandard is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="zstd requires zstandard")
+
+    @staticmethod
+    def media_type(export_format: str, compression: str) -> str:
+        # Parquet сжимается внутри файла (по колонкам), внешнего сжатия у него нет
+        if export_format == "parquet" or compression == "none":
+            return EXPORT_FORMATS[export_format][0]
+        return EXPORT_COMPRESSIONS[compression][0]
+
+    @staticmethod
+    def file_name(export_format: str, compression: str, after_id: Optional[int], to_id: Optional[int]) -> str:
+        name = f"books_{after_id or 0}_{to_id if to_id is not None else 'end'}.{EXPORT_FORMATS[export_format][1]}"
+        return name if export_format == "parquet" else name + EXPORT_COMPRESSIONS[compression][1]
+
+    @staticmethod
+    async def book_batches(after_id: Optional[int], to_id: Optional[int]) -> AsyncIterator[List[dict]]:
+        """
+        Пачки книг с after_id < id <= to_id по возрастанию ИД. Сессия берется из фабрики,
+        т.к. поток живет дольше зависимости get_async_session. Серверному курсору Postgres
+        нужна транзакция, поэтому фабрика пишущая (commit не выполняется, записи нет).
+        """
+        query = ALL_BOOK_ROWS.order_by(_books.c.id)
+        if after_id is not None:
+            query = query.where(_books.c.id > after_id)
+        if to_id is not None:
+            query = query.where(_books.c.id <= to_id)
+        batch_size = settings.export_batch_size
+
+        async with get_session_factory()() as session:
+            connections = await _book_connections(session)
+            results = [await conn.stream(query.execution_options(yield_per=batch_size)) for conn in connections]
+            if len(results) == 1:
+                async for batch in _partitions(results[0], batch_size):
+                    yield batch
+            else:
+                async for batch in _merge_by_id(results, batch_size):
+                    yield batch
+
+    @staticmethod
+    async def export_books(
+        export_format: str, compression: str, after_id: Optional[int] = None, to_id: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        if export_format == "parquet":
+            encoder, compressor = _ParquetEncoder(compression), _Identity()
+        else:
+            encoder = _CsvEncoder() if export_format == "csv" else _NdjsonEncoder()
+            compressor = _compressor(compression)
+
+        head = compressor.compress(encoder.begin())
+        if head:
+            yield head
+        async for batch in ExportService.book_batches(after_id, to_id):
+            chunk = compressor.compress(encoder.encode(batch))
+            if chunk:
+                yield chunk
+        yield compressor.compress(encoder.end()) + compressor.flush()
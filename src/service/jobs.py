@@ -0,0 +1,75 @@
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from fastapi import Response, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.configurations.settings import settings
+from src.models.jobs import Job, utcnow
+from src.schemas.jobs import ReturnedJob, ReturnedJobsStatus
+from src.utils.db_session import DBSession
+from src.utils.job_queue import job_handler
+
+logger = logging.getLogger(__name__)
+
+
+# Виды фоновых задач, которые умеет выполнять приложение
+class JobKind:
+    EMAIL = "email"
+
+
+class JobService:
+    @staticmethod
+    def enqueue(
+        kind: str,
+        payload: dict,
+        session: DBSession,
+        delay: Optional[timedelta] = None,
+        max_attempts: Optional[int] = None,
+    ) -> Job:
+        """
+        Ставит задачу в очередь в рамках текущей транзакции.
+        Задача станет видна воркерам только после commit'а, сделанного в get_async_session.
+        """
+        job = Job(
+            kind=kind,
+            payload=payload,
+            run_at=utcnow() + (delay or timedelta()),
+            max_attempts=max_attempts or settings.jobs_max_attempts,
+        )
+        session.add(job)
+        return job
+
+    @staticmethod
+    async def get_jobs(session: DBSession, job_status: Optional[str] = None, limit: int = 100) -> ReturnedJobsStatus:
+        res = await session.execute(select(Job.status, func.count()).group_by(Job.status))
+        stats = {row_status: count for row_status, count in res.all()}
+
+        query = select(Job).order_by(Job.id.desc()).limit(limit)
+        if job_status:
+            query = query.where(Job.status == job_status)
+        res = await session.execute(query)
+        jobs = [ReturnedJob.model_validate(job) for job in res.scalars().all()]
+
+        return ReturnedJobsStatus(stats=stats, jobs=jobs)
+
+    @staticmethod
+    async def get_job(job_id: int, session: DBSession) -> ReturnedJob | Response:
+        job = await session.get(Job, job_id)
+        if job:
+            return ReturnedJob.model_validate(job)
+        else:
+            return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+
+# ===================================================================
+# ---------------------ОБРАБОТЧИКИ ЗАДАЧ-----------------------------
+# ===================================================================
+
+
+@job_handler(JobKind.EMAIL)
+async def send_email(payload: dict, session: AsyncSession) -> None:
+    # Почтового транспорта в проекте пока нет, поэтому письмо только логируется.
+    logger.info("Sending email '%s' to %s", payload.get("template"), payload.get("to"))
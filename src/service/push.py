@@ -0,0 +1,230 @@
+"""
+Push-канал обновлений каталога (SSE и WebSocket).
+
+Источник событий - outbox из ChangeService: после фиксации транзакции события раздаются
+подписчикам внутрипроцессного брокера. При push_pg_bridge события дополнительно
+отправляются через pg_notify в той же транзакции, а каждый процесс приложения
+получает их через LISTEN, раздает своим подписчикам и передает слушателям change_notifier
+(так, например, кэш неизвестных email сбрасывается во всех воркерах, а не только в записавшем).
+
+Темы подписки: books, sellers, book:<id>, seller:<id>, seller:<id>:books (каталог продавца).
+"""
+
+import asyncio
+import json
+import re
+from typing import AsyncIterator, Iterable, List, Optional
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect, status
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+
+from src.configurations.settings import settings
+from src.models.events import EventEntity, OutboxEvent
+from src.schemas.changes import ReturnedEvent
+from src.service.changes import OUTBOX_EVENTS_KEY, change_notifier
+from src.utils.pubsub import Broker, PgNotifyBridge
+
+TOPIC_PATTERN = re.compile(r"^(books|sellers|book:\d+|seller:\d+|seller:\d+:books)$")
+
+# Ключ в session.info с событиями, уже отправленными через pg_notify в текущей транзакции
+PUSH_NOTIFIED_KEY = "push_notified"
+
+# Лимит payload у NOTIFY - 8000 байт, оставляем запас
+PG_NOTIFY_MAX_PAYLOAD = 7900
+
+catalog_broker = Broker(maxsize=settings.push_queue_size, policy=settings.push_drop_policy)
+
+_bridge: Optional[PgNotifyBridge] = None
+
+
+def topics_for_event(item: ReturnedEvent) -> List[str]:
+    if item.entity == EventEntity.BOOK:
+        topics = ["books", f"book:{item.entity_id}"]
+        seller_id = (item.payload or {}).get("seller_id")
+        if seller_id is not None:
+            topics.append(f"seller:{seller_id}:books")
+        return topics
+
+    return ["sellers", f"seller:{item.entity_id}"]
+
+
+def publish_events(events: List[ReturnedEvent]) -> None:
+    for item in events:
+        catalog_broker.publish(topics_for_event(item), item.model_dump_json())
+
+
+def publish_message(message: str) -> None:
+    catalog_broker.publish(topics_for_event(ReturnedEvent.model_validate_json(message)), message)
+
+
+def receive_bridge_message(message: str) -> None:
+    # Событие любого процесса (и этого тоже): слушатели change_notifier должны быть идемпотентны
+    item = ReturnedEvent.model_validate_json(message)
+    catalog_broker.publish(topics_for_event(item), message)
+    change_notifier.notify([item])
+
+
+def validate_topics(topics: Iterable[str]) -> List[str]:
+    topics = [topic.strip() for topic in topics if topic.strip()]
+    wrong_topics = [topic for topic in topics if not TOPIC_PATTERN.match(topic)]
+    if wrong_topics:
+        raise ValueError(f"Unknown topics: {', '.join(wrong_topics)}")
+    if len(topics) > settings.push_max_topics:
+        raise ValueError(f"Too many topics, max is {settings.push_max_topics}")
+    return topics
+
+
+if not settings.push_pg_bridge:
+    # Без моста события раздаются прямо из хука after_commit этого процесса
+    change_notifier.add_listener(publish_events)
+
+
+@event.listens_for(Session, "after_flush_postexec")
+def _pg_notify_after_flush(session: Session, flush_context) -> None:
+    if not settings.push_pg_bridge:
+        return
+
+    events = session.info.get(OUTBOX_EVENTS_KEY)
+    if not events:
+        return
+    # NOTIFY отправляется через соединение основной базы, где лежит outbox (важно при шардировании)
+    connection = session.connection(bind_arguments={"mapper": inspect(OutboxEvent)})
+    if connection.dialect.name != "postgresql":
+        return
+
+    # NOTIFY доставляется слушателям только после commit, т.е. атомарно с самой записью
+    notified = session.info.setdefault(PUSH_NOTIFIED_KEY, set())
+    for item in events:
+        if id(item) in notified:
+            continue
+        notified.add(id(item))
+        returned_event = ReturnedEvent.model_validate(item)
+        message = returned_event.model_dump_json()
+        if len(message.encode()) > PG_NOTIFY_MAX_PAYLOAD:
+            # Слишком большое событие отправляем без payload, клиент дочитает его из /changes
+            message = returned_event.model_copy(update={"payload": None}).model_dump_json()
+        connection.execute(select(func.pg_notify(settings.push_channel, message)))
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _forget_notified(session: Session) -> None:
+    session.info.pop(PUSH_NOTIFIED_KEY, None)
+
+
+class PushService:
+    @staticmethod
+    def check_topics(topics: Iterable[str]) -> List[str]:
+        try:
+            return validate_topics(topics)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    @staticmethod
+    async def stream_sse(topics: List[str]) -> AsyncIterator[str]:
+        # Подписка создается в самом генераторе: если клиент уйдет до начала ответа, генератор
+        # не запустится и подписка не останется в брокере без отписки
+        subscription = catalog_broker.subscribe(topics)
+        try:
+            while True:
+                try:
+                    message = await subscription.get(timeout=settings.push_heartbeat)
+                except ConnectionError:
+                    # Подписка закрыта политикой disconnect - клиент переподключится сам
+                    return
+                if message is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"data: {message}\n\n"
+        finally:
+            catalog_broker.unsubscribe(subscription)
+
+    @staticmethod
+    async def serve_websocket(websocket: WebSocket) -> None:
+        """
+        Протокол: клиент присылает {"action": "subscribe" | "unsubscribe", "topics": [...]},
+        сервер отвечает {"ack": ..., "topics": [...]} или {"error": ...} и присылает события.
+        На невалидный JSON сервер отвечает {"error": ...} и продолжает читать команды, бинарный кадр закрывает
+        соединение с кодом 1003.
+        """
+        await websocket.accept()
+        subscription = catalog_broker.subscribe()
+        send_lock = asyncio.Lock()
+
+        async def send(message: str) -> None:
+            async with send_lock:
+                await websocket.send_text(message)
+
+        async def receive_commands() -> None:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+                if message.get("text") is None:
+                    # Команды - только текстовые кадры JSON (1003: Unsupported Data)
+                    await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+                    return
+                try:
+                    command = json.loads(message["text"])
+                except ValueError:
+                    # Битая команда не закрывает соединение: клиент получает ошибку и может прислать следующую
+                    async with send_lock:
+                        await websocket.send_json({"error": "Invalid JSON"})
+                    continue
+                if not isinstance(command, dict):
+                    command = {}
+                action = command.get("action")
+                try:
+                    topics = validate_topics(command.get("topics") or [])
+                    if action == "subscribe":
+                        validate_topics(subscription.topics | set(topics))
+                        catalog_broker.add_topics(subscription, topics)
+                    elif action == "unsubscribe":
+                        catalog_broker.remove_topics(subscription, topics)
+                    else:
+                        raise ValueError(f"Unknown action: {action}")
+                    reply = {"ack": action, "topics": sorted(subscription.topics)}
+                except ValueError as e:
+                    reply = {"error": str(e)}
+                async with send_lock:
+                    await websocket.send_json(reply)
+
+        async def send_events() -> None:
+            while True:
+                message = await subscription.get(timeout=settings.push_heartbeat)
+                if message is not None:
+                    await send(message)
+
+        tasks = [asyncio.create_task(receive_commands()), asyncio.create_task(send_events())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if isinstance(task.exception(), ConnectionError):
+                    # Клиент не успевает читать - закрываем соединение (1013: Try Again Later)
+                    await websocket.close(code=1013)
+        finally:
+            # Отписываемся до любого await, чтобы подписка не утекла при отмене обработчика
+            catalog_broker.unsubscribe(subscription)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def start_bridge(engine: AsyncEngine) -> None:
+        global _bridge
+
+        if not settings.push_pg_bridge or engine.dialect.name != "postgresql":
+            return
+
+        _bridge = PgNotifyBridge(engine, settings.push_channel, receive_bridge_message)
+        await _bridge.start()
+
+    @staticmethod
+    async def stop_bridge() -> None:
+        global _bridge
+
+        if _bridge is not None:
+            await _bridge.stop()
+            _bridge = None
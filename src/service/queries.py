@@ -0,0 +1,79 @@
+"""
+Реестр заранее построенных запросов для самых частых операций.
+
+Запросы собираются один раз при импорте, а значения передаются через bindparam.
+Так на каждый вызов не тратится время на построение select(...) и вычисление ключа
+кэша SQLAlchemy (у готового выражения он мемоизирован), а скомпилированный SQL
+берется из кэша движка. На стороне asyncpg тот же текст запроса попадает в кэш
+подготовленных выражений соединения (см. engine_options в configurations.database).
+"""
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import selectinload
+
+from src.models.books import ArchivedBook, Book
+from src.models.sellers import Seller
+
+__all__ = [
+    "SELLER_BY_EMAIL",
+    "SELLER_WITH_BOOKS",
+    "ALL_SELLERS",
+    "BOOK_BY_ID",
+    "ALL_BOOKS",
+    "ARCHIVED_BOOK_BY_ID",
+    "ALL_ARCHIVED_BOOKS",
+    "BOOK_ROW_BY_ID",
+    "ALL_BOOK_ROWS",
+    "BOOK_RETURNING_COLUMNS",
+    "SELLER_RETURNING_COLUMNS",
+]
+
+# Аутентификация и проверка токена: параметр email - нормализованный (normalize_email)
+SELLER_BY_EMAIL = select(Seller).where(Seller.email_normalized == bindparam("email"))
+
+# Продавец вместе с книгами: параметр seller_id
+SELLER_WITH_BOOKS = select(Seller).where(Seller.id == bindparam("seller_id")).options(selectinload(Seller.books))
+
+ALL_SELLERS = select(Seller)
+
+# Книга по ИД: параметр book_id
+BOOK_BY_ID = select(Book).where(Book.id == bindparam("book_id"))
+
+ALL_BOOKS = select(Book)
+
+# Архив холодных книг (include_archived): параметр book_id
+ARCHIVED_BOOK_BY_ID = select(ArchivedBook).where(ArchivedBook.id == bindparam("book_id"))
+
+ALL_ARCHIVED_BOOKS = select(ArchivedBook)
+
+# Core-запросы для быстрого пути чтения книг (без ORM): строки сразу превращаются в словари.
+# Колонки перечислены в порядке полей ReturnedBook, чтобы JSON совпадал байт в байт.
+_books = Book.__table__
+_BOOK_ROW_COLUMNS = (
+    _books.c.seller_id,
+    _books.c.title,
+    _books.c.author,
+    _books.c.year,
+    _books.c.id,
+    _books.c.count_pages,
+)
+
+# Версия нужна для заголовка ETag и в тело ответа не попадает
+BOOK_ROW_BY_ID = select(*_BOOK_ROW_COLUMNS, _books.c.version).where(_books.c.id == bindparam("book_id"))
+
+ALL_BOOK_ROWS = select(*_BOOK_ROW_COLUMNS)
+
+# Колонки RETURNING для частичных обновлений (PATCH): поля ответа и версия для ETag.
+# Первичный ключ идет первым: synchronize_session="fetch" сам ставит его в начало RETURNING,
+# и при другом порядке строка из закэшированного запроса могла разойтись с именами колонок
+BOOK_RETURNING_COLUMNS = (
+    Book.id,
+    Book.seller_id,
+    Book.title,
+    Book.author,
+    Book.year,
+    Book.count_pages,
+    Book.version,
+)
+
+SELLER_RETURNING_COLUMNS = (Seller.id, Seller.first_name, Seller.last_name, Seller.email, Seller.version)
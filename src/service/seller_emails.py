@@ -0,0 +1,78 @@
+"""
+Справочник email продавцов при шардировании (seller_emails_table в основной базе).
+
+Уникальные индексы email у продавцов действуют только внутри шарда, а шард продавца выбирается по ИД.
+Поэтому при шардировании email занимается в справочнике в той же транзакции, что и сам продавец:
+первичный ключ справочника не дает двум продавцам в разных шардах получить один email.
+Он же находит продавца по email точечным запросом в один шард вместо обхода всех шардов.
+
+Без шардирования справочник не ведется: продавцы лежат в одной таблице с уникальным индексом.
+"""
+
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete
+
+from src.models.sellers import Seller, SellerEmail
+from src.service.queries import SELLER_BY_EMAIL
+from src.utils.db_session import DBSession
+
+__all__ = ["SellerEmailService", "email_taken"]
+
+
+def email_taken() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email is already registered")
+
+
+class SellerEmailService:
+    @staticmethod
+    def enabled(session: DBSession) -> bool:
+        # Сессии шардированной базы знают свои шарды (ShardRouter.session_factory)
+        return bool(session.info.get("book_shards"))
+
+    @staticmethod
+    async def find_seller(email: str, session: DBSession) -> Optional[Seller]:
+        """
+        Продавец по нормализованному email (normalize_email).
+        """
+        if SellerEmailService.enabled(session):
+            claim = await session.get(SellerEmail, email)
+            if claim is not None:
+                seller = await session.get(Seller, claim.seller_id)
+                if seller is not None and seller.email_normalized == email:
+                    return seller
+            # Запись справочника могла не зафиксироваться вместе с продавцом (commit шардов идет по очереди)
+        res = await session.execute(SELLER_BY_EMAIL, {"email": email})
+        return res.scalars().first()
+
+    @staticmethod
+    async def claim(email: str, seller_id: int, session: DBSession) -> None:
+        """
+        Занимает email за продавцом. Если он занят другим продавцом - 409. Запись, оставшаяся от удаленного
+        продавца или прежнего email, переходит новому владельцу. Одновременную регистрацию того же email
+        в другой транзакции остановит первичный ключ справочника (IntegrityError при flush).
+        """
+        if not SellerEmailService.enabled(session):
+            return
+        claim = await session.get(SellerEmail, email)
+        if claim is None:
+            session.add(SellerEmail(email_normalized=email, seller_id=seller_id))
+        elif claim.seller_id != seller_id:
+            owner = await session.get(Seller, claim.seller_id)
+            if owner is not None and owner.email_normalized == email:
+                raise email_taken()
+            claim.seller_id = seller_id
+        await session.flush()
+
+    @staticmethod
+    async def release(seller_id: int, session: DBSession, keep: Optional[str] = None) -> None:
+        """
+        Освобождает email продавца (кроме keep - его текущего email).
+        """
+        if not SellerEmailService.enabled(session):
+            return
+        query = delete(SellerEmail).where(SellerEmail.seller_id == seller_id)
+        if keep is not None:
+            query = query.where(SellerEmail.email_normalized != keep)
+        await session.execute(query.execution_options(synchronize_session=False))
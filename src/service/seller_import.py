@@ -0,0 +1,274 @@
+"""
+Массовый импорт продавцов (перенос из старой системы): python -m src.commands.import_sellers
+
+Записи IncomingSeller читаются потоком и обрабатываются пачками, каждая пачка - отдельная транзакция:
+1. Валидация схемой IncomingSeller и разбор уже захешированных паролей, невалидные записи
+   пропускаются с номером строки в отчете.
+2. Проверка занятости email - один запрос на пачку (при шардировании - к справочнику email основной базы).
+3. Хеширование паролей (settings.password_scheme) в пуле процессов на всех ядрах.
+   Уже захешированные пароли переносятся без изменений.
+4. Вставка продавцов многострочными INSERT ... ON CONFLICT DO NOTHING RETURNING и событий в outbox
+   для ленты изменений. Email, который успели занять между проверкой и вставкой (регистрация через API),
+   не прерывает импорт: такая строка пропускается и считается в existing.
+   При шардировании email пачки сначала занимаются в справочнике основной базы (SellerEmail).
+"""
+
+import asyncio
+import time
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.configurations.sharding import ShardRouter
+from src.models.events import EventEntity, EventOp
+from src.models.sellers import Seller, SellerEmail, normalize_email
+from src.schemas import IncomingSeller
+from src.service.changes import ChangeService
+from src.service.jobs import JobKind, JobService
+from src.service.seller_emails import SellerEmailService
+from src.utils.auth import get_password_hash, pwd_context
+
+__all__ = ["SellerImportService", "is_password_hash", "hash_passwords", "password_hash_error"]
+
+_sellers = Seller.__table__
+_seller_emails = SellerEmail.__table__
+SELLER_IMPORT_COLUMNS = (_sellers.c.id, _sellers.c.first_name, _sellers.c.last_name, _sellers.c.email)
+MAX_REPORTED_ERRORS = 20
+# Паролей в одной задаче пула: меньше накладных расходов на pickle, но куски достаточно мелкие,
+# чтобы нагрузка ровно распределялась по процессам
+HASH_CHUNK_SIZE = 16
+
+
+def is_password_hash(password: str) -> bool:
+    """
+    Пароль из старой системы уже захеширован bcrypt ($2a$, $2b$, $2y$) или argon2 - переносим как есть.
+    Если стоимость хеша ниже текущей политики, он пересчитается при первом входе продавца.
+    """
+    return pwd_context.identify(password, required=False) is not None
+
+
+def password_hash_error(password: str) -> Optional[str]:
+    """
+    Хеш, опознанный по префиксу схемы, разбирается целиком (соль, стоимость, длина контрольной суммы).
+    Битый хеш переносить нельзя: при входе продавца verify_and_update упадет на нем с ValueError.
+    Возвращает описание ошибки или None, если хеш корректен (или это не хеш).
+    """
+    scheme = pwd_context.identify(password, required=False)
+    if scheme is None:
+        return None
+    try:
+        pwd_context.handler(scheme).from_string(password)
+    except ValueError as e:
+        return f"invalid {scheme} hash: {e}"
+    return None
+
+
+def insert_or_skip(table, dialect_name: str):
+    """
+    INSERT ... ON CONFLICT DO NOTHING: строки с уже занятыми уникальными ключами пропускаются
+    и не попадают в RETURNING. Поддерживаются Postgres и SQLite (его локальная замена).
+    Вставка идет в таблицу, а не в модель: массовая ORM-вставка не работает с шардированной сессией.
+    """
+    dialect = postgresql if dialect_name == "postgresql" else sqlite
+    return dialect.insert(table).on_conflict_do_nothing()
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    # Выполняется в процессах пула, поэтому функция модульного уровня (должна сериализоваться pickle)
+    return [get_password_hash(password) for password in passwords]
+
+
+class SellerImportService:
+    @staticmethod
+    def new_report() -> dict:
+        return {
+            "read": 0,
+            "imported": 0,
+            "invalid": 0,
+            "existing": 0,
+            "duplicates": 0,
+            "hashed": 0,
+            "passthrough": 0,
+            "batches": 0,
+            "seconds": 0.0,
+            "rows_per_sec": 0.0,
+            "errors": [],
+        }
+
+    @staticmethod
+    def reject(line_no: int, error: str, report: dict) -> None:
+        report["invalid"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append(f"line {line_no}: {error}")
+
+    @staticmethod
+    def validate(lines: Iterable[Tuple[int, Any]], report: dict) -> List[IncomingSeller]:
+        sellers = []
+        for line_no, record in lines:
+            report["read"] += 1
+            try:
+                seller = IncomingSeller.model_validate(record)
+            except ValidationError as e:
+                SellerImportService.reject(line_no, f"{e.errors()[0]['loc']} {e.errors()[0]['msg']}", report)
+                continue
+            hash_error = password_hash_error(seller.password)
+            if hash_error:
+                SellerImportService.reject(line_no, f"('password',) {hash_error}", report)
+                continue
+            sellers.append(seller)
+        return sellers
+
+    @staticmethod
+    async def hash_batch(sellers: List[IncomingSeller], executor: Optional[Executor], report: dict) -> List[str]:
+        """
+        Хеши паролей пачки в исходном порядке. Пароли уходят в пул кусками по HASH_CHUNK_SIZE,
+        а не по одному через межпроцессную очередь.
+        """
+        passwords = [seller.password for seller in sellers]
+        plain = [i for i, password in enumerate(passwords) if not is_password_hash(password)]
+        report["passthrough"] += len(passwords) - len(plain)
+        report["hashed"] += len(plain)
+        if not plain:
+            return passwords
+
+        plain_passwords = [passwords[i] for i in plain]
+        if executor is None:
+            hashes = hash_passwords(plain_passwords)
+        else:
+            loop = asyncio.get_running_loop()
+            parts = [
+                plain_passwords[start : start + HASH_CHUNK_SIZE]  # noqa: E203
+                for start in range(0, len(plain_passwords), HASH_CHUNK_SIZE)
+            ]
+            results = await asyncio.gather(*(loop.run_in_executor(executor, hash_passwords, part) for part in parts))
+            hashes = [password_hash for part in results for password_hash in part]
+        for i, password_hash in zip(plain, hashes):
+            passwords[i] = password_hash
+        return passwords
+
+    @staticmethod
+    async def new_sellers(sellers: List[IncomingSeller], session: AsyncSession, report: dict) -> List[IncomingSeller]:
+        """
+        Отбрасывает продавцов с уже занятым email (одним запросом на пачку, без учета регистра) и повторы внутри пачки.
+        """
+        emails = {normalize_email(seller.email) for seller in sellers}
+        # При шардировании занятые email - в справочнике основной базы: один запрос вместо обхода шардов
+        column = SellerEmail.email_normalized if SellerEmailService.enabled(session) else Seller.email_normalized
+        res = await session.execute(select(column).where(column.in_(emails)))
+        existing = set(res.scalars().all())
+
+        fresh, seen = [], set()
+        for seller in sellers:
+            email = normalize_email(seller.email)
+            if email in existing:
+                report["existing"] += 1
+            elif email in seen:
+                report["duplicates"] += 1
+            else:
+                seen.add(email)
+                fresh.append(seller)
+        return fresh
+
+    @staticmethod
+    async def insert_batch(
+        sellers: List[IncomingSeller],
+        passwords: List[str],
+        session: AsyncSession,
+        router: Optional[ShardRouter],
+        welcome: bool,
+        report: dict,
+    ) -> None:
+        rows = [
+            {
+                "first_name": seller.first_name,
+                "last_name": seller.last_name,
+                "email": seller.email,
+                "password": password,
+            }
+            for seller, password in zip(sellers, passwords)
+        ]
+        # Без шардирования ИД выдает база, при шардировании - генератор маршрутизатора, он же выбирает шард
+        groups = defaultdict(list)
+        if router is None:
+            dialect_name = session.get_bind().dialect.name
+            groups[None] = rows
+        else:
+            dialect_name = router.default_engine.dialect.name
+            for row in rows:
+                row["id"] = router.next_id()
+            # email занимаются в справочнике основной базы в той же транзакции, что и продавцы в шардах.
+            # Дальше идут только продавцы, чей email удалось занять
+            query = insert_or_skip(_seller_emails, dialect_name).returning(_seller_emails.c.email_normalized)
+            res = await session.execute(
+                query, [{"email_normalized": normalize_email(row["email"]), "seller_id": row["id"]} for row in rows]
+            )
+            claimed = set(res.scalars().all())
+            for row in rows:
+                if normalize_email(row["email"]) in claimed:
+                    groups[router.shard_for(row["id"])].append(row)
+
+        query = insert_or_skip(_sellers, dialect_name).returning(*SELLER_IMPORT_COLUMNS)
+        inserted_ids = set()
+        for shard_id, shard_rows in groups.items():
+            bind_arguments = {} if shard_id is None else {"shard_id": shard_id}
+            res = await session.execute(query, shard_rows, bind_arguments=bind_arguments)
+            for row in res.all():
+                payload = row._asdict()
+                ChangeService.record(EventEntity.SELLER, EventOp.CREATED, row.id, payload, session)
+                if welcome:
+                    JobService.enqueue(JobKind.EMAIL, {"to": row.email, "template": "welcome"}, session)
+                inserted_ids.add(row.id)
+
+        if router is not None:
+            # email, занятый в шарде продавцом из времени до справочника, освобождается обратно
+            skipped_ids = [
+                row["id"] for shard_rows in groups.values() for row in shard_rows if row["id"] not in inserted_ids
+            ]
+            if skipped_ids:
+                await session.execute(delete(_seller_emails).where(_seller_emails.c.seller_id.in_(skipped_ids)))
+        report["imported"] += len(inserted_ids)
+        report["existing"] += len(rows) - len(inserted_ids)
+
+    @staticmethod
+    async def import_sellers(
+        batches: Iterable[List[Tuple[int, Any]]],
+        session_factory: Callable[[], AsyncSession],
+        router: Optional[ShardRouter] = None,
+        executor: Optional[Executor] = None,
+        welcome: bool = False,
+        progress: Optional[Callable[[dict], None]] = None,
+    ) -> dict:
+        """
+        Импорт пачек записей (номер строки, запись). Каждая пачка фиксируется сразу, поэтому
+        прерванный импорт можно запустить повторно: уже перенесенные продавцы отсеются по email.
+        """
+        report = SellerImportService.new_report()
+        started = time.perf_counter()
+        for lines in batches:
+            sellers = SellerImportService.validate(lines, report)
+            if not sellers:
+                continue
+            async with session_factory() as session:
+                sellers = await SellerImportService.new_sellers(sellers, session, report)
+            if sellers:
+                # Хеширование идет без открытой транзакции: соединение не простаивает в пуле базы
+                passwords = await SellerImportService.hash_batch(sellers, executor, report)
+                async with session_factory() as session:
+                    await SellerImportService.insert_batch(sellers, passwords, session, router, welcome, report)
+                    await session.commit()
+            report["batches"] += 1
+            report["seconds"] = time.perf_counter() - started
+            report["rows_per_sec"] = report["imported"] / report["seconds"] if report["seconds"] else 0.0
+            if progress is not None:
+                progress(report)
+        return report
+
+    @staticmethod
+    def process_pool(workers: Optional[int]) -> Optional[Executor]:
+        # workers=0 - хешировать в текущем процессе (для отладки и тестов), None - по числу ядер
+        return None if workers == 0 else ProcessPoolExecutor(max_workers=workers)
@@ -1,34 +1,88 @@
+import logging
+from typing import List, Optional
+
 from fastapi import HTTPException, Response, status
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
 
-from src.models.sellers import Seller
+from src.configurations.database import get_session_factory, request_session
+from src.models.books import ArchivedBook, Book
+from src.models.events import EventEntity, EventOp
+from src.models.sellers import Seller, normalize_email
 from src.schemas import IncomingSeller
+from src.schemas.changes import ReturnedEvent
 from src.schemas.sellers import ReturnedAllSellers, ReturnedSeller, ReturnedSellerWithBooks, SellerOut, UpdatedSeller
-from src.utils.auth import get_password_hash, verify_password
+from src.service.changes import ChangeService, change_notifier
+from src.service.jobs import JobKind, JobService
+from src.service.queries import ALL_SELLERS, SELLER_RETURNING_COLUMNS, SELLER_WITH_BOOKS
+from src.service.seller_emails import SellerEmailService, email_taken
+from src.utils.auth import get_password_hash, run_hashing, verify_and_update_password
 from src.utils.db_session import DBSession
+from src.utils.etag import ANY_VERSION
+from src.utils.negative_cache import unknown_emails
+from src.utils.single_flight import model_response
+from src.utils.tracing import trace_methods
+
+logger = logging.getLogger(__name__)
+
+
+def _with_normalized_email(fields: dict) -> dict:
+    # Нормализованный email меняется вместе с email
+    if fields.get("email") is not None:
+        fields["email_normalized"] = normalize_email(fields["email"])
+    return fields
+
+
+async def _claim_changed_email(seller_id: int, email: Optional[str], session: DBSession) -> None:
+    # Новый email занимается в справочнике, прежний освобождается (только при шардировании)
+    if email is not None:
+        email = normalize_email(email)
+        await SellerEmailService.claim(email, seller_id, session)
+        await SellerEmailService.release(seller_id, session, keep=email)
+
 
+def _forget_unknown_emails(events: List[ReturnedEvent]) -> None:
+    # Зафиксированный продавец с новым email больше не "неизвестный" (с push_pg_bridge - во всех воркерах)
+    for item in events:
+        if item.entity == EventEntity.SELLER and item.payload and item.payload.get("email"):
+            unknown_emails.discard(normalize_email(item.payload["email"]))
 
+
+change_notifier.add_listener(_forget_unknown_emails)
+
+
+@trace_methods
 class SellersService:
     @staticmethod
     async def create_seller(seller: IncomingSeller, session: DBSession) -> ReturnedSeller:
-        hashed_password = get_password_hash(seller.password)
+        hashed_password = await run_hashing(get_password_hash, seller.password)
         new_seller = Seller(
             first_name=seller.first_name,
             last_name=seller.last_name,
             email=seller.email,
+            email_normalized=normalize_email(seller.email),
             password=hashed_password,
         )
         session.add(new_seller)
+        # Приветственное письмо отправит фоновый воркер, уже после фиксации транзакции
+        JobService.enqueue(JobKind.EMAIL, {"to": seller.email, "template": "welcome"}, session)
 
-        await session.flush()
+        try:
+            await session.flush()
+            # При шардировании email занимается и в общем для всех шардов справочнике
+            await SellerEmailService.claim(new_seller.email_normalized, new_seller.id, session)
+        except IntegrityError:
+            raise email_taken()
 
-        return ReturnedSeller.from_orm(new_seller)
+        returned_seller = ReturnedSeller.from_orm(new_seller)
+        ChangeService.record(
+            EventEntity.SELLER, EventOp.CREATED, new_seller.id, returned_seller.model_dump(mode="json"), session
+        )
+        return returned_seller
 
     @staticmethod
     async def get_all_sellers(session: DBSession) -> ReturnedAllSellers | Response:
-        query = select(Seller)
-        res = await session.execute(query)
+        res = await session.execute(ALL_SELLERS)
         sellers = res.scalars().all()
         if sellers:
             sellers_response = [ReturnedSeller.from_orm(seller) for seller in sellers]
@@ -39,17 +93,36 @@ class SellersService:
     @staticmethod
     async def get_seller(seller_id: int, session: DBSession) -> ReturnedSellerWithBooks | Response:
 
-        res = await session.execute(select(Seller).where(Seller.id == seller_id).options(selectinload(Seller.books)))
+        res = await session.execute(SELLER_WITH_BOOKS, {"seller_id": seller_id})
         seller = res.scalars().first()
         if seller:
             return ReturnedSellerWithBooks.from_orm(seller)
         else:
             return Response(status_code=status.HTTP_404_NOT_FOUND)
 
+    @staticmethod
+    async def get_seller_response(seller_id: int) -> Response:
+        """
+        Готовый ответ GET /seller/{seller_id} в собственной сессии чтения (для single-flight),
+        с тем же жизненным циклом, что у сессии запроса (см. BookService.get_book_response).
+        """
+        async with request_session(get_session_factory(read_only=True), "read") as session:
+            return model_response(await SellersService.get_seller(seller_id, session))
+
     @staticmethod
     async def delete_seller(seller_id: int, session: DBSession) -> Response:
         deleted_seller = await session.get(Seller, seller_id)
         if deleted_seller:
+            # Книги удаляются каскадом, о них потребители ленты тоже должны узнать
+            res = await session.execute(select(Book.id).where(Book.seller_id == seller_id))
+            for book_id in res.scalars().all():
+                ChangeService.record(
+                    EventEntity.BOOK, EventOp.DELETED, book_id, {"id": book_id, "seller_id": seller_id}, session
+                )
+            ChangeService.record(EventEntity.SELLER, EventOp.DELETED, seller_id, None, session)
+            await session.execute(delete(ArchivedBook).where(ArchivedBook.seller_id == seller_id))
+            await SellerEmailService.release(seller_id, session)
+
             await session.delete(deleted_seller)
             await session.flush()
             return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -57,28 +130,104 @@ class SellersService:
             return Response(status_code=status.HTTP_404_NOT_FOUND)
 
     @staticmethod
-    async def update_seller(seller_id: int, new_data: UpdatedSeller, session: DBSession) -> ReturnedSeller | Response:
-        updated_seller = await session.get(Seller, seller_id)
+    async def update_seller(
+        seller_id: int, new_data: UpdatedSeller, session: DBSession, expected_version: Optional[int] = None
+    ) -> ReturnedSeller | Response:
+        """
+        Обновление одним запросом UPDATE ... RETURNING без предварительного чтения строки.
+        При несовпадении ожидаемой версии (If-Match) возвращается 412.
+        """
+        query = (
+            update(Seller)
+            .where(Seller.id == seller_id)
+            .values(**_with_normalized_email(new_data.dict(exclude_unset=True)), version=Seller.version + 1)
+            .returning(Seller)
+            .execution_options(synchronize_session="fetch")
+        )
+        if expected_version not in (None, ANY_VERSION):
+            query = query.where(Seller.version == expected_version)
+
+        try:
+            res = await session.execute(query)
+        except IntegrityError:
+            raise email_taken()
+        updated_seller = res.scalar_one_or_none()
         if updated_seller:
-            # Проходим по всем полям в new_data
-            for field_name, value in new_data.dict(exclude_unset=True).items():
-                # Устанавливаем значение поля updated_seller, соответствующее каждому полю new_data
-                setattr(updated_seller, field_name, value)
+            await _claim_changed_email(seller_id, new_data.email, session)
+            returned_seller = ReturnedSeller.from_orm(updated_seller)
+            ChangeService.record(
+                EventEntity.SELLER, EventOp.UPDATED, seller_id, returned_seller.model_dump(mode="json"), session
+            )
+            return returned_seller
 
-            await session.flush()
-            return ReturnedSeller.from_orm(updated_seller)
-        else:
-            return Response(status_code=status.HTTP_404_NOT_FOUND)
+        # If-Match: * на отсутствующий ресурс - тоже несработавшее условие
+        if expected_version == ANY_VERSION or (expected_version is not None and await session.get(Seller, seller_id)):
+            return Response(status_code=status.HTTP_412_PRECONDITION_FAILED)
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
 
     @staticmethod
-    async def authenticate_seller(email: str, password: str, session: DBSession) -> SellerOut | None:
-        query = select(Seller).where(Seller.email == email)
-        res = await session.execute(query)
+    async def patch_seller(
+        seller_id: int, patch: UpdatedSeller, session: DBSession, expected_version: Optional[int] = None
+    ) -> ReturnedSeller | Response:
+        """
+        Частичное обновление одним UPDATE ... RETURNING: только переданные поля, без загрузки ORM-объекта.
+        """
+        fields = patch.dict(exclude_unset=True, exclude_none=True)
+        query = (
+            update(Seller)
+            .where(Seller.id == seller_id)
+            .values(**_with_normalized_email(fields), version=Seller.version + 1 if fields else Seller.version)
+            .returning(*SELLER_RETURNING_COLUMNS)
+            .execution_options(synchronize_session="fetch")
+        )
+        if expected_version not in (None, ANY_VERSION):
+            query = query.where(Seller.version == expected_version)
 
-        # используется для получения одного результата из выполненного запроса или None, если результат отсутствует.
-        seller = res.scalar_one_or_none()
+        try:
+            res = await session.execute(query)
+        except IntegrityError:
+            raise email_taken()
+        row = res.first()
+        if row:
+            await _claim_changed_email(seller_id, fields.get("email"), session)
+            returned_seller = ReturnedSeller.model_validate(row._asdict())
+            if fields:
+                ChangeService.record(
+                    EventEntity.SELLER, EventOp.UPDATED, seller_id, returned_seller.model_dump(mode="json"), session
+                )
+            return returned_seller
 
-        if seller and verify_password(password, seller.password):
-            return SellerOut.from_orm(seller)
-        else:
+        # If-Match: * на отсутствующий ресурс - тоже несработавшее условие
+        if expected_version == ANY_VERSION or (expected_version is not None and await session.get(Seller, seller_id)):
+            return Response(status_code=status.HTTP_412_PRECONDITION_FAILED)
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+    @staticmethod
+    async def authenticate_seller(email: str, password: str, session: DBSession) -> SellerOut | None:
+        email = normalize_email(email)
+        # Неизвестный email отвечается из памяти: перебор по спискам адресов не доходит до базы
+        if email in unknown_emails:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
+        seller = await SellerEmailService.find_seller(email, session)
+
+        if seller is None:
+            unknown_emails.add(email)
+        else:
+            try:
+                verified, new_hash = await run_hashing(verify_and_update_password, password, seller.password)
+            except ValueError as e:
+                # Хеш в базе не разбирается (битый перенос из старой системы): войти с ним нельзя, но это не 500
+                logger.warning("Seller %s has an invalid password hash: %s", seller.id, e)
+                verified, new_hash = False, None
+            if verified:
+                if new_hash:
+                    # Хеш устарел по текущей политике (схема, стоимость) - пересчитываем, пока знаем пароль.
+                    # Версия строки не меняется: для клиентов продавец остался прежним.
+                    await session.execute(
+                        update(Seller)
+                        .where(Seller.id == seller.id)
+                        .values(password=new_hash)
+                        .execution_options(synchronize_session=False)
+                    )
+                return SellerOut.from_orm(seller)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
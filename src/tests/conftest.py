@@ -9,22 +9,22 @@ import asyncio
 import httpx
 import pytest
 import pytest_asyncio
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from src.configurations.settings import settings
 from src.models import books  # noqa
 from src.models.base import BaseModel
 from src.models.books import Book  # noqa F401
-
+from src.tests.databases import create_worker_engine, provision_database
+from src.utils.negative_cache import unknown_emails
 
 # Переопределяем движок для запуска тестов и подключаем его к тестовой базе.
 # Это решает проблему с сохранностью данных в основной базе приложения.
 # Фикстуры тестов их не зачистят.
 # И обеспечивает чистую среду для запуска тестов. В ней не будет лишних записей.
-async_test_engine = create_async_engine(
-    settings.database_test_url,
-    echo=True,
-)
+# У каждого воркера pytest-xdist своя база, поэтому тесты можно запускать параллельно (pytest -n auto).
+# Логирование SQL включается переменной TEST_DB_ECHO=true.
+async_test_engine = create_worker_engine()
 
 # Создаем фабрику сессий для тестового движка.
 async_test_session = async_sessionmaker(async_test_engine, expire_on_commit=False, autoflush=False)
@@ -39,22 +39,34 @@ def event_loop():
     loop.close()
 
 
-# Создаем таблицы в тестовой БД. Предварительно удаляя старые.
+# Готовим базу воркера. Для Postgres она клонируется из шаблона, где схема уже создана.
 @pytest_asyncio.fixture(scope="session", autouse=True)
 async def create_tables() -> None:
     """Create tables in DB."""
-    async with async_test_engine.begin() as connection:
-        await connection.run_sync(BaseModel.metadata.drop_all)
-        await connection.run_sync(BaseModel.metadata.create_all)
+    await provision_database()
+    if settings.test_db_backend == "sqlite":
+        async with async_test_engine.begin() as connection:
+            await connection.run_sync(BaseModel.metadata.create_all)
+    yield
+    await async_test_engine.dispose()
 
 
-# Создаем сессию для БД, используемую для тестов
+# Создаем сессию для БД, используемую для тестов.
+# Весь тест идет внутри внешней транзакции, которая в конце откатывается.
+# commit/rollback внутри кода приложения работают с SAVEPOINT и не выходят за пределы теста.
 @pytest_asyncio.fixture(scope="function")
 async def db_session():
     async with async_test_engine.connect() as connection:
-        async with async_test_session(bind=connection) as session:
+        transaction = await connection.begin()
+        async with async_test_session(bind=connection, join_transaction_mode="create_savepoint") as session:
             yield session
-            await session.rollback()
+        await transaction.rollback()
+
+
+# Кэш неизвестных email живет в процессе, а тесты создают продавцов напрямую, минуя ленту изменений
+@pytest.fixture(scope="function", autouse=True)
+def clear_unknown_emails():
+    unknown_emails.clear()
 
 
 # Коллбэк для переопределения сессии в приложении
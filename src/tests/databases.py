@@ -0,0 +1,106 @@
+"""
+Подготовка изолированных тестовых баз для параллельного запуска (pytest-xdist).
+
+Каждый воркер xdist получает свою базу:
+- postgres: база клонируется из шаблона {db_test_name}_template (CREATE DATABASE ... TEMPLATE).
+  Шаблон со схемой создается один раз и пересоздается только при изменении моделей.
+- sqlite: база в памяти процесса воркера, схема создается при старте сессии.
+"""
+
+import hashlib
+import os
+
+from sqlalchemy import event, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool, StaticPool
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from src.configurations.settings import settings
+from src.models.base import BaseModel
+
+# Ключ advisory-блокировки, под которой воркеры по очереди готовят шаблон и свои базы
+TEMPLATE_LOCK_KEY = 31_0031
+
+
+def worker_id() -> str:
+    # Переменную выставляет pytest-xdist, без него тесты идут в одном процессе
+    return os.environ.get("PYTEST_XDIST_WORKER", "master")
+
+
+def worker_database_name() -> str:
+    return f"{settings.db_test_name}_{worker_id()}"
+
+
+def schema_fingerprint() -> str:
+    dialect = postgresql.dialect()
+    ddl = []
+    for table in BaseModel.metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(dialect=dialect)))
+        ddl.extend(str(CreateIndex(index).compile(dialect=dialect)) for index in table.indexes)
+    return hashlib.sha256("\n".join(ddl).encode()).hexdigest()
+
+
+def create_worker_engine() -> AsyncEngine:
+    if settings.test_db_backend == "sqlite":
+        engine = create_async_engine(
+            "sqlite+aiosqlite://",
+            echo=settings.test_db_echo,
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False},
+        )
+
+        # Драйвер sqlite3 сам управляет транзакциями и ломает SAVEPOINT.
+        # Отключаем это и открываем транзакции явно (рецепт из документации SQLAlchemy).
+        @event.listens_for(engine.sync_engine, "connect")
+        def _disable_driver_transactions(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine.sync_engine, "begin")
+        def _emit_begin(conn):
+            conn.exec_driver_sql("BEGIN")
+
+        return engine
+
+    return create_async_engine(f"{settings.db_host}/{worker_database_name()}", echo=settings.test_db_echo)
+
+
+async def _recreate_template(conn: AsyncConnection, template_name: str, fingerprint: str) -> None:
+    await conn.execute(text(f'DROP DATABASE IF EXISTS "{template_name}"'))
+    await conn.execute(text(f'CREATE DATABASE "{template_name}"'))
+
+    template_engine = create_async_engine(f"{settings.db_host}/{template_name}", poolclass=NullPool)
+    async with template_engine.begin() as template_conn:
+        await template_conn.run_sync(BaseModel.metadata.create_all)
+    await template_engine.dispose()
+
+    await conn.execute(text(f"COMMENT ON DATABASE \"{template_name}\" IS '{fingerprint}'"))
+
+
+async def provision_database() -> None:
+    """
+    Создает базу текущего воркера. Для sqlite создает схему в уже открытой базе в памяти.
+    """
+    if settings.test_db_backend == "sqlite":
+        return
+
+    template_name = f"{settings.db_test_name}_template"
+    database_name = worker_database_name()
+    fingerprint = schema_fingerprint()
+
+    admin_engine = create_async_engine(f"{settings.db_host}/postgres", isolation_level="AUTOCOMMIT", poolclass=NullPool)
+    async with admin_engine.connect() as conn:
+        await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": TEMPLATE_LOCK_KEY})
+        try:
+            current_fingerprint = await conn.scalar(
+                text("SELECT shobj_description(oid, 'pg_database') FROM pg_database WHERE datname = :name"),
+                {"name": template_name},
+            )
+            if current_fingerprint != fingerprint:
+                await _recreate_template(conn, template_name, fingerprint)
+
+            await conn.execute(text(f'DROP DATABASE IF EXISTS "{database_name}" WITH (FORCE)'))
+            await conn.execute(text(f'CREATE DATABASE "{database_name}" TEMPLATE "{template_name}"'))
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": TEMPLATE_LOCK_KEY})
+    await admin_engine.dispose()
@@ -1,5 +1,7 @@
+import pytest
 import pytest_asyncio
 
+from src.configurations.settings import settings
 from src.models import sellers
 from src.models.sellers import Seller
 from src.tests.constants import HASH_SELLER_1_EXAMPLE, HASH_SELLER_2_EXAMPLE
@@ -20,3 +22,9 @@ async def get_2_new_sellers(db_session) -> Seller:
     db_session.add_all([seller_1, seller_2])
     await db_session.flush()
     yield seller_1, seller_2
+
+
+@pytest.fixture()
+def internal_headers(monkeypatch) -> dict:
+    monkeypatch.setattr(settings, "internal_token", "test-internal-token")
+    yield {settings.internal_token_header: "test-internal-token"}
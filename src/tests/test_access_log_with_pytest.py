@@ -0,0 +1,75 @@
+import orjson
+import pytest
+from fastapi import status
+
+from src.utils.access_log import access_log_writer
+
+from .constants import PREFIX, SELLER_1_EXAMPLE_PASSWORD
+from .fixtures import get_new_seller  # noqa F401
+
+
+# Журнал выключен по умолчанию: включаем общий, который использует middleware, с файлом во временном каталоге
+@pytest.fixture(scope="function")
+def access_log_file(tmp_path, monkeypatch):
+    path = tmp_path / "access.log"
+    access_log_writer.shutdown()
+    monkeypatch.setattr(access_log_writer, "enabled", True)
+    monkeypatch.setattr(access_log_writer, "path", str(path))
+    yield path
+    access_log_writer.shutdown()
+
+
+def read_entries(path) -> list:
+    access_log_writer.shutdown()
+    return [orjson.loads(line) for line in path.read_bytes().splitlines()]
+
+
+# Тест: запись на запрос с шаблоном пути, статусом, задержкой и ИД продавца из токена
+@pytest.mark.asyncio
+async def test_access_log_entries(async_client, access_log_file, get_new_seller):
+    response = await async_client.post(
+        PREFIX + "token", data={"username": get_new_seller.email, "password": SELLER_1_EXAMPLE_PASSWORD}
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await async_client.post(
+        PREFIX + "books/",
+        json={"title": "Title", "author": "Author", "year": 2020, "count_pages": 100, "seller_id": get_new_seller.id},
+        headers=headers,
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    await async_client.get(PREFIX + "books/100500")
+
+    entries = {(entry["method"], entry["route"]): entry for entry in read_entries(access_log_file)}
+    created = entries[("POST", "/api/v1/books/")]
+    assert created["status"] == 201
+    assert created["seller_id"] == get_new_seller.id
+    assert created["latency_ms"] > 0
+    assert created["sample_rate"] == 1.0
+    assert entries[("POST", "/api/v1/token")]["seller_id"] is None
+    assert entries[("GET", "/api/v1/books/{book_id}")]["status"] == 404
+
+
+# Тест: успешные быстрые запросы отбираются выборкой, ошибки и медленные пишутся всегда;
+# при полной очереди записи отбрасываются, а не ждут места
+@pytest.mark.asyncio
+async def test_access_log_sampling_and_drops(access_log_file, monkeypatch):
+    monkeypatch.setattr(access_log_writer, "sample_ratio", 0.0)
+    monkeypatch.setattr(access_log_writer, "queue_size", 2)
+    monkeypatch.setattr(access_log_writer, "flush_interval", 60.0)
+    sampled_out, dropped, written = (
+        access_log_writer.sampled_out,
+        access_log_writer.dropped,
+        access_log_writer.written,
+    )
+
+    assert not access_log_writer.should_log(200, 1.0)
+    assert access_log_writer.should_log(500, 1.0)
+    assert access_log_writer.should_log(200, access_log_writer.slow_ms)
+    assert access_log_writer.sampled_out == sampled_out + 1
+
+    for i in range(5):
+        access_log_writer.log({"route": f"/{i}"})
+    assert access_log_writer.dropped == dropped + 3
+
+    assert [entry["route"] for entry in read_entries(access_log_file)] == ["/0", "/1"]
+    assert access_log_writer.written == written + 2
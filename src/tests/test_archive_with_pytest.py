@@ -0,0 +1,104 @@
+import pytest
+import pytest_asyncio
+from fastapi import Response
+from sqlalchemy import MetaData, func, insert, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.schema import CreateTable
+
+from src.models.base import BaseModel
+from src.models.books import ArchivedBook, Book
+from src.models.events import OutboxEvent
+from src.models.partitioning import partition_books_table
+from src.models.sellers import Seller
+from src.service.archive import ArchiveService
+from src.service.books import BookService
+from src.service.sellers import SellersService
+
+YEARS = (1890, 1950, 1990, 2010)
+
+
+# Отдельная база в файле: архивация работает пачками в собственных транзакциях
+@pytest_asyncio.fixture(scope="function")
+async def archive_engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/archive.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.create_all)
+        await conn.execute(
+            insert(Seller.__table__),
+            [{"id": 1, "first_name": "Seller", "last_name": "Seller", "email": "seller@archive.com", "password": "x"}],
+        )
+        await conn.execute(
+            insert(Book.__table__),
+            [
+                {"id": i, "title": f"book {year}", "author": "author", "year": year, "count_pages": 10, "seller_id": 1}
+                for i, year in enumerate(YEARS, start=1)
+            ],
+        )
+    yield engine
+    await engine.dispose()
+
+
+async def count_rows(engine, model) -> int:
+    async with engine.connect() as conn:
+        return (await conn.execute(select(func.count()).select_from(model))).scalar_one()
+
+
+# Тест: схема секционирования попадает в DDL таблицы, секции создаются событием after_create
+def test_partition_books_table_ddl():
+    metadata = MetaData()
+    Seller.__table__.to_metadata(metadata)
+    books = Book.__table__.to_metadata(metadata)
+    partition_books_table(books, "hash", partitions=4)
+    partition_books_table(books, "hash", partitions=4)  # повторный вызов ничего не меняет
+
+    ddl = str(CreateTable(books).compile(dialect=postgresql.dialect()))
+    assert "PARTITION BY HASH (seller_id)" in ddl
+    assert "PRIMARY KEY (id, seller_id)" in ddl
+    assert "BIGSERIAL" in ddl
+    assert len(books.dispatch.after_create) == 4
+
+    # Таблица приложения не секционирована, а ORM идентифицирует книгу только по id
+    assert "PARTITION BY" not in str(CreateTable(Book.__table__).compile(dialect=postgresql.dialect()))
+    assert [column.name for column in Book.__mapper__.primary_key] == ["id"]
+
+
+# Тест: холодные книги переезжают в архив пачками и читаются с include_archived
+@pytest.mark.asyncio
+async def test_archive_books_and_include_archived(archive_engine):
+    report = await ArchiveService.archive_books(archive_engine, before_year=1960, dry_run=True)
+    assert report["archived"] == 2
+    assert await count_rows(archive_engine, ArchivedBook) == 0
+
+    report = await ArchiveService.archive_books(archive_engine, before_year=1960, batch_size=1)
+    assert report == {"archived": 2, "batches": 2, "files": []}
+    assert await count_rows(archive_engine, Book) == 2
+    assert await count_rows(archive_engine, ArchivedBook) == 2
+
+    # Лента изменений узнает, что книги ушли из каталога
+    async with archive_engine.connect() as conn:
+        res = await conn.execute(select(OutboxEvent.entity_id, OutboxEvent.op, OutboxEvent.payload))
+        events = res.all()
+    assert [(entity_id, op) for entity_id, op, _ in events] == [(1, "deleted"), (2, "deleted")]
+    assert events[0].payload == {"id": 1, "seller_id": 1, "archived": True}
+
+    session_factory = async_sessionmaker(archive_engine, expire_on_commit=False)
+    async with session_factory() as session:
+        books = await BookService.get_all_books(session)
+        assert [book.year for book in books.books] == [1990, 2010]
+
+        books = await BookService.get_all_books(session, include_archived=True)
+        assert sorted(book.id for book in books.books) == [1, 2, 3, 4]
+
+        page = await BookService.get_all_books(session, after_id=1, limit=2, include_archived=True)
+        assert [book.id for book in page.books] == [2, 3]
+
+        assert isinstance(await BookService.get_book(1, session), Response)
+        archived_book = await BookService.get_book(1, session, include_archived=True)
+        assert archived_book.year == 1890
+
+        # Вместе с продавцом удаляются и его архивные книги
+        await SellersService.delete_seller(1, session)
+        await session.commit()
+
+    assert await count_rows(archive_engine, ArchivedBook) == 0
@@ -1,7 +1,16 @@
 import pytest
 from fastapi import status
-from .fixtures import get_new_seller
+
+from src.models.jobs import utcnow
+from src.models.sellers import Seller
+from src.schemas.changes import ReturnedEvent
+from src.service.push import receive_bridge_message
+from src.utils import auth, negative_cache
+from src.utils.auth import make_password_context
+from src.utils.negative_cache import NegativeCache, unknown_emails
+
 from .constants import PREFIX, SELLER_1_EXAMPLE_PASSWORD
+from .fixtures import get_new_seller
 
 
 @pytest.mark.asyncio
@@ -40,3 +49,128 @@ async def test_login_for_access_token_wrong_email(async_client, db_session, get_
     response = await async_client.post(PREFIX + "token", data=login_data)
 
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+# Тест: битый хеш в базе (соль не той длины) - вход отвечает 401, а не 500
+@pytest.mark.asyncio
+async def test_login_with_invalid_hash(async_client, db_session):
+    db_session.add(
+        Seller(first_name="Seller", last_name="Seller", email="broken@seller.seller", password="$2b$12$notarealhash")
+    )
+    await db_session.flush()
+
+    login_data = {"username": "broken@seller.seller", "password": SELLER_1_EXAMPLE_PASSWORD}
+    response = await async_client.post(PREFIX + "token", data=login_data)
+
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+# Тест: хеш с меньшей стоимостью, чем в политике, пересчитывается при входе, версия продавца не меняется
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_password(async_client, db_session, monkeypatch):
+    monkeypatch.setattr(auth, "pwd_context", make_password_context("bcrypt", bcrypt_rounds=4))
+    seller = Seller(first_name="Seller", last_name="Seller", email="rehash@seller.seller", password="")
+    seller.password = auth.get_password_hash(SELLER_1_EXAMPLE_PASSWORD)
+    db_session.add(seller)
+    await db_session.flush()
+    old_hash = seller.password
+
+    monkeypatch.setattr(auth, "pwd_context", make_password_context("bcrypt", bcrypt_rounds=5))
+    login_data = {"username": seller.email, "password": SELLER_1_EXAMPLE_PASSWORD}
+    response = await async_client.post(PREFIX + "token", data=login_data)
+    assert response.status_code == status.HTTP_200_OK
+
+    await db_session.refresh(seller)
+    assert seller.password != old_hash
+    assert seller.password.startswith("$2b$05$")
+    assert seller.version == 1
+
+    # Хеш уже соответствует политике - повторный вход его не трогает
+    response = await async_client.post(PREFIX + "token", data=login_data)
+    assert response.status_code == status.HTTP_200_OK
+    new_hash = seller.password
+    await db_session.refresh(seller)
+    assert seller.password == new_hash
+
+
+# Тест: политика хеширования - устаревшими считаются другая схема и меньшая стоимость
+def test_password_context_policy():
+    context = make_password_context("bcrypt", bcrypt_rounds=5)
+    assert context.needs_update(make_password_context("bcrypt", bcrypt_rounds=4).hash("password"))
+    assert not context.needs_update(context.hash("password"))
+    assert not context.needs_update(make_password_context("bcrypt", bcrypt_rounds=6).hash("password"))
+
+    verified, new_hash = context.verify_and_update("wrong", make_password_context("bcrypt", bcrypt_rounds=4).hash("x"))
+    assert (verified, new_hash) == (False, None)
+
+    with pytest.raises(ValueError):
+        make_password_context("md5_crypt")
+
+
+# Тест: вход не зависит от регистра email, неизвестный email повторно не запрашивается из базы
+@pytest.mark.asyncio
+async def test_login_email_case_and_unknown_cache(async_client, db_session, get_new_seller):
+    seller = get_new_seller
+
+    login_data = {"username": seller.email.upper(), "password": SELLER_1_EXAMPLE_PASSWORD}
+    response = await async_client.post(PREFIX + "token", data=login_data)
+    assert response.status_code == status.HTTP_200_OK
+
+    unknown = {"username": "Nobody@Seller.Seller", "password": SELLER_1_EXAMPLE_PASSWORD}
+    response = await async_client.post(PREFIX + "token", data=unknown)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert "nobody@seller.seller" in unknown_emails
+
+    hits = unknown_emails.hits
+    response = await async_client.post(PREFIX + "token", data=unknown)
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+    assert unknown_emails.hits == hits + 1
+
+
+# Тест: созданный продавец убирается из кэша неизвестных email после фиксации транзакции
+@pytest.mark.asyncio
+async def test_created_seller_leaves_unknown_cache(async_client, db_session):
+    unknown_emails.add("new@seller.seller")
+    new_seller = {"first_name": "New", "last_name": "Seller", "email": "New@Seller.Seller", "password": "password"}
+    response = await async_client.post(PREFIX + "seller/", json=new_seller)
+    assert response.status_code == status.HTTP_201_CREATED
+    assert "new@seller.seller" in unknown_emails
+    # В приложении commit делает request_session, в тестах сессию фиксируем сами
+    await db_session.commit()
+    assert "new@seller.seller" not in unknown_emails
+
+    login_data = {"username": "new@seller.seller", "password": "password"}
+    response = await async_client.post(PREFIX + "token", data=login_data)
+    assert response.status_code == status.HTTP_200_OK
+
+
+# Тест: событие о продавце, созданном другим воркером (пришло через LISTEN), тоже убирает email из кэша
+def test_bridge_event_leaves_unknown_cache():
+    unknown_emails.add("remote@seller.seller")
+    event = ReturnedEvent(
+        seq=1,
+        entity="seller",
+        entity_id=1,
+        op="created",
+        payload={"id": 1, "first_name": "Remote", "last_name": "Seller", "email": "Remote@Seller.Seller"},
+        created_at=utcnow(),
+    )
+    receive_bridge_message(event.model_dump_json())
+    assert "remote@seller.seller" not in unknown_emails
+
+
+# Тест: записи кэша устаревают через ttl, при переполнении вытесняются самые старые
+def test_negative_cache_ttl_and_size(monkeypatch):
+    cache = NegativeCache(ttl=10, max_size=2)
+    now = [100.0]
+    monkeypatch.setattr(negative_cache.time, "monotonic", lambda: now[0])
+
+    cache.add("a")
+    cache.add("b")
+    cache.add("c")  # вытесняет самый старый
+    assert "a" not in cache
+    assert "b" in cache and "c" in cache
+
+    now[0] += 11
+    assert "b" not in cache
+    assert cache.stats()["size"] == 1
@@ -2,6 +2,7 @@ import pytest
 from fastapi import status
 from sqlalchemy import select
 
+from src.configurations.settings import settings
 from src.models import books
 from src.tests.constants import PREFIX, SELLER_1_EXAMPLE_PASSWORD
 from src.tests.helpers import add_2_books_for_seller, add_book_for_seller
@@ -11,7 +12,6 @@ from src.utils.auth import authenticate_user
 from .fixtures import get_new_seller
 
 
-
 # Тест на ручку создающую книгу
 @pytest.mark.asyncio
 async def test_create_book(async_client, db_session, get_new_seller):
@@ -99,6 +99,28 @@ async def test_get_single_book(db_session, async_client, get_new_seller):
     }
 
 
+# Тест на быстрый путь чтения: ответы должны совпадать с обычными байт в байт
+@pytest.mark.asyncio
+async def test_books_fast_path_is_byte_identical(db_session, async_client, get_new_seller, monkeypatch):
+    seller = get_new_seller
+
+    book_1, book_2 = await add_2_books_for_seller(db_session=db_session, sellerID=seller.id)
+    urls = [PREFIX + "books/", PREFIX + f"books/{book_1.id}", PREFIX + f"books/{book_2.id + 1}"]
+
+    regular = [await async_client.get(url) for url in urls]
+
+    monkeypatch.setattr(settings, "books_fast_path_get_all", True)
+    monkeypatch.setattr(settings, "books_fast_path_get_book", True)
+    fast = [await async_client.get(url) for url in urls]
+
+    assert [r.status_code for r in regular] == [status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_404_NOT_FOUND]
+    for regular_response, fast_response in zip(regular, fast):
+        assert fast_response.status_code == regular_response.status_code
+        assert fast_response.content == regular_response.content
+        assert fast_response.headers.get("content-type") == regular_response.headers.get("content-type")
+        assert fast_response.headers.get("etag") == regular_response.headers.get("etag")
+
+
 # Тест на ручку удаления книги
 @pytest.mark.asyncio
 async def test_delete_book(db_session, async_client, get_new_seller):
@@ -147,3 +169,91 @@ async def test_update_book(db_session, async_client, get_new_seller):
     assert res.count_pages == new_book_data["count_pages"]
     assert res.year == new_book_data["year"]
     assert res.id == book.id
+
+
+# Тест на обновление книги с If-Match: устаревшая версия дает 412, актуальная - обновляет книгу
+@pytest.mark.asyncio
+async def test_update_book_if_match(db_session, async_client, get_new_seller):
+    seller = get_new_seller
+    access_token = await authenticate_user(async_client, seller.email, SELLER_1_EXAMPLE_PASSWORD)
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    book = await add_book_for_seller(db_session=db_session, sellerID=seller.id)
+    etag = (await async_client.get(PREFIX + f"books/{book.id}")).headers["etag"]
+    assert etag == '"1"'
+
+    new_book_data = BookExample(seller_id=seller.id).gen_new_book_data()
+    new_book_data.pop("seller_id")
+
+    # Первый клиент успешно обновляет книгу и получает новую версию
+    response = await async_client.put(
+        PREFIX + f"books/{book.id}", headers={**headers, "If-Match": etag}, json=new_book_data
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] == '"2"'
+    assert "version" not in response.json()
+
+    # Второй клиент со старым ETag получает отказ, данные первого не затираются
+    response = await async_client.put(
+        PREFIX + f"books/{book.id}",
+        headers={**headers, "If-Match": etag},
+        json={**new_book_data, "title": "lost update"},
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    response = await async_client.put(
+        PREFIX + f"books/{book.id + 1}", headers={**headers, "If-Match": etag}, json=new_book_data
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    # If-Match: * требует, чтобы книга существовала
+    response = await async_client.put(
+        PREFIX + f"books/{book.id + 1}", headers={**headers, "If-Match": "*"}, json=new_book_data
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    # Слабый ETag под If-Match не совпадает даже с актуальной версией
+    response = await async_client.put(
+        PREFIX + f"books/{book.id}", headers={**headers, "If-Match": 'W/"2"'}, json=new_book_data
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    res = await db_session.get(books.Book, book.id)
+    assert res.title == new_book_data["title"]
+    assert res.version == 2
+
+    response = await async_client.put(
+        PREFIX + f"books/{book.id}", headers={**headers, "If-Match": "*"}, json=new_book_data
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] == '"3"'
+
+
+# Тест на частичное обновление книги: непереданные поля не меняются
+@pytest.mark.asyncio
+async def test_patch_book(db_session, async_client, get_new_seller):
+    seller = get_new_seller
+    access_token = await authenticate_user(async_client, seller.email, SELLER_1_EXAMPLE_PASSWORD)
+    headers = {"Authorization": f"Bearer {access_token}"}
+
+    book = await add_book_for_seller(db_session=db_session, sellerID=seller.id)
+
+    response = await async_client.patch(PREFIX + f"books/{book.id}", headers=headers, json={"pages": 500})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] == '"2"'
+    assert response.json() == {
+        "title": book.title,
+        "author": book.author,
+        "year": book.year,
+        "id": book.id,
+        "count_pages": 500,
+        "seller_id": seller.id,
+    }
+
+    res = await db_session.get(books.Book, book.id)
+    assert res.count_pages == 500
+    assert res.year == BookExample().year
+
+    response = await async_client.patch(PREFIX + f"books/{book.id + 1}", headers=headers, json={"pages": 1})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,61 @@
+import pytest
+from fastapi import status
+
+from src.tests.constants import PREFIX, SELLER_1_EXAMPLE_PASSWORD
+from src.tests.models import BookExample
+from src.utils.auth import authenticate_user
+
+from .fixtures import get_new_seller
+
+
+# Тест на запись событий в outbox при изменениях книг и продавцов
+@pytest.mark.asyncio
+async def test_changes_feed(db_session, async_client, get_new_seller):
+    seller = get_new_seller
+    access_token = await authenticate_user(async_client, seller.email, SELLER_1_EXAMPLE_PASSWORD)
+
+    response = await async_client.post(
+        PREFIX + "books/",
+        headers={"Authorization": f"Bearer {access_token}"},
+        json=BookExample(seller_id=seller.id).to_dict(),
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    book = response.json()
+
+    response = await async_client.put(
+        PREFIX + f"seller/{seller.id}", json={"first_name": "Seller_new", "last_name": "Seller_new"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    response = await async_client.delete(PREFIX + f"seller/{seller.id}")
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    response = await async_client.get(PREFIX + "changes")
+
+    assert response.status_code == status.HTTP_200_OK
+    events = response.json()["events"]
+    assert [(item["entity"], item["op"], item["entity_id"]) for item in events] == [
+        ("book", "created", book["id"]),
+        ("seller", "updated", seller.id),
+        ("book", "deleted", book["id"]),
+        ("seller", "deleted", seller.id),
+    ]
+    assert events[0]["payload"] == book
+    assert "password" not in events[1]["payload"]
+    assert response.json()["last_seq"] == events[-1]["seq"]
+
+    # Чтение с середины ленты по номеру последнего полученного события
+    response = await async_client.get(PREFIX + "changes", params={"since": events[1]["seq"], "limit": 1})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [item["seq"] for item in response.json()["events"]] == [events[2]["seq"]]
+    assert response.json()["last_seq"] == events[2]["seq"]
+
+
+# Тест на long-poll без новых событий
+@pytest.mark.asyncio
+async def test_changes_long_poll_timeout(async_client):
+    response = await async_client.get(PREFIX + "changes", params={"since": 100, "wait": 0.1})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"events": [], "last_seq": 100}
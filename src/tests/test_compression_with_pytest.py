@@ -0,0 +1,130 @@
+import gzip
+import sys
+
+import anyio.to_thread
+import orjson
+import pytest
+from fastapi import FastAPI, Response, status
+from httpx import AsyncClient
+
+from src.models import books
+from src.tests.constants import PREFIX
+from src.tests.models import BookExample
+from src.utils import compression
+from src.utils.compression import CompressionMiddleware, choose_encoding, compressed_cache, compressors
+
+from .fixtures import get_new_seller
+
+
+async def add_many_books_for_seller(db_session, sellerID, count=50):
+    db_session.add_all([books.Book(**BookExample(seller_id=sellerID).to_dict()) for _ in range(count)])
+    await db_session.flush()
+
+
+# Тест на выбор кодировки по Accept-Encoding
+def test_choose_encoding():
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("gzip;q=0.5, deflate") == "gzip"
+    assert choose_encoding("deflate, identity") is None
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding("*") == next(iter(compressors))
+
+
+# Тест на сжатие большого списка книг и повторное использование сжатого тела
+@pytest.mark.asyncio
+async def test_gzip_books_list(db_session, async_client, get_new_seller):
+    await add_many_books_for_seller(db_session, get_new_seller.id)
+    hits = compressed_cache.hits
+
+    for _ in range(2):
+        response = await async_client.get(PREFIX + "books/", headers={"Accept-Encoding": "gzip"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert len(response.json()["books"]) == 50
+
+    assert compressed_cache.hits == hits + 1
+
+    response = await async_client.get(PREFIX + "books/", headers={"Accept-Encoding": "identity"})
+
+    assert "content-encoding" not in response.headers
+    assert len(gzip.compress(response.content)) < len(response.content)
+
+
+# Тест на то, что маленькие ответы не сжимаются
+@pytest.mark.asyncio
+async def test_small_response_not_compressed(db_session, async_client, get_new_seller):
+    await add_many_books_for_seller(db_session, get_new_seller.id, count=1)
+
+    response = await async_client.get(PREFIX + "books/", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert "content-encoding" not in response.headers
+
+
+# Тест на выдачу ответа в MessagePack
+@pytest.mark.asyncio
+async def test_msgpack_books_list(db_session, async_client, get_new_seller):
+    msgpack = pytest.importorskip("msgpack")
+    await add_many_books_for_seller(db_session, get_new_seller.id, count=2)
+
+    response = await async_client.get(
+        PREFIX + "books/", headers={"Accept": "application/msgpack", "Accept-Encoding": "identity"}
+    )
+    json_response = await async_client.get(PREFIX + "books/", headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content) == orjson.loads(json_response.content)
+
+
+# Тест на заголовки Vary у ответов, которые не сжимались и не перекодировались
+@pytest.mark.asyncio
+async def test_vary_on_untransformed_response(db_session, async_client, get_new_seller):
+    await add_many_books_for_seller(db_session, get_new_seller.id, count=1)
+
+    for accept_encoding in ("identity", "gzip"):
+        response = await async_client.get(PREFIX + "books/", headers={"Accept-Encoding": accept_encoding})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert "content-encoding" not in response.headers
+        assert "Accept-Encoding" in response.headers["vary"]
+        if "msgpack" in sys.modules:
+            assert "Accept" in [value.strip() for value in response.headers["vary"].split(",")]
+
+
+# Тест: большие тела сжимаются и перекодируются в пуле потоков, к ETag добавляется суффикс представления
+@pytest.mark.asyncio
+async def test_large_body_encoded_in_thread(monkeypatch):
+    msgpack = pytest.importorskip("msgpack")
+    content = {"books": [{"id": i, "title": f"Book {i}"} for i in range(2000)]}
+    app = FastAPI()
+
+    @app.get("/books")
+    async def get_books():
+        return Response(orjson.dumps(content), media_type="application/json", headers={"ETag": '"3"'})
+
+    app.add_middleware(CompressionMiddleware, minimum_size=1024, thread_min_size=16 * 1024)
+    offloaded = []
+    run_sync = anyio.to_thread.run_sync
+
+    async def counting_run_sync(func, *args, **kwargs):
+        offloaded.append(func.__name__)
+        return await run_sync(func, *args, **kwargs)
+
+    monkeypatch.setattr(compression.anyio.to_thread, "run_sync", counting_run_sync)
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/books", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["etag"] == '"3-gzip"'
+        assert response.json() == content
+
+        response = await client.get("/books", headers={"Accept": "application/msgpack", "Accept-Encoding": "gzip"})
+        assert response.headers["etag"] == '"3-msgpack-gzip"'
+        assert msgpack.unpackb(response.content) == content
+
+        response = await client.get("/books", headers={"Accept-Encoding": "identity"})
+        assert response.headers["etag"] == '"3"'
+
+    assert offloaded == ["_encode", "_encode"]
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, status
+from httpx import AsyncClient
+
+from src.utils.concurrency import AdaptiveLimiter, ConcurrencyLimitMiddleware, LimitExceeded, route_class
+
+
+def make_limiter(**kwargs) -> AdaptiveLimiter:
+    options = {"initial_limit": 2, "max_limit": 10, "max_queue": 1, "queue_timeout": 1.0}
+    options.update(kwargs)
+    return AdaptiveLimiter("test", **options)
+
+
+# Тест: сверх лимита запрос ждет в очереди, при полной очереди - сразу LimitExceeded
+@pytest.mark.asyncio
+async def test_limiter_queues_and_rejects():
+    limiter = make_limiter()
+    await limiter.acquire()
+    await limiter.acquire()
+
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.queue_size == 1
+    with pytest.raises(LimitExceeded) as exc_info:
+        await limiter.acquire()
+    assert exc_info.value.retry_after >= 1
+
+    limiter.release(0.01)
+    await waiter
+    assert limiter.in_flight == 2
+    stats = limiter.stats()
+    assert stats["accepted"] == 3
+    assert stats["queued"] == 1
+    assert stats["rejected"] == 1
+    assert stats["queue_size"] == 0
+
+
+# Тест: ожидание в очереди ограничено queue_timeout, ушедший из очереди клиент не занимает место
+@pytest.mark.asyncio
+async def test_limiter_queue_timeout_and_cancellation():
+    limiter = make_limiter(initial_limit=1, max_queue=2, queue_timeout=0.05)
+    await limiter.acquire()
+    with pytest.raises(LimitExceeded):
+        await limiter.acquire()
+    assert limiter.stats()["queue_timeouts"] == 1
+
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    limiter.release(None)
+    assert limiter.in_flight == 0
+    assert limiter.queue_size == 0
+    await limiter.acquire()
+    assert limiter.in_flight == 1
+
+
+# Тест: gradient снижает лимит при росте задержки и поднимает его, пока задержка стабильна
+@pytest.mark.asyncio
+async def test_gradient_limit_follows_latency():
+    limiter = make_limiter(initial_limit=10, max_limit=100, long_window=100)
+    for _ in range(50):
+        limiter.in_flight = 10
+        limiter.release(0.01)
+    grown = limiter.current_limit
+    assert grown > 10
+
+    for _ in range(10):
+        limiter.in_flight = grown
+        limiter.release(0.1)
+    assert limiter.current_limit < grown
+
+
+# Тест: aimd прибавляет по единице при успехах и уменьшает лимит на ошибках
+@pytest.mark.asyncio
+async def test_aimd_limit():
+    limiter = make_limiter(initial_limit=4, algorithm="aimd", aimd_backoff=0.5)
+    for _ in range(3):
+        limiter.in_flight = limiter.current_limit
+        limiter.release(0.01)
+    assert limiter.current_limit == 7
+    limiter.in_flight = 1
+    limiter.release(0.01, dropped=True)
+    assert limiter.current_limit == 3
+    assert limiter.stats()["drops"] == 1
+
+
+# Тест: классы ручек и 503 с Retry-After от middleware при переполнении
+@pytest.mark.asyncio
+async def test_middleware_rejects_with_retry_after():
+    assert route_class("POST", "/api/v1/token") == "auth"
+    assert route_class("GET", "/api/v1/books/1") == "read"
+    assert route_class("PATCH", "/api/v1/books/1") == "write"
+
+    release = asyncio.Event()
+    app = FastAPI()
+
+    @app.get("/api/v1/slow")
+    async def slow():
+        await release.wait()
+        return {"ok": True}
+
+    limiters = {name: make_limiter(initial_limit=1, max_queue=0) for name in ("auth", "read", "write")}
+    app.add_middleware(ConcurrencyLimitMiddleware, limiters=limiters)
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        first = asyncio.create_task(client.get("/api/v1/slow"))
+        while limiters["read"].in_flight == 0:
+            await asyncio.sleep(0.01)
+        response = await client.get("/api/v1/slow")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert int(response.headers["retry-after"]) >= 1
+        release.set()
+        assert (await first).status_code == status.HTTP_200_OK
+
+    assert limiters["read"].stats()["rejected"] == 1
+    assert limiters["read"].in_flight == 0
+    assert limiters["write"].stats()["accepted"] == 0
@@ -0,0 +1,80 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.configurations.database import request_session
+from src.models.base import BaseModel
+from src.models.sellers import Seller
+from src.utils.access_log import RequestLogContext, current_log_context
+from src.utils.db_metrics import DBMetrics, TimedAsyncAdaptedQueuePool, instrument_engine
+
+
+# Отдельный движок на файле SQLite: тесту нужны настоящие commit'ы и пул соединений,
+# а общий тестовый движок работает внутри откатываемой транзакции.
+@pytest_asyncio.fixture(scope="function")
+async def lifecycle_engine(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/lifecycle.db", poolclass=TimedAsyncAdaptedQueuePool)
+    instrument_engine(engine)
+    async with engine.begin() as connection:
+        await connection.run_sync(BaseModel.metadata.create_all)
+
+    # Свои счетчики на тест, чтобы не зависеть от остальных тестов
+    metrics = DBMetrics()
+    monkeypatch.setattr("src.utils.db_metrics.db_metrics", metrics)
+    monkeypatch.setattr("src.configurations.database.db_metrics", metrics)
+    yield engine, metrics
+    await engine.dispose()
+
+
+# Тест: читающий запрос выполняется в autocommit без commit и за одно обращение к базе
+@pytest.mark.asyncio
+async def test_read_request_skips_commit(lifecycle_engine):
+    engine, metrics = lifecycle_engine
+    read_factory = async_sessionmaker(engine.execution_options(isolation_level="AUTOCOMMIT"))
+
+    async with request_session(read_factory, "read") as session:
+        # Соединение берется лениво, до первого запроса пул не трогаем
+        assert metrics.checkouts == 0
+        await session.execute(select(func.count(Seller.id)))
+
+    assert metrics.requests["read"] == 1
+    assert metrics.round_trips["read"] == 1
+    assert metrics.commits == 0
+    assert metrics.commits_skipped == 1
+    assert metrics.checkouts == 1
+
+
+# Тест: пишущий запрос фиксируется, а запрос без изменений обходится без commit
+@pytest.mark.asyncio
+async def test_write_request_commits_only_with_changes(lifecycle_engine):
+    engine, metrics = lifecycle_engine
+    session_factory = async_sessionmaker(engine)
+
+    async with request_session(session_factory, "write") as session:
+        session.add(Seller(first_name="Seller", last_name="Seller", email="seller@seller.seller", password="x"))
+
+    async with request_session(session_factory, "write") as session:
+        res = await session.execute(select(Seller))
+        assert len(res.scalars().all()) == 1
+
+    assert metrics.requests["write"] == 2
+    assert metrics.commits == 1
+    assert metrics.commits_skipped == 1
+
+
+# Тест: время и число запросов к базе попадают в запись журнала запросов
+@pytest.mark.asyncio
+async def test_request_db_time_in_access_log(lifecycle_engine):
+    engine, metrics = lifecycle_engine
+    read_factory = async_sessionmaker(engine.execution_options(isolation_level="AUTOCOMMIT"))
+    context = RequestLogContext()
+    token = current_log_context.set(context)
+    try:
+        async with request_session(read_factory, "read") as session:
+            await session.execute(select(func.count(Seller.id)))
+    finally:
+        current_log_context.reset(token)
+
+    assert context.db_queries == 1
+    assert context.db_time > 0
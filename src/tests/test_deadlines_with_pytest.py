@@ -0,0 +1,185 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, Request, status
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.configurations.database import DEADLINE_KEY, request_session
+from src.utils import deadlines
+from src.utils.deadlines import DeadlineMetrics, DeadlineMiddleware, current_deadline, statement_timeout_sql
+
+
+@pytest.fixture(scope="function")
+def metrics(monkeypatch):
+    metrics = DeadlineMetrics()
+    monkeypatch.setattr(deadlines, "deadline_metrics", metrics)
+    return metrics
+
+
+def make_app(cancelled: list, **options) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow(seconds: float = 1.0):
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return {"deadline": current_deadline.get() is not None}
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        chunks = []
+        async for chunk in request.stream():
+            chunks.append(chunk)
+            request.app.state.chunk_read.set()
+        return {"chunks": [chunk.decode() for chunk in chunks if chunk]}
+
+    app.add_middleware(DeadlineMiddleware, **options)
+    return app
+
+
+def make_scope(method: str, path: str, query_string: bytes = b"", headers: list = ()) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string,
+        "root_path": "",
+        "headers": [(b"host", b"test"), *headers],
+        "server": ("test", 80),
+        "client": ("test", 1234),
+    }
+
+
+# Тест: ручка, не успевшая к дедлайну, отменяется, клиент получает 504
+@pytest.mark.asyncio
+async def test_deadline_exceeded(metrics):
+    cancelled = []
+    app = make_app(cancelled, default=0.05, routes={})
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/slow")
+        assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+
+        response = await client.get("/slow", params={"seconds": 0})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"deadline": True}
+
+    assert cancelled == [True]
+    assert metrics.stats()["deadline_exceeded"] == 1
+    assert metrics.stats()["cancelled_work_seconds"] >= 0.05
+
+
+# Тест: дедлайн ручки из настроек, заголовок может его сократить, но не продлить; 0 - без дедлайна
+@pytest.mark.asyncio
+async def test_route_and_header_deadlines(metrics):
+    cancelled = []
+    app = make_app(cancelled, default=0, routes={"GET /slow": 0.2}, header="X-Request-Timeout")
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/slow", params={"seconds": 0.1})
+        assert response.status_code == status.HTTP_200_OK
+
+        response = await client.get("/slow", params={"seconds": 0.1}, headers={"X-Request-Timeout": "0.02"})
+        assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+
+        response = await client.get("/slow", params={"seconds": 0.5}, headers={"X-Request-Timeout": "10"})
+        assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+
+    app = make_app(cancelled, default=0, routes={"GET /slow": 0})
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/slow", params={"seconds": 0.05}, headers={"X-Request-Timeout": "0.01"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {"deadline": False}
+
+    assert metrics.stats()["deadline_exceeded"] == 2
+    assert metrics.stats()["from_header"] == 2
+
+
+# Тест: отключение клиента отменяет ручку, ответ не отправляется
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_handler(metrics):
+    cancelled = []
+    app = make_app(cancelled, default=5, routes={})
+    disconnect = asyncio.Event()
+    sent = []
+
+    async def receive():
+        if not sent:
+            sent.append("request")
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message["type"])
+
+    call = asyncio.create_task(app(make_scope("GET", "/slow", b"seconds=5"), receive, send))
+    await asyncio.sleep(0.05)
+    disconnect.set()
+    await asyncio.wait_for(call, 1)
+
+    assert cancelled == [True]
+    assert sent == ["request"]
+    assert metrics.stats()["client_disconnects"] == 1
+
+
+# Тест: тело запроса не буферизуется - ручка получает первый кусок раньше, чем клиент пришлет второй,
+# а отключение клиента отслеживается только после последнего куска
+@pytest.mark.asyncio
+async def test_request_body_is_streamed(metrics):
+    app = make_app([], default=5, routes={})
+    app.state.chunk_read = asyncio.Event()
+    disconnect = asyncio.Event()
+    received = []
+    sent = []
+
+    async def receive():
+        if not received:
+            received.append("first")
+            return {"type": "http.request", "body": b"first", "more_body": True}
+        if len(received) == 1:
+            # Второй кусок приходит только после того, как ручка прочитала первый
+            await app.state.chunk_read.wait()
+            received.append("second")
+            return {"type": "http.request", "body": b"second", "more_body": False}
+        received.append("watch")
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    headers = [(b"transfer-encoding", b"chunked")]
+    await asyncio.wait_for(app(make_scope("POST", "/upload", headers=headers), receive, send), 1)
+
+    assert sent[0]["status"] == status.HTTP_200_OK
+    assert sent[1]["body"] == b'{"chunks":["first","second"]}'
+    assert received[:2] == ["first", "second"]
+    assert metrics.stats()["client_disconnects"] == 0
+
+
+# Тест: остаток дедлайна попадает в сессию запроса и в команды statement_timeout
+@pytest.mark.asyncio
+async def test_statement_timeout(db_session):
+    assert statement_timeout_sql(1500, False, None) == ["SET LOCAL statement_timeout = 1500"]
+    assert statement_timeout_sql(None, False, None) == []
+    assert statement_timeout_sql(None, False, 1500) == ["SET LOCAL statement_timeout = DEFAULT"]
+    assert statement_timeout_sql(1500, True, None) == ["SET statement_timeout = 1500"]
+    assert statement_timeout_sql(None, True, 1500) == ["RESET statement_timeout"]
+    assert statement_timeout_sql(None, True, None) == []
+
+    def session_factory():
+        return AsyncSession(bind=db_session.bind, join_transaction_mode="create_savepoint")
+
+    token = current_deadline.set(123.0)
+    try:
+        async with request_session(session_factory, "read") as session:
+            assert session.info[DEADLINE_KEY] == 123.0
+    finally:
+        current_deadline.reset(token)
@@ -0,0 +1,133 @@
+import csv
+import gzip
+import io
+
+import orjson
+import pytest
+from fastapi import status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.configurations.settings import settings
+from src.models import books, sellers
+from src.service import export
+from src.service.changes import ChangeService
+from src.service.export import _merge_by_id
+from src.utils.snapshots import snapshot_store
+
+
+# Выгрузка открывает свою сессию через фабрику - подменяем ее сессией на соединении теста
+@pytest.fixture(scope="function")
+def export_session(db_session, monkeypatch):
+    def factory():
+        return lambda: AsyncSession(bind=db_session.bind, join_transaction_mode="create_savepoint")
+
+    monkeypatch.setattr(export, "get_session_factory", factory)
+    monkeypatch.setattr(settings, "export_batch_size", 2)
+
+
+async def create_books(db_session, count: int) -> list:
+    seller = sellers.Seller(first_name="Seller", last_name="Seller", email="seller@export.com", password="password")
+    db_session.add(seller)
+    await db_session.flush()
+    new_books = [
+        books.Book(author="Author", title=f"Book {i}", year=2000 + i, count_pages=100 + i, seller_id=seller.id)
+        for i in range(count)
+    ]
+    db_session.add_all(new_books)
+    await db_session.flush()
+    return [book.id for book in new_books]
+
+
+# Тест: NDJSON - по строке на книгу по возрастанию ИД, выгрузку можно продолжить с after_id
+@pytest.mark.asyncio
+async def test_export_ndjson_with_resume(db_session, async_client, export_session):
+    book_ids = await create_books(db_session, 5)
+
+    response = await async_client.get("/api/v1/books/export")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert 'filename="books_0_end.ndjson"' in response.headers["content-disposition"]
+    rows = [orjson.loads(line) for line in response.content.splitlines()]
+    assert [row["id"] for row in rows] == book_ids
+    assert rows[0] == {
+        "seller_id": rows[0]["seller_id"],
+        "title": "Book 0",
+        "author": "Author",
+        "year": 2000,
+        "id": book_ids[0],
+        "count_pages": 100,
+    }
+
+    response = await async_client.get(f"/api/v1/books/export?after_id={book_ids[1]}&to_id={book_ids[3]}")
+    assert [orjson.loads(line)["id"] for line in response.content.splitlines()] == book_ids[2:4]
+
+
+# Тест: CSV со сжатием gzip - один корректный gzip-поток с заголовком колонок
+@pytest.mark.asyncio
+async def test_export_csv_gzip(db_session, async_client, export_session):
+    book_ids = await create_books(db_session, 3)
+
+    response = await async_client.get("/api/v1/books/export?format=csv&compression=gzip")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/gzip"
+    assert 'filename="books_0_end.csv.gz"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.content).decode())))
+    assert [int(row["id"]) for row in rows] == book_ids
+    assert rows[2]["title"] == "Book 2"
+
+    response = await async_client.get("/api/v1/books/export?format=xml")
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+# Тест: готовая выгрузка отдается из снимка на диске, пока каталог не изменился
+@pytest.mark.asyncio
+async def test_export_snapshot(db_session, async_client, export_session, monkeypatch, tmp_path):
+    monkeypatch.setattr(snapshot_store, "directory", str(tmp_path))
+    monkeypatch.setattr(snapshot_store, "_mapped", {})
+    book_ids = await create_books(db_session, 3)
+    seller_id = (await db_session.get(books.Book, book_ids[0])).seller_id
+    hits = snapshot_store.hits
+
+    first = await async_client.get("/api/v1/books/export")
+    second = await async_client.get("/api/v1/books/export")
+    assert second.content == first.content
+    assert second.headers["content-length"] == str(len(first.content))
+    assert snapshot_store.hits == hits + 1
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # Новая книга меняет версию каталога - снимок строится заново
+    new_book = books.Book(author="Author", title="New", year=2024, count_pages=1, seller_id=seller_id)
+    db_session.add(new_book)
+    await db_session.flush()
+    ChangeService.record("book", "create", new_book.id, None, db_session)
+    await db_session.flush()
+    third = await async_client.get("/api/v1/books/export")
+    assert len(third.content.splitlines()) == 4
+    assert snapshot_store.hits == hits + 1
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+class FakeResult:
+    def __init__(self, ids):
+        self.ids = ids
+
+    async def partitions(self, size):
+        for start in range(0, len(self.ids), size):
+            yield [FakeRow(i) for i in self.ids[start : start + size]]  # noqa: E203
+
+
+class FakeRow:
+    def __init__(self, i):
+        self.i = i
+
+    def _asdict(self):
+        return {"id": self.i}
+
+
+# Тест: потоки шардов сливаются в один упорядоченный по ИД поток пачек заданного размера
+@pytest.mark.asyncio
+async def test_merge_by_id():
+    results = [FakeResult([1, 4, 5, 9]), FakeResult([]), FakeResult([2, 3, 10]), FakeResult([6, 7, 8])]
+    batches = [batch async for batch in _merge_by_id(results, 3)]
+    assert [len(batch) for batch in batches] == [3, 3, 3, 1]
+    assert [row["id"] for batch in batches for row in batch] == list(range(1, 11))
@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import status
+from sqlalchemy import select
+
+from src.configurations.settings import settings
+from src.models.jobs import Job, JobStatus, utcnow
+from src.service.jobs import JobKind, JobService
+from src.tests.constants import PREFIX, SELLER_1_EXAMPLE
+from src.utils.job_queue import JobWorker, job_handler
+
+FAILING_JOB_KIND = "test_failing"
+
+
+@job_handler(FAILING_JOB_KIND)
+async def failing_handler(payload, session):
+    raise RuntimeError("boom")
+
+
+# Тест на постановку письма в очередь при создании продавца
+@pytest.mark.asyncio
+async def test_create_seller_enqueues_email(db_session, async_client):
+    response = await async_client.post(PREFIX + "seller/", json=SELLER_1_EXAMPLE)
+
+    assert response.status_code == status.HTTP_201_CREATED
+
+    res = await db_session.execute(select(Job))
+    jobs = res.scalars().all()
+    assert len(jobs) == 1
+    assert jobs[0].kind == JobKind.EMAIL
+    assert jobs[0].payload == {"to": SELLER_1_EXAMPLE["email"], "template": "welcome"}
+    assert jobs[0].status == JobStatus.PENDING
+
+
+# Тест на ручку просмотра состояния очереди: доступна только с токеном оператора
+@pytest.mark.asyncio
+async def test_get_jobs(db_session, async_client, monkeypatch):
+    job = JobService.enqueue(JobKind.EMAIL, {"to": "a@a.a", "template": "welcome"}, db_session)
+    await db_session.flush()
+
+    response = await async_client.get("/internal/jobs/")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    monkeypatch.setattr(settings, "internal_token", "test-internal-token")
+    response = await async_client.get("/internal/jobs/")
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+    response = await async_client.get("/internal/jobs/", headers={settings.internal_token_header: "wrong"})
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    headers = {settings.internal_token_header: "test-internal-token"}
+    response = await async_client.get("/internal/jobs/", headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["stats"] == {JobStatus.PENDING: 1}
+    assert [item["id"] for item in response.json()["jobs"]] == [job.id]
+
+    response = await async_client.get(f"/internal/jobs/{job.id}", headers=headers)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["kind"] == JobKind.EMAIL
+
+
+# Тест на успешное выполнение задачи воркером
+@pytest.mark.asyncio
+async def test_worker_runs_job(db_session):
+    job = JobService.enqueue(JobKind.EMAIL, {"to": "a@a.a", "template": "welcome"}, db_session)
+    delayed_job = JobService.enqueue(JobKind.EMAIL, {}, db_session, delay=timedelta(hours=1))
+    await db_session.flush()
+
+    processed = await JobWorker.process_batch(db_session, batch_size=10)
+
+    assert processed == 1
+    assert job.status == JobStatus.DONE
+    assert job.attempts == 1
+    assert delayed_job.status == JobStatus.PENDING
+
+
+# Тест на повторные попытки с задержкой и перевод задачи в failed
+@pytest.mark.asyncio
+async def test_worker_retries_failed_job(db_session):
+    job = JobService.enqueue(FAILING_JOB_KIND, {}, db_session, max_attempts=2)
+    await db_session.flush()
+
+    assert await JobWorker.process_batch(db_session, batch_size=10) == 1
+    assert job.status == JobStatus.PENDING
+    assert job.attempts == 1
+    assert "boom" in job.last_error
+    assert job.run_at.replace(tzinfo=None) > utcnow().replace(tzinfo=None)
+
+    # Задача отложена, поэтому сейчас воркер её не берёт
+    assert await JobWorker.process_batch(db_session, batch_size=10) == 0
+
+    job.run_at = utcnow()
+    await db_session.flush()
+
+    assert await JobWorker.process_batch(db_session, batch_size=10) == 1
+    assert job.status == JobStatus.FAILED
+    assert job.attempts == 2
@@ -0,0 +1,118 @@
+import pytest
+import pytest_asyncio
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.configurations.migrations import (
+    BASELINE_REVISION,
+    alembic_config,
+    head_revision,
+    lock_report,
+    prepare_database,
+)
+from src.configurations.settings import settings
+from src.models.base import BaseModel
+
+NEW_INDEXES = ("ix_books_table_seller_id", "ix_books_table_year")
+
+
+# Отдельная база в файле: миграции фиксируют свои транзакции
+@pytest_asyncio.fixture(scope="function")
+async def migrations_engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/migrations.db")
+    yield engine
+    await engine.dispose()
+
+
+def connection_config(sync_conn):
+    config = alembic_config()
+    config.attributes["connection"] = sync_conn
+    return config
+
+
+async def schema_state(engine) -> tuple:
+    def _state(sync_conn):
+        revision = MigrationContext.configure(sync_conn).get_current_revision()
+        diff = compare_metadata(MigrationContext.configure(sync_conn), BaseModel.metadata)
+        indexes = {index["name"] for index in inspect(sync_conn).get_indexes("books_table")}
+        return revision, diff, indexes
+
+    async with engine.connect() as conn:
+        return await conn.run_sync(_state)
+
+
+# Тест: миграции с нуля строят ту же схему, что и модели
+@pytest.mark.asyncio
+async def test_migrations_match_models(migrations_engine, monkeypatch):
+    monkeypatch.setattr(settings, "db_create_on_startup", False)
+
+    assert await prepare_database(migrations_engine) == "upgraded"
+    revision, diff, indexes = await schema_state(migrations_engine)
+    assert revision == head_revision()
+    assert diff == []
+    assert set(NEW_INDEXES) <= indexes
+
+    assert await prepare_database(migrations_engine) == "up to date"
+
+
+# Тест: пустая база создается через create_all и сразу помечается последней ревизией
+@pytest.mark.asyncio
+async def test_fresh_database_is_created_and_stamped(migrations_engine):
+    assert await prepare_database(migrations_engine) == "created"
+    revision, diff, _ = await schema_state(migrations_engine)
+    assert revision == head_revision()
+    assert diff == []
+
+
+# Тест: база, созданная до появления миграций, помечается базовой ревизией и догоняет последнюю
+@pytest.mark.asyncio
+async def test_legacy_database_is_upgraded(migrations_engine, monkeypatch):
+    # Схема базовой ревизии без alembic_version - так выглядят базы, созданные create_all до миграций
+    async with migrations_engine.connect() as conn:
+        await conn.run_sync(lambda sync_conn: command.upgrade(connection_config(sync_conn), BASELINE_REVISION))
+    async with migrations_engine.begin() as conn:
+        await conn.execute(text("DROP TABLE alembic_version"))
+        await conn.execute(
+            text(
+                "INSERT INTO sellers_table (id, first_name, last_name, email, password, version) "
+                "VALUES (1, 'Seller', 'Seller', 'Mixed.Case@Seller.com', 'x', 1)"
+            )
+        )
+
+    # Без разрешения на миграцию при старте приложение не запускается на старой схеме
+    monkeypatch.setattr(settings, "db_migrate_on_startup", False)
+    with pytest.raises(RuntimeError, match=BASELINE_REVISION):
+        await prepare_database(migrations_engine)
+
+    monkeypatch.setattr(settings, "db_migrate_on_startup", True)
+    assert await prepare_database(migrations_engine) == "upgraded"
+    revision, diff, indexes = await schema_state(migrations_engine)
+    assert revision == head_revision()
+    assert diff == []
+    assert set(NEW_INDEXES) <= indexes
+
+    # Нормализованный email заполнен для уже существующих продавцов
+    async with migrations_engine.connect() as conn:
+        email = (await conn.execute(text("SELECT email_normalized FROM sellers_table"))).scalar_one()
+    assert email == "mixed.case@seller.com"
+
+
+# Тест: отчет о блокировках различает конкурентные и блокирующие запись операции
+def test_lock_report():
+    sql = """
+    BEGIN;
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_books_table_seller_id ON books_table (seller_id);
+    CREATE INDEX ix_books_table_year ON books_table (year);
+    ALTER TABLE books_table ADD COLUMN isbn VARCHAR(20);
+    UPDATE alembic_version SET version_num='0002' WHERE alembic_version.version_num = '0001';
+    COMMIT;
+    """
+    report = lock_report(sql)
+    assert [(item["table"], item["lock"], item["blocks"]) for item in report] == [
+        ("books_table", "SHARE UPDATE EXCLUSIVE", "-"),
+        ("books_table", "SHARE", "writes"),
+        ("books_table", "ACCESS EXCLUSIVE", "reads and writes"),
+    ]
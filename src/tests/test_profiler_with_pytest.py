@@ -0,0 +1,76 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import status
+
+from src.configurations.settings import settings
+from src.utils.profiler import profile
+
+from .constants import PREFIX, SELLER_1_EXAMPLE_PASSWORD
+from .fixtures import get_new_seller, internal_headers  # noqa F401
+
+
+def busy_loop(seconds: float) -> None:
+    finished = time.perf_counter() + seconds
+    while time.perf_counter() < finished:
+        pass
+
+
+async def busy_task(seconds: float) -> None:
+    finished = time.perf_counter() + seconds
+    while time.perf_counter() < finished:
+        busy_loop(0.005)
+        await asyncio.sleep(0)
+
+
+# Тест: стеки цикла событий начинаются с задачи asyncio, стеки других потоков - с имени потока
+@pytest.mark.asyncio
+async def test_profile_task_and_thread_attribution():
+    worker = threading.Thread(target=busy_loop, args=(0.5,), name="busy-thread")
+    worker.start()
+    task = asyncio.create_task(busy_task(0.5), name="busy-task")
+    result = await profile(0.4, 0.002)
+    await task
+    worker.join()
+
+    assert result.samples > 10
+    assert result.overhead < 0.2
+    task_stacks = [stack for stack in result.stacks if stack[0] == "task:busy-task"]
+    assert task_stacks
+    assert any(stack[-1].endswith(":busy_loop") for stack in task_stacks)
+    assert any(stack[0] == "thread:busy-thread" and stack[-1].endswith(":busy_loop") for stack in result.stacks)
+
+
+# Тест: ручка профиля доступна только оператору, включается настройкой, укладывается в дедлайн
+# и отдает collapsed stacks
+@pytest.mark.asyncio
+async def test_profile_endpoint(async_client, monkeypatch, get_new_seller, internal_headers):
+    response = await async_client.post(
+        PREFIX + "token", data={"username": get_new_seller.email, "password": SELLER_1_EXAMPLE_PASSWORD}
+    )
+    seller_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = await async_client.get("/internal/profile", params={"seconds": 0.1}, headers=seller_headers)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    response = await async_client.get("/internal/profile", params={"seconds": 0.1}, headers=internal_headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    # Снимки идут по процессорному времени: пока ручка ждет, цикл событий занят работой
+    monkeypatch.setattr(settings, "profiler_enabled", True)
+    response, _ = await asyncio.gather(
+        async_client.get("/internal/profile", params={"seconds": 0.2}, headers=internal_headers), busy_task(0.3)
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/plain")
+    assert int(response.headers["X-Profile-Samples"]) > 0
+    lines = response.text.splitlines()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any(":busy_loop " in line for line in lines)
+
+    # Профиль короче дедлайна запроса на запас для ответа
+    headers = {**internal_headers, settings.request_deadline_header: "1.3"}
+    response = await async_client.get("/internal/profile", params={"seconds": 60}, headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert float(response.headers["X-Profile-Seconds"]) < 0.5
@@ -0,0 +1,128 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, status
+from fastapi.testclient import TestClient
+
+from src.schemas.changes import ReturnedEvent
+from src.service.push import PushService, catalog_broker, publish_events, topics_for_event
+from src.tests.constants import PREFIX
+from src.utils.pubsub import Broker, DropPolicy
+
+
+def make_event(seq, entity="book", entity_id=1, payload=None):
+    return ReturnedEvent(
+        seq=seq, entity=entity, entity_id=entity_id, op="updated", payload=payload, created_at=datetime.now()
+    )
+
+
+# Тест на маршрутизацию событий по темам
+def test_topics_for_event():
+    assert topics_for_event(make_event(1, "book", 5, {"seller_id": 2})) == ["books", "book:5", "seller:2:books"]
+    assert topics_for_event(make_event(2, "seller", 2)) == ["sellers", "seller:2"]
+
+
+# Тест на доставку события подписчикам нужных тем
+@pytest.mark.asyncio
+async def test_publish_events():
+    book_subscription = catalog_broker.subscribe(["book:5"])
+    catalog_subscription = catalog_broker.subscribe(["seller:2:books", "books"])
+    other_subscription = catalog_broker.subscribe(["book:6"])
+
+    publish_events([make_event(1, "book", 5, {"seller_id": 2})])
+
+    assert ReturnedEvent.model_validate_json(await book_subscription.get(timeout=1)).seq == 1
+    # Подписчик двух подходящих тем получает событие один раз
+    assert ReturnedEvent.model_validate_json(await catalog_subscription.get(timeout=1)).seq == 1
+    assert await catalog_subscription.get(timeout=0.01) is None
+    assert await other_subscription.get(timeout=0.01) is None
+
+    for subscription in (book_subscription, catalog_subscription, other_subscription):
+        catalog_broker.unsubscribe(subscription)
+
+
+# Тест на политики переполнения буфера подписки
+@pytest.mark.asyncio
+async def test_drop_policies():
+    broker = Broker(maxsize=2, policy=DropPolicy.DROP_OLDEST)
+    subscription = broker.subscribe(["books"])
+    for message in ("1", "2", "3"):
+        broker.publish(["books"], message)
+    assert [await subscription.get(), await subscription.get()] == ["2", "3"]
+    assert subscription.dropped == 1
+
+    broker = Broker(maxsize=2, policy=DropPolicy.DROP_NEWEST)
+    subscription = broker.subscribe(["books"])
+    for message in ("1", "2", "3"):
+        broker.publish(["books"], message)
+    assert [await subscription.get(), await subscription.get()] == ["1", "2"]
+
+    broker = Broker(maxsize=2, policy=DropPolicy.DISCONNECT)
+    subscription = broker.subscribe(["books"])
+    for message in ("1", "2", "3"):
+        broker.publish(["books"], message)
+    with pytest.raises(ConnectionError):
+        await subscription.get()
+
+    broker.unsubscribe(subscription)
+    assert broker.stats()["subscriptions"] == 0
+
+
+# Тест на отказ в подписке на неизвестную тему
+@pytest.mark.asyncio
+async def test_sse_wrong_topic(async_client):
+    response = await async_client.get(PREFIX + "push/sse", params={"topics": "books,users"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+# Тест на отказ в неизвестной политике переполнения
+def test_unknown_drop_policy():
+    with pytest.raises(ValueError):
+        Broker(maxsize=2, policy="drop_all")
+
+
+# Тест на то, что SSE-поток, который так и не начали читать, не оставляет подписку в брокере
+@pytest.mark.asyncio
+async def test_sse_stream_subscribes_lazily():
+    subscriptions = catalog_broker.stats()["subscriptions"]
+
+    stream = PushService.stream_sse(PushService.check_topics(["books"]))
+    assert catalog_broker.stats()["subscriptions"] == subscriptions
+    await stream.aclose()
+    assert catalog_broker.stats()["subscriptions"] == subscriptions
+
+    stream = PushService.stream_sse(["books"])
+    # Генератор еще не запущен: подписки нет, а значит нет и событий, опубликованных до первого чтения
+    publish_events([make_event(1, "book", 5)])
+    task = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0)
+    catalog_broker.publish(["books"], "message")
+    assert await task == "data: message\n\n"
+    assert catalog_broker.stats()["subscriptions"] == subscriptions + 1
+    await stream.aclose()
+    assert catalog_broker.stats()["subscriptions"] == subscriptions
+
+
+# Тест: невалидный JSON в WebSocket получает ошибку, а соединение продолжает принимать команды;
+# бинарный кадр закрывает соединение с кодом 1003
+def test_websocket_invalid_command():
+    app = FastAPI()
+
+    @app.websocket("/ws")
+    async def websocket_endpoint(websocket: WebSocket):
+        await PushService.serve_websocket(websocket)
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws") as websocket:
+            websocket.send_text("{not json")
+            assert websocket.receive_json() == {"error": "Invalid JSON"}
+
+            websocket.send_json({"action": "subscribe", "topics": ["books"]})
+            assert websocket.receive_json() == {"ack": "subscribe", "topics": ["books"]}
+
+            websocket.send_bytes(b"\x00")
+            with pytest.raises(WebSocketDisconnect) as e:
+                websocket.receive_json()
+            assert e.value.code == status.WS_1003_UNSUPPORTED_DATA
@@ -0,0 +1,78 @@
+import os
+
+import httpx
+import orjson
+import pytest
+from fastapi import status
+
+from src.benchmarks.replay import parse_capture, parse_http_file, prepare_variables, render, replay
+from src.utils.traffic_capture import TrafficCaptureMiddleware, capture_writer
+
+from .constants import PREFIX
+
+TEST_HTTP = os.path.join(os.path.dirname(__file__), "..", "..", "test.http")
+
+
+# Тест: test.http разбирается как в REST Client - переменные файла, имена запросов и тела
+def test_parse_test_http():
+    with open(TEST_HTTP, encoding="utf-8") as file:
+        requests, variables = parse_http_file(file.read())
+
+    assert variables["host"] == "http://localhost:8000"
+    assert {request.name for request in requests if request.name} == {"registered", "login", "created"}
+    create_book = next(request for request in requests if request.name == "created")
+    assert (create_book.method, create_book.url) == ("POST", "{{host}}/api/v1/books/")
+    assert create_book.headers["Authorization"] == "Bearer {{token}}"
+
+    body = orjson.loads(render(create_book.body, {**variables, "seller_id": "7"}, {}))
+    assert body["seller_id"] == 7
+    registered = next(request for request in requests if request.name == "registered")
+    assert render(registered.body, variables, {}) != render(registered.body, variables, {})  # {{$guid}}
+
+
+# Тест: записанный трафик без паролей и токенов воспроизводится с ИД и токеном из подготовки
+@pytest.mark.asyncio
+async def test_capture_and_replay(test_app, async_client, tmp_path, monkeypatch):
+    capture_file = tmp_path / "capture.jsonl"
+    capture_writer.shutdown()
+    monkeypatch.setattr(capture_writer, "enabled", True)
+    monkeypatch.setattr(capture_writer, "path", str(capture_file))
+
+    capturing_app = TrafficCaptureMiddleware(test_app, writer=capture_writer, sample_ratio=1.0)
+    async with httpx.AsyncClient(app=capturing_app, base_url="http://127.0.0.1:8000") as client:
+        seller = {"first_name": "Captured", "last_name": "Seller", "email": "captured@mail.com", "password": "secret1"}
+        seller_id = (await client.post(PREFIX + "seller/", json=seller)).json()["id"]
+        response = await client.post(PREFIX + "token", data={"username": seller["email"], "password": "secret1"})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        book = {"title": "Book", "author": "Author", "year": 2020, "count_pages": 10, "seller_id": seller_id}
+        book_id = (await client.post(PREFIX + "books/", json=book, headers=headers)).json()["id"]
+        await client.get(PREFIX + f"books/{book_id}")
+    capture_writer.shutdown()
+
+    captured = capture_file.read_text()
+    assert "secret1" not in captured
+    assert "Bearer" not in captured
+    assert "captured@mail.com" not in captured
+    assert "Captured" not in captured
+    requests = parse_capture(captured.splitlines())
+    assert [request.url for request in requests] == [
+        "/api/v1/seller/",
+        "/api/v1/token",
+        "/api/v1/books/",
+        "/api/v1/books/{{book_id}}",
+    ]
+    assert requests[2].headers["Authorization"] == "Bearer {{token}}"
+
+    variables = await prepare_variables(async_client, "replay@replay.bench", "password")
+    # Записанная регистрация повторяется: email в ней каждый раз новый ({{$guid}})
+    stats = await replay(async_client, requests, variables, concurrency=2, total=8)
+    assert set(stats) == {
+        "POST /api/v1/seller/",
+        "POST /api/v1/token",
+        "POST /api/v1/books/",
+        "GET /api/v1/books/{book_id}",
+    }
+    assert sum(len(endpoint.latencies) for endpoint in stats.values()) == 8
+    assert set(stats["POST /api/v1/seller/"].statuses) == {status.HTTP_201_CREATED}
+    assert set(stats["POST /api/v1/books/"].statuses) == {status.HTTP_201_CREATED}
+    assert set(stats["GET /api/v1/books/{book_id}"].statuses) == {status.HTTP_200_OK}
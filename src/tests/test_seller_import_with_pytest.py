@@ -0,0 +1,115 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.commands.import_sellers import batched
+from src.models.events import OutboxEvent
+from src.models.sellers import Seller
+from src.schemas import IncomingSeller
+from src.service.seller_import import SellerImportService, is_password_hash, password_hash_error
+from src.utils.auth import get_password_hash, verify_password
+
+LEGACY_HASH = get_password_hash("legacy")
+
+
+def record(i: int, **kw) -> dict:
+    return {
+        "first_name": "Seller",
+        "last_name": "Seller",
+        "email": f"seller{i}@import.com",
+        "password": f"pass{i}",
+    } | kw
+
+
+# Тест: импорт пачками - валидация, пропуск занятых email, перенос готовых хешей, события в ленте
+@pytest.mark.asyncio
+async def test_import_sellers(db_session):
+    db_session.add(Seller(first_name="Old", last_name="Old", email="seller0@import.com", password="x"))
+    await db_session.flush()
+
+    records = [
+        record(0),  # email уже занят
+        record(1),
+        record(2, first_name="S"),  # невалидная запись
+        record(3, password=LEGACY_HASH),
+        record(4),
+        record(4, first_name="Again"),  # повтор внутри пачки
+    ]
+    progress = []
+    report = await SellerImportService.import_sellers(
+        batched(iter(enumerate(records, start=1)), 3),
+        lambda: AsyncSession(bind=db_session.bind, join_transaction_mode="create_savepoint"),
+        progress=lambda report: progress.append(report["imported"]),
+    )
+
+    assert report["read"] == 6
+    assert report["imported"] == 3
+    assert (report["existing"], report["duplicates"]) == (1, 1)
+    assert report["invalid"] == 1
+    assert report["errors"] == ["line 3: ('first_name',) String should have at least 2 characters"]
+    assert (report["hashed"], report["passthrough"]) == (2, 1)
+    assert progress == [1, 3]
+    assert report["rows_per_sec"] > 0
+
+    res = await db_session.execute(select(Seller).where(Seller.email.like("%@import.com")).order_by(Seller.email))
+    sellers = {seller.email: seller for seller in res.scalars().all()}
+    assert list(sellers) == [f"seller{i}@import.com" for i in range(5) if i != 2]
+    assert sellers["seller0@import.com"].first_name == "Old"
+    assert verify_password("pass1", sellers["seller1@import.com"].password)
+    assert sellers["seller3@import.com"].password == LEGACY_HASH
+    assert verify_password("pass4", sellers["seller4@import.com"].password)
+
+    res = await db_session.execute(
+        select(OutboxEvent.entity_id, OutboxEvent.payload).where(OutboxEvent.op == "created")
+    )
+    events = {entity_id: payload for entity_id, payload in res.all()}
+    seller = sellers["seller4@import.com"]
+    assert events[seller.id] == {"id": seller.id, "first_name": "Seller", "last_name": "Seller", "email": seller.email}
+
+
+# Тест: хеш, опознанный только по префиксу, но не разбираемый схемой, не переносится, а попадает в отчет
+def test_validate_rejects_invalid_hash():
+    assert password_hash_error(LEGACY_HASH) is None
+    assert password_hash_error("plain password") is None
+    assert "bcrypt" in password_hash_error("$2b$12$notarealhash")
+
+    report = SellerImportService.new_report()
+    records = [record(1, password="$2b$12$notarealhash"), record(2, password=LEGACY_HASH), record(3)]
+    sellers = SellerImportService.validate(enumerate(records, start=1), report)
+
+    assert [seller.email for seller in sellers] == ["seller2@import.com", "seller3@import.com"]
+    assert (report["read"], report["invalid"]) == (3, 1)
+    assert report["errors"][0].startswith("line 1: ('password',) invalid bcrypt hash: salt too small")
+
+
+# Тест: пароли хешируются в пуле процессов, порядок сохраняется, готовые хеши не трогаются
+@pytest.mark.asyncio
+async def test_hash_batch_in_process_pool():
+    sellers = [IncomingSeller.model_validate(record(i)) for i in range(3)]
+    sellers.append(IncomingSeller.model_validate(record(3, password=LEGACY_HASH)))
+    report = SellerImportService.new_report()
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        hashes = await SellerImportService.hash_batch(sellers, executor, report)
+
+    assert all(is_password_hash(password_hash) for password_hash in hashes)
+    assert [verify_password(f"pass{i}", hashes[i]) for i in range(3)] == [True, True, True]
+    assert hashes[3] == LEGACY_HASH
+    assert (report["hashed"], report["passthrough"]) == (3, 1)
+
+
+# Тест: email, занятый между проверкой и вставкой пачки (регистрация через API), не прерывает импорт
+@pytest.mark.asyncio
+async def test_insert_batch_skips_taken_email(db_session):
+    sellers = [IncomingSeller.model_validate(record(i)) for i in range(3)]
+    db_session.add(Seller(first_name="Race", last_name="Race", email="SELLER1@import.com", password="x"))
+    await db_session.flush()
+
+    report = SellerImportService.new_report()
+    await SellerImportService.insert_batch(sellers, ["x", "y", "z"], db_session, None, False, report)
+    assert (report["imported"], report["existing"]) == (2, 1)
+
+    res = await db_session.execute(select(Seller.first_name).where(Seller.email_normalized == "seller1@import.com"))
+    assert res.scalar_one() == "Race"
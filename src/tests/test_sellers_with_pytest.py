@@ -1,5 +1,5 @@
 import pytest
-from fastapi import status
+from fastapi import HTTPException, status
 from sqlalchemy import select
 
 from src.models import books, sellers
@@ -11,11 +11,11 @@ from src.tests.constants import (
     SELLER_1_EXAMPLE_PASSWORD,
 )
 from src.utils.auth import authenticate_user
+from src.utils.etag import ANY_VERSION, parse_if_match
 
+from .fixtures import get_2_new_sellers, get_new_seller
 from .helpers import add_2_books_for_seller
 
-from .fixtures import get_new_seller, get_2_new_sellers
-
 
 @pytest.mark.asyncio
 async def test_create_seller(async_client):
@@ -190,3 +190,92 @@ async def test_update_seller(db_session, async_client, get_new_seller):
     assert res.email == NEW_SELLER_1_EXAMPLE["email"]
     assert res.password == seller.password
     assert res.id == seller.id
+
+
+@pytest.mark.asyncio
+async def test_update_seller_if_match(db_session, async_client, get_new_seller):
+    seller = get_new_seller
+
+    response = await async_client.put(
+        PREFIX + f"seller/{seller.id}", headers={"If-Match": '"1"'}, json={"first_name": "Updated"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] == '"2"'
+
+    response = await async_client.put(
+        PREFIX + f"seller/{seller.id}", headers={"If-Match": '"1"'}, json={"first_name": "Stale"}
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    response = await async_client.put(
+        PREFIX + f"seller/{seller.id}", headers={"If-Match": 'W/"2"'}, json={"first_name": "Weak"}
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    response = await async_client.patch(
+        PREFIX + f"seller/{seller.id + 1}", headers={"If-Match": "*"}, json={"first_name": "Missing"}
+    )
+    assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    # "0" - не выданная нами версия, а не "любая"; ETag без кавычек не принимается
+    for if_match in ('"0"', "2", '"2', '"-1"'):
+        response = await async_client.patch(
+            PREFIX + f"seller/{seller.id}", headers={"If-Match": if_match}, json={"first_name": "Forged"}
+        )
+        assert response.status_code == status.HTTP_412_PRECONDITION_FAILED
+
+    res = await db_session.get(sellers.Seller, seller.id)
+    assert res.first_name == "Updated"
+
+
+@pytest.mark.asyncio
+async def test_patch_seller(db_session, async_client, get_new_seller):
+    seller = get_new_seller
+
+    response = await async_client.patch(PREFIX + f"seller/{seller.id}", json={"last_name": "Patched"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "first_name": seller.first_name,
+        "last_name": "Patched",
+        "email": seller.email,
+        "id": seller.id,
+    }
+
+    res = await db_session.get(sellers.Seller, seller.id)
+    assert res.last_name == "Patched"
+    assert res.password == seller.password
+
+    response = await async_client.patch(PREFIX + f"seller/{seller.id + 1}", json={"last_name": "Patched"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+# Тест: регистрация с email, уже занятым другим продавцом (без учета регистра), - 409
+@pytest.mark.asyncio
+async def test_create_seller_email_taken(async_client, get_new_seller):
+    response = await async_client.post(
+        PREFIX + "seller/", json=SELLER_1_EXAMPLE | {"email": get_new_seller.email.upper()}
+    )
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+
+# Тест: смена email на занятый другим продавцом - 409
+@pytest.mark.asyncio
+async def test_patch_seller_email_taken(db_session, async_client, get_2_new_sellers):
+    seller_1, seller_2 = get_2_new_sellers
+
+    response = await async_client.patch(PREFIX + f"seller/{seller_2.id}", json={"email": seller_1.email})
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+
+# Тест: разбор If-Match - "*" отличается от любой версии, версия только положительная и в кавычках,
+# суффиксы представления ("3-gzip") не меняют версию
+def test_parse_if_match():
+    assert parse_if_match(None) is None
+    assert parse_if_match(" * ") is ANY_VERSION
+    assert parse_if_match('"12"') == 12
+    # ETag сжатого или перекодированного представления - та же версия
+    assert parse_if_match('"12-msgpack-gzip"') == 12
+    for value in ('"0"', "1", '"1', 'W/"1"', '"01"', '"a"', '"1-deflate"', '"0-gzip"'):
+        with pytest.raises(HTTPException):
+            parse_if_match(value)
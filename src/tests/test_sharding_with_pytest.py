@@ -0,0 +1,290 @@
+from datetime import timedelta
+
+import orjson
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.configurations.sharding import IdGenerator, IdNodeLease, ShardRouter, jump_hash
+from src.models.books import ArchivedBook, Book
+from src.models.events import OutboxEvent
+from src.models.id_nodes import IdNodeLease as IdNodeLeaseModel
+from src.models.jobs import utcnow
+from src.models.sellers import Seller, SellerEmail
+from src.schemas import IncomingBook, IncomingSeller
+from src.schemas.books import PatchedBook
+from src.schemas.sellers import UpdatedSeller
+from src.service.archive import ArchiveService
+from src.service.books import BookService
+from src.service.seller_emails import SellerEmailService
+from src.service.seller_import import SellerImportService
+from src.service.sellers import SellersService
+
+SHARDS_COUNT = 3
+
+
+def make_engine(tmp_path, name):
+    return create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/{name}.db")
+
+
+# Шарды - отдельные файлы SQLite, основная база (outbox, задачи) - еще один файл
+@pytest_asyncio.fixture(scope="function")
+async def shard_router(tmp_path):
+    router = ShardRouter(
+        make_engine(tmp_path, "default"),
+        [make_engine(tmp_path, f"shard_{i}") for i in range(SHARDS_COUNT - 1)],
+        IdGenerator(node=1),
+    )
+    await router.create_tables()
+    yield router
+    await router.dispose()
+    await router.default_engine.dispose()
+
+
+async def count_rows(engine, model) -> int:
+    async with engine.connect() as conn:
+        return (await conn.execute(select(func.count()).select_from(model))).scalar_one()
+
+
+async def create_catalog(router, sellers_count=6, books_per_seller=3) -> list:
+    session_factory = router.session_factory()
+    seller_ids = []
+    async with session_factory() as session:
+        for i in range(sellers_count):
+            seller = await SellersService.create_seller(
+                IncomingSeller(first_name="Seller", last_name="Seller", email=f"seller_{i}@shard.com", password="1234"),
+                session,
+            )
+            seller_ids.append(seller.id)
+            for j in range(books_per_seller):
+                book = IncomingBook(title=f"book {i}-{j}", author="author", year=2000, pages=10, seller_id=seller.id)
+                await BookService.create_book(book, session)
+        await session.commit()
+    return seller_ids
+
+
+def test_jump_hash_moves_only_to_new_shard():
+    for key in range(1000):
+        old, new = jump_hash(key, 4), jump_hash(key, 5)
+        assert new == old or new == 4
+
+
+# Тест: продавец и его книги попадают в один шард, чтения по продавцу идут только в него
+@pytest.mark.asyncio
+async def test_sharded_reads_and_writes(shard_router):
+    seller_ids = await create_catalog(shard_router, sellers_count=4)
+
+    counts = [await count_rows(engine, Book) for engine in shard_router.shard_engines]
+    assert sum(counts) == len(seller_ids) * 3
+
+    session_factory = shard_router.session_factory()
+    async with session_factory() as session:
+        for seller_id in seller_ids:
+            seller = await SellersService.get_seller(seller_id, session)
+            assert {book.title for book in seller.books} == {
+                f"book {seller_ids.index(seller_id)}-{j}" for j in range(3)
+            }
+
+        # Постраничное чтение по ключу собирает страницы всех шардов в общий порядок ИД
+        all_books = (await BookService.get_all_books(session)).books
+        pages, after_id = [], None
+        while True:
+            page = await BookService.get_all_books(session, after_id=after_id, limit=4)
+            if not hasattr(page, "books"):
+                break
+            pages.extend(book.id for book in page.books)
+            after_id = page.books[-1].id
+        assert pages == sorted(book.id for book in all_books)
+
+        # Быстрый путь тоже обходит все шарды
+        raw_page = await BookService.get_all_books_raw(session, limit=4)
+        assert orjson.loads(raw_page.body) == (await BookService.get_all_books(session, limit=4)).model_dump()
+
+        book_id = all_books[0].id
+        assert (await BookService.get_book(book_id, session)).id == book_id
+        patched = await BookService.patch_book(book_id, PatchedBook(pages=99), session)
+        assert patched.count_pages == 99
+
+        assert (await SellersService.delete_seller(seller_ids[0], session)).status_code == 204
+        await session.commit()
+
+    assert sum([await count_rows(engine, Book) for engine in shard_router.shard_engines]) == (len(seller_ids) - 1) * 3
+
+
+# Тест: после добавления шарда перебалансировка переносит продавцов туда, где их ищет новый маршрутизатор
+@pytest.mark.asyncio
+async def test_rebalance_to_new_shard(shard_router, tmp_path):
+    seller_ids = await create_catalog(shard_router, sellers_count=10, books_per_seller=2)
+
+    grown = ShardRouter(
+        shard_router.default_engine,
+        shard_router.shard_engines + [make_engine(tmp_path, f"shard_{SHARDS_COUNT - 1}")],
+        IdGenerator(node=2),
+    )
+    await grown.create_tables()
+
+    report = await grown.rebalance(grown.shard_engines, dry_run=True)
+    assert report["scanned"] == len(seller_ids)
+    assert await count_rows(grown.shard_engines[-1], Seller) == 0
+
+    report = await grown.rebalance(grown.shard_engines)
+    moved = [seller_id for seller_id in seller_ids if grown.shard_for(seller_id) == grown.shard_ids[-1]]
+    assert report["moved_sellers"] == len(moved)
+    assert report["moved_books"] == len(moved) * 2
+    assert await count_rows(grown.shard_engines[-1], Seller) == len(moved)
+
+    # Повторный запуск ничего не переносит, все продавцы находятся через новый маршрутизатор
+    assert (await grown.rebalance(grown.shard_engines))["moved_sellers"] == 0
+    async with grown.session_factory()() as session:
+        for seller_id in seller_ids:
+            seller = await SellersService.get_seller(seller_id, session)
+            assert len(seller.books) == 2
+    await grown.shard_engines[-1].dispose()
+
+
+# Тест: процессы арендуют разные номера узлов, без аренды генератор ИД не выдает
+@pytest.mark.asyncio
+async def test_id_node_leases(shard_router):
+    engine = shard_router.default_engine
+    leases = [IdNodeLease(engine, IdGenerator(), ttl=30) for _ in range(IdGenerator.NODES)]
+    nodes = [await lease.acquire() for lease in leases]
+    assert sorted(nodes) == list(range(IdGenerator.NODES))
+    assert len({lease.generator() >> IdGenerator.SEQUENCE_BITS for lease in leases}) == IdGenerator.NODES
+
+    # Все номера заняты: новому процессу узла не достается
+    extra = IdNodeLease(engine, IdGenerator(), ttl=30)
+    with pytest.raises(RuntimeError):
+        await extra.acquire()
+    with pytest.raises(RuntimeError):
+        extra.generator()
+
+    # Освобожденный номер достается следующему процессу, старый владелец ИД больше не выдает
+    await leases[0].release()
+    with pytest.raises(RuntimeError):
+        leases[0].generator()
+    assert await extra.acquire() == nodes[0]
+
+    # Просроченную аренду забирает другой процесс, а прежний владелец при продлении арендует новый номер
+    async with engine.begin() as conn:
+        await conn.execute(
+            update(IdNodeLeaseModel)
+            .where(IdNodeLeaseModel.node == nodes[1])
+            .values(expires_at=utcnow() - timedelta(seconds=1))
+        )
+    assert await IdNodeLease(engine, IdGenerator(), ttl=30).acquire() == nodes[1]
+    await leases[2].release()
+    await leases[1].renew()
+    assert leases[1].node == nodes[2]
+    leases[1].generator()
+
+
+# Тест: маршрутизатор арендует узел для генератора без явного номера и освобождает его при закрытии
+@pytest.mark.asyncio
+async def test_router_leases_id_node(shard_router):
+    router = ShardRouter(shard_router.default_engine, [], IdGenerator())
+    await router.lease_id_node(ttl=30)
+    node = router.id_lease.node
+    assert (router.next_id() >> IdGenerator.SEQUENCE_BITS) & (IdGenerator.NODES - 1) == node
+
+    await router.dispose()
+    with pytest.raises(RuntimeError):
+        router.next_id()
+    assert await count_rows(shard_router.default_engine, IdNodeLeaseModel) == 0
+
+
+# Тест: справочник в основной базе не дает двум продавцам в разных шардах занять один email
+@pytest.mark.asyncio
+async def test_seller_email_directory(shard_router):
+    seller_ids = await create_catalog(shard_router, sellers_count=4, books_per_seller=0)
+    assert await count_rows(shard_router.default_engine, SellerEmail) == len(seller_ids)
+    session_factory = shard_router.session_factory()
+
+    # Повтор email в другом регистре уходит в другой шард, но справочник его не пропускает
+    async with session_factory() as session:
+        with pytest.raises(HTTPException) as exc:
+            await SellersService.create_seller(
+                IncomingSeller(first_name="Seller", last_name="Seller", email="SELLER_0@shard.com", password="1234"),
+                session,
+            )
+        assert exc.value.status_code == 409
+    assert sum([await count_rows(engine, Seller) for engine in shard_router.shard_engines]) == len(seller_ids)
+
+    async with session_factory() as session:
+        assert (await SellerEmailService.find_seller("seller_2@shard.com", session)).id == seller_ids[2]
+        with pytest.raises(HTTPException) as exc:
+            await SellersService.patch_seller(seller_ids[1], UpdatedSeller(email="seller_2@shard.com"), session)
+        assert exc.value.status_code == 409
+
+    # Смена email освобождает прежний, удаление продавца - текущий
+    async with session_factory() as session:
+        await SellersService.patch_seller(seller_ids[1], UpdatedSeller(email="renamed@shard.com"), session)
+        assert (await SellersService.delete_seller(seller_ids[2], session)).status_code == 204
+        await session.commit()
+    async with shard_router.default_engine.connect() as conn:
+        claims = dict((await conn.execute(select(SellerEmail.email_normalized, SellerEmail.seller_id))).all())
+    assert claims == {
+        "seller_0@shard.com": seller_ids[0],
+        "renamed@shard.com": seller_ids[1],
+        "seller_3@shard.com": seller_ids[3],
+    }
+    async with session_factory() as session:
+        seller = await SellersService.create_seller(
+            IncomingSeller(first_name="Seller", last_name="Seller", email="seller_1@shard.com", password="1234"),
+            session,
+        )
+        await session.commit()
+    async with session_factory() as session:
+        assert (await SellerEmailService.find_seller("seller_1@shard.com", session)).id == seller.id
+
+    # Досоздание справочника для продавцов, созданных до него, сообщает о совпадениях email между шардами
+    async with shard_router.default_engine.begin() as conn:
+        await conn.execute(delete(SellerEmail))
+    other_shard = next(
+        engine
+        for shard_id, engine in zip(shard_router.shard_ids, shard_router.shard_engines)
+        if shard_id != shard_router.shard_for(seller_ids[1])
+    )
+    async with other_shard.begin() as conn:
+        await conn.execute(
+            insert(Seller).values(id=1, first_name="Old", last_name="Old", email="Renamed@shard.com", password="x")
+        )
+    report = await shard_router.sync_email_directory()
+    assert report == {"scanned": 5, "added": 4, "conflicts": 1}
+    assert (await shard_router.sync_email_directory())["added"] == 0
+
+
+# Тест: архивация шарда пишет события удаления книг в outbox основной базы
+@pytest.mark.asyncio
+async def test_archive_shards_records_events(shard_router):
+    await create_catalog(shard_router, sellers_count=3, books_per_seller=2)
+    for engine in shard_router.shard_engines:
+        await ArchiveService.archive_books(engine, before_year=2001, outbox_engine=shard_router.default_engine)
+
+    assert sum([await count_rows(engine, ArchivedBook) for engine in shard_router.shard_engines]) == 6
+    async with shard_router.default_engine.connect() as conn:
+        res = await conn.execute(select(func.count()).where(OutboxEvent.op == "deleted"))
+        assert res.scalar_one() == 6
+
+
+# Тест: импорт при шардировании занимает email в справочнике и пропускает уже занятые
+@pytest.mark.asyncio
+async def test_import_sellers_sharded(shard_router):
+    await create_catalog(shard_router, sellers_count=2, books_per_seller=0)
+    records = [
+        {"first_name": "Seller", "last_name": "Seller", "email": email, "password": "1234"}
+        for email in ("SELLER_0@shard.com", "new_1@shard.com", "new_2@shard.com")
+    ]
+    session_factory = shard_router.session_factory()
+    async with session_factory() as session:
+        sellers = [IncomingSeller.model_validate(record) for record in records]
+        report = SellerImportService.new_report()
+        await SellerImportService.insert_batch(sellers, ["x"] * 3, session, shard_router, False, report)
+        await session.commit()
+    assert (report["imported"], report["existing"]) == (2, 1)
+
+    assert sum([await count_rows(engine, Seller) for engine in shard_router.shard_engines]) == 4
+    assert await count_rows(shard_router.default_engine, SellerEmail) == 4
+    async with session_factory() as session:
+        assert (await SellerEmailService.find_seller("new_2@shard.com", session)).email == "new_2@shard.com"
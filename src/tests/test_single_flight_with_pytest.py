@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+from fastapi import status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.configurations.database import DEADLINE_KEY
+from src.configurations.settings import settings
+from src.models import books, sellers
+from src.service import books as books_service
+from src.utils import single_flight as single_flight_module
+from src.utils.db_metrics import db_metrics
+from src.utils.single_flight import SingleFlight
+
+
+# Тест: одновременные вызовы с одним ключом выполняют загрузку один раз и получают один результат
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight(timeout=1.0)
+    started = asyncio.Event()
+    release = asyncio.Event()
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        started.set()
+        await release.wait()
+        return "result"
+
+    waiters = [asyncio.create_task(flight.do("key", load)) for _ in range(5)]
+    await started.wait()
+    other = asyncio.create_task(flight.do("other", lambda: asyncio.sleep(0, result="other")))
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ["result"] * 5
+    assert await other == "other"
+    assert loads == 1
+    stats = flight.stats()
+    assert stats["requests"] == 6
+    assert stats["executions"] == 2
+    assert stats["coalesced"] == 4
+    assert stats["max_waiters"] == 5
+    assert stats["in_flight"] == 0
+
+    # Это не кэш: после завершения загрузки следующий вызов идет заново
+    release.clear()
+    release.set()
+    assert await flight.do("key", load) == "result"
+    assert loads == 2
+
+
+# Тест: отмена одного ждущего не прерывает загрузку для остальных, отмена всех - прерывает
+@pytest.mark.asyncio
+async def test_single_flight_cancellation():
+    flight = SingleFlight(timeout=1.0)
+    release = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def load():
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "result"
+
+    first = asyncio.create_task(flight.do("key", load))
+    second = asyncio.create_task(flight.do("key", load))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    assert await second == "result"
+    assert first.cancelled()
+    assert not cancelled.is_set()
+
+    release.clear()
+    waiters = [asyncio.create_task(flight.do("key", load)) for _ in range(2)]
+    await asyncio.sleep(0)
+    for waiter in waiters:
+        waiter.cancel()
+    await asyncio.gather(*waiters, return_exceptions=True)
+    await asyncio.wait_for(cancelled.wait(), 1)
+    stats = flight.stats()
+    assert stats["cancelled_waiters"] == 3
+    assert stats["cancelled_calls"] == 1
+    assert stats["in_flight"] == 0
+
+
+# Тест: зависшая загрузка отдает ждущим TimeoutError, а новый вызов запускает ее заново
+@pytest.mark.asyncio
+async def test_single_flight_timeout():
+    flight = SingleFlight(timeout=0.05)
+    loads = 0
+
+    async def load():
+        nonlocal loads
+        loads += 1
+        await asyncio.sleep(10)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.gather(flight.do("key", load), flight.do("key", load))
+    assert loads == 1
+    assert flight.stats()["timeouts"] == 2
+
+    with pytest.raises(asyncio.TimeoutError):
+        await flight.do("key", load)
+    assert loads == 2
+    await asyncio.sleep(0)
+    assert flight.stats()["in_flight"] == 0
+
+
+# Тест: ручка книги через single-flight отдает тот же ответ и ETag, 404 для неизвестной книги;
+# сессия загрузки получает свой дедлайн и попадает в статистику БД, как сессия запроса
+@pytest.mark.asyncio
+async def test_get_book_through_single_flight(db_session, async_client, monkeypatch):
+    # Загрузка открывает свою сессию через фабрику - подменяем ее сессией на соединении теста
+    load_sessions = []
+
+    def session_factory():
+        load_sessions.append(AsyncSession(bind=db_session.bind, join_transaction_mode="create_savepoint"))
+        return load_sessions[-1]
+
+    monkeypatch.setattr(books_service, "get_session_factory", lambda read_only=False: session_factory)
+    read_requests = db_metrics.requests["read"]
+    monkeypatch.setattr(settings, "single_flight_get_book", True)
+    monkeypatch.setattr(single_flight_module, "single_flight", SingleFlight(timeout=5.0))
+
+    seller = sellers.Seller(first_name="Seller", last_name="Seller", email="seller@flight.com", password="password")
+    db_session.add(seller)
+    await db_session.flush()
+    book = books.Book(author="Author", title="Book", year=2020, count_pages=100, seller_id=seller.id)
+    db_session.add(book)
+    await db_session.flush()
+
+    responses = await asyncio.gather(*(async_client.get(f"/api/v1/books/{book.id}") for _ in range(3)))
+    for response in responses:
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {
+            "id": book.id,
+            "title": "Book",
+            "author": "Author",
+            "year": 2020,
+            "count_pages": 100,
+            "seller_id": seller.id,
+        }
+        assert response.headers["etag"] == responses[0].headers["etag"]
+    assert single_flight_module.single_flight.stats()["requests"] == 3
+    executions = single_flight_module.single_flight.stats()["executions"]
+    assert len(load_sessions) == executions
+    assert all(session.info[DEADLINE_KEY] is not None for session in load_sessions)
+    assert db_metrics.requests["read"] == read_requests + executions
+
+    response = await async_client.get(f"/api/v1/books/{book.id + 100}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
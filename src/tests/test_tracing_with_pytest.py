@@ -0,0 +1,108 @@
+import orjson
+import pytest
+from fastapi import status
+
+from src.utils import tracing
+from src.utils.tracing import BatchSpanProcessor, FileSpanExporter, Tracer, instrument_engine_tracing
+
+from .constants import PREFIX, SELLER_1_EXAMPLE_PASSWORD
+from .fixtures import get_new_seller  # noqa F401
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, payload: bytes) -> None:
+        for resource in orjson.loads(payload)["resourceSpans"]:
+            for scope in resource["scopeSpans"]:
+                self.spans.extend(scope["spans"])
+
+
+# Трассировка выключена по умолчанию: включаем ее у общего трассировщика, который импортирован модулями
+def enable_tracing(monkeypatch, exporter, sample_ratio: float = 1.0) -> None:
+    processor = BatchSpanProcessor(exporter, "test", 100, 1000, 60.0)
+    monkeypatch.setattr(tracing.tracer, "enabled", True)
+    monkeypatch.setattr(tracing.tracer, "sample_ratio", sample_ratio)
+    monkeypatch.setattr(tracing.tracer, "processor", processor)
+
+
+@pytest.fixture(scope="function")
+def exporter(db_session, monkeypatch):
+    exporter = ListExporter()
+    enable_tracing(monkeypatch, exporter)
+    instrument_engine_tracing(db_session.bind.engine)
+    yield exporter
+    tracing.tracer.shutdown()
+
+
+# Тест: спаны запроса создания книги - ручка, проверка JWT, метод сервиса и SQL в одной трассе
+@pytest.mark.asyncio
+async def test_request_spans(db_session, async_client, exporter, get_new_seller):
+    response = await async_client.post(
+        PREFIX + "token", data={"username": get_new_seller.email, "password": SELLER_1_EXAMPLE_PASSWORD}
+    )
+    token = response.json()["access_token"]
+    tracing.tracer.shutdown()
+    exporter.spans.clear()
+
+    response = await async_client.post(
+        PREFIX + "books/",
+        json={"title": "Title", "author": "Author", "year": 2020, "count_pages": 100, "seller_id": get_new_seller.id},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    tracing.tracer.shutdown()
+
+    spans = {span["name"]: span for span in exporter.spans}
+    server = spans["POST /api/v1/books/"]
+    assert server["kind"] == 2
+    assert "parentSpanId" not in server
+    assert {"key": "http.status_code", "value": {"intValue": "201"}} in server["attributes"]
+    assert {span["traceId"] for span in exporter.spans} == {server["traceId"]}
+    assert spans["BookService.create_book"]["parentSpanId"] == server["spanId"]
+    assert spans["jwt.decode"]["parentSpanId"] == server["spanId"]
+    queries = [span for span in exporter.spans if span["name"] == "db.query"]
+    assert queries
+    assert all(span["kind"] == 3 for span in queries)
+    assert any(span["parentSpanId"] == spans["BookService.create_book"]["spanId"] for span in queries)
+
+
+# Тест: доля записи 0 - трасса не пишется, но флаг sampled из traceparent вызывающего сервиса сильнее
+@pytest.mark.asyncio
+async def test_sampling_and_traceparent(async_client, monkeypatch):
+    exporter = ListExporter()
+    enable_tracing(monkeypatch, exporter, sample_ratio=0.0)
+    sampled_out = tracing.tracer.sampled_out
+
+    await async_client.get(PREFIX + "books/")
+    trace_id, parent_id = "0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331"
+    await async_client.get(PREFIX + "books/", headers={"traceparent": f"00-{trace_id}-{parent_id}-01"})
+    tracing.tracer.shutdown()
+
+    assert tracing.tracer.stats()["sampled_out_traces"] == sampled_out + 1
+    assert {span["traceId"] for span in exporter.spans} == {trace_id}
+    server = next(span for span in exporter.spans if span["kind"] == 2)
+    assert server["parentSpanId"] == parent_id
+    assert server["name"] == "GET /api/v1/books/"
+
+
+# Тест: файловый экспорт - по строке OTLP JSON на пачку, переполненная очередь отбрасывает спаны
+def test_file_exporter_and_queue_limit(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    processor = BatchSpanProcessor(FileSpanExporter(str(path)), "test", batch_size=2, queue_size=3, interval=60.0)
+    test_tracer = Tracer(True, 1.0, processor)
+    for i in range(5):
+        with test_tracer.span(f"span {i}", index=i):
+            pass
+    test_tracer.shutdown()
+
+    batches = [orjson.loads(line) for line in path.read_bytes().splitlines()]
+    assert len(batches) == 2
+    resource = batches[0]["resourceSpans"][0]["resource"]
+    assert resource["attributes"] == [{"key": "service.name", "value": {"stringValue": "test"}}]
+    names = [span["name"] for batch in batches for span in batch["resourceSpans"][0]["scopeSpans"][0]["spans"]]
+    assert names == ["span 0", "span 1", "span 2"]
+    stats = test_tracer.stats()
+    assert stats["exported"] == 3
+    assert stats["dropped"] == 2
@@ -0,0 +1,282 @@
+"""
+Структурированный журнал запросов (access log): строка JSON на запрос.
+
+Поля: ts (начало запроса, unix-время), method, route (шаблон пути ручки, для неизвестных путей - путь),
+status, latency_ms, db_ms (выполнение SQL и ожидание соединения из пула), db_queries, seller_id
+(если запрос прошел проверку токена), trace_id (если запрос трассируется), pid и sample_rate.
+
+AccessLogMiddleware кладет в contextvar изменяемый RequestLogContext: сессия запроса дописывает в него
+время работы с базой, проверка токена - ИД продавца. Это работает и когда ручка выполняется отдельной
+задачей (DeadlineMiddleware): задача получает копию контекста, но объект в нем тот же.
+
+Успешные быстрые запросы пишутся с долей sample_ratio (sample_rate в записи - для пересчета в полное
+число), ошибки (status >= 400) и медленные (latency >= slow_ms) - всегда. Запись уходит в логгер
+src.access, его QueueHandler кладет ее в ограниченную очередь и не блокирует цикл событий: при полной
+очереди запись отбрасывается и считается в dropped. Фоновый поток забирает накопившееся раз в
+flush_interval и дописывает в файл пачкой - одним вызовом write с O_APPEND, поэтому строки нескольких
+воркеров в общем файле не перемешиваются.
+"""
+
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler
+from typing import List, Optional
+
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.configurations.settings import settings
+from src.utils import tracing
+
+__all__ = [
+    "ACCESS_LOGGER",
+    "AccessLogFormatter",
+    "AccessLogMiddleware",
+    "AccessLogWriter",
+    "RequestLogContext",
+    "access_log_writer",
+    "annotate_seller",
+    "current_log_context",
+]
+
+ACCESS_LOGGER = "src.access"
+
+
+class RequestLogContext:
+    __slots__ = ("seller_id", "db_time", "db_queries")
+
+    def __init__(self):
+        self.seller_id: Optional[int] = None
+        self.db_time = 0.0
+        self.db_queries = 0
+
+
+current_log_context: ContextVar[Optional[RequestLogContext]] = ContextVar("current_log_context", default=None)
+
+
+def annotate_seller(seller_id: int) -> None:
+    context = current_log_context.get()
+    if context is not None:
+        context.seller_id = seller_id
+
+
+class AccessLogFormatter(logging.Formatter):
+    """
+    Запись журнала запросов - словарь в record.msg, строка журнала - его JSON.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        return orjson.dumps(record.msg).decode()
+
+
+class _DroppingQueueHandler(QueueHandler):
+    def __init__(self, records: queue.Queue, writer: "AccessLogWriter"):
+        super().__init__(records)
+        self.writer = writer
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Запись уже готова к сериализации: форматирование и копирование откладываются до фонового потока
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.writer.dropped += 1
+
+
+class AccessLogWriter:
+    """
+    Обработчик логгера (src.access, у записи трафика - src.capture) и фоновый поток,
+    дописывающий записи в файл пачками.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        path: str,
+        sample_ratio: float,
+        slow_ms: float,
+        batch_size: int,
+        queue_size: int,
+        flush_interval: float,
+        logger_name: str = ACCESS_LOGGER,
+    ):
+        self.enabled = enabled
+        self.path = path
+        self.sample_ratio = sample_ratio
+        self.slow_ms = slow_ms
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.formatter = AccessLogFormatter()
+        self.logger = logging.getLogger(logger_name)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._handler = _DroppingQueueHandler(self._queue, self)
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.logged = 0
+        self.sampled_out = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.write_errors = 0
+
+    def should_log(self, status: int, latency_ms: float) -> bool:
+        if status >= 400 or latency_ms >= self.slow_ms or self.sample_ratio >= 1.0:
+            return True
+        if random.random() < self.sample_ratio:
+            return True
+        self.sampled_out += 1
+        return False
+
+    def log(self, entry: dict) -> None:
+        if self._pid != os.getpid():
+            # Поток не переживает fork: каждый воркер запускает свой
+            self.start()
+        self.logged += 1
+        entry["pid"] = self._pid
+        # Запись собирается без logger.info: место вызова журналу не нужно, а его поиск (findCaller,
+        # обход стека) - самая дорогая часть logger.info. Обработчики логгера вызываются как обычно
+        self.logger.handle(self.logger.makeRecord(self.logger.name, logging.INFO, "", 0, entry, None, None))
+
+    def start(self) -> None:
+        self._pid = os.getpid()
+        self._queue = queue.Queue(self.queue_size)
+        self._handler.queue = self._queue
+        if self._handler not in self.logger.handlers:
+            self.logger.addHandler(self._handler)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=f"{self.logger.name}-writer", daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        """
+        Останавливает фоновый поток и дописывает все, что осталось в очереди.
+        """
+        if self._thread is not None and self._pid == os.getpid():
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+            self._pid = None
+        self.flush()
+
+    def flush(self) -> None:
+        while True:
+            records = self._drain()
+            if not records:
+                return
+            self._write(records)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            # Пауза между записями: при высокой нагрузке за нее копится большая пачка
+            self._stopped.wait(self.flush_interval)
+            self.flush()
+
+    def _drain(self) -> List[logging.LogRecord]:
+        records = []
+        while len(records) < self.batch_size:
+            try:
+                records.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return records
+
+    def _write(self, records: List[logging.LogRecord]) -> None:
+        data = "".join(f"{self.formatter.format(record)}\n" for record in records).encode()
+        try:
+            if self.path == "-":
+                os.write(1, data)
+            else:
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(fd, data)
+                finally:
+                    os.close(fd)
+        except OSError:
+            # Недоступный файл журнала не должен влиять на обработку запросов: пачка теряется
+            self.write_errors += 1
+            return
+        self.batches += 1
+        self.written += len(records)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queue_size": self._queue.qsize(),
+            "max_queue_size": self.queue_size,
+            "logged": self.logged,
+            "sampled_out": self.sampled_out,
+            "dropped": self.dropped,
+            "written": self.written,
+            "batches": self.batches,
+            "write_errors": self.write_errors,
+        }
+
+
+access_log_writer = AccessLogWriter(
+    settings.access_log_enabled,
+    settings.access_log_file,
+    settings.access_log_sample_ratio,
+    settings.access_log_slow_ms,
+    settings.access_log_batch_size,
+    settings.access_log_queue_size,
+    settings.access_log_flush_interval,
+)
+
+
+class AccessLogMiddleware:
+    def __init__(self, app: ASGIApp, writer: Optional[AccessLogWriter] = None):
+        self.app = app
+        self.writer = writer or access_log_writer
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.writer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        timestamp = time.time()
+        started = time.perf_counter()
+        status = 500
+        context = RequestLogContext()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = current_log_context.set(context)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_log_context.reset(token)
+            latency_ms = (time.perf_counter() - started) * 1000
+            if self.writer.should_log(status, latency_ms):
+                self.writer.log(self._entry(scope, context, timestamp, status, latency_ms))
+
+    def _entry(self, scope: Scope, context: RequestLogContext, timestamp: float, status: int, latency_ms: float):
+        route = scope.get("route")
+        span = tracing.current_span.get()
+        sampled = status < 400 and latency_ms < self.writer.slow_ms
+        return {
+            "ts": round(timestamp, 3),
+            "method": scope["method"],
+            "route": route.path if route is not None else scope["path"],
+            "status": status,
+            "latency_ms": round(latency_ms, 3),
+            "db_ms": round(context.db_time * 1000, 3),
+            "db_queries": context.db_queries,
+            "seller_id": context.seller_id,
+            "trace_id": f"{span.trace_id:032x}" if span is not None else None,
+            "sample_rate": self.writer.sample_ratio if sampled else 1.0,
+        }
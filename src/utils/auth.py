@@ -1,23 +1,79 @@
+import os
+import secrets
 from datetime import datetime, timedelta
+from typing import Callable, Optional, Tuple, TypeVar
 
+import anyio
+import anyio.to_thread
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy import select
 
 from src.configurations.settings import settings
-from src.models.sellers import Seller
+from src.models.sellers import normalize_email
 from src.schemas import SellerOut
+from src.service.seller_emails import SellerEmailService
+from src.utils.access_log import annotate_seller
 from src.utils.db_session import DBSession
+from src.utils.negative_cache import unknown_emails
+from src.utils.tracing import tracer
 
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+internal_token_scheme = APIKeyHeader(name=settings.internal_token_header, auto_error=False)
+
+PASSWORD_SCHEMES = ("bcrypt", "argon2")
+
+T = TypeVar("T")
+
+
+def make_password_context(
+    scheme: str = settings.password_scheme,
+    bcrypt_rounds: int = settings.password_bcrypt_rounds,
+    argon2_time_cost: int = settings.password_argon2_time_cost,
+    argon2_memory_cost: int = settings.password_argon2_memory_cost,
+    argon2_parallelism: int = settings.password_argon2_parallelism,
+) -> CryptContext:
+    """
+    Контекст хеширования по политике из настроек. Новые хеши считаются схемой scheme,
+    хеши другой схемы (deprecated="auto") или с меньшей стоимостью (min_rounds, параметры argon2)
+    проверяются как обычно, но помечаются устаревшими - их пересчитывает verify_and_update.
+    """
+    if scheme not in PASSWORD_SCHEMES:
+        raise ValueError(f"Unknown password scheme {scheme!r}, expected one of {PASSWORD_SCHEMES}")
+    return CryptContext(
+        schemes=[scheme] + [other for other in PASSWORD_SCHEMES if other != scheme],
+        deprecated="auto",
+        bcrypt__default_rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        argon2__type="ID",
+        argon2__time_cost=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__parallelism=argon2_parallelism,
+    )
+
 
 # Создание контекста хеширования
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = make_password_context()
+
+# Хеширование занимает процессор на сотни миллисекунд (bcrypt и argon2 отпускают GIL),
+# поэтому оно идет в пуле потоков, а не в цикле событий. Ограничитель создается лениво - внутри цикла.
+_hash_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+async def run_hashing(func: Callable[..., T], *args) -> T:
+    """
+    Выполняет хеширование или проверку пароля в пуле потоков,
+    не больше settings.password_hash_threads одновременно (0 - по числу ядер).
+    """
+    global _hash_limiter
+    if _hash_limiter is None:
+        _hash_limiter = anyio.CapacityLimiter(settings.password_hash_threads or os.cpu_count() or 1)
+    with tracer.span(f"password.{func.__name__}", scheme=settings.password_scheme):
+        return await anyio.to_thread.run_sync(func, *args, limiter=_hash_limiter)
 
 
 def get_password_hash(password: str) -> str:
@@ -34,6 +90,14 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Проверка пароля за одно хеширование. Если хеш устарел по текущей политике,
+    вторым элементом возвращается новый хеш для сохранения, иначе None.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -41,27 +105,44 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    with tracer.span("jwt.encode"):
+        encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 async def check_seller_token(session: DBSession, token: str = Depends(oauth2_scheme)) -> SellerOut:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with tracer.span("jwt.decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise HTTPException(status_code=400, detail="Invalid token payload")
 
-        result = await session.execute(select(Seller).filter_by(email=email))
-        seller = result.scalars().first()
+        email = normalize_email(email)
+        if email in unknown_emails:
+            raise HTTPException(status_code=404, detail="Seller not found")
+        seller = await SellerEmailService.find_seller(email, session)
         if seller is None:
+            unknown_emails.add(email)
             raise HTTPException(status_code=404, detail="Seller not found")
 
+        annotate_seller(seller.id)
         return SellerOut.model_validate(seller)
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
+async def check_internal_token(token: Optional[str] = Depends(internal_token_scheme)) -> None:
+    """
+    Пускает к служебным ручкам /internal только с токеном оператора из settings.internal_token.
+    Пока токен не задан, служебных ручек как будто нет (404).
+    """
+    if not settings.internal_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if token is None or not secrets.compare_digest(token.encode(), settings.internal_token.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid internal token")
+
+
 # Функция для аутентификации пользователя и получения токена доступа
 async def authenticate_user(async_client, username: str, password: str):
     """
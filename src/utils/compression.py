@@ -0,0 +1,241 @@
+"""
+Согласование формата и сжатия ответов.
+
+CompressionMiddleware:
+- сжимает ответы по Accept-Encoding (zstd, br, gzip - какие доступны) начиная с порога размера;
+- кэширует сжатые тела ответов на GET-запросы, чтобы не сжимать одни и те же данные повторно;
+- по Accept: application/msgpack перекодирует JSON-ответ в MessagePack;
+- тела от settings.compression_thread_min_size сжимает и перекодирует в пуле потоков:
+  цикл событий не стоит, пока сжимается большой список (zlib, brotli, zstandard отпускают GIL);
+- к ETag измененного тела добавляет суффикс представления ("3-msgpack-gzip"), см. utils.etag.
+
+Потоковые ответы (SSE, выгрузки) не трогаются: они отдаются как есть.
+brotli, zstandard и msgpack - необязательные зависимости.
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import anyio.to_thread
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.configurations.settings import settings
+from src.utils.etag import representation_etag
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+__all__ = ["CompressionMiddleware", "CompressedBodyCache", "compressors", "choose_encoding", "compressed_cache"]
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+COMPRESSIBLE_MEDIA_TYPES = ("application/json", "application/msgpack", "application/x-ndjson", "text/")
+
+
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=settings.compression_gzip_level, mtime=0)
+
+
+def _brotli(body: bytes) -> bytes:
+    return brotli.compress(body, quality=settings.compression_brotli_quality)
+
+
+def _zstd(body: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=settings.compression_zstd_level).compress(body)
+
+
+# Поддерживаемые кодировки в порядке предпочтения сервера
+compressors: Dict[str, Callable[[bytes], bytes]] = {}
+if zstandard is not None:
+    compressors["zstd"] = _zstd
+if brotli is not None:
+    compressors["br"] = _brotli
+compressors["gzip"] = _gzip
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Выбирает кодировку с наибольшим q среди поддерживаемых.
+    При равных q побеждает кодировка, которую предпочитает сервер.
+    """
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for name in compressors:
+        weight = weights.get(name, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = name, weight
+    return best
+
+
+def accepts_msgpack(accept: str) -> bool:
+    return any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES)
+
+
+class CompressedBodyCache:
+    """
+    LRU-кэш сжатых тел, ограниченный суммарным размером в байтах.
+    Ключ - кодировка и SHA-256 исходного тела: аппаратно ускоренный хеш заметно дешевле сжатия.
+    Вызывается и из пула потоков, поэтому словарь защищен блокировкой (само сжатие идет без нее).
+    """
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._size = 0
+        self._items: "OrderedDict[Tuple[str, bytes], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compress(self, encoding: str, body: bytes) -> bytes:
+        key = (encoding, hashlib.sha256(body).digest())
+        with self._lock:
+            compressed = self._items.get(key)
+            if compressed is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return compressed
+            self.misses += 1
+
+        compressed = compressors[encoding](body)
+        if len(compressed) <= self._max_bytes:
+            with self._lock:
+                # Одно и то же тело могли одновременно сжать в двух потоках
+                if key not in self._items:
+                    self._items[key] = compressed
+                    self._size += len(compressed)
+                while self._size > self._max_bytes:
+                    _, evicted = self._items.popitem(last=False)
+                    self._size -= len(evicted)
+        return compressed
+
+    def stats(self) -> dict:
+        return {"items": len(self._items), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+
+compressed_cache = CompressedBodyCache(settings.compression_cache_bytes)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = settings.compression_min_size,
+        thread_min_size: int = settings.compression_thread_min_size,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_min_size = thread_min_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        to_msgpack = msgpack is not None and accepts_msgpack(request_headers.get("accept", ""))
+        # Даже без сжатия и MessagePack ответ проходит через обертку: ему нужны заголовки Vary
+
+        start_message: Optional[Message] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if start_message is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            if message.get("more_body", False):
+                # Потоковый ответ - отдаем без изменений
+                await send(start_message)
+                start_message = None
+                await send(message)
+                return
+
+            body = await self._transform(scope, start_message, message.get("body", b""), encoding, to_msgpack)
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _transform(
+        self, scope: Scope, start: Message, body: bytes, encoding: Optional[str], to_msgpack: bool
+    ) -> bytes:
+        headers = MutableHeaders(scope=start)
+        if "content-encoding" in headers:
+            return body
+
+        content_type = headers.get("content-type", "")
+        # Vary ставится на любой ответ, который мог бы быть перекодирован или сжат, а не только
+        # на измененные: иначе общий кэш отдаст несжатый или JSON-вариант клиенту, договорившемуся об ином
+        if msgpack is not None and content_type.startswith("application/json"):
+            headers.add_vary_header("Accept")
+        if content_type.startswith(COMPRESSIBLE_MEDIA_TYPES):
+            headers.add_vary_header("Accept-Encoding")
+        if scope["method"] == "HEAD":
+            return body
+
+        to_msgpack = to_msgpack and content_type.startswith("application/json") and bool(body)
+        if not content_type.startswith(COMPRESSIBLE_MEDIA_TYPES):
+            encoding = None
+        no_store = "no-store" in headers.get("cache-control", "")
+        cacheable = scope["method"] == "GET" and start["status"] == 200 and not no_store
+        if (to_msgpack or encoding) and len(body) >= self.thread_min_size:
+            body, compressed = await anyio.to_thread.run_sync(self._encode, body, to_msgpack, encoding, cacheable)
+        else:
+            body, compressed = self._encode(body, to_msgpack, encoding, cacheable)
+
+        etag = headers.get("etag")
+        if to_msgpack:
+            headers["content-type"] = "application/msgpack"
+            etag = etag and representation_etag(etag, "msgpack")
+        if compressed:
+            headers["content-encoding"] = encoding
+            etag = etag and representation_etag(etag, encoding)
+        if etag:
+            headers["etag"] = etag
+        headers["content-length"] = str(len(body))
+        return body
+
+    def _encode(self, body: bytes, to_msgpack: bool, encoding: Optional[str], cacheable: bool) -> Tuple[bytes, bool]:
+        """
+        Процессорная часть преобразования (перекодирование и сжатие) - без заголовков, чтобы ее можно было
+        выполнить в потоке. Возвращает тело и признак сжатия.
+        """
+        if to_msgpack:
+            body = msgpack.packb(orjson.loads(body))
+        if encoding is None or len(body) < self.minimum_size:
+            return body, False
+        return (compressed_cache.get_or_compress(encoding, body) if cacheable else compressors[encoding](body)), True
@@ -0,0 +1,304 @@
+"""
+Адаптивное ограничение числа одновременных запросов (admission control).
+
+Когда база замедляется, запросы копятся в ожидании соединения из пула, и задержка растет у всех ручек,
+включая дешевые. AdaptiveLimiter держит лимит одновременно выполняемых запросов и подстраивает его
+по наблюдаемой задержке (в духе Netflix concurrency-limits):
+- gradient - лимит умножается на отношение задержки без очереди (минимум за окно, с допуском tolerance)
+  к текущей, но не меньше чем на 0.5, и получает запас sqrt(limit) на рост: пока задержка не растет,
+  лимит растет, а когда запросы начинают ждать соединений, задержка растет, и лимит снижается;
+- aimd - +1 при успешном запросе, умножение на backoff при ошибке 5xx или задержке больше
+  задержки без очереди в tolerance раз.
+
+Запросы сверх лимита ждут в очереди ограниченной длины не дольше queue_timeout, остальным сразу
+отвечается 503 с Retry-After. Лимиты раздельные для классов ручек: auth (bcrypt при входе и регистрации),
+read и write - дорогое хеширование не занимает место чтений и наоборот.
+Долгие потоковые ручки (SSE, WebSocket, выгрузки) не ограничиваются: их длительность не говорит о нагрузке.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from fastapi import status
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.configurations.settings import settings
+
+__all__ = [
+    "ROUTE_CLASSES",
+    "LIMIT_ALGORITHMS",
+    "AdaptiveLimiter",
+    "LimitExceeded",
+    "ConcurrencyLimitMiddleware",
+    "concurrency_limiters",
+    "route_class",
+]
+
+ROUTE_CLASSES = ("auth", "read", "write")
+LIMIT_ALGORITHMS = ("gradient", "aimd")
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# Ручки, хеширующие пароль: вход и регистрация продавца
+AUTH_ROUTES = frozenset({("POST", "/api/v1/token"), ("POST", "/api/v1/seller/"), ("POST", "/api/v1/seller")})
+
+
+class LimitExceeded(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Concurrency limit exceeded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        max_limit: int,
+        max_queue: int,
+        queue_timeout: float,
+        algorithm: str = "gradient",
+        min_limit: int = 1,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+        long_window: int = 600,
+        aimd_backoff: float = 0.9,
+    ):
+        if algorithm not in LIMIT_ALGORITHMS:
+            raise ValueError(f"Unknown limit algorithm {algorithm!r}, expected one of {LIMIT_ALGORITHMS}")
+        self.name = name
+        self.algorithm = algorithm
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.long_window = long_window
+        self.aimd_backoff = aimd_backoff
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Задержки в секундах: последнего запроса, скользящее среднее и оценка задержки без очереди
+        self.short_rtt = 0.0
+        self.long_rtt = 0.0
+        self.min_rtt = 0.0
+        self.samples = 0
+        self._window_min = math.inf
+        self._window_samples = 0
+
+        self.accepted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.drops = 0
+        self.queue_wait = 0.0
+        self.max_in_flight = 0
+
+    @property
+    def current_limit(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """
+        Занимает место среди выполняющихся запросов: сразу, после ожидания в очереди или LimitExceeded.
+        """
+        if self.in_flight < self.current_limit and not self._waiters:
+            self._admit()
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise LimitExceeded(self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self.queued += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not self._granted(future):
+                self.queue_timeouts += 1
+                raise LimitExceeded(self.retry_after())
+        except asyncio.CancelledError:
+            # Клиент ушел: если место уже было отдано этому запросу, возвращаем его следующему
+            if self._granted(future):
+                self.release(None)
+            raise
+        finally:
+            self.queue_wait += time.perf_counter() - started
+            if not future.done():
+                future.cancel()
+            try:
+                self._waiters.remove(future)
+            except ValueError:
+                pass
+
+    def release(self, latency: Optional[float], dropped: bool = False) -> None:
+        """
+        Освобождает место. latency=None - запрос прерван, его задержка не учитывается в лимите.
+        """
+        in_flight = self.in_flight
+        self.in_flight -= 1
+        if latency is not None:
+            self._update(latency, dropped, in_flight)
+        self._wake()
+
+    def retry_after(self) -> int:
+        """
+        Сколько секунд при текущей задержке выполняются уже принятые и ждущие запросы.
+        """
+        latency = self.long_rtt or self.short_rtt
+        return max(1, math.ceil(latency * (len(self._waiters) + self.in_flight + 1) / self.current_limit))
+
+    def _admit(self) -> None:
+        self.in_flight += 1
+        self.accepted += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    @staticmethod
+    def _granted(future: asyncio.Future) -> bool:
+        return future.done() and not future.cancelled()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.current_limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                self._admit()
+
+    def _update(self, latency: float, dropped: bool, in_flight: int) -> None:
+        latency = max(latency, 1e-6)
+        self.samples += 1
+        self.short_rtt = latency
+        window = min(self.samples, self.long_window)
+        self.long_rtt += (latency - self.long_rtt) / window
+        if dropped:
+            self.drops += 1
+
+        # Задержка без очереди - минимум за окно из long_window запросов. В конце окна берется минимум
+        # этого окна: так оценка следует за базой, которая стала медленнее (или быстрее) надолго
+        if self.min_rtt == 0.0 or latency < self.min_rtt:
+            self.min_rtt = latency
+        self._window_min = min(self._window_min, latency)
+        self._window_samples += 1
+        if self._window_samples >= self.long_window:
+            self.min_rtt = self._window_min
+            self._window_min = math.inf
+            self._window_samples = 0
+
+        # Лимит не растет, пока запросов меньше его половины: нагрузка не проверяет его
+        app_limited = in_flight * 2 < self.current_limit
+        queueing = latency > self.tolerance * self.min_rtt
+        if self.algorithm == "aimd":
+            if dropped or queueing:
+                new_limit = self.limit * self.aimd_backoff
+            elif app_limited:
+                new_limit = self.limit
+            else:
+                new_limit = self.limit + 1
+        else:
+            gradient = 0.5 if dropped else max(0.5, min(1.0, self.tolerance * self.min_rtt / latency))
+            new_limit = self.limit * gradient + math.sqrt(self.limit)
+            if app_limited:
+                new_limit = min(new_limit, self.limit)
+            new_limit = self.limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self.limit = min(float(self.max_limit), max(float(self.min_limit), new_limit))
+
+    def stats(self) -> dict:
+        return {
+            "algorithm": self.algorithm,
+            "limit": self.current_limit,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_size": len(self._waiters),
+            "max_queue": self.max_queue,
+            "accepted": self.accepted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "queue_timeouts": self.queue_timeouts,
+            "drops": self.drops,
+            "queue_wait_ms_avg": self.queue_wait / self.queued * 1000 if self.queued else 0.0,
+            "latency_ms": self.short_rtt * 1000,
+            "latency_ms_avg": self.long_rtt * 1000,
+            "latency_ms_no_load": self.min_rtt * 1000,
+        }
+
+
+def route_class(method: str, path: str) -> str:
+    if (method, path) in AUTH_ROUTES:
+        return "auth"
+    return "read" if method in READ_METHODS else "write"
+
+
+def _make_limiters() -> Dict[str, AdaptiveLimiter]:
+    return {
+        name: AdaptiveLimiter(
+            name,
+            initial_limit=settings.concurrency_initial_limits[name],
+            max_limit=settings.concurrency_max_limits[name],
+            max_queue=settings.concurrency_max_queue[name],
+            queue_timeout=settings.concurrency_queue_timeout,
+            algorithm=settings.concurrency_algorithm,
+            min_limit=settings.concurrency_min_limit,
+        )
+        for name in ROUTE_CLASSES
+    }
+
+
+concurrency_limiters = _make_limiters()
+
+
+class ConcurrencyLimitMiddleware:
+    def __init__(self, app: ASGIApp, limiters: Optional[Dict[str, AdaptiveLimiter]] = None):
+        self.app = app
+        self.limiters = concurrency_limiters if limiters is None else limiters
+        self.exempt_paths = tuple(settings.concurrency_exempt_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith("/api/") or path.startswith(self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters[route_class(scope["method"], path)]
+        try:
+            await limiter.acquire()
+        except LimitExceeded as e:
+            response = ORJSONResponse(
+                {"detail": "Server is overloaded"},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(e.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        started = time.perf_counter()
+        latency = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+            latency = time.perf_counter() - started
+        except Exception:
+            latency = time.perf_counter() - started
+            raise
+        finally:
+            # При отмене (клиент ушел) latency остается None
+            limiter.release(latency, dropped=status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -0,0 +1,128 @@
+"""
+Метрики работы с базой в разрезе запросов: время получения соединения из пула,
+число обращений к серверу (round trips) и время выполнения SQL на один HTTP-запрос.
+
+Статистика текущего запроса лежит в contextvar, который выставляет get_async_session.
+События движка (выполнение запросов, BEGIN/COMMIT/ROLLBACK) увеличивают счетчики этого запроса,
+а по его завершении они попадают в общие счетчики процесса (см. /internal/db/).
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+__all__ = [
+    "RequestDBStats",
+    "DBMetrics",
+    "TimedAsyncAdaptedQueuePool",
+    "current_request_stats",
+    "db_metrics",
+    "instrument_engine",
+]
+
+
+class RequestDBStats:
+    __slots__ = ("round_trips", "checkouts", "checkout_time", "query_time")
+
+    def __init__(self):
+        self.round_trips = 0
+        self.checkouts = 0
+        self.checkout_time = 0.0
+        self.query_time = 0.0
+
+
+current_request_stats: ContextVar[Optional[RequestDBStats]] = ContextVar("current_request_stats", default=None)
+
+
+class DBMetrics:
+    def __init__(self):
+        self.requests = {"read": 0, "write": 0}
+        self.round_trips = {"read": 0, "write": 0}
+        self.commits = 0
+        self.commits_skipped = 0
+        self.checkouts = 0
+        self.checkout_time = 0.0
+        self.checkout_time_max = 0.0
+
+    def observe_checkout(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.checkout_time += seconds
+        self.checkout_time_max = max(self.checkout_time_max, seconds)
+
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.checkouts += 1
+            stats.checkout_time += seconds
+
+    def observe_request(self, kind: str, stats: RequestDBStats, committed: bool) -> None:
+        self.requests[kind] += 1
+        self.round_trips[kind] += stats.round_trips
+        if committed:
+            self.commits += 1
+        else:
+            self.commits_skipped += 1
+
+    def stats(self) -> dict:
+        return {
+            "requests": dict(self.requests),
+            "round_trips_per_request": {
+                kind: self.round_trips[kind] / count if count else 0.0 for kind, count in self.requests.items()
+            },
+            "commits": self.commits,
+            "commits_skipped": self.commits_skipped,
+            "checkouts": self.checkouts,
+            "checkout_ms_avg": self.checkout_time / self.checkouts * 1000 if self.checkouts else 0.0,
+            "checkout_ms_max": self.checkout_time_max * 1000,
+        }
+
+
+db_metrics = DBMetrics()
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, замеряющий время выдачи соединения: ожидание свободного и открытие нового.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_metrics.observe_checkout(time.perf_counter() - started)
+
+
+def _count_round_trip() -> None:
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.round_trips += 1
+
+
+def _count_transaction_control(conn) -> None:
+    # В режиме AUTOCOMMIT драйвер не отправляет BEGIN/COMMIT на сервер
+    if conn.get_execution_options().get("isolation_level") != "AUTOCOMMIT":
+        _count_round_trip()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        _count_round_trip()
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _on_executed(conn, cursor, statement, parameters, context, executemany):
+        stats = current_request_stats.get()
+        started = getattr(context, "_query_started", None)
+        if stats is not None and started is not None:
+            stats.query_time += time.perf_counter() - started
+
+    event.listen(sync_engine, "begin", _count_transaction_control)
+    event.listen(sync_engine, "commit", _count_transaction_control)
+    event.listen(sync_engine, "rollback", _count_transaction_control)
@@ -0,0 +1,252 @@
+"""
+Дедлайны запросов: сколько ручка может выполняться, прежде чем ее работа будет прервана.
+
+Дедлайн берется из настройки ручки (settings.request_deadlines, ключ - "МЕТОД шаблон пути"),
+иначе из settings.request_deadline_default. Клиент может сократить его заголовком
+settings.request_deadline_header (секунды), но не продлить. 0 - без дедлайна (потоковые ручки).
+
+DeadlineMiddleware выполняет ручку отдельной задачей и отменяет ее (тело запроса не буферизуется -
+ручка читает его сама, а отключение клиента отслеживается после последнего куска тела):
+- по истечении дедлайна - клиент получает 504, если ответ еще не начат;
+- при отключении клиента - ответ уже некому отдавать.
+Отмена доходит до базы: asyncpg прерывает выполняющийся запрос на сервере. Кроме того, остаток
+дедлайна передается в statement_timeout транзакции (см. configurations.database), поэтому сервер
+сам прервет запрос, даже если приложение не успеет. Отмененная работа видна в /internal/deadlines/.
+"""
+
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from fastapi import status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.exc import DBAPIError
+from starlette.datastructures import Headers
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.configurations.settings import settings
+
+__all__ = [
+    "DeadlineMetrics",
+    "DeadlineMiddleware",
+    "current_deadline",
+    "deadline_metrics",
+    "remaining_ms",
+    "statement_timeout_sql",
+]
+
+# Postgres: canceling statement due to statement timeout / user request
+QUERY_CANCELED_SQLSTATE = "57014"
+
+# Момент (time.monotonic()), к которому запрос должен завершиться
+current_deadline: ContextVar[Optional[float]] = ContextVar("current_deadline", default=None)
+
+
+def remaining_ms(deadline: Optional[float]) -> Optional[int]:
+    """
+    Остаток дедлайна в миллисекундах (не меньше 1) или None, если дедлайна нет.
+    """
+    if deadline is None:
+        return None
+    return max(1, int((deadline - time.monotonic()) * 1000))
+
+
+def statement_timeout_sql(timeout_ms: Optional[int], autocommit: bool, session_timeout_ms: Optional[int]) -> List[str]:
+    """
+    Команды Postgres, ограничивающие время запросов транзакции остатком дедлайна.
+
+    В транзакции - SET LOCAL, он действует до ее конца. Без транзакции (autocommit у читающих сессий)
+    остается только SET на все соединение: его значение (session_timeout_ms) помнится в connection.info,
+    и следующая транзакция на этом соединении перекрывает его своим SET LOCAL или DEFAULT.
+    """
+    if autocommit:
+        if timeout_ms == session_timeout_ms:
+            return []
+        return [f"SET statement_timeout = {timeout_ms}" if timeout_ms else "RESET statement_timeout"]
+    if timeout_ms:
+        return [f"SET LOCAL statement_timeout = {timeout_ms}"]
+    if session_timeout_ms:
+        return ["SET LOCAL statement_timeout = DEFAULT"]
+    return []
+
+
+class DeadlineMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.from_header = 0
+        self.deadline_exceeded = 0
+        self.client_disconnects = 0
+        self.statement_timeouts = 0
+        # Сколько секунд выполнялись ручки до отмены: работа, результат которой никому не достался
+        self.cancelled_work = 0.0
+
+    def observe_cancelled(self, seconds: float) -> None:
+        self.cancelled_work += seconds
+
+    def stats(self) -> dict:
+        cancelled = self.deadline_exceeded + self.client_disconnects
+        return {
+            "requests": self.requests,
+            "from_header": self.from_header,
+            "deadline_exceeded": self.deadline_exceeded,
+            "client_disconnects": self.client_disconnects,
+            "statement_timeouts": self.statement_timeouts,
+            "cancelled_work_seconds": self.cancelled_work,
+            "cancelled_work_ms_avg": self.cancelled_work / cancelled * 1000 if cancelled else 0.0,
+        }
+
+
+deadline_metrics = DeadlineMetrics()
+
+
+def _is_query_canceled(error: DBAPIError) -> bool:
+    return getattr(error.orig, "sqlstate", None) == QUERY_CANCELED_SQLSTATE
+
+
+class DeadlineMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        default: Optional[float] = None,
+        routes: Optional[Dict[str, float]] = None,
+        header: Optional[str] = None,
+    ):
+        self.app = app
+        self.default = settings.request_deadline_default if default is None else default
+        self.routes = settings.request_deadlines if routes is None else routes
+        self.header = (header or settings.request_deadline_header).lower()
+
+    def route_timeout(self, scope: Scope) -> float:
+        if self.routes:
+            for route in scope["app"].router.routes:
+                match, _ = route.matches(scope)
+                if match == Match.FULL:
+                    return self.routes.get(f"{scope['method']} {route.path}", self.default)
+        return self.default
+
+    def timeout(self, scope: Scope) -> float:
+        timeout = self.route_timeout(scope)
+        requested = Headers(scope=scope).get(self.header)
+        if not timeout or requested is None:
+            # Ручки без дедлайна (потоковые) заголовок не ограничивает
+            return timeout
+        try:
+            requested_timeout = float(requested)
+        except ValueError:
+            return timeout
+        if requested_timeout <= 0:
+            return timeout
+        deadline_metrics.from_header += 1
+        return min(timeout, requested_timeout)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timeout = self.timeout(scope)
+        if not timeout:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.monotonic()
+        deadline_metrics.requests += 1
+        # Тело ручка читает сама, по мере надобности: receive отдается ей до последнего куска тела,
+        # и только после него освобождается для ожидания отключения клиента
+        body_read = asyncio.Event()
+        disconnected = asyncio.Event()
+        first_message: Optional[Message] = None
+        if not _has_body(scope):
+            # Без тела сервер присылает одно пустое сообщение: его можно прочитать сразу
+            first_message = await receive()
+            if first_message["type"] == "http.disconnect":
+                return
+            body_read.set()
+        response_started = False
+        response_complete = False
+
+        async def receive_wrapper() -> Message:
+            nonlocal first_message
+            if first_message is not None:
+                message, first_message = first_message, None
+                return message
+            if body_read.is_set():
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body", False):
+                body_read.set()
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started, response_complete
+            if message["type"] == "http.response.start":
+                response_started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        async def watch_disconnect() -> None:
+            await body_read.wait()
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        token = current_deadline.set(started + timeout)
+        try:
+            handler = asyncio.ensure_future(self.app(scope, receive_wrapper, send_wrapper))
+        finally:
+            current_deadline.reset(token)
+        watcher = asyncio.ensure_future(watch_disconnect())
+        disconnect = asyncio.ensure_future(disconnected.wait())
+        try:
+            done, _ = await asyncio.wait(
+                {handler, disconnect},
+                timeout=started + timeout - time.monotonic(),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if response_complete or (handler in done and not disconnected.is_set()):
+                # Ответ отдан целиком: фоновые задачи ответа дедлайн не прерывает
+                await handler
+                return
+
+            # Дедлайн истек или клиент ушел до конца ответа: прерываем ручку вместе с ее запросами к базе
+            handler.cancel()
+            await asyncio.gather(handler, return_exceptions=True)
+            deadline_metrics.observe_cancelled(time.monotonic() - started)
+            if disconnected.is_set():
+                deadline_metrics.client_disconnects += 1
+                return
+            deadline_metrics.deadline_exceeded += 1
+            if not response_started:
+                await self._deadline_exceeded(scope, send)
+        except DBAPIError as e:
+            if not _is_query_canceled(e) or response_started:
+                raise
+            # Запрос к базе прервал statement_timeout из дедлайна
+            deadline_metrics.statement_timeouts += 1
+            deadline_metrics.observe_cancelled(time.monotonic() - started)
+            await self._deadline_exceeded(scope, send)
+        finally:
+            watcher.cancel()
+            disconnect.cancel()
+            if not handler.done():
+                # Отменили саму обработку запроса (остановка сервера)
+                handler.cancel()
+
+    @staticmethod
+    async def _deadline_exceeded(scope: Scope, send: Send) -> None:
+        response = ORJSONResponse({"detail": "Deadline exceeded"}, status_code=status.HTTP_504_GATEWAY_TIMEOUT)
+        await response(scope, _no_body, send)
+
+
+def _has_body(scope: Scope) -> bool:
+    headers = Headers(scope=scope)
+    return "transfer-encoding" in headers or headers.get("content-length", "0") not in ("", "0")
+
+
+async def _no_body() -> Message:
+    return {"type": "http.disconnect"}
@@ -0,0 +1,68 @@
+"""
+ETag и If-Match для оптимистичных блокировок: ETag ресурса - это номер версии строки в базе.
+"""
+
+import re
+from typing import Any, Optional
+
+from fastapi import HTTPException, Response, status
+
+__all__ = ["ANY_VERSION", "format_etag", "parse_if_match", "representation_etag", "set_etag"]
+
+
+class _AnyVersion:
+    def __repr__(self) -> str:
+        return "ANY_VERSION"
+
+
+# If-Match: * - подойдет любая версия, но ресурс должен существовать. Отдельный объект, а не число:
+# ни одна версия из заголовка не может с ним совпасть
+ANY_VERSION: Any = _AnyVersion()
+# Перекодированное (MessagePack) или сжатое тело - другое представление с тем же состоянием ресурса:
+# к его ETag добавляются суффиксы преобразований (см. utils.compression)
+REPRESENTATION_SUFFIXES = ("msgpack", "zstd", "br", "gzip")
+# Наши ETag - версия строки (начинается с 1) в двойных кавычках, без W/, с суффиксами представления
+ENTITY_TAG = re.compile(r'^"([1-9][0-9]*)(?:-(?:%s))*"$' % "|".join(REPRESENTATION_SUFFIXES))
+
+
+def format_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def representation_etag(etag: str, suffix: str) -> str:
+    """
+    ETag другого представления того же ресурса: "3" -> "3-gzip". Одинаковый сильный ETag у разных байт
+    сломал бы кэши и запросы Range. Слабый ETag и так не обещает побайтного совпадения - он не меняется.
+    """
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{suffix}"'
+
+
+def parse_if_match(value: Optional[str]) -> Optional[int]:
+    """
+    Ожидаемая версия из заголовка If-Match: None - заголовка нет, ANY_VERSION - указан "*".
+    If-Match сравнивает ETag строго (RFC 9110, 13.1.1), поэтому слабый ETag (W/"...") не совпадает ни с чем.
+    ETag любого представления ("3-gzip", "3-msgpack") означает ту же версию строки.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value == "*":
+        return ANY_VERSION
+
+    match = ENTITY_TAG.match(value)
+    if match is None:
+        # Слабый, не взятый в кавычки или не выданный нами ETag (в том числе "0") не совпадет ни с одной версией
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Invalid If-Match header")
+    return int(match.group(1))
+
+
+def set_etag(result: Any, response: Response) -> Any:
+    """
+    Проставляет ETag ответу ручки, если сервис вернул модель с версией.
+    """
+    version = getattr(result, "version", None)
+    if version is not None and not isinstance(result, Response):
+        response.headers["ETag"] = format_etag(version)
+    return result
@@ -0,0 +1,156 @@
+"""
+Лёгкая фоновая очередь задач поверх таблицы jobs_table.
+
+Задачи ставятся в очередь в той же транзакции, что и основная запись (см. JobService.enqueue),
+поэтому задача появится только если транзакция запроса зафиксирована.
+Воркеры пула забирают готовые задачи через SELECT ... FOR UPDATE SKIP LOCKED,
+так что несколько воркеров (и несколько процессов приложения) не берут одну и ту же задачу.
+Блокировка строки держится до конца транзакции воркера: если процесс упадёт посреди
+выполнения, транзакция откатится и задача снова станет доступной.
+"""
+
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.configurations.settings import settings
+from src.models.jobs import Job, JobStatus, utcnow
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["JobHandler", "job_handler", "JobWorker", "JobWorkerPool"]
+
+JobHandler = Callable[[dict, AsyncSession], Awaitable[None]]
+
+_handlers: Dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """
+    Регистрирует обработчик задач указанного вида.
+    Обработчик получает payload задачи и сессию транзакции воркера.
+    """
+
+    def decorator(func: JobHandler) -> JobHandler:
+        _handlers[kind] = func
+        return func
+
+    return decorator
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """
+    Экспоненциальная задержка перед повторной попыткой, ограниченная сверху.
+    """
+    delay = settings.jobs_retry_backoff * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.jobs_retry_backoff_max))
+
+
+class JobWorker:
+    @staticmethod
+    async def process_batch(session: AsyncSession, batch_size: int) -> int:
+        """
+        Забирает до batch_size готовых задач и выполняет их в текущей транзакции.
+        Фиксировать транзакцию должен вызывающий код. Возвращает число обработанных задач.
+        """
+        query = (
+            select(Job)
+            .where(Job.status == JobStatus.PENDING, Job.run_at <= utcnow())
+            .order_by(Job.run_at, Job.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        res = await session.execute(query)
+        jobs = res.scalars().all()
+
+        for job in jobs:
+            await JobWorker._run(job, session)
+
+        return len(jobs)
+
+    @staticmethod
+    async def _run(job: Job, session: AsyncSession) -> None:
+        job.attempts += 1
+        attempts, max_attempts = job.attempts, job.max_attempts
+        handler = _handlers.get(job.kind)
+
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind '{job.kind}'")
+            # Работа обработчика идёт в SAVEPOINT, чтобы при ошибке откатить только её,
+            # а счётчик попыток и текст ошибки всё равно сохранить.
+            async with session.begin_nested():
+                await handler(job.payload, session)
+        except Exception as e:
+            logger.warning("Job %s (%s) failed on attempt %s: %r", job.id, job.kind, attempts, e)
+            job.last_error = repr(e)[:1000]
+            if attempts >= max_attempts:
+                job.status = JobStatus.FAILED
+            else:
+                job.run_at = utcnow() + retry_delay(attempts)
+        else:
+            job.status = JobStatus.DONE
+            job.last_error = None
+
+        job.updated_at = utcnow()
+        await session.flush()
+
+
+class JobWorkerPool:
+    """
+    Пул asyncio-воркеров, живущий в процессе приложения.
+    Каждый воркер в цикле открывает транзакцию, обрабатывает пачку задач и фиксирует её.
+    Если задач нет, воркер засыпает на poll_interval секунд.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        workers: int = settings.jobs_workers,
+        poll_interval: float = settings.jobs_poll_interval,
+        batch_size: int = settings.jobs_batch_size,
+    ):
+        self._session_factory = session_factory
+        self._workers = workers
+        self._poll_interval = poll_interval
+        self._batch_size = batch_size
+        self._stopping = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._stopping.clear()
+        self._tasks = [asyncio.create_task(self._worker_loop(), name=f"job-worker-{i}") for i in range(self._workers)]
+
+    async def stop(self, timeout: Optional[float] = 10.0) -> None:
+        """
+        Просит воркеров завершиться после текущей пачки и ждёт их не дольше timeout секунд.
+        """
+        self._stopping.set()
+        if not self._tasks:
+            return
+
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker_loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                async with self._session_factory() as session:
+                    async with session.begin():
+                        processed = await JobWorker.process_batch(session, self._batch_size)
+            except Exception as e:
+                logger.error("Job worker iteration failed: %s", e)
+                processed = 0
+
+            if not processed:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self._poll_interval)
+                except asyncio.TimeoutError:
+                    pass
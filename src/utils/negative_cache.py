@@ -0,0 +1,69 @@
+"""
+Кэш отрицательных ответов: ключи, которых заведомо нет в базе (например, email неизвестных продавцов).
+
+Перебор паролей по спискам чужих email почти весь приходится на несуществующие адреса.
+Повторная попытка с тем же адресом отвечается из памяти процесса, без запроса в базу.
+Кэш живет в одном процессе: адрес удаляется из него после фиксации транзакции, создавшей продавца
+(ChangeNotifier). С push_pg_bridge событие доходит через LISTEN до всех воркеров и удаляет адрес
+и в них, без моста в остальных воркерах запись устаревает через ttl секунд.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+from src.configurations.settings import settings
+
+__all__ = ["NegativeCache", "unknown_emails"]
+
+
+class NegativeCache:
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        # ключ -> момент устаревания, в порядке добавления (самые старые - в начале)
+        self._expires: "OrderedDict[Hashable, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        expires = self._expires.get(key)
+        if expires is not None and expires > time.monotonic():
+            self.hits += 1
+            return True
+        if expires is not None:
+            del self._expires[key]
+        self.misses += 1
+        return False
+
+    def add(self, key: Hashable) -> None:
+        if not self.enabled:
+            return
+        self._expires.pop(key, None)
+        self._expires[key] = time.monotonic() + self.ttl
+        while len(self._expires) > self.max_size:
+            self._expires.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, key: Hashable) -> None:
+        self._expires.pop(key, None)
+
+    def clear(self) -> None:
+        self._expires.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._expires),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+unknown_emails = NegativeCache(settings.auth_unknown_email_ttl, settings.auth_unknown_email_cache_size)
@@ -0,0 +1,191 @@
+"""
+Встроенный сэмплирующий профилировщик воркера: какой код занимает процессор прямо сейчас.
+
+Таймер ITIMER_PROF отсчитывает процессорное время процесса и каждые interval секунд CPU присылает SIGPROF.
+Обработчик сигнала выполняется в главном потоке (в нем работает цикл событий uvicorn) на следующей
+инструкции байткода и получает прерванный кадр - снимок стека не смещен к точкам отпускания GIL,
+как у фонового потока с sys._current_frames. Простаивающий процесс сигналов не получает, поэтому
+число снимков пропорционально потраченному процессору.
+
+Стек цикла событий начинается с задачи asyncio, выполнявшейся в момент снимка
+(task:<имя задачи или корутины>): обработка запросов видна отдельно от фоновых воркеров.
+Стеки других потоков (пул хеширования паролей, экспорт спанов) добавляются с префиксом thread:<имя>,
+если поток не ждет на блокировке или очереди. Результат - collapsed stacks ("кадр;кадр;кадр число"),
+формат flamegraph.pl, speedscope и inferno.
+
+Снимок - обход нескольких десятков кадров, десятки микросекунд; при интервале 10 мс это доли процента
+процессора. Реальную долю профилировщик меряет сам (overhead).
+"""
+
+import asyncio
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Tuple
+
+__all__ = ["ProfileResult", "ProfilerUnavailable", "SamplingProfiler", "collapsed_stacks", "profile"]
+
+# Кадры этих модулей на вершине стека означают ожидание, а не работу
+WAITING_MODULES = ("selectors.py", "threading.py", "queue.py")
+# Процессор потрачен вне кадров Python (сборщик мусора, ядро, потоки без интерпретатора)
+UNATTRIBUTED_FRAME = "(unattributed)"
+# Потоки без имени ("Thread-12 (worker)") называются по функции, иначе одинаковые стеки не складываются
+DEFAULT_THREAD_NAME = re.compile(r"^Thread-\d+ \((.+)\)$")
+
+
+class ProfilerUnavailable(Exception):
+    pass
+
+
+class ProfileResult:
+    def __init__(self, stacks: Counter, samples: int, seconds: float, sampling_time: float):
+        self.stacks = stacks
+        self.samples = samples
+        self.seconds = seconds
+        self.sampling_time = sampling_time
+
+    @property
+    def overhead(self) -> float:
+        """
+        Доля времени, потраченная обработчиком сигнала на снятие стеков.
+        """
+        return self.sampling_time / self.seconds if self.seconds else 0.0
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float, threads: bool = True, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.interval = interval
+        self.threads = threads
+        self.loop = loop
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sampling_time = 0.0
+        self._names: Dict[CodeType, str] = {}
+        self._thread_names: Dict[int, str] = {}
+        self._previous_handler = None
+        self._started = 0.0
+        self._root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def start(self) -> None:
+        """
+        Ставит обработчик SIGPROF и запускает таймер. Только из главного потока.
+        """
+        self._started = time.perf_counter()
+        self._previous_handler = signal.signal(signal.SIGPROF, self._handle)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self) -> ProfileResult:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        return ProfileResult(self.stacks, self.samples, time.perf_counter() - self._started, self.sampling_time)
+
+    def _handle(self, signum: int, frame: Optional[FrameType]) -> None:
+        started = time.perf_counter()
+        self.samples += 1
+        recorded = False
+        main_thread = threading.main_thread().ident
+        if frame is not None and not self._waiting(frame):
+            self.stacks[(self._root_frame(),) + self._frames(frame)] += 1
+            recorded = True
+        if self.threads:
+            for thread_id, thread_frame in sys._current_frames().items():
+                if thread_id == main_thread or self._waiting(thread_frame):
+                    continue
+                self.stacks[(f"thread:{self._thread_name(thread_id)}",) + self._frames(thread_frame)] += 1
+                recorded = True
+        if not recorded:
+            self.stacks[(UNATTRIBUTED_FRAME,)] += 1
+        self.sampling_time += time.perf_counter() - started
+
+    def _root_frame(self) -> str:
+        if self.loop is None:
+            return "main"
+        task = asyncio.current_task(self.loop)
+        return f"task:{self._task_name(task)}" if task is not None else "loop"
+
+    @staticmethod
+    def _waiting(frame: FrameType) -> bool:
+        return frame.f_code.co_filename.endswith(WAITING_MODULES)
+
+    def _thread_name(self, thread_id: int) -> str:
+        name = self._thread_names.get(thread_id)
+        if name is None:
+            self._thread_names = {
+                thread.ident: DEFAULT_THREAD_NAME.sub(r"\1", thread.name) for thread in threading.enumerate()
+            }
+            name = self._thread_names.get(thread_id, str(thread_id))
+        return name
+
+    def _frames(self, frame: Optional[FrameType]) -> Tuple[str, ...]:
+        names: List[str] = []
+        while frame is not None:
+            names.append(self._name(frame.f_code))
+            frame = frame.f_back
+        names.reverse()
+        return tuple(names)
+
+    def _name(self, code: CodeType) -> str:
+        name = self._names.get(code)
+        if name is None:
+            name = f"{self._module(code.co_filename)}:{code.co_qualname}"
+            self._names[code] = name
+        return name
+
+    def _module(self, filename: str) -> str:
+        for marker in ("site-packages" + os.sep, "lib" + os.sep + "python"):
+            index = filename.rfind(marker)
+            if index != -1:
+                filename = filename[index + len(marker) :]
+                if marker.startswith("lib"):
+                    # Стандартная библиотека: lib/python3.11/asyncio/base_events.py -> asyncio/base_events.py
+                    filename = filename.split(os.sep, 1)[-1]
+                break
+        else:
+            if filename.startswith(self._root):
+                filename = os.path.relpath(filename, self._root)
+        return filename[:-3] if filename.endswith(".py") else filename
+
+    @staticmethod
+    def _task_name(task: asyncio.Task) -> str:
+        name = task.get_name()
+        if not name.startswith("Task-"):
+            return name
+        coro = task.get_coro()
+        return getattr(coro, "__qualname__", type(coro).__name__)
+
+
+def collapsed_stacks(stacks: Counter) -> str:
+    """
+    Collapsed stacks: строка на стек, кадры через ";" от внешнего к внутреннему, затем число снимков.
+    """
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+
+# Профилирование в воркере одно: таймер ITIMER_PROF у процесса один
+_profile_lock = asyncio.Lock()
+
+
+async def profile(seconds: float, interval: float, threads: bool = True) -> ProfileResult:
+    """
+    Профилирует текущий процесс seconds секунд, не блокируя цикл событий.
+    Отмена (клиент ушел) останавливает таймер.
+    """
+    if not hasattr(signal, "setitimer"):
+        raise ProfilerUnavailable("Profiler is not supported on this platform")
+    if threading.current_thread() is not threading.main_thread():
+        raise ProfilerUnavailable("Profiler requires the event loop in the main thread")
+    if _profile_lock.locked():
+        raise ProfilerUnavailable("Profiler is already running")
+    async with _profile_lock:
+        profiler = SamplingProfiler(interval, threads, asyncio.get_running_loop())
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            result = profiler.stop()
+        return result
@@ -0,0 +1,201 @@
+"""
+Внутрипроцессный pub/sub для push-уведомлений клиентов.
+
+Подписка хранит небольшой ограниченный буфер сообщений, поэтому память на соединение
+ограничена сверху даже для медленных клиентов. Когда буфер заполнен, срабатывает политика:
+- drop_oldest - выбрасываем самое старое сообщение (клиент видит самые свежие данные);
+- drop_newest - выбрасываем новое сообщение;
+- disconnect - закрываем подписку, клиент должен переподключиться и дочитать ленту /changes.
+
+Опционально события между процессами пересылаются через Postgres LISTEN/NOTIFY (PgNotifyBridge).
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["DROP_POLICIES", "DropPolicy", "Subscription", "Broker", "PgNotifyBridge"]
+
+
+class DropPolicy:
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    DISCONNECT = "disconnect"
+
+
+DROP_POLICIES = (DropPolicy.DROP_OLDEST, DropPolicy.DROP_NEWEST, DropPolicy.DISCONNECT)
+
+
+class Subscription:
+    # Подписок могут быть десятки тысяч, поэтому никаких лишних полей и задач на подписку
+    __slots__ = ("topics", "dropped", "closed", "_maxsize", "_policy", "_buffer", "_waiter")
+
+    def __init__(self, maxsize: int, policy: str):
+        self.topics: Set[str] = set()
+        self.dropped = 0
+        self.closed = False
+        self._maxsize = maxsize
+        self._policy = policy
+        self._buffer: Deque[str] = deque()
+        self._waiter: Optional[asyncio.Future] = None
+
+    def offer(self, message: str) -> None:
+        if self.closed:
+            return
+
+        if len(self._buffer) >= self._maxsize:
+            self.dropped += 1
+            if self._policy == DropPolicy.DROP_NEWEST:
+                return
+            if self._policy == DropPolicy.DISCONNECT:
+                self.close()
+                return
+            self._buffer.popleft()
+
+        self._buffer.append(message)
+        self._wakeup()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Возвращает следующее сообщение или None по таймауту.
+        После закрытия подписки бросает ConnectionError.
+        """
+        if not self._buffer and not self.closed:
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await asyncio.wait_for(self._waiter, timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._waiter = None
+
+        if self._buffer:
+            return self._buffer.popleft()
+        if self.closed:
+            raise ConnectionError("Subscription is closed")
+        return None
+
+    def close(self) -> None:
+        self.closed = True
+        self._buffer.clear()
+        self._wakeup()
+
+    def _wakeup(self) -> None:
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+class Broker:
+    def __init__(self, maxsize: int, policy: str):
+        # Неизвестная политика иначе молча работала бы как drop_oldest: ошибка настройки видна при старте
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy {policy!r}, expected one of {DROP_POLICIES}")
+        self._maxsize = maxsize
+        self._policy = policy
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, topics: Iterable[str] = ()) -> Subscription:
+        subscription = Subscription(self._maxsize, self._policy)
+        self.add_topics(subscription, topics)
+        return subscription
+
+    def add_topics(self, subscription: Subscription, topics: Iterable[str]) -> None:
+        for topic in topics:
+            self._topics.setdefault(topic, set()).add(subscription)
+            subscription.topics.add(topic)
+
+    def remove_topics(self, subscription: Subscription, topics: Iterable[str]) -> None:
+        for topic in list(topics):
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[topic]
+            subscription.topics.discard(topic)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.remove_topics(subscription, subscription.topics)
+        subscription.close()
+
+    def publish(self, topics: Iterable[str], message: str) -> int:
+        """
+        Раздает уже сериализованное сообщение всем подписчикам перечисленных тем.
+        Подписчик нескольких подходящих тем получает сообщение один раз.
+        """
+        receivers: Set[Subscription] = set()
+        for topic in topics:
+            receivers.update(self._topics.get(topic, ()))
+
+        for subscription in receivers:
+            subscription.offer(message)
+
+        self.published += 1
+        self.delivered += len(receivers)
+        return len(receivers)
+
+    def stats(self) -> dict:
+        subscriptions = set().union(*self._topics.values()) if self._topics else set()
+        return {
+            "topics": len(self._topics),
+            "subscriptions": len(subscriptions),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": sum(subscription.dropped for subscription in subscriptions),
+        }
+
+
+class PgNotifyBridge:
+    """
+    Слушает канал Postgres LISTEN/NOTIFY и передает полученные сообщения в on_message.
+    Соединение для LISTEN держится отдельно от пула и переоткрывается при обрыве.
+    """
+
+    def __init__(self, engine: AsyncEngine, channel: str, on_message: Callable[[str], None]):
+        self._engine = engine
+        self._channel = channel
+        self._on_message = on_message
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._listen(), name="pg-notify-bridge")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._engine.connect() as conn:
+                    raw_connection = await conn.get_raw_connection()
+                    driver_connection = raw_connection.driver_connection
+                    closed = asyncio.get_running_loop().create_future()
+
+                    def _on_notify(connection, pid, channel, payload):
+                        self._on_message(payload)
+
+                    def _on_termination(connection, closed=closed):
+                        if not closed.done():
+                            closed.set_result(None)
+
+                    driver_connection.add_termination_listener(_on_termination)
+                    await driver_connection.add_listener(self._channel, _on_notify)
+                    try:
+                        await closed
+                    finally:
+                        if not driver_connection.is_closed():
+                            await driver_connection.remove_listener(self._channel, _on_notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("LISTEN connection lost: %s", e)
+            await asyncio.sleep(1)
@@ -0,0 +1,160 @@
+"""
+Single-flight: одинаковые одновременные чтения выполняются одним обращением к базе.
+
+Первый запрос с ключом (ручка и параметры) запускает загрузку отдельной задачей, остальные
+запросы с тем же ключом, пришедшие до ее завершения, ждут ту же задачу и получают тот же
+сериализованный ответ (тело в байтах, статус, заголовки). Это не кэш: после завершения задачи
+ключ забывается, и следующий запрос снова идет в базу.
+
+Отмена безопасна: запрос, чей клиент отключился, перестает ждать, но загрузка продолжается
+для остальных (asyncio.shield). Когда не осталось ни одного ждущего, загрузка отменяется.
+Загрузка, не уложившаяся в timeout, отдает ждущим 504, а новые запросы с этим ключом
+запускают ее заново.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException, Response, status
+
+from src.configurations.settings import settings
+from src.utils.deadlines import current_deadline
+from src.utils.etag import format_etag
+
+__all__ = ["SingleFlight", "SharedResponse", "single_flight", "shared_response", "model_response"]
+
+
+@dataclass(frozen=True)
+class SharedResponse:
+    """
+    Ответ, который можно отдать нескольким запросам: у каждого свой объект Response.
+    """
+
+    status_code: int
+    body: bytes
+    headers: Tuple[Tuple[str, str], ...]
+
+    @classmethod
+    def from_response(cls, response: Response) -> "SharedResponse":
+        return cls(response.status_code, bytes(response.body), tuple(response.headers.items()))
+
+    def to_response(self) -> Response:
+        return Response(content=self.body, status_code=self.status_code, headers=dict(self.headers))
+
+
+def model_response(result: Any) -> Response:
+    """
+    Ответ сервиса (модель или Response) в виде готового Response: тело orjson, ETag из версии модели.
+    """
+    if isinstance(result, Response):
+        return result
+    version = getattr(result, "version", None)
+    headers = {"ETag": format_etag(version)} if version is not None else None
+    return Response(
+        content=orjson.dumps(result.model_dump(mode="json")), media_type="application/json", headers=headers
+    )
+
+
+@dataclass
+class _Call:
+    key: Hashable
+    task: asyncio.Task
+    deadline: float
+    waiters: int = 0
+
+
+class SingleFlight:
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._calls: Dict[Hashable, _Call] = {}
+        self.requests = 0
+        self.executions = 0
+        self.timeouts = 0
+        self.cancelled_waiters = 0
+        self.cancelled_calls = 0
+        self.max_waiters = 0
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable], timeout: Optional[float] = None):
+        """
+        Результат load() для ключа: общий для всех одновременных вызовов с этим ключом.
+        """
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        call = self._calls.get(key)
+        if call is None:
+            deadline = loop.time() + (timeout or self.timeout)
+            # Загрузка живет дольше запроса, который ее запустил: ее дедлайн (statement_timeout) - свой,
+            # а не дедлайн первого запроса. loop.time() - те же часы, что time.monotonic() у дедлайнов
+            token = current_deadline.set(deadline)
+            try:
+                call = _Call(key, loop.create_task(load()), deadline)
+            finally:
+                current_deadline.reset(token)
+            call.task.add_done_callback(lambda task, call=call: self._finished(call))
+            self._calls[key] = call
+            self.executions += 1
+        call.waiters += 1
+        self.max_waiters = max(self.max_waiters, call.waiters)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(call.task), max(call.deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            # Зависшую загрузку новые запросы не ждут, она доработает (или отменится) для уже ждущих
+            self._forget(call)
+            raise
+        except asyncio.CancelledError:
+            self.cancelled_waiters += 1
+            raise
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Результат больше никому не нужен
+                self.cancelled_calls += 1
+                call.task.cancel()
+                self._forget(call)
+
+    def _forget(self, call: _Call) -> None:
+        if self._calls.get(call.key) is call:
+            del self._calls[call.key]
+
+    def _finished(self, call: _Call) -> None:
+        self._forget(call)
+        if not call.task.cancelled():
+            # Ошибку уже получили ждущие, иначе asyncio напишет "exception was never retrieved"
+            call.task.exception()
+
+    def stats(self) -> dict:
+        coalesced = self.requests - self.executions
+        return {
+            "requests": self.requests,
+            "executions": self.executions,
+            "coalesced": coalesced,
+            "coalescing_ratio": coalesced / self.requests if self.requests else 0.0,
+            "in_flight": len(self._calls),
+            "max_waiters": self.max_waiters,
+            "timeouts": self.timeouts,
+            "cancelled_waiters": self.cancelled_waiters,
+            "cancelled_calls": self.cancelled_calls,
+        }
+
+
+single_flight = SingleFlight(settings.single_flight_timeout)
+
+
+async def shared_response(key: Hashable, load: Callable[[], Awaitable[Response]]) -> Response:
+    """
+    Ответ ручки через single-flight: load() строит готовый Response в собственной сессии,
+    т.к. загрузка может пережить запрос, который ее запустил.
+    """
+
+    async def load_shared() -> SharedResponse:
+        return SharedResponse.from_response(await load())
+
+    try:
+        shared = await single_flight.do(key, load_shared)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Read timed out")
+    return shared.to_response()
@@ -0,0 +1,137 @@
+"""
+Дисковый кэш готовых выгрузок (снимков) каталога.
+
+Снимок пишется на диск по ходу первой выгрузки (write_through) и атомарно переименовывается
+в конце, поэтому недописанный файл никогда не отдается. Повторные скачивания того же снимка
+обслуживаются из файла через mmap: страницы лежат в page cache и общие для всех воркеров,
+а ответ нарезается из отображения без чтения файла и без обращения к базе.
+Хранится не больше max_files снимков, старые удаляются вместе со своими отображениями.
+"""
+
+import mmap
+import os
+import time
+import uuid
+from typing import AsyncIterator, Dict, Optional, Union
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from src.configurations.settings import settings
+
+__all__ = ["SnapshotStore", "MmapResponse", "snapshot_store"]
+
+
+class MmapResponse(Response):
+    """
+    Ответ из отображенного в память файла: тело нарезается кусками по chunk_size прямо из отображения,
+    без системных вызовов чтения и без загрузки файла целиком.
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, mapped: Union[mmap.mmap, bytes], media_type: str, headers: Optional[dict] = None):
+        super().__init__(content=None, media_type=media_type, headers=headers)
+        self.mapped = mapped
+        self.headers["content-length"] = str(len(mapped))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        size = len(self.mapped)
+        if scope["method"] == "HEAD" or size == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        for offset in range(0, size, self.chunk_size):
+            end = min(offset + self.chunk_size, size)
+            await send({"type": "http.response.body", "body": self.mapped[offset:end], "more_body": end < size})
+
+
+class SnapshotStore:
+    def __init__(self, directory: str, ttl: float, max_files: int):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_files = max_files
+        self._mapped: Dict[str, mmap.mmap] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> Optional[Union[mmap.mmap, bytes]]:
+        """
+        Отображение готового снимка или None, если его нет или он устарел (ttl).
+        """
+        path = self._path(name)
+        try:
+            age = time.time() - os.path.getmtime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        if age > self.ttl:
+            self._remove(name)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        mapped = self._mapped.get(name)
+        if mapped is None:
+            with open(path, "rb") as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    # Пустой файл отобразить нельзя
+                    return b""
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped[name] = mapped
+        return mapped
+
+    async def write_through(self, name: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        Отдает куски выгрузки дальше и попутно пишет их во временный файл.
+        Снимок появляется только если выгрузка дошла до конца.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self._path(f".{name}.{uuid.uuid4().hex}.tmp")
+        completed = False
+        try:
+            with open(temp_path, "wb") as file:
+                async for chunk in chunks:
+                    file.write(chunk)
+                    yield chunk
+            completed = True
+        finally:
+            if completed:
+                self._forget(name)
+                os.replace(temp_path, self._path(name))
+                self._prune()
+            elif os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _forget(self, name: str) -> None:
+        # Отображение не закрываем: его могут еще отдавать текущие ответы,
+        # оно закроется само вместе с последней ссылкой (удаленный файл при этом остается доступен)
+        self._mapped.pop(name, None)
+
+    def _remove(self, name: str) -> None:
+        self._forget(name)
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def _prune(self) -> None:
+        names = [name for name in os.listdir(self.directory) if not name.startswith(".")]
+        names.sort(key=lambda name: os.path.getmtime(self._path(name)), reverse=True)
+        for name in names[self.max_files :]:  # noqa: E203
+            self._remove(name)
+
+    def stats(self) -> dict:
+        return {"mapped": len(self._mapped), "hits": self.hits, "misses": self.misses}
+
+
+snapshot_store = SnapshotStore(
+    settings.export_snapshot_dir, settings.export_snapshot_ttl, settings.export_snapshot_max_files
+)
@@ -0,0 +1,482 @@
+"""
+Трассировка запросов, совместимая с OpenTelemetry: W3C traceparent на входе и OTLP/HTTP JSON на выходе.
+
+Спаны:
+- TracingMiddleware - спан HTTP-запроса (kind=server), имя - метод и шаблон пути ручки;
+- trace_methods - спан каждого метода сервиса (BookService.get_book, SellersService.authenticate_seller, ...);
+- instrument_engine_tracing - спан каждого SQL-запроса по событиям движка (kind=client);
+- tracer.span(...) вручную - хеширование паролей и операции с JWT (src.utils.auth).
+
+Решение о записи трассы принимается один раз на корневом спане (доля settings.tracing_sample_ratio,
+или флаг sampled из traceparent вызывающего сервиса), дочерние спаны наследуют его. Незаписываемая
+трасса почти ничего не стоит: спаны не создаются. Законченные спаны копятся в очереди и отправляются
+пачками в фоновом потоке (BatchSpanProcessor): в OTLP-коллектор (tracing_exporter=otlp) или в файл JSONL
+(tracing_exporter=file) - по строке ExportTraceServiceRequest на пачку. Цикл событий экспорт не блокирует:
+при переполнении очереди спаны отбрасываются и считаются в /internal/tracing/.
+"""
+
+import functools
+import inspect
+import os
+import random
+import threading
+import time
+import urllib.request
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.configurations.settings import settings
+
+__all__ = [
+    "Span",
+    "Tracer",
+    "BatchSpanProcessor",
+    "FileSpanExporter",
+    "OtlpHttpSpanExporter",
+    "TracingMiddleware",
+    "current_span",
+    "instrument_engine_tracing",
+    "parse_traceparent",
+    "trace_methods",
+    "traced",
+    "tracer",
+]
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+STATUS_OK = 1
+STATUS_ERROR = 2
+SQL_STATEMENT_MAX_LENGTH = 2000
+
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, kind: str, trace_id: int, parent_id: Optional[int], attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64) or 1
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": f"{self.trace_id:032x}",
+            "spanId": f"{self.span_id:016x}",
+            "name": self.name,
+            "kind": SPAN_KINDS[self.kind],
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": STATUS_ERROR, "message": self.error} if self.error else {"code": STATUS_OK},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = f"{self.parent_id:016x}"
+        return span
+
+
+class _Unsampled:
+    """
+    Место спана в контексте незаписываемой трассы: дочерние спаны по нему понимают, что записывать не нужно.
+    """
+
+    __slots__ = ("trace_id", "span_id")
+
+    def __init__(self, trace_id: int, span_id: int):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+current_span: ContextVar[Optional[Any]] = ContextVar("current_span", default=None)
+
+
+def _otlp_attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[int, int, bool]]:
+    """
+    W3C traceparent "00-<trace_id>-<parent_id>-<flags>" -> (trace_id, parent_id, sampled) или None.
+    """
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        trace_id, parent_id, flags = int(parts[1], 16), int(parts[2], 16), int(parts[3][:2], 16)
+    except ValueError:
+        return None
+    if not trace_id or not parent_id:
+        return None
+    return trace_id, parent_id, bool(flags & 1)
+
+
+class FileSpanExporter:
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, payload: bytes) -> None:
+        with open(self.path, "ab") as file:
+            file.write(payload + b"\n")
+
+
+class OtlpHttpSpanExporter:
+    def __init__(self, endpoint: str, timeout: float = 10.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, payload: bytes) -> None:
+        request = urllib.request.Request(
+            self.endpoint, data=payload, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class BatchSpanProcessor:
+    """
+    Очередь законченных спанов и фоновый поток, отправляющий их пачками.
+    """
+
+    def __init__(self, exporter, service_name: str, batch_size: int, queue_size: int, interval: float):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.interval = interval
+        self.resource = {"attributes": [_otlp_attribute("service.name", service_name)]}
+        self._queue: Deque[Span] = deque()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.exported = 0
+        self.dropped = 0
+        self.batches = 0
+        self.export_errors = 0
+
+    def on_end(self, span: Span) -> None:
+        if len(self._queue) >= self.queue_size:
+            self.dropped += 1
+            return
+        self._queue.append(span)
+        if self._pid != os.getpid():
+            # Поток не переживает fork: каждый воркер запускает свой
+            self.start()
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        self._pid = os.getpid()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        """
+        Останавливает фоновый поток и отправляет все, что осталось в очереди.
+        """
+        if self._thread is not None and self._pid == os.getpid():
+            self._stopped.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+            self._pid = None
+        self.flush()
+
+    def flush(self) -> None:
+        while self._queue:
+            self._export_batch()
+
+    def encode(self, spans: List[Span]) -> bytes:
+        return orjson.dumps(
+            {
+                "resourceSpans": [
+                    {
+                        "resource": self.resource,
+                        "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}],
+                    }
+                ]
+            }
+        )
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _export_batch(self) -> None:
+        spans = []
+        while self._queue and len(spans) < self.batch_size:
+            spans.append(self._queue.popleft())
+        try:
+            self.exporter.export(self.encode(spans))
+        except Exception:
+            # Недоступный коллектор не должен влиять на обработку запросов: пачка теряется
+            self.export_errors += 1
+            return
+        self.batches += 1
+        self.exported += len(spans)
+
+    def stats(self) -> dict:
+        return {
+            "queue_size": len(self._queue),
+            "max_queue_size": self.queue_size,
+            "exported": self.exported,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "export_errors": self.export_errors,
+        }
+
+
+class _SpanScope:
+    __slots__ = ("tracer", "span", "token")
+
+    def __init__(self, tracer: "Tracer", span):
+        self.tracer = tracer
+        self.span = span
+        self.token = None
+
+    def __enter__(self):
+        if self.span is not None:
+            self.token = current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.token is not None:
+            current_span.reset(self.token)
+        if isinstance(self.span, Span):
+            self.tracer.end(self.span, exc)
+
+
+class Tracer:
+    def __init__(self, enabled: bool, sample_ratio: float, processor: Optional[BatchSpanProcessor]):
+        self.enabled = enabled and processor is not None
+        self.sample_ratio = sample_ratio
+        self.processor = processor
+        self.started = 0
+        self.sampled_out = 0
+
+    def start_span(
+        self,
+        name: str,
+        kind: str = "internal",
+        attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[Tuple[int, int, bool]] = None,
+    ):
+        """
+        Новый спан (Span), _Unsampled для незаписываемой трассы или None, если трассировка выключена.
+        Без parent родителем становится текущий спан контекста; без текущего спана начинается новая трасса.
+        """
+        if not self.enabled:
+            return None
+        if parent is None:
+            current = current_span.get()
+            if current is None:
+                return self._root(name, kind, attributes, random.getrandbits(128) or 1, None, None)
+            if isinstance(current, _Unsampled):
+                return None
+            trace_id, parent_id = current.trace_id, current.span_id
+        else:
+            trace_id, parent_id, sampled = parent
+            return self._root(name, kind, attributes, trace_id, parent_id, sampled)
+        self.started += 1
+        return Span(name, kind, trace_id, parent_id, attributes or {})
+
+    def _root(self, name, kind, attributes, trace_id: int, parent_id: Optional[int], sampled: Optional[bool]):
+        if sampled is None:
+            # Решение зависит только от trace_id: все сервисы с той же долей выберут одни и те же трассы
+            sampled = (trace_id & 0xFFFFFFFFFFFFFFFF) < self.sample_ratio * 2**64
+        if not sampled:
+            self.sampled_out += 1
+            return _Unsampled(trace_id, parent_id or 0)
+        self.started += 1
+        return Span(name, kind, trace_id, parent_id, attributes or {})
+
+    def span(self, name: str, kind: str = "internal", **attributes) -> _SpanScope:
+        """
+        Контекстный менеджер спана: with tracer.span("jwt.decode"): ...
+        """
+        return _SpanScope(self, self.start_span(name, kind, attributes))
+
+    def end(self, span: Span, error: Optional[BaseException] = None) -> None:
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        self.processor.on_end(span)
+
+    def shutdown(self) -> None:
+        if self.processor is not None:
+            self.processor.shutdown()
+
+    def stats(self) -> dict:
+        stats = {"enabled": self.enabled, "sample_ratio": self.sample_ratio, "spans": self.started}
+        stats["sampled_out_traces"] = self.sampled_out
+        if self.processor is not None:
+            stats.update(self.processor.stats())
+        return stats
+
+
+def _make_tracer() -> Tracer:
+    if not settings.tracing_enabled:
+        return Tracer(False, settings.tracing_sample_ratio, None)
+    if settings.tracing_exporter == "otlp":
+        exporter = OtlpHttpSpanExporter(settings.tracing_otlp_endpoint)
+    else:
+        exporter = FileSpanExporter(settings.tracing_file)
+    processor = BatchSpanProcessor(
+        exporter,
+        settings.tracing_service_name,
+        settings.tracing_batch_size,
+        settings.tracing_queue_size,
+        settings.tracing_export_interval,
+    )
+    return Tracer(True, settings.tracing_sample_ratio, processor)
+
+
+tracer = _make_tracer()
+
+
+def traced(name: str) -> Callable:
+    """
+    Декоратор функции или корутины: вызов оборачивается в спан name.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return await func(*args, **kwargs)
+                with tracer.span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def trace_methods(cls: type) -> type:
+    """
+    Декоратор класса сервиса: каждый staticmethod (кроме генераторов) получает спан "Класс.метод".
+    """
+    for name, attribute in list(vars(cls).items()):
+        if name.startswith("__") or not isinstance(attribute, staticmethod):
+            continue
+        func = attribute.__func__
+        if inspect.isasyncgenfunction(func) or inspect.isgeneratorfunction(func):
+            continue
+        setattr(cls, name, staticmethod(traced(f"{cls.__name__}.{name}")(func)))
+    return cls
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    span = tracer.start_span(
+        "db.query",
+        "client",
+        {"db.system": conn.dialect.name, "db.statement": statement[:SQL_STATEMENT_MAX_LENGTH]},
+    )
+    if isinstance(span, Span):
+        conn.info.setdefault("trace_spans", []).append(span)
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    spans = conn.info.get("trace_spans")
+    if spans:
+        span = spans.pop()
+        if cursor is not None and cursor.rowcount is not None and cursor.rowcount >= 0:
+            span.set_attribute("db.rows", cursor.rowcount)
+        tracer.end(span)
+
+
+def _on_error(context) -> None:
+    spans = context.connection.info.get("trace_spans") if context.connection is not None else None
+    if spans:
+        tracer.end(spans.pop(), context.original_exception)
+
+
+def instrument_engine_tracing(engine: AsyncEngine) -> None:
+    """
+    Спан на каждый SQL-запрос движка: от отправки до получения результата драйвером.
+    """
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_execute)
+    event.listen(sync_engine, "handle_error", _on_error)
+
+
+class TracingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        parent = parse_traceparent(Headers(scope=scope).get("traceparent"))
+        span = tracer.start_span(
+            f"{scope['method']} {scope['path']}",
+            "server",
+            {"http.method": scope["method"], "http.target": scope["path"]},
+            parent,
+        )
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+            await send(message)
+
+        token = current_span.set(span)
+        error = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            current_span.reset(token)
+            if isinstance(span, Span):
+                route = scope.get("route")
+                if route is not None:
+                    # Имя по шаблону пути, а не по пути с ИД: так спаны одной ручки группируются
+                    span.name = f"{scope['method']} {route.path}"
+                    span.set_attribute("http.route", route.path)
+                if error is None and span.attributes.get("http.status_code", 500) >= 500:
+                    error = RuntimeError(f"HTTP {span.attributes.get('http.status_code', 500)}")
+                tracer.end(span, error)
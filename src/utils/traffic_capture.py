@@ -0,0 +1,164 @@
+"""
+Запись трафика для воспроизведения (src.benchmarks.replay): строка JSON на запрос /api.
+
+Поля: ts, method, path, query, route (шаблон пути ручки), path_params, headers (только влияющие
+на обработку: content-type, accept, accept-encoding), auth (был ли токен - сам токен не пишется),
+body (текст тела; больше max_body байт - null и body_truncated), status и latency_ms.
+Пароли и личные данные не пишутся: поле password в JSON и форме заменяется на {{password}}, username
+формы входа - на {{email}} (при воспроизведении туда подставляются данные продавца из подготовки).
+email в JSON заменяется шаблоном с {{$guid}} (каждая регистрация при воспроизведении получает свой
+адрес), first_name и last_name - постоянными значениями (REDACTED_JSON_FIELDS).
+
+Запросы отбираются долей sample_ratio и пишутся через AccessLogWriter (логгер src.capture):
+ограниченная очередь и дозапись в файл пачками из фонового потока, как у журнала запросов.
+Потоковые ручки (exempt_paths) не записываются - их нельзя воспроизвести как обычный запрос.
+"""
+
+import random
+import time
+from typing import List, Optional
+from urllib.parse import parse_qsl, urlencode
+
+import orjson
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.configurations.settings import settings
+from src.utils.access_log import AccessLogWriter
+
+__all__ = [
+    "CAPTURE_LOGGER",
+    "CAPTURED_HEADERS",
+    "REDACTED_JSON_FIELDS",
+    "TrafficCaptureMiddleware",
+    "capture_writer",
+    "redact_body",
+]
+
+CAPTURE_LOGGER = "src.capture"
+CAPTURED_HEADERS = ("content-type", "accept", "accept-encoding")
+# Поля JSON-тел, которые заменяются при записи: значения проходят валидацию схем продавца
+REDACTED_JSON_FIELDS = {
+    "password": "{{password}}",
+    "email": "seller-{{$guid}}@replay.bench",
+    "first_name": "Replay",
+    "last_name": "Seller",
+}
+
+
+def redact_body(body: str, content_type: str) -> str:
+    """
+    Заменяет пароль, логин формы входа и личные данные продавца переменными воспроизведения.
+    """
+    if content_type.startswith("application/json"):
+        try:
+            data = orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return body
+        if isinstance(data, dict) and data.keys() & REDACTED_JSON_FIELDS.keys():
+            for key in data.keys() & REDACTED_JSON_FIELDS.keys():
+                data[key] = REDACTED_JSON_FIELDS[key]
+            return orjson.dumps(data).decode()
+        return body
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        fields = []
+        for key, value in parse_qsl(body, keep_blank_values=True):
+            if key == "password":
+                value = "{{password}}"
+            elif key == "username":
+                value = "{{email}}"
+            fields.append((key, value))
+        # Фигурные скобки переменных остаются читаемыми, остальное кодируется как в форме
+        return urlencode(fields, safe="{}")
+    return body
+
+
+capture_writer = AccessLogWriter(
+    settings.capture_enabled,
+    settings.capture_file,
+    1.0,
+    0.0,
+    settings.access_log_batch_size,
+    settings.access_log_queue_size,
+    settings.access_log_flush_interval,
+    logger_name=CAPTURE_LOGGER,
+)
+
+
+class TrafficCaptureMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        writer: Optional[AccessLogWriter] = None,
+        sample_ratio: Optional[float] = None,
+        max_body: Optional[int] = None,
+        exempt_paths: Optional[List[str]] = None,
+    ):
+        self.app = app
+        self.writer = writer or capture_writer
+        self.sample_ratio = settings.capture_sample_ratio if sample_ratio is None else sample_ratio
+        self.max_body = settings.capture_max_body if max_body is None else max_body
+        self.exempt_paths = tuple(settings.capture_exempt_paths if exempt_paths is None else exempt_paths)
+
+    def should_capture(self, scope: Scope) -> bool:
+        if scope["type"] != "http" or not self.writer.enabled:
+            return False
+        path = scope["path"]
+        if not path.startswith("/api/") or path.startswith(self.exempt_paths):
+            return False
+        return self.sample_ratio >= 1.0 or random.random() < self.sample_ratio
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.should_capture(scope):
+            await self.app(scope, receive, send)
+            return
+
+        timestamp = time.time()
+        started = time.perf_counter()
+        status = 500
+        chunks: List[bytes] = []
+        size = 0
+
+        async def receive_wrapper() -> Message:
+            nonlocal size
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                size += len(body)
+                if size <= self.max_body:
+                    chunks.append(body)
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            latency_ms = (time.perf_counter() - started) * 1000
+            self.writer.log(self._entry(scope, timestamp, status, latency_ms, chunks, size))
+
+    def _entry(self, scope: Scope, timestamp: float, status: int, latency_ms: float, chunks: List[bytes], size: int):
+        headers = Headers(scope=scope)
+        route = scope.get("route")
+        truncated = size > self.max_body
+        body = None
+        if size and not truncated:
+            body = redact_body(b"".join(chunks).decode("utf-8", "replace"), headers.get("content-type", ""))
+        return {
+            "ts": round(timestamp, 3),
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope["query_string"].decode("latin-1"),
+            "route": route.path if route is not None else None,
+            "path_params": {key: str(value) for key, value in scope.get("path_params", {}).items()},
+            "headers": {name: headers[name] for name in CAPTURED_HEADERS if name in headers},
+            "auth": "authorization" in headers,
+            "body": body,
+            "body_truncated": truncated,
+            "status": status,
+            "latency_ms": round(latency_ms, 3),
+        }